@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+非同期Claude APIクライアントモジュール
+
+asyncio と aiohttp で Messages API を呼び出す。1つのセッションで接続を保持して再利用し
+（keep-alive）、同時に送信する要求の数をセマフォで制限する。レート制限（429）や過負荷（529）
+などの一時的なエラーは、retry-after ヘッダまたは揺らぎを加えた指数バックオフに従って再試行し、
+待機中は同じクライアントの他の要求の送信も止める。要求ごとにタイムアウトを設定でき、
+タスクを取り消すと送信中の要求も中断する。
+
+リクエストの本文・応答キャッシュ・トークン数の集計・レート制限は ClaudeClient と共有するため、
+同期版と同じプロンプトとキャッシュのまま、複数の呼び出しを重ねて実行できる。
+
+aiohttp がインストールされていない場合は使用できない。
+"""
+
+import asyncio
+import contextvars
+
+try:
+    import aiohttp
+except ImportError:  # aiohttpは任意
+    aiohttp = None
+
+from claude_client import (LineDeduplicator, UnexpectedResponseError, MAX_RETRIES, MAX_TOKENS,
+                           RETRYABLE_STATUS_CODES, SYSTEM_PROMPT, retry_delay)
+from response_cache import make_cache_key
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 300  # 1回の要求の応答を待つ時間の上限（秒）
+KEEPALIVE_TIMEOUT = 60  # 使っていない接続を保持する時間（秒）
+
+# 直前の呼び出しの usage（タスクごとに持つ）
+_last_usage = contextvars.ContextVar("last_usage", default=None)
+# 直前の call_api が失敗したか（タスクごとに持つ）
+_last_failed = contextvars.ContextVar("last_failed", default=False)
+
+
+def is_available():
+    """非同期クライアントを使えるか（aiohttpがインストールされているか）"""
+    return aiohttp is not None
+
+
+class AsyncClaudeClient:
+    def __init__(self, claude, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+        """
+        初期化
+
+        Args:
+            claude (ClaudeClient): 認証情報・APIのURL・応答キャッシュ・計測・レート制限を共有するClaudeクライアント
+            concurrency (int): 同時に送信する要求の数（保持する接続の数）
+            timeout (float): 1回の要求の応答を待つ時間の上限（秒）
+        """
+        if aiohttp is None:
+            raise RuntimeError("aiohttpがインストールされていないため非同期クライアントを使用できません")
+        self.claude = claude
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.telemetry = claude.telemetry
+        self._session = None
+        self._semaphore = None
+        # レート制限を受けたとき、全タスクの送信を再開する時刻（イベントループの時刻）
+        self._resume_at = 0.0
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        await self.close()
+
+    async def open(self):
+        """セッションを開く（接続は要求のたびに作らず、セッション内で再利用する）"""
+        if self._session is not None:
+            return
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=KEEPALIVE_TIMEOUT)
+        self._session = aiohttp.ClientSession(connector=connector, headers=self.claude.headers(),
+                                              timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self._semaphore = asyncio.BoundedSemaphore(self.concurrency)
+
+    async def close(self):
+        """セッションと保持している接続を閉じる"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def last_usage(self):
+        """このタスクで直前に呼び出したAPIの usage（応答キャッシュを使った場合はNone）"""
+        return _last_usage.get()
+
+    @property
+    def last_call_failed(self):
+        """このタスクで直前の call_api が失敗し、エラーメッセージを返したか"""
+        return _last_failed.get()
+
+    async def send_message(self, prompt, system=SYSTEM_PROMPT, max_tokens=MAX_TOKENS, max_retries=MAX_RETRIES,
+                           timeout=None):
+        """
+        Claude APIを呼び出し、応答テキストをそのまま返す
+
+        Args:
+            prompt (Prompt or str): 送信するプロンプト
+            system (str): システムプロンプト
+            max_tokens (int): 最大出力トークン数
+            max_retries (int): 最大再試行回数
+            timeout (float): この要求の応答を待つ時間の上限（秒。省略時は初期化時の値）
+
+        Returns:
+            str: Claudeからの応答
+
+        Raises:
+            aiohttp.ClientError: 再試行しても呼び出しに失敗した場合
+            asyncio.TimeoutError: 応答がタイムアウトした場合
+            UnexpectedResponseError: 応答の形式が想定と異なる場合
+        """
+        await self.open()
+        data = self.claude.message_params(prompt, system, max_tokens)
+        _last_usage.set(None)
+        cache = self.claude.response_cache
+        cache_key = make_cache_key(data) if cache is not None else None
+        if cache_key is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                self.telemetry.count("response_cache_hits")
+                return cached
+
+        # timeout=None を渡すとタイムアウトがなくなるため、指定した場合だけ渡す
+        options = {"timeout": aiohttp.ClientTimeout(total=timeout)} if timeout is not None else {}
+        for attempt in range(max_retries + 1):
+            async with self._semaphore:
+                await self._wait_for_rate_limit()
+                self.telemetry.count("api_requests")
+                async with self._session.post(self.claude.api_url, json=data, **options) as response:
+                    if response.status in RETRYABLE_STATUS_CODES and attempt < max_retries:
+                        self.telemetry.count("api_retries")
+                        self._throttle(retry_delay(response.headers.get("retry-after"), attempt))
+                        continue
+                    if response.status >= 400:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history, status=response.status,
+                            message=await response.text(), headers=response.headers)
+                    result = await response.json()
+
+            _last_usage.set(result.get("usage"))
+            self.telemetry.add_usage(result.get("usage"))
+            if "content" in result and len(result["content"]) > 0 and "text" in result["content"][0]:
+                response_text = result["content"][0]["text"]
+                if cache_key is not None:
+                    cache.put(cache_key, response_text)
+                return response_text
+            raise UnexpectedResponseError(result)
+
+    def _throttle(self, delay):
+        """全タスクの送信を delay 秒後まで止める"""
+        loop = asyncio.get_running_loop()
+        self._resume_at = max(self._resume_at, loop.time() + delay)
+
+    async def _wait_for_rate_limit(self):
+        """レート制限による待機時間が残っていれば待ち、送信用のトークンを取得する"""
+        loop = asyncio.get_running_loop()
+        while True:
+            remaining = self._resume_at - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(remaining)
+        if self.claude.rate_limiter is not None:
+            # トークンバケットは待機中にスレッドを止めるため、イベントループの外で待つ
+            await loop.run_in_executor(None, self.claude.rate_limiter.acquire)
+
+    async def call_api(self, prompt, timeout=None):
+        """
+        Claude APIを呼び出す（ClaudeClient.call_api の非同期版）
+
+        Args:
+            prompt (Prompt or str): 送信するプロンプト
+            timeout (float): 応答を待つ時間の上限（秒）
+
+        Returns:
+            str: 重複行を除いた応答（失敗した場合はエラーメッセージ。last_call_failed が True になる）
+        """
+        _last_failed.set(True)
+        try:
+            response_text = await self.send_message(prompt, timeout=timeout)
+            dedup = LineDeduplicator()
+            text = dedup.feed(response_text) + dedup.flush()
+        except UnexpectedResponseError:
+            return "APIからの応答で予期しない形式が返されました。"
+        except asyncio.TimeoutError:
+            return "APIの呼び出し中にエラーが発生しました: 応答がタイムアウトしました"
+        except aiohttp.ClientError as e:
+            return f"APIの呼び出し中にエラーが発生しました: {e}"
+        _last_failed.set(False)
+        return text
+
+    async def map_prompts(self, prompts, system=SYSTEM_PROMPT, max_tokens=MAX_TOKENS, timeout=None):
+        """
+        複数のプロンプトを並行して送信
+
+        同時に送信するのは concurrency 件までで、残りはセマフォの空きを待つ。
+        呼び出し元のタスクを取り消すと、送信中・待機中の要求もすべて取り消す。
+
+        Args:
+            prompts (list): プロンプトのリスト
+            system (str): システムプロンプト
+            max_tokens (int): 1回あたりの最大出力トークン数
+            timeout (float): 1回あたりの応答を待つ時間の上限（秒）
+
+        Returns:
+            list: プロンプトと同じ順序の応答テキスト（失敗した要素は例外オブジェクト）
+        """
+        return await asyncio.gather(
+            *(self.send_message(prompt, system, max_tokens, timeout=timeout) for prompt in prompts),
+            return_exceptions=True)
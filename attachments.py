@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+添付ファイルのテキスト抽出モジュール
+
+メールの添付ファイルを一時フォルダに保存し、PDF・docx・xlsx・テキストから
+本文を抽出する。抽出はCPU負荷が高いため multiprocessing.Pool の別プロセスで行い、
+COMを操作するスレッドやAPI呼び出しを止めない。ファイルごとにサイズと処理時間の
+上限を設け、抽出結果は内容のハッシュをキーとして MailCache に保存する。
+処理時間の上限は抽出処理の中でもページや段落ごとに確かめるが、1ページの解析で
+止まったワーカーはそれでは止まらないため、上限を過ぎた抽出があった場合と終了時には
+ワーカープロセスごと停止する。プロンプトには抽出したテキストの冒頭だけを含める。
+
+PDFの抽出には pypdf を使う（インストールされていない場合、PDFは抽出しない）。
+"""
+
+import hashlib
+import math
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from xml.etree import ElementTree
+
+try:
+    import pypdf
+except ImportError:  # PDFの抽出は任意機能
+    pypdf = None
+
+# 抽出の対象とする拡張子
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".xlsx", ".txt", ".csv", ".md")
+
+# 1ファイルあたりのサイズの上限（バイト）と処理時間の上限（秒）
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_TIMEOUT_SECONDS = 20
+
+# docx・xlsx内のXMLを展開するときのサイズの上限（圧縮爆弾対策）
+MAX_UNCOMPRESSED_BYTES = 50 * 1024 * 1024
+
+# 1ファイルから抽出する最大文字数と、プロンプトに含める文字数
+MAX_EXTRACTED_CHARS = 20000
+EXCERPT_CHARS = 300
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_SHEET_NAME = re.compile(r'^xl/worksheets/sheet(\d+)\.xml$')
+
+
+class ExtractionLimitExceeded(Exception):
+    """処理時間の上限を超えた"""
+
+
+def is_extractable(filename, size=0, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    テキストを抽出する対象の添付ファイルか判定
+
+    Args:
+        filename (str): ファイル名
+        size (int): サイズ（バイト）
+        max_bytes (int): サイズの上限
+
+    Returns:
+        bool: 対象なら True
+    """
+    return os.path.splitext(filename or "")[1].lower() in SUPPORTED_EXTENSIONS and (size or 0) <= max_bytes
+
+
+def file_hash(path):
+    """ファイル内容のSHA-256の16進文字列"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _check_deadline(deadline):
+    if time.monotonic() > deadline:
+        raise ExtractionLimitExceeded("処理時間の上限を超えました")
+
+
+def _decode(data):
+    """テキストファイルの文字コードを推定して復号"""
+    for encoding in ("utf-8-sig", "cp932"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("utf-8", errors="replace")
+
+
+def _extract_txt(path, max_chars, deadline):
+    with open(path, "rb") as f:
+        data = f.read(max_chars * 4)
+    return _decode(data)[:max_chars]
+
+
+def _open_xml(archive, name):
+    """zip内のXMLを開く（展開後のサイズが上限を超える場合はエラー）"""
+    if archive.getinfo(name).file_size > MAX_UNCOMPRESSED_BYTES:
+        raise ValueError(f"{name} が大きすぎます")
+    return archive.open(name)
+
+
+def _extract_docx(path, max_chars, deadline):
+    parts = []
+    length = 0
+    with zipfile.ZipFile(path) as archive, _open_xml(archive, "word/document.xml") as xml:
+        for _, element in ElementTree.iterparse(xml):
+            if element.tag == _WORD_NS + "t" and element.text:
+                parts.append(element.text)
+                length += len(element.text)
+            elif element.tag == _WORD_NS + "p":
+                parts.append("\n")
+                element.clear()
+                _check_deadline(deadline)
+                if length >= max_chars:
+                    break
+    return "".join(parts)[:max_chars]
+
+
+def _extract_xlsx(path, max_chars, deadline):
+    with zipfile.ZipFile(path) as archive:
+        shared = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            with _open_xml(archive, "xl/sharedStrings.xml") as xml:
+                for _, element in ElementTree.iterparse(xml):
+                    if element.tag == _SHEET_NS + "si":
+                        shared.append("".join(t.text or "" for t in element.iter(_SHEET_NS + "t")))
+                        element.clear()
+        _check_deadline(deadline)
+
+        sheets = sorted((int(m.group(1)), name) for name in archive.namelist() for m in [_SHEET_NAME.match(name)] if m)
+        lines = []
+        length = 0
+        for number, name in sheets:
+            lines.append(f"## シート{number}")
+            with _open_xml(archive, name) as xml:
+                for _, element in ElementTree.iterparse(xml):
+                    if element.tag != _SHEET_NS + "row":
+                        continue
+                    cells = []
+                    for cell in element.iter(_SHEET_NS + "c"):
+                        kind = cell.get("t")
+                        if kind == "inlineStr":
+                            cells.append("".join(t.text or "" for t in cell.iter(_SHEET_NS + "t")))
+                            continue
+                        value = cell.find(_SHEET_NS + "v")
+                        if value is None or value.text is None:
+                            continue
+                        if kind == "s":
+                            index = int(value.text)
+                            cells.append(shared[index] if index < len(shared) else "")
+                        else:
+                            cells.append(value.text)
+                    element.clear()
+                    if cells:
+                        line = "\t".join(cells)
+                        lines.append(line)
+                        length += len(line) + 1
+                    if length >= max_chars:
+                        return "\n".join(lines)[:max_chars]
+                    _check_deadline(deadline)
+        return "\n".join(lines)[:max_chars]
+
+
+def _extract_pdf(path, max_chars, deadline):
+    if pypdf is None:
+        raise RuntimeError("pypdfがインストールされていないためPDFを抽出できません")
+    parts = []
+    length = 0
+    for page in pypdf.PdfReader(path).pages:
+        text = page.extract_text() or ""
+        parts.append(text)
+        length += len(text)
+        if length >= max_chars:
+            break
+        _check_deadline(deadline)
+    return "\n".join(parts)[:max_chars]
+
+
+_EXTRACTORS = {
+    ".txt": _extract_txt,
+    ".csv": _extract_txt,
+    ".md": _extract_txt,
+    ".docx": _extract_docx,
+    ".xlsx": _extract_xlsx,
+    ".pdf": _extract_pdf,
+}
+
+
+def extract_text(path, max_bytes=DEFAULT_MAX_BYTES, timeout=DEFAULT_TIMEOUT_SECONDS, max_chars=MAX_EXTRACTED_CHARS):
+    """
+    ファイルからテキストを抽出（ワーカープロセスで実行する）
+
+    Args:
+        path (str): ファイルのパス
+        max_bytes (int): サイズの上限（超える場合は抽出しない）
+        timeout (float): 処理時間の上限（秒）
+        max_chars (int): 抽出する最大文字数
+
+    Returns:
+        tuple: (抽出したテキスト, エラーメッセージ)。失敗した場合はテキストがNone
+    """
+    extractor = _EXTRACTORS.get(os.path.splitext(path)[1].lower())
+    if extractor is None:
+        return None, "未対応の形式です"
+    try:
+        if os.path.getsize(path) > max_bytes:
+            return None, "サイズの上限を超えています"
+        text = extractor(path, max_chars, time.monotonic() + timeout)
+        return " ".join(text.split()), None
+    except Exception as e:
+        return None, str(e)
+
+
+def format_attachments(email, excerpt_chars=EXCERPT_CHARS):
+    """
+    プロンプト用に添付ファイルを整形
+
+    Args:
+        email (EmailRecord): メール情報
+        excerpt_chars (int): 1ファイルあたりに含める文字数
+
+    Returns:
+        str: 「あり」「なし」に、抽出したテキストがある添付ファイルの抜粋を続けた文字列
+    """
+    if not email.has_attachments:
+        return "なし"
+    lines = ["あり"]
+    for attachment in email.attachments:
+        if attachment.text:
+            text = attachment.text
+            lines.append(f"  - {attachment.filename}: {text[:excerpt_chars]}{'...' if len(text) > excerpt_chars else ''}")
+    return "\n".join(lines)
+
+
+class AttachmentExtractor:
+    def __init__(self, cache=None, workers=None, max_bytes=DEFAULT_MAX_BYTES, timeout=DEFAULT_TIMEOUT_SECONDS):
+        """
+        初期化
+
+        Args:
+            cache (MailCache): 抽出したテキストの保存先（省略時は使用しない）
+            workers (int): ワーカープロセスの数（省略時はCPU数）
+            max_bytes (int): 1ファイルあたりのサイズの上限
+            timeout (float): 1ファイルあたりの処理時間の上限（秒）
+        """
+        self.cache = cache
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.temp_dir = tempfile.mkdtemp(prefix="outlook_attachments_")
+        self._pool = None
+        self._pool_size = 0
+        self._pending = []  # (添付ファイル, AsyncResult, 提出時刻)
+        self.extracted = 0
+        self.reused = 0
+        self.failed = 0
+
+    def submit(self, email):
+        """
+        メールの添付ファイルの抽出を開始（結果は待たない）
+
+        保存済みの添付ファイル（path を持つもの）を対象とし、内容のハッシュが
+        キャッシュにあればその場でテキストを設定する。
+
+        Args:
+            email (EmailRecord): 添付ファイル情報を取得済みのメール
+        """
+        for attachment in email.attachments:
+            if attachment.text is not None:
+                continue
+            if attachment.content_hash is None and attachment.path and os.path.exists(attachment.path):
+                attachment.content_hash = file_hash(attachment.path)
+            if attachment.content_hash is None:
+                continue
+            cached = self.cache.get_attachment_text(attachment.content_hash) if self.cache is not None else None
+            if cached is not None:
+                attachment.text = cached
+                self.reused += 1
+                continue
+            if not attachment.path or not os.path.exists(attachment.path):
+                continue
+            if self._pool is None:
+                self._pool_size = self.workers or os.cpu_count() or 1
+                self._pool = multiprocessing.Pool(self._pool_size)
+            result = self._pool.apply_async(extract_text, (attachment.path, self.max_bytes, self.timeout))
+            self._pending.append((attachment, result, time.monotonic()))
+
+    def collect(self):
+        """
+        抽出の完了を待ち、各添付ファイルにテキストを設定
+
+        処理時間の上限を過ぎても終わらない抽出は待たずに失敗として扱い、
+        止まったワーカーが残らないように、すべて受け取った後でワーカープロセスを停止する
+        （次に submit したときに作り直す）。
+        """
+        timed_out = False
+        for position, (attachment, result, submitted_at) in enumerate(self._pending, 1):
+            # 先に提出した抽出が終わるまでワーカーが空かないため、待ち行列の順番に応じて上限を延ばす
+            # （ワーカーの起動と結果の受け渡しの分として、さらに1ファイル分の余裕を持たせる）
+            rounds = math.ceil(position / self._pool_size) + 1
+            remaining = max(0.0, submitted_at + self.timeout * rounds - time.monotonic())
+            try:
+                text, error = result.get(timeout=remaining)
+            except multiprocessing.TimeoutError:
+                timed_out = True
+                text, error = None, "処理時間の上限を超えました"
+            except Exception as e:
+                text, error = None, str(e)
+
+            if text is None:
+                self.failed += 1
+                print(f"  添付ファイル {attachment.filename} のテキストを抽出できませんでした: {error}")
+                continue
+            attachment.text = text
+            self.extracted += 1
+            if self.cache is not None:
+                self.cache.put_attachment_text(attachment.content_hash, text)
+        self._pending = []
+        if timed_out:
+            self._terminate()
+
+    def stats(self):
+        """表示用の集計"""
+        return f"抽出 {self.extracted}件 / キャッシュ {self.reused}件 / 失敗 {self.failed}件"
+
+    def _terminate(self):
+        """処理中の抽出があってもワーカープロセスを停止"""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def close(self):
+        """ワーカープロセスを停止し、一時フォルダを削除"""
+        self._pending = []
+        self._terminate()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
@@ -0,0 +1,454 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+一括モジュール
+
+複数のメールボックス（自分のメールボックス、共有・代理アクセスのメールボックス、
+追加したストア）のレポートを1回の実行でまとめて作成する。メールボックスごとの
+取得はスレッドプールで並列に行い、スレッドごとにCOMのアパートメントを初期化して
+Outlookに接続する。取得が終わったメールボックスから順にAPI呼び出し用の
+スレッドプールに渡し、全スレッドで共有するトークンバケットで送信間隔を制限する。
+全体の所要時間は、全員分の合計ではなく最も時間のかかる利用者に近くなる。
+非同期クライアントを使う場合は、API呼び出し用のスレッドプールの代わりに1つのイベントループで
+各利用者のレポート作成を並行して進め、取得はスレッドプールで行ったまま重ねて実行する。
+
+メールボックスの一覧はJSONファイルで指定する:
+
+[
+  {"name": "ceo", "address": "ceo@example.com", "kind": "shared",
+   "emails": 20, "days": 7, "settings": {"priority_keywords": ["取締役会"]}},
+  {"name": "me"}
+]
+"""
+
+import asyncio
+import copy
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import win32com.client
+    import pythoncom
+except ImportError:  # Windows以外ではpywin32を利用できない
+    win32com = None
+    pythoncom = None
+
+from async_claude_client import AsyncClaudeClient
+from mail_cache import MailCache
+from mail_store import OL_FOLDER_INBOX
+from outlook_client import OutlookClient
+from records import Record
+
+# メールボックスの種類
+DEFAULT_MAILBOX = "default"  # 自分のメールボックス（Namespace.GetDefaultFolder）
+SHARED_MAILBOX = "shared"    # 共有・代理アクセス（Namespace.GetSharedDefaultFolder）
+STORE_MAILBOX = "store"      # Outlookに追加したストア（Namespace.Folders）
+MAILBOX_KINDS = (DEFAULT_MAILBOX, SHARED_MAILBOX, STORE_MAILBOX)
+
+DEFAULT_FETCH_WORKERS = 4
+DEFAULT_API_WORKERS = 4
+DEFAULT_RATE_LIMIT = 50  # 1分あたりのAPIリクエスト数
+
+
+class MailboxConfig(Record):
+    """一括モードで処理するメールボックスと利用者ごとの設定"""
+
+    __slots__ = ("name", "address", "kind", "emails", "days", "settings", "output", "cache_file")
+    _defaults = {"kind": DEFAULT_MAILBOX, "settings": {}}
+
+
+def load_mailboxes(path):
+    """
+    メールボックスの一覧をJSONファイルから読み込む
+
+    Args:
+        path (str): JSONファイルのパス
+
+    Returns:
+        list: MailboxConfig のリスト
+
+    Raises:
+        ValueError: 名前の重複や不明な種類がある場合
+    """
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+
+    mailboxes = []
+    names = set()
+    for entry in entries:
+        mailbox = MailboxConfig(**entry)
+        mailbox.name = mailbox.name or mailbox.address or DEFAULT_MAILBOX
+        if mailbox.name in names:
+            raise ValueError(f"メールボックスの名前が重複しています: {mailbox.name}")
+        if mailbox.kind not in MAILBOX_KINDS:
+            raise ValueError(f"メールボックスの種類が不明です: {mailbox.kind}（{', '.join(MAILBOX_KINDS)} のいずれか）")
+        if mailbox.kind != DEFAULT_MAILBOX and not mailbox.address:
+            raise ValueError(f"メールボックス {mailbox.name} の address を指定してください")
+        names.add(mailbox.name)
+        mailboxes.append(mailbox)
+    return mailboxes
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        """
+        初期化
+
+        Args:
+            rate (float): 1秒あたりに補充するトークン数
+            capacity (float): バケットの容量（連続して送信できる数）
+            clock (callable): 現在時刻（秒）を返す関数
+            sleep (callable): 待機する関数
+        """
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        トークンを取得（足りない場合は補充されるまで待つ）
+
+        Args:
+            tokens (float): 取得するトークン数
+
+        Returns:
+            float: 待った時間（秒）
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            self.sleep(delay)
+            waited += delay
+
+
+@contextmanager
+def com_apartment():
+    """現在のスレッドでCOMのアパートメント（STA）を初期化し、終了時に解放する"""
+    if pythoncom is None:
+        yield
+        return
+    pythoncom.CoInitializeEx(pythoncom.COINIT_APARTMENTTHREADED)
+    try:
+        yield
+    finally:
+        pythoncom.CoUninitialize()
+
+
+class MailboxNamespace:
+    """
+    共有・代理アクセスのメールボックスやストアを、既定のメールボックスと同じ
+    インターフェース（GetDefaultFolder, GetItemFromID）で扱うための名前空間
+
+    OutlookClient と OutlookMailStore はこの2つのメソッドだけを使うため、
+    namespace に渡せば対象のメールボックスからそのまま取得できる。
+    """
+
+    def __init__(self, namespace, address=None, kind=DEFAULT_MAILBOX):
+        """
+        初期化
+
+        Args:
+            namespace: MAPI名前空間
+            address (str): 共有メールボックスのアドレス、またはストアの表示名
+            kind (str): メールボックスの種類
+        """
+        self.namespace = namespace
+        self.address = address
+        self.kind = kind
+        self._folders = {}
+        self._store_id = None
+        self._recipient = None
+
+    def GetDefaultFolder(self, folder_id):
+        folder = self._folders.get(folder_id)
+        if folder is not None:
+            return folder
+        if self.kind == SHARED_MAILBOX:
+            if self._recipient is None:
+                recipient = self.namespace.CreateRecipient(self.address)
+                recipient.Resolve()
+                if not recipient.Resolved:
+                    raise RuntimeError(f"共有メールボックス {self.address} を解決できませんでした")
+                self._recipient = recipient
+            folder = self.namespace.GetSharedDefaultFolder(self._recipient, folder_id)
+        elif self.kind == STORE_MAILBOX:
+            folder = self.namespace.Folders.Item(self.address).Store.GetDefaultFolder(folder_id)
+        else:
+            folder = self.namespace.GetDefaultFolder(folder_id)
+        if self.kind != DEFAULT_MAILBOX and self._store_id is None:
+            self._store_id = folder.StoreID
+        self._folders[folder_id] = folder
+        return folder
+
+    def GetItemFromID(self, entry_id):
+        # 既定以外のストアのアイテムは StoreID を指定しないと取得できない
+        if self._store_id is not None:
+            return self.namespace.GetItemFromID(entry_id, self._store_id)
+        return self.namespace.GetItemFromID(entry_id)
+
+
+def open_outlook_mailbox(mailbox):
+    """
+    現在のスレッドでOutlookに接続し、メールボックスの名前空間を返す
+
+    COMのオブジェクトはアパートメントをまたいで使えないため、スレッドごとに接続する。
+
+    Args:
+        mailbox (MailboxConfig): メールボックス
+
+    Returns:
+        MailboxNamespace: メールボックスの名前空間
+    """
+    if win32com is None:
+        raise RuntimeError("Outlookへの接続に失敗しました: pywin32がインストールされていません")
+    namespace = win32com.client.Dispatch("Outlook.Application").GetNamespace("MAPI")
+    mailbox_namespace = MailboxNamespace(namespace, mailbox.address, mailbox.kind)
+    # アクセス権がない・アドレスを解決できないなどの失敗は、ここでメールボックスのエラーとして扱う
+    mailbox_namespace.GetDefaultFolder(OL_FOLDER_INBOX)
+    return mailbox_namespace
+
+
+class BatchResult(Record):
+    """メールボックス1件分の処理結果"""
+
+    __slots__ = ("name", "report_path", "error", "emails", "events", "fetch_seconds", "total_seconds")
+    _defaults = {"emails": 0, "events": 0}
+
+
+class BatchRunner:
+    def __init__(self, mailboxes, args, settings, claude, session_factory, open_mailbox=open_outlook_mailbox,
+                 fetch_workers=DEFAULT_FETCH_WORKERS, api_workers=DEFAULT_API_WORKERS, telemetry=None, async_api=False):
+        """
+        初期化
+
+        Args:
+            mailboxes (list): MailboxConfig のリスト
+            args (argparse.Namespace): 全員に共通のコマンドライン引数
+            settings (dict): 全員に共通のカスタム設定（メールボックスの settings で上書きする）
+            claude (ClaudeClient): 全スレッドで共有するClaudeクライアント（レート制限を共有する）
+            session_factory (callable): (args, settings, outlook, cache, report_file, name) から ReportSession を作る関数
+            open_mailbox (callable): MailboxConfig から名前空間を返す関数（取得用スレッドで呼ばれる）
+            fetch_workers (int): 取得を並列に行うスレッド数
+            api_workers (int): API呼び出しを並列に行うスレッド数（非同期クライアントでは同時に送信する要求の数）
+            telemetry (Telemetry): 所要時間の集計先
+            async_api (bool): レポート作成のAPI呼び出しに非同期クライアント（aiohttp）を使うか
+        """
+        self.mailboxes = mailboxes
+        self.args = args
+        self.settings = settings
+        self.claude = claude
+        self.session_factory = session_factory
+        self.open_mailbox = open_mailbox
+        self.fetch_workers = fetch_workers
+        self.api_workers = api_workers
+        self.telemetry = telemetry
+        self.async_api = async_api
+
+    def _mailbox_args(self, mailbox):
+        """メールボックスごとのコマンドライン引数"""
+        args = copy.copy(self.args)
+        if mailbox.emails is not None:
+            args.emails = mailbox.emails
+        if mailbox.days is not None:
+            args.days = mailbox.days
+        # 複数の利用者のレポートが画面上で混ざらないよう、ストリーミングは使わない
+        args.stream = False
+        return args
+
+    def _cache_file(self, mailbox):
+        """メールボックスごとのキャッシュファイル"""
+        if mailbox.cache_file:
+            return mailbox.cache_file
+        stem, ext = os.path.splitext(self.args.cache_file)
+        return f"{stem}_{mailbox.name}{ext}"
+
+    def _report_file(self, mailbox, timestamp):
+        return mailbox.output or f"assistant_report_{mailbox.name}_{timestamp}.md"
+
+    def _fetch(self, mailbox, timestamp):
+        """取得用スレッドでメールと予定を取得し、レポート作成前のセッションを返す"""
+        started_at = time.perf_counter()
+        settings = {**self.settings, **(mailbox.settings or {})}
+        # キャッシュは取得用スレッドで開き、レポート作成用スレッドで閉じる（同時には使わない）
+        cache = None if self.args.no_cache else MailCache(self._cache_file(mailbox), check_same_thread=False)
+        try:
+            with com_apartment():
+                outlook = OutlookClient(cache=cache, namespace=self.open_mailbox(mailbox), telemetry=self.telemetry)
+                session = self.session_factory(self._mailbox_args(mailbox), settings, outlook, cache,
+                                               self._report_file(mailbox, timestamp), mailbox.name)
+                try:
+                    print(f"\n[{mailbox.name}] メールと予定を取得します...")
+                    session.fetch_emails()
+                    session.fetch_events()
+                finally:
+                    # アパートメントを解放する前にCOMオブジェクトへの参照を手放す
+                    outlook.disconnect()
+        except Exception:
+            if cache is not None:
+                cache.close()
+            raise
+        return session, time.perf_counter() - started_at
+
+    def _generate(self, mailbox, session):
+        """API呼び出し用スレッドでレポートを作成"""
+        try:
+            print(f"\n[{mailbox.name}] レポートを作成します...")
+            return session.generate()
+        finally:
+            self._close_cache(session)
+
+    def _close_cache(self, session):
+        if session.cache is not None:
+            session.cache.prune()
+            session.cache.close()
+
+    def collect_prompts(self):
+        """
+        全メールボックスを取得してプロンプトだけを作成（Message Batches APIでまとめて送る場合）
+
+        Returns:
+            list: (メールボックス名, プロンプト, レポートのファイル名) のリスト
+                （mailboxes の順。取得に失敗したメールボックスは含まない）
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        prompts = {}
+        with ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix="fetch") as fetch_pool:
+            fetches = {fetch_pool.submit(self._fetch, mailbox, timestamp): mailbox for mailbox in self.mailboxes}
+            for future in as_completed(fetches):
+                mailbox = fetches[future]
+                try:
+                    session, _ = future.result()
+                    try:
+                        prompt = session.build_prompt()
+                    finally:
+                        self._close_cache(session)
+                except Exception as e:
+                    print(f"\n[{mailbox.name}] 取得中にエラー: {e}")
+                    traceback.print_exc()
+                    continue
+                prompts[mailbox.name] = (mailbox.name, prompt, session.report_file)
+        return [prompts[mailbox.name] for mailbox in self.mailboxes if mailbox.name in prompts]
+
+    def run(self):
+        """
+        全メールボックスのレポートを作成
+
+        取得が終わったメールボックスから順にレポート作成を始めるため、
+        取得とAPI呼び出しが重なって進む。
+
+        Returns:
+            list: BatchResult のリスト（mailboxes の順）
+        """
+        started_at = time.perf_counter()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        results = {mailbox.name: BatchResult(name=mailbox.name) for mailbox in self.mailboxes}
+        if self.async_api:
+            asyncio.run(self._run_async(results, started_at, timestamp))
+            return self._finish(results)
+
+        with ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix="fetch") as fetch_pool, \
+                ThreadPoolExecutor(max_workers=self.api_workers, thread_name_prefix="api") as api_pool:
+            fetches = {fetch_pool.submit(self._fetch, mailbox, timestamp): mailbox for mailbox in self.mailboxes}
+            reports = {}
+            for future in as_completed(fetches):
+                mailbox = fetches[future]
+                result = results[mailbox.name]
+                try:
+                    session, result.fetch_seconds = future.result()
+                except Exception as e:
+                    print(f"\n[{mailbox.name}] 取得中にエラー: {e}")
+                    traceback.print_exc()
+                    result.error = str(e)
+                    continue
+                result.emails = len(session.emails_data)
+                result.events = len(session.events_data)
+                reports[api_pool.submit(self._generate, mailbox, session)] = mailbox
+
+            for future in as_completed(reports):
+                mailbox = reports[future]
+                result = results[mailbox.name]
+                try:
+                    result.report_path = future.result()
+                except Exception as e:
+                    print(f"\n[{mailbox.name}] レポート作成中にエラー: {e}")
+                    traceback.print_exc()
+                    result.error = str(e)
+                result.total_seconds = time.perf_counter() - started_at
+        return self._finish(results)
+
+    async def _run_async(self, results, started_at, timestamp):
+        """取得はスレッドプールで、レポート作成は非同期クライアントで、メールボックスごとに並行して進める"""
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix="fetch") as fetch_pool:
+            async with AsyncClaudeClient(self.claude, self.api_workers) as client:
+                async def process(mailbox):
+                    result = results[mailbox.name]
+                    try:
+                        session, result.fetch_seconds = await loop.run_in_executor(
+                            fetch_pool, self._fetch, mailbox, timestamp)
+                    except Exception as e:
+                        print(f"\n[{mailbox.name}] 取得中にエラー: {e}")
+                        traceback.print_exc()
+                        result.error = str(e)
+                        return
+                    result.emails = len(session.emails_data)
+                    result.events = len(session.events_data)
+                    try:
+                        print(f"\n[{mailbox.name}] レポートを作成します...")
+                        result.report_path = await session.generate_async(client)
+                    except Exception as e:
+                        print(f"\n[{mailbox.name}] レポート作成中にエラー: {e}")
+                        traceback.print_exc()
+                        result.error = str(e)
+                    finally:
+                        self._close_cache(session)
+                    result.total_seconds = time.perf_counter() - started_at
+
+                await asyncio.gather(*(process(mailbox) for mailbox in self.mailboxes))
+
+    def _finish(self, results):
+        """結果を集計して mailboxes の順に並べる"""
+        if self.telemetry is not None:
+            self.telemetry.count("mailboxes", len(self.mailboxes))
+            self.telemetry.count("mailbox_errors", sum(1 for r in results.values() if r.error))
+        return [results[mailbox.name] for mailbox in self.mailboxes]
+
+
+def format_results(results, elapsed):
+    """
+    表示用の結果一覧
+
+    Args:
+        results (list): BatchResult のリスト
+        elapsed (float): 全体の所要時間（秒）
+
+    Returns:
+        str: 結果の一覧
+    """
+    lines = [f"一括処理の結果（{len(results)}件, 全体 {elapsed:.1f}秒）:"]
+    for result in results:
+        if result.error:
+            lines.append(f"  {result.name}: 失敗 - {result.error}")
+        else:
+            lines.append(f"  {result.name}: メール{result.emails}件, 予定{result.events}件, "
+                         f"取得 {result.fetch_seconds or 0:.1f}秒, 完了 {result.total_seconds or 0:.1f}秒"
+                         f" - {result.report_path or '変更なし'}")
+    return "\n".join(lines)
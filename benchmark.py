@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ベンチマークスクリプト
+
+Outlookやネットワークに接続せず、合成データで各処理の性能を計測する。
+
+使用方法:
+python benchmark.py classifier [--count N]
+python benchmark.py calendar [--days N] [--recurring N]
+python benchmark.py prompt [--emails N] [--events N]
+python benchmark.py suite [--sizes N,N,...] [--repeat N] [--output FILE] [--baseline FILE]
+python benchmark.py batch [--users N] [--com-latency SEC] [--api-latency SEC]
+python benchmark.py archive [--reports N] [--users N]
+python benchmark.py entities [--count N]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from async_claude_client import is_available as async_api_available
+from batch import BatchRunner, MailboxConfig, MailboxNamespace, TokenBucket, SHARED_MAILBOX
+from config import DEFAULT_SETTINGS, create_arg_parser as create_report_arg_parser
+from entity_extractor import annotate
+from priority_classifier import PriorityClassifier
+from calendar_index import CalendarIndex
+from claude_client import ClaudeClient
+from fake_outlook import generate_fake_events, generate_fake_mailbox, generate_fake_messages
+from mock_claude_server import MockClaudeServer
+from outlook_assistant import ReportSession
+from outlook_client import OutlookClient
+from prompt_templates import PromptRenderer
+from records import EmailRecord
+from report_archive import ReportArchive
+
+
+def _print_result(name, count, elapsed):
+    """計測結果を表示"""
+    rate = count / elapsed if elapsed > 0 else float("inf")
+    print(f"  {name}: {count}件 / {elapsed:.3f}秒 ({rate:,.0f}件/秒)")
+
+
+def _naive_score(email, settings):
+    """比較用: キーワードとドメインを1つずつ照合する素朴な実装"""
+    score = 0
+    sender_email = email.sender_email.lower()
+    if any(sender_email.endswith("@" + d) for d in settings["priority_domains"]):
+        score += 1
+    for keyword in settings["priority_keywords"]:
+        if keyword in email.subject or keyword in email.body:
+            score += 1
+    return score
+
+
+def bench_classifier(args):
+    """優先度分類の計測"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings["priority_keywords"] = settings["priority_keywords"] + [f"KW{i:04d}" for i in range(args.keywords)]
+    emails = [EmailRecord.from_row(message, i)
+              for i, message in enumerate(generate_fake_messages(args.count, seed=args.seed), 1)]
+    now = datetime.now()
+    print(f"優先度分類: メール{args.count}件, キーワード{len(settings['priority_keywords'])}個")
+
+    start = time.perf_counter()
+    classifier = PriorityClassifier(settings)
+    print(f"  コンパイル: {time.perf_counter() - start:.3f}秒")
+
+    start = time.perf_counter()
+    results = [classifier.classify(email, now) for email in emails]
+    _print_result("PriorityClassifier", len(emails), time.perf_counter() - start)
+    print(f"  優先メール: {sum(1 for r in results if r['priority'])}件")
+
+    start = time.perf_counter()
+    for email in emails:
+        _naive_score(email, settings)
+    _print_result("素朴な照合（参考）", len(emails), time.perf_counter() - start)
+
+
+def bench_calendar(args):
+    """カレンダー解析の計測"""
+    events = generate_fake_events(args.days, args.recurring, seed=args.seed)
+    print(f"カレンダー解析: {args.days}日間, 定期的な予定{args.recurring}件, 展開後{len(events)}件")
+
+    start = time.perf_counter()
+    index = CalendarIndex(events)
+    _print_result("索引の作成", len(events), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    conflicts = index.conflicts()
+    _print_result("重複の検出", len(events), time.perf_counter() - start)
+    print(f"  重複: {len(conflicts)}組")
+
+    start = time.perf_counter()
+    facts = index.summarize(DEFAULT_SETTINGS, first_day=datetime.now().date(), days=args.days)
+    _print_result("事実一覧の作成", len(events), time.perf_counter() - start)
+    print(f"  事実一覧: {len(facts)}文字")
+
+
+def bench_prompt(args):
+    """プロンプト描画の計測（件数を倍にしたときの処理時間で線形性を確認する）"""
+    emails = [EmailRecord.from_row(message, i)
+              for i, message in enumerate(generate_fake_messages(args.emails, seed=args.seed), 1)]
+    events = generate_fake_events(-(-args.events // 3), 0, single_per_day=3, seed=args.seed)[:args.events]
+    renderer = PromptRenderer(DEFAULT_SETTINGS)
+    print(f"プロンプト描画: メール{len(emails)}件, 予定{len(events)}件")
+
+    for divisor in (4, 2, 1):
+        email_count = len(emails) // divisor
+        event_count = len(events) // divisor
+        start = time.perf_counter()
+        prompt = renderer.render(emails[:email_count], events[:event_count])
+        elapsed = time.perf_counter() - start
+        _print_result(f"1/{divisor}（{len(prompt.text()):,}文字）", email_count + event_count, elapsed)
+
+
+def percentile(values, p):
+    """
+    パーセンタイルを計算（線形補間）
+
+    Args:
+        values (list): 値のリスト
+        p (float): 0～100のパーセンタイル
+
+    Returns:
+        float: パーセンタイル値
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _measure(samples, name, func):
+    """func を実行して所要時間を samples[name] に追加し、戻り値を返す"""
+    start = time.perf_counter()
+    result = func()
+    samples.setdefault(name, []).append(time.perf_counter() - start)
+    return result
+
+
+def _run_suite_once(namespace, server, args, samples):
+    """取得・プロンプト作成・API呼び出しを1回実行して各段の時間を記録"""
+    start = time.perf_counter()
+    outlook = OutlookClient(namespace=namespace)
+    claude = ClaudeClient("mock-key", "2023-06-01", api_url=server.url)
+    with contextlib.redirect_stdout(io.StringIO()):
+        emails = _measure(samples, "fetch_emails", lambda: outlook.get_unread_emails(args.emails))
+        events = _measure(samples, "fetch_events", lambda: outlook.get_calendar_events(args.days))
+        prompt = _measure(samples, "prompt", lambda: claude.create_prompt(emails, events, DEFAULT_SETTINGS))
+        if args.stream:
+            _measure(samples, "api", lambda: claude.call_api_stream(prompt))
+        else:
+            _measure(samples, "api", lambda: claude.call_api(prompt))
+    samples.setdefault("end_to_end", []).append(time.perf_counter() - start)
+    return len(emails), len(events)
+
+
+def bench_suite(args):
+    """疑似Outlookとモックサーバーを使った取得・プロンプト作成・全体の計測"""
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = {}
+    with MockClaudeServer(latency=args.api_latency, chunk_delay=args.chunk_delay) as server:
+        for size in sizes:
+            namespace = generate_fake_mailbox(size, days=args.days, seed=args.seed, latency=args.com_latency)
+            samples = {}
+            for _ in range(args.repeat):
+                email_count, event_count = _run_suite_once(namespace, server, args, samples)
+            com_calls = namespace.latency.calls // args.repeat
+            print(f"メールボックス{size:,}件: メール{email_count}件, 予定{event_count}件を取得, COM呼び出し{com_calls:,}回/回")
+            items = {"fetch_emails": email_count, "fetch_events": event_count,
+                     "prompt": email_count + event_count, "api": 1, "end_to_end": email_count + event_count}
+            results[str(size)] = {}
+            for name, values in samples.items():
+                p50 = percentile(values, 50)
+                p95 = percentile(values, 95)
+                throughput = items[name] / p50 if p50 > 0 else float("inf")
+                results[str(size)][name] = {"p50": p50, "p95": p95, "throughput": throughput}
+                print(f"  {name:<13} p50 {p50 * 1000:9.2f}ms  p95 {p95 * 1000:9.2f}ms  {throughput:12,.0f}件/秒")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"計測結果を保存しました: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = []
+        for size, stages in results.items():
+            for name, result in stages.items():
+                base = baseline.get(size, {}).get(name)
+                if base and result["p95"] > base["p95"] * (1 + args.tolerance):
+                    regressions.append(f"  {size}件 {name}: p95 {base['p95'] * 1000:.2f}ms → {result['p95'] * 1000:.2f}ms")
+        if regressions:
+            print(f"性能の劣化を検出しました（許容 +{args.tolerance:.0%}）:")
+            print("\n".join(regressions))
+            sys.exit(1)
+        print("基準との比較: 劣化はありません。")
+
+
+def bench_batch(args):
+    """複数メールボックスの一括処理を、1件ずつ順に処理した場合と比較"""
+    com_lock = threading.Lock()
+    shared = {f"user{i}@example.com": generate_fake_mailbox(args.size, seed=i, latency=args.com_latency,
+                                                            store_id=f"STORE{i}", com_lock=com_lock)
+              for i in range(args.users)}
+    primary = generate_fake_mailbox(0, shared=shared, com_lock=com_lock)
+    report_args = create_report_arg_parser().parse_args(
+        ["--emails", str(args.emails), "--no-cache", "--no-response-cache", "--no-normalize"])
+
+    with MockClaudeServer(latency=args.api_latency) as server, tempfile.TemporaryDirectory() as report_dir:
+        mailboxes = [MailboxConfig(name=f"user{i}", address=address, kind=SHARED_MAILBOX,
+                                   output=os.path.join(report_dir, f"user{i}.md"))
+                     for i, address in enumerate(shared)]
+
+        def run(mailboxes, fetch_workers, api_workers, async_api=False):
+            claude = ClaudeClient("mock-key", "2023-06-01", api_url=server.url,
+                                  rate_limiter=TokenBucket(args.rate_limit / 60, api_workers))
+
+            def create_session(mailbox_args, settings, outlook, cache, report_file, name):
+                return ReportSession(mailbox_args, settings, outlook, claude, cache, report_file=report_file,
+                                     user=name)
+
+            runner = BatchRunner(mailboxes, report_args, DEFAULT_SETTINGS, claude, create_session,
+                                 open_mailbox=lambda m: MailboxNamespace(primary, m.address, m.kind),
+                                 fetch_workers=fetch_workers, api_workers=api_workers, async_api=async_api)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = runner.run()
+            elapsed = time.perf_counter() - start
+            failed = [r.name for r in results if r.error or not r.report_path]
+            if failed:
+                print(f"  失敗したメールボックス: {', '.join(failed)}")
+            return elapsed
+
+        print(f"{args.users}人分（各{args.size:,}件, COM {args.com_latency * 1000:.1f}ms/回, API {args.api_latency:.2f}秒）:")
+        single = run(mailboxes[:1], 1, 1)
+        print(f"  1人分だけの処理: {single:.2f}秒")
+        sequential = run(mailboxes, 1, 1)
+        print(f"  1件ずつ順に処理: {sequential:.2f}秒")
+        parallel = run(mailboxes, args.workers, args.workers)
+        print(f"  一括処理（{args.workers}並列）: {parallel:.2f}秒（順に処理した場合の{sequential / parallel:.1f}倍速）")
+        if async_api_available():
+            concurrent = run(mailboxes, args.workers, args.workers, async_api=True)
+            print(f"  一括処理（非同期, 同時{args.workers}件）: {concurrent:.2f}秒（順に処理した場合の{sequential / concurrent:.1f}倍速）")
+
+
+_VENDORS = ["A社", "B商事", "C工業", "Dシステムズ", "E物産", "F電機", "G建設", "H銀行"]
+_ACTIONS = ["見積書を確認", "契約書をレビュー", "請求書を承認", "議事録を共有", "提案書を作成", "納期を回答"]
+
+
+def _synthetic_report(rng, day):
+    """合成レポート（タスク管理の節を含む）"""
+    tasks = [f"- {rng.choice(_VENDORS)}の{rng.choice(_ACTIONS)}する（期限: {(day + timedelta(days=rng.randint(0, 14))):%m/%d}）"
+             for _ in range(rng.randint(3, 8))]
+    mails = [f"- {rng.choice(_VENDORS)}から{rng.choice(['至急', '確認依頼', '共有', 'お知らせ'])}: "
+             f"{rng.choice(_ACTIONS)}についての連絡 #{rng.randint(1, 99999)}" for _ in range(10)]
+    return "\n".join([f"# 秘書レポート {day:%Y-%m-%d}", "## 1. 重要メールの要約", *mails,
+                      "## 3. タスク管理", *tasks, "## 4. 提案事項", "- 午後に集中作業時間を確保してください。"])
+
+
+def bench_archive(args):
+    """レポートアーカイブの登録・全文検索・タスクの差分の計測"""
+    rng = random.Random(args.seed)
+    first_day = datetime(2020, 1, 1, 9)
+    with tempfile.TemporaryDirectory() as work_dir:
+        archive = ReportArchive(os.path.join(work_dir, "archive.sqlite3"))
+        print(f"レポートアーカイブ: レポート{args.reports:,}件, 利用者{args.users}人")
+
+        start = time.perf_counter()
+        for i in range(args.reports):
+            day = first_day + timedelta(days=i // args.users)
+            archive.add(_synthetic_report(rng, day), user=f"user{i % args.users}", run_id=f"run{i}",
+                        settings={}, usage={"input_tokens": 2000, "output_tokens": 800}, created_at=day)
+        archive.conn.commit()
+        _print_result("登録", args.reports, time.perf_counter() - start)
+        print(f"  ファイルサイズ: {os.path.getsize(archive.path) / 1024 / 1024:.1f}MB")
+
+        queries = [("最初に現れたレポート", "F電機の納期", {"oldest_first": True, "limit": 1}),
+                   ("最新の20件", "契約書をレビュー", {}),
+                   ("利用者・期間で絞り込み", "請求書", {"user": "user1", "since": first_day + timedelta(days=365)}),
+                   ("2文字（インデックスなし）", "至急", {"limit": 20})]
+        for name, query, options in queries:
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                results = archive.search(query, **options)
+                samples.append(time.perf_counter() - start)
+            print(f"  検索 {name}「{query}」: {len(results)}件, p50 {percentile(samples, 50) * 1000:.2f}ms, "
+                  f"p95 {percentile(samples, 95) * 1000:.2f}ms")
+
+        start = time.perf_counter()
+        diff = archive.diff(user="user0")
+        print(f"  タスクの差分: 追加{len(diff.added)}件 / なくなった{len(diff.removed)}件, "
+              f"{(time.perf_counter() - start) * 1000:.2f}ms")
+        archive.close()
+
+
+_ENTITY_SNIPPETS = [
+    "Microsoft Teams 会議に参加: https://teams.microsoft.com/l/meetup-join/19%3aMeeting_N2E3ZTk%40thread.v2/0?context=%7b%22Tid%22%7d",
+    "Zoom: https://us02web.zoom.us/j/81234567890?pwd=QWxhZGRpbjpvcGVu",
+    "Google Meet: https://meet.google.com/abc-defg-hij",
+    "Webex: https://example.webex.com/example/j.php?MTID=m0123456789abcdef",
+    "回答期限：5/1(木) 17:00",
+    "資料は6月3日までに提出をお願いします。",
+    "〆切 明日",
+    "Please send the revised quote by Friday.",
+    "ご確認ください。",
+]
+
+
+def _naive_extract(body):
+    """比較用: 本文を小文字にして、サービス・種類ごとに別々の正規表現で走査する素朴な実装"""
+    lowered = body.lower()
+    links = [m.group(0) for pattern in (r'https://teams\.microsoft\.com/l/meetup-join/[^\s<>"]+',
+                                         r'https://[a-z0-9-.]+zoom\.us/[^\s<>"]+',
+                                         r'https://meet\.google\.com/[^\s<>"]+',
+                                         r'https://[a-z0-9-.]+webex\.com/[^\s<>"]+')
+             for m in re.finditer(pattern, lowered)]
+    deadlines = re.findall(r'(?:期限|締切|〆切|〆)\s*[:：]?\s*\S+|\S+(?:まで|必着)|by \w+', lowered)
+    actions = re.findall(r'[^。\n]*(?:ください|お願いします|please)[^。\n]*', lowered)
+    return links, deadlines, actions
+
+
+def bench_entities(args):
+    """本文からの会議URL・期限・依頼の文の抽出の計測"""
+    rng = random.Random(args.seed)
+    emails = [EmailRecord.from_row(message, i)
+              for i, message in enumerate(generate_fake_messages(args.count, seed=args.seed), 1)]
+    for email in emails:
+        email.body += "\n".join(rng.sample(_ENTITY_SNIPPETS, rng.randint(0, 4)))
+    chars = sum(len(email.body) for email in emails)
+    print(f"本文の情報抽出: メール{len(emails)}件, 本文{chars:,}文字")
+
+    start = time.perf_counter()
+    annotate(emails)
+    elapsed = time.perf_counter() - start
+    _print_result("1回の走査（entity_extractor）", len(emails), elapsed)
+    print(f"  {chars / elapsed / 1024 / 1024:.1f}M文字/秒, 会議URL {sum(len(e.meeting_links) for e in emails)}件, "
+          f"期限 {sum(len(e.deadlines) for e in emails)}件, 依頼 {sum(len(e.action_items) for e in emails)}件")
+
+    start = time.perf_counter()
+    for email in emails:
+        _naive_extract(email.body)
+    _print_result("種類ごとの走査（参考）", len(emails), time.perf_counter() - start)
+
+
+def create_arg_parser():
+    """コマンドライン引数パーサーを作成"""
+    parser = argparse.ArgumentParser(
+        description='合成データによるベンチマーク',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    classifier = subparsers.add_parser('classifier', help='優先度分類の計測')
+    classifier.add_argument('--count', type=int, default=100000, help='合成メールの件数')
+    classifier.add_argument('--keywords', type=int, default=200, help='追加する合成キーワードの数')
+    classifier.add_argument('--seed', type=int, default=0, help='乱数シード')
+    classifier.set_defaults(func=bench_classifier)
+
+    calendar = subparsers.add_parser('calendar', help='カレンダー解析の計測')
+    calendar.add_argument('--days', type=int, default=90, help='期間の日数')
+    calendar.add_argument('--recurring', type=int, default=300, help='毎週の定期的な予定の数')
+    calendar.add_argument('--seed', type=int, default=0, help='乱数シード')
+    calendar.set_defaults(func=bench_calendar)
+
+    prompt = subparsers.add_parser('prompt', help='プロンプト描画の計測')
+    prompt.add_argument('--emails', type=int, default=10000, help='合成メールの件数')
+    prompt.add_argument('--events', type=int, default=5000, help='合成予定の件数')
+    prompt.add_argument('--seed', type=int, default=0, help='乱数シード')
+    prompt.set_defaults(func=bench_prompt)
+
+    suite = subparsers.add_parser('suite', help='疑似Outlookとモックサーバーを使った取得・プロンプト作成・全体の計測')
+    suite.add_argument('--sizes', type=str, default='100,1000,10000', help='メールボックスの件数（カンマ区切り）')
+    suite.add_argument('--emails', type=int, default=50, help='取得する未読メールの件数')
+    suite.add_argument('--days', type=int, default=7, help='取得する予定の日数')
+    suite.add_argument('--repeat', type=int, default=10, help='繰り返し回数')
+    suite.add_argument('--com-latency', type=float, default=0.0, help='COM呼び出し1回ごとの待ち時間（秒）')
+    suite.add_argument('--api-latency', type=float, default=0.05, help='モックサーバーが応答するまでの待ち時間（秒）')
+    suite.add_argument('--chunk-delay', type=float, default=0.0, help='ストリーミング時の断片ごとの待ち時間（秒）')
+    suite.add_argument('--stream', action='store_true', help='ストリーミングでAPIを呼び出す')
+    suite.add_argument('--output', type=str, help='計測結果を保存するJSONファイル')
+    suite.add_argument('--baseline', type=str, help='比較する基準の計測結果（p95が許容範囲を超えて遅くなると終了コード1）')
+    suite.add_argument('--tolerance', type=float, default=0.2, help='基準に対して許容するp95の増加率')
+    suite.add_argument('--seed', type=int, default=0, help='乱数シード')
+    suite.set_defaults(func=bench_suite)
+
+    batch = subparsers.add_parser('batch', help='複数メールボックスの一括処理の計測')
+    batch.add_argument('--users', type=int, default=8, help='メールボックスの数')
+    batch.add_argument('--size', type=int, default=1000, help='1メールボックスあたりのメールの件数')
+    batch.add_argument('--emails', type=int, default=20, help='1メールボックスあたりに取得する未読メールの件数')
+    batch.add_argument('--workers', type=int, default=4, help='取得・API呼び出しそれぞれの並列数')
+    batch.add_argument('--com-latency', type=float, default=0.001, help='COM呼び出し1回ごとの待ち時間（秒。全メールボックスで順番に処理する）')
+    batch.add_argument('--api-latency', type=float, default=0.5, help='モックサーバーが応答するまでの待ち時間（秒）')
+    batch.add_argument('--rate-limit', type=float, default=600, help='1分あたりのAPIリクエスト数の上限')
+    batch.set_defaults(func=bench_batch)
+
+    archive = subparsers.add_parser('archive', help='レポートアーカイブの全文検索の計測')
+    archive.add_argument('--reports', type=int, default=20000, help='登録する合成レポートの件数')
+    archive.add_argument('--users', type=int, default=10, help='利用者の数（1日に1人1件）')
+    archive.add_argument('--repeat', type=int, default=20, help='検索の繰り返し回数')
+    archive.add_argument('--seed', type=int, default=0, help='乱数シード')
+    archive.set_defaults(func=bench_archive)
+
+    entities = subparsers.add_parser('entities', help='本文からの会議URL・期限・依頼の文の抽出の計測')
+    entities.add_argument('--count', type=int, default=20000, help='合成メールの件数')
+    entities.add_argument('--seed', type=int, default=0, help='乱数シード')
+    entities.set_defaults(func=bench_entities)
+
+    return parser
+
+
+def main():
+    """メイン関数"""
+    args = create_arg_parser().parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+メール本文の正規化モジュール
+
+OutlookClient が取得したメール本文から、引用された過去のやり取り、署名、
+法的な定型文、HTMLの残骸、余分な空白を取り除く。各処理は行を受け取って
+行を返すジェネレータとして実装し、本文を1回走査するだけで全段を通す。
+先の行を確かめる段は、決まった行数までの先読みバッファだけを使うため、
+本文の長さに比例した時間とメモリで処理できる。
+段ごとの削減バイト数を NormalizationStats に記録する。
+"""
+
+import html
+import re
+from collections import deque
+
+from prompt_packer import estimate_tokens
+
+# 引用部分の開始を示す行（以降はすべて過去のやり取りとして除く）
+_QUOTE_START = re.compile(
+    r'^\s*(?:'
+    r'-{2,}\s*(?:original message|元のメッセージ|forwarded message|転送されたメッセージ)\s*-{2,}'
+    r'|_{20,}'
+    r'|on .{5,200}wrote\s*:'
+    r'|.{1,200}さんは書きました\s*[:：]'
+    # 「のメッセージ:」は日付かメールアドレスを含む行だけ（本文中の「〇〇さんからのメッセージ：」を除かないため）
+    r'|.{0,200}(?:\d{2,4}\s*[/年.-]\s*\d{1,2}|[\w.+-]+@[\w-]+\.[\w.-]+).{0,200}のメッセージ\s*[:：]'
+    r')\s*$',
+    re.IGNORECASE
+)
+# 引用ヘッダの1行目（差出人）と、それに続くヘッダ行
+_QUOTE_FROM = re.compile(r'^\s*(?:差出人|送信者|from)\s*[:：]', re.IGNORECASE)
+_QUOTE_HEADER = re.compile(r'^\s*(?:送信日時|日時|宛先|件名|cc|sent|date|to|subject)\s*[:：]', re.IGNORECASE)
+_QUOTE_HEADER_LOOKAHEAD = 4
+# 「>」で始まる引用行
+_QUOTED_LINE = re.compile(r'^\s*[>＞]')
+
+# 署名の区切り
+_SIGNATURE_DELIMITER = re.compile(r'^--\s*$')
+_SEPARATOR_LINE = re.compile(r'^\s*[-=*_─━―‐＝＊~〜・]{5,}\s*$')
+_CONTACT_INFO = re.compile(r'(?:tel|fax|phone|mobile|携帯|電話|〒|e-?mail|mail\s*[:：]|https?://|@[\w.-]+\.\w+)', re.IGNORECASE)
+# 区切り線から本文の終わりまでがこの行数以内の場合だけ署名とみなす
+_SIGNATURE_LOOKAHEAD = 12
+
+# 法的な定型文（以降はフッターとして除く）
+_LEGAL_FOOTER = re.compile(
+    r'(?:this (?:e-?mail|message)[^.]{0,80}(?:confidential|privileged|intended (?:solely )?for)'
+    r'|if you (?:are not|have received this)[^.]{0,60}(?:intended recipient|in error)'
+    r'|本(?:メール|電子メール)[^。]{0,60}(?:機密|秘密|宛先|誤って|誤送信)'
+    r'|このメールは[^。]{0,60}(?:機密|秘密|誤って|誤送信)'
+    r'|confidentiality notice|disclaimer\s*[:：])',
+    re.IGNORECASE
+)
+
+# HTMLの残骸
+_HTML_TAG = re.compile(r'</?(?:p|div|span|br|table|tbody|tr|td|th|font|b|i|u|strong|em|img|a|html|body|head|style|meta|o:p)\b[^>]*>', re.IGNORECASE)
+_CID_IMAGE = re.compile(r'\[cid:[^\]]*\]', re.IGNORECASE)
+_INVISIBLE = re.compile(r'[​‌‍⁠﻿­]')
+_SPACES = re.compile(r'[ \t 　]{2,}')
+
+
+def strip_html_noise(lines):
+    """HTMLタグ、文字参照、埋め込み画像の参照、不可視文字を除去"""
+    for line in lines:
+        line = _HTML_TAG.sub('', line)
+        line = _CID_IMAGE.sub('', line)
+        line = html.unescape(line) if '&' in line else line
+        yield _INVISIBLE.sub('', line)
+
+
+class _Lookahead:
+    """先読みした行を保持しながら行を順に返すイテレータ"""
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.buffer = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.buffer:
+            return self.buffer.popleft()
+        return next(self.lines)
+
+    def peek(self, count):
+        """
+        次の行から最大 count 行を、消費せずに返す
+
+        Returns:
+            deque: 先読みした行（本文の終わりに達した場合は count 行より少ない）
+        """
+        while len(self.buffer) < count:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer.append(line)
+        return self.buffer
+
+
+def drop_quoted_history(lines):
+    """引用された過去のやり取りを除去"""
+    lines = _Lookahead(lines)
+    for line in lines:
+        if _QUOTE_START.match(line):
+            return
+        if _QUOTED_LINE.match(line):
+            continue
+        if _QUOTE_FROM.match(line):
+            # 差出人の直後（空行を除く）に送信日時や宛先が続けば、引用ヘッダとみなす
+            following = next((l for l in lines.peek(_QUOTE_HEADER_LOOKAHEAD) if l.strip()), None)
+            if following is not None and _QUOTE_HEADER.match(following):
+                return
+        yield line
+
+
+def drop_signature(lines):
+    """署名を除去"""
+    lines = _Lookahead(lines)
+    has_content = False
+    for line in lines:
+        if _SIGNATURE_DELIMITER.match(line):
+            return
+        if has_content and _SEPARATOR_LINE.match(line):
+            # 区切り線の後が本文の終わりまで短く、連絡先らしき行を含めば署名とみなす
+            # （本文の途中にある表の罫線などは、後ろに行が続くため署名とみなさない）
+            following = lines.peek(_SIGNATURE_LOOKAHEAD + 1)
+            if len(following) <= _SIGNATURE_LOOKAHEAD and any(_CONTACT_INFO.search(l) for l in following):
+                return
+        has_content = has_content or bool(line.strip())
+        yield line
+
+
+def drop_legal_footer(lines):
+    """機密保持などの法的な定型文以降を除去"""
+    has_content = False
+    for line in lines:
+        if has_content and _LEGAL_FOOTER.search(line):
+            return
+        has_content = has_content or bool(line.strip())
+        yield line
+
+
+def collapse_whitespace(lines):
+    """行末の空白と連続する空白・空行をまとめる"""
+    pending_blank = False
+    started = False
+    for line in lines:
+        line = _SPACES.sub(' ', line).rstrip()
+        if not line.strip():
+            pending_blank = started
+            continue
+        if pending_blank:
+            yield ''
+            pending_blank = False
+        started = True
+        yield line
+
+
+# 処理段（名前, 行のジェネレータ）
+STAGES = (
+    ("html", strip_html_noise),
+    ("quoted", drop_quoted_history),
+    ("signature", drop_signature),
+    ("footer", drop_legal_footer),
+    ("whitespace", collapse_whitespace),
+)
+
+
+class NormalizationStats:
+    """段ごとの入出力バイト数の集計"""
+
+    def __init__(self):
+        self.input_bytes = 0
+        self.output_bytes = {name: 0 for name, _ in STAGES}
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.emails = 0
+        self.failed = 0
+
+    def add(self, other):
+        """他の集計を加える"""
+        self.input_bytes += other.input_bytes
+        for name, value in other.output_bytes.items():
+            self.output_bytes[name] += value
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.emails += other.emails
+        self.failed += other.failed
+
+    def _count(self, lines, name):
+        """通過した行のバイト数を数えながら行を返す"""
+        for line in lines:
+            self.output_bytes[name] += len(line.encode('utf-8')) + 1
+            yield line
+
+    def summary(self):
+        """
+        削減量の表示用文字列
+
+        Returns:
+            str: 段ごとの削減バイト数と、推定トークン数の削減量
+        """
+        parts = []
+        previous = self.input_bytes
+        for name, _ in STAGES:
+            parts.append(f"{name} -{previous - self.output_bytes[name]:,}B")
+            previous = self.output_bytes[name]
+        saved = self.input_tokens - self.output_tokens
+        failed = f", 失敗 {self.failed}件" if self.failed else ""
+        return (f"{self.emails}件 {self.input_bytes:,}B → {previous:,}B（{', '.join(parts)}）"
+                f" 推定 {saved:,} トークン削減{failed}")
+
+
+def normalize_body(body, stats=None):
+    """
+    メール本文を正規化
+
+    Args:
+        body (str): メール本文
+        stats (NormalizationStats): 集計先（省略可。途中で失敗した場合は加えない）
+
+    Returns:
+        str: 正規化した本文
+    """
+    raw_lines = body.splitlines()
+    lines = iter(raw_lines)
+    counted = NormalizationStats() if stats is not None else None
+    for name, stage in STAGES:
+        lines = stage(lines)
+        if counted is not None:
+            lines = counted._count(lines, name)
+    normalized = '\n'.join(lines)
+
+    if stats is not None:
+        counted.emails = 1
+        counted.input_bytes = sum(len(line.encode('utf-8')) + 1 for line in raw_lines)
+        counted.input_tokens = estimate_tokens(body)
+        counted.output_tokens = estimate_tokens(normalized)
+        stats.add(counted)
+    return normalized
+
+
+def normalize_emails(emails_data, stats=None):
+    """
+    メールの本文を順に正規化
+
+    Args:
+        emails_data (iterable): メールのリストまたはイテレータ
+        stats (NormalizationStats): 集計先（省略可）
+
+    Yields:
+        EmailRecord: 本文を正規化したメール（元の本文は raw_body に残す。
+            正規化できなかったメールは本文をそのまま使う）
+    """
+    for email in emails_data:
+        body = email.body or ""
+        try:
+            normalized = normalize_body(body, stats)
+        except Exception as e:
+            # 1件の失敗で他のメールまで失わないよう、このメールだけ元の本文を使う
+            print(f"  本文を正規化できなかったため、元の本文を使います（{email.subject}）: {e}")
+            if stats is not None:
+                stats.failed += 1
+            normalized = body
+        yield email.copy(raw_body=body, body=normalized)
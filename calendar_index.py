@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+カレンダー解析モジュール
+
+予定を開始日時でソートした区間の索引にまとめ、重複する予定、勤務時間内の
+空き時間、集中作業時間に入っている予定をローカルで計算する。どの処理も
+ソート済みの区間を1回走査するだけなので、全体で O(n log n) に収まる。
+計算結果は簡潔な事実の一覧としてプロンプトに含める。
+"""
+
+import heapq
+from datetime import datetime, timedelta
+
+# 空き時間として報告する最短の長さ（分）
+MIN_FREE_MINUTES = 30
+
+# プロンプトに含める重複・集中作業時間との重なりの最大件数
+MAX_REPORTED_CONFLICTS = 20
+MAX_REPORTED_FOCUS_VIOLATIONS = 20
+
+
+def _at_hour(day, hour):
+    """日付と時からdatetimeを作成"""
+    return datetime.combine(day, datetime.min.time()) + timedelta(hours=hour)
+
+
+def _format_range(start, end):
+    """時間帯の表示用文字列"""
+    return f"{start.strftime('%H:%M')}～{end.strftime('%H:%M')}"
+
+
+class CalendarIndex:
+    def __init__(self, events_data):
+        """
+        初期化
+
+        終日の予定は時間帯を占有しないものとして区間から除く。
+
+        Args:
+            events_data (list): 予定のリスト
+        """
+        self.intervals = []
+        self.all_day_events = []
+        for event in events_data:
+            start, end = event.start, event.end
+            if start is None or end is None:
+                continue
+            if event.is_all_day_event:
+                self.all_day_events.append(event)
+                continue
+            self.intervals.append((start, max(start, end), event))
+        self.intervals.sort(key=lambda interval: (interval[0], interval[1]))
+
+    def conflicts(self):
+        """
+        時間が重なる予定の組を取得
+
+        開始順に走査し、終了時刻のヒープで進行中の予定を管理する。
+
+        Returns:
+            list: (予定A, 予定B, 重なりの開始, 重なりの終了) のリスト
+        """
+        result = []
+        active = []  # (終了時刻, 通し番号, 開始時刻, 予定)
+        for number, (start, end, event) in enumerate(self.intervals):
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+            for other_end, _, _, other in active:
+                result.append((other, event, start, min(end, other_end)))
+            heapq.heappush(active, (end, number, start, event))
+        return result
+
+    def busy_intervals(self):
+        """
+        重なりを統合した予定ありの時間帯
+
+        Returns:
+            list: (開始, 終了) のリスト
+        """
+        merged = []
+        for start, end, _ in self.intervals:
+            if merged and start <= merged[-1][1]:
+                if end > merged[-1][1]:
+                    merged[-1][1] = end
+            else:
+                merged.append([start, end])
+        return [(start, end) for start, end in merged]
+
+    def free_slots(self, first_day, days, working_hours, min_minutes=MIN_FREE_MINUTES, now=None):
+        """
+        勤務時間内の空き時間を日ごとに計算
+
+        Args:
+            first_day (date): 最初の日
+            days (int): 日数
+            working_hours (dict): start と end を持つ勤務時間
+            min_minutes (int): 報告する最短の空き時間（分）
+            now (datetime): 現在日時（指定した場合、これより前の時間は空き時間にしない）
+
+        Returns:
+            dict: 日付から (開始, 終了) のリストへの辞書（土日は除く）
+        """
+        busy = self.busy_intervals()
+        cursor = 0
+        min_length = timedelta(minutes=min_minutes)
+        slots = {}
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            if day.weekday() >= 5:
+                continue
+            day_start = _at_hour(day, working_hours["start"])
+            day_end = _at_hour(day, working_hours["end"])
+            if now is not None:
+                # 今日は現在時刻から数える（過ぎた時間を空き時間として報告しない）
+                day_start = max(day_start, now)
+
+            # その日より前に終わる予定を読み飛ばす
+            while cursor < len(busy) and busy[cursor][1] <= day_start:
+                cursor += 1
+
+            free = []
+            position = day_start
+            index = cursor
+            while index < len(busy) and busy[index][0] < day_end:
+                busy_start, busy_end = busy[index]
+                if busy_start - position >= min_length:
+                    free.append((position, busy_start))
+                position = max(position, busy_end)
+                index += 1
+            if day_end - position >= min_length:
+                free.append((position, day_end))
+            slots[day] = free
+        return slots
+
+    def focus_violations(self, focus_time):
+        """
+        集中作業時間に入っている予定を取得
+
+        Args:
+            focus_time (dict): start と end を持つ集中作業時間
+
+        Returns:
+            list: (日付, 予定) のリスト
+        """
+        violations = []
+        for start, end, event in self.intervals:
+            day = start.date()
+            while day <= end.date():
+                focus_start = _at_hour(day, focus_time["start"])
+                focus_end = _at_hour(day, focus_time["end"])
+                if start < focus_end and end > focus_start:
+                    violations.append((day, event))
+                day += timedelta(days=1)
+        return violations
+
+    def summarize(self, settings, first_day=None, days=7, now=None):
+        """
+        予定の空き状況をプロンプト用の事実の一覧にまとめる
+
+        Args:
+            settings (dict): working_hours と focus_time を含む設定
+            first_day (date): 最初の日（省略時は今日）
+            days (int): 日数
+            now (datetime): 現在日時（省略時は datetime.now()。これより前の空き時間は含めない）
+
+        Returns:
+            str: Markdownの箇条書き
+        """
+        now = now or datetime.now()
+        first_day = first_day or now.date()
+        lines = []
+
+        conflicts = self.conflicts()
+        if conflicts:
+            lines.append(f"## 重複している予定（{len(conflicts)}組）")
+            for a, b, start, end in conflicts[:MAX_REPORTED_CONFLICTS]:
+                lines.append(f"- {start.strftime('%m/%d')} {_format_range(start, end)}: {a.subject} / {b.subject}")
+            if len(conflicts) > MAX_REPORTED_CONFLICTS:
+                lines.append(f"- ほか{len(conflicts) - MAX_REPORTED_CONFLICTS}組")
+        else:
+            lines.append("## 重複している予定\n- なし")
+
+        lines.append("\n## 勤務時間内の空き時間")
+        for day, free in self.free_slots(first_day, days, settings["working_hours"], now=now).items():
+            ranges = ", ".join(_format_range(start, end) for start, end in free) or "なし"
+            lines.append(f"- {day.strftime('%m/%d(%a)')}: {ranges}")
+
+        violations = self.focus_violations(settings["focus_time"])
+        lines.append("\n## 集中作業時間と重なる予定")
+        if violations:
+            for day, event in violations[:MAX_REPORTED_FOCUS_VIOLATIONS]:
+                lines.append(f"- {day.strftime('%m/%d(%a)')}: {event.subject}")
+            if len(violations) > MAX_REPORTED_FOCUS_VIOLATIONS:
+                lines.append(f"- ほか{len(violations) - MAX_REPORTED_FOCUS_VIOLATIONS}件")
+        else:
+            lines.append("- なし")
+
+        return "\n".join(lines)
@@ -7,22 +7,74 @@ Claude APIクライアントモジュール
 
 import requests
 from datetime import datetime
+import json
 import os
+import random
+import threading
+import time
+
+from prompt_templates import Prompt, PromptRenderer
+from config import API_URL, PROMPT_CACHE_MIN_TOKENS
+from prompt_packer import estimate_tokens
+from response_cache import make_cache_key
+from telemetry import Telemetry
+
+MODEL = "claude-3-7-sonnet-20250219"  # 最新のモデル
+MAX_TOKENS = 4000
+SYSTEM_PROMPT = "あなたは優秀な秘書です。メールや予定表の情報を整理し、優先順位をつけてMarkdown形式で簡潔にまとめてください。重要なタスクを特定し、具体的なアドバイスを提供してください。Markdown形式の見出し、箇条書き、強調などを活用して、読みやすく構造化されたレポートを作成してください。"
+
+# 再試行するHTTPステータス（レート制限・過負荷・一時的なサーバーエラー）
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 529)
+MAX_RETRIES = 4
+MAX_RETRY_DELAY = 60
+# 接続と応答（ストリーミング時は断片の間隔）を待つ時間の上限（秒）
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 300
+# 再試行する通信エラー（接続できない・タイムアウト）
+RETRYABLE_EXCEPTIONS = (requests.ConnectionError, requests.Timeout)
 
 class ClaudeClient:
-    def __init__(self, api_key, api_version):
+    def __init__(self, api_key, api_version, response_cache=None, api_url=API_URL, telemetry=None,
+                 rate_limiter=None, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
         """
         初期化
         
         Args:
             api_key (str): Anthropic API Key
             api_version (str): API バージョン
+            response_cache (ResponseCache): 応答キャッシュ（省略時は使用しない）
+            api_url (str): Messages APIのURL（モックサーバーを使う場合に変更する）
+            telemetry (Telemetry): API呼び出し回数とトークン数の集計先
+            rate_limiter (TokenBucket): 送信ごとにトークンを取得するレート制限（省略時は制限しない）
+            timeout (tuple): requests に渡す (接続, 応答) のタイムアウト（秒）
         """
         self.api_key = api_key
         self.api_version = api_version
-        self.api_url = "https://api.anthropic.com/v1/messages"
+        self.api_url = api_url
+        self.response_cache = response_cache
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        # レート制限を受けたとき、全スレッドの送信を再開する時刻
+        self._resume_at = 0.0
+        self._throttle_lock = threading.Lock()
+        # 直前の呼び出しの usage（一括モードでは複数スレッドから呼ぶため、スレッドごとに持つ）
+        self._local = threading.local()
+        # 短すぎてキャッシュされないことを表示済みの先頭部分
+        self._uncacheable_prefixes = set()
+
+    @property
+    def last_usage(self):
+        """このスレッドで直前に呼び出したAPIの usage（応答キャッシュを使った場合はNone）"""
+        return getattr(self._local, "usage", None)
+
+    @property
+    def last_call_failed(self):
+        """このスレッドで直前の call_api・call_api_stream が失敗し、エラーメッセージを返したか"""
+        return getattr(self._local, "failed", False)
 
-    def create_prompt(self, emails_data, events_data, settings=None):
+    def create_prompt(self, emails_data, events_data, settings=None, email_summaries=None, token_budget=None,
+                      calendar_facts=None):
         """
         プロンプトを作成
         
@@ -30,189 +82,493 @@ class ClaudeClient:
             emails_data (list): 未読メールのリスト
             events_data (list): 予定のリスト
             settings (dict): カスタム設定
+            email_summaries (str): メールの要約（指定した場合は各メールの本文の代わりに使用）
+            token_budget (int): メール欄のトークン予算（指定した場合は優先度に応じて本文量を調整）
+            calendar_facts (str): ローカルで計算した予定の重複・空き時間の一覧
             
         Returns:
-            str: Claudeに送るプロンプト
+            Prompt: Claudeに送るプロンプト（キャッシュする部分と毎回変わる部分）
         """
-        today = datetime.now().strftime("%Y年%m月%d日")
-        
         # デフォルト設定を取得（settings引数が無効な場合に使用）
         from config import DEFAULT_SETTINGS
         settings = settings or DEFAULT_SETTINGS
         
-        prompt = f"""
-あなたは経験豊富なエグゼクティブアシスタントです。今日は{today}です。
-以下の情報を基に、効率的なタスク管理と意思決定をサポートするレポートを作成してください。
+        return PromptRenderer(settings).render(emails_data, events_data, email_summaries, token_budget,
+                                               calendar_facts)
 
-# 分析のためのガイドライン
-- 優先ドメイン: {', '.join(settings['priority_domains'])}
-- 優先キーワード: {', '.join(settings['priority_keywords'])}
-- 勤務時間: {settings['working_hours']['start']}時～{settings['working_hours']['end']}時
-- 集中作業時間: {settings['focus_time']['start']}時～{settings['focus_time']['end']}時
-- レポートスタイル: {settings['report_style']}
+    def headers(self):
+        """
+        APIリクエストのヘッダ
+        
+        Returns:
+            dict: 認証情報とAPIバージョンを含むヘッダ
+        """
+        return {
+            "x-api-key": self.api_key,
+            "anthropic-version": self.api_version,
+            "content-type": "application/json"
+        }
 
-# 未読メール（最新{len(emails_data)}件）
-"""
+    def batch_request(self, custom_id, prompt, system=SYSTEM_PROMPT, max_tokens=MAX_TOKENS):
+        """
+        Message Batches APIに送る1件分のリクエストを作成
+        
+        Args:
+            custom_id (str): 結果と対応付けるためのID
+            prompt (Prompt or str): 送信するプロンプト
+            system (str): システムプロンプト
+            max_tokens (int): 最大出力トークン数
+            
+        Returns:
+            dict: custom_id と params（Messages APIの本文と同じ形式）を持つ辞書
+        """
+        return {"custom_id": custom_id, "params": self.message_params(prompt, system, max_tokens)}
 
-        # メール情報の追加
-        if not emails_data:
-            prompt += "未読メールはありません。\n\n"
-        else:
-            for i, email in enumerate(emails_data, 1):
-                prompt += f"""
-## メール {i}: {email['subject']}
-- 送信者: {email['sender']} ({email['sender_email']})
-- 受信日時: {email['received_time']}
-- 添付ファイル: {'あり' if email.get('has_attachments', False) else 'なし'}
+    def message_params(self, prompt, system=SYSTEM_PROMPT, max_tokens=MAX_TOKENS):
+        """
+        Messages APIに送る本文を作成（Message Batches APIや非同期クライアントで使う）
+        
+        Args:
+            prompt (Prompt or str): 送信するプロンプト
+            system (str): システムプロンプト
+            max_tokens (int): 最大出力トークン数
+            
+        Returns:
+            dict: リクエストの本文
+        """
+        _, data = self._build_request(prompt, system=system, max_tokens=max_tokens)
+        return data
 
-{email['body'][:500]}{"..." if len(email['body']) > 500 else ""}
+    def _build_request(self, prompt, stream=False, system=SYSTEM_PROMPT, max_tokens=MAX_TOKENS):
+        """
+        APIリクエストのヘッダと本文を作成
+        
+        Prompt を渡した場合は、変わらない部分（ガイドラインと分析指示）をシステムプロンプトの
+        後ろに cache_control 付きで置き、毎回変わる部分だけをユーザーのメッセージにする。
+        設定が同じなら2回目以降はキャッシュから読み込まれ、入力の料金と応答までの時間が減る。
+        先頭の部分が PROMPT_CACHE_MIN_TOKENS に満たないと見込まれる場合は、キャッシュされないことを
+        先頭の部分ごとに1回だけ表示する。
+        
+        Args:
+            prompt (Prompt or str): 送信するプロンプト
+            stream (bool): ストリーミング応答を要求するか
+            system (str): システムプロンプト
+            max_tokens (int): 最大出力トークン数
+            
+        Returns:
+            tuple: (headers, data)
+        """
+        headers = self.headers()
+        if isinstance(prompt, Prompt):
+            system = [
+                {"type": "text", "text": system},
+                {"type": "text", "text": prompt.prefix, "cache_control": {"type": "ephemeral"}},
+            ]
+            self._check_cacheable(system)
+            prompt = prompt.body
+        
+        data = {
+            "model": MODEL,
+            "max_tokens": max_tokens,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "system": system
+        }
+        if stream:
+            data["stream"] = True
+        
+        return headers, data
 
-"""
+    def _check_cacheable(self, system):
+        """キャッシュの対象が最小トークン数に満たない場合に、キャッシュされないことを表示"""
+        text = "".join(block["text"] for block in system)
+        tokens = estimate_tokens(text)
+        if tokens >= PROMPT_CACHE_MIN_TOKENS:
+            return
+        with self._throttle_lock:
+            if text in self._uncacheable_prefixes:
+                return
+            self._uncacheable_prefixes.add(text)
+        print(f"  プロンプトキャッシュ: 先頭の部分が推定 {tokens:,} トークンで、キャッシュされる最小の長さ"
+              f"（{PROMPT_CACHE_MIN_TOKENS:,} トークン）に満たないため、キャッシュされません。")
 
-        # 予定情報の追加
-        prompt += f"\n# 今後{len(events_data)}件の予定\n"
-        
-        if not events_data:
-            prompt += "予定はありません。\n\n"
-        else:
-            # 日付ごとにグループ化
-            events_by_date = {}
-            for event in events_data:
-                try:
-                    start_datetime = datetime.strptime(event['start'].split('+')[0].split('.')[0], '%Y-%m-%d %H:%M:%S')
-                    date_str = start_datetime.strftime('%Y年%m月%d日(%a)')
-                    
-                    if date_str not in events_by_date:
-                        events_by_date[date_str] = []
-                        
-                    events_by_date[date_str].append(event)
-                except Exception:
-                    continue
+    def call_api(self, prompt):
+        """
+        Claude APIを呼び出す
+        
+        Args:
+            prompt (Prompt or str): 送信するプロンプト
             
-            # 日付順に予定を表示
-            for date_str, day_events in sorted(events_by_date.items()):
-                prompt += f"\n## {date_str}\n"
+        Returns:
+            str: Claudeからの応答（失敗した場合はエラーメッセージ。last_call_failed が True になる）
+        """
+        self._local.failed = False
+        try:
+            response_text = self.send_message(prompt)
+            
+            # 重複部分を検出して削除する処理
+            dedup = LineDeduplicator()
+            return dedup.feed(response_text) + dedup.flush()
                 
-                for event in sorted(day_events, key=lambda x: x['start']):
-                    try:
-                        start_time = datetime.strptime(event['start'].split('+')[0].split('.')[0], '%Y-%m-%d %H:%M:%S').strftime('%H:%M')
-                        end_time = datetime.strptime(event['end'].split('+')[0].split('.')[0], '%Y-%m-%d %H:%M:%S').strftime('%H:%M')
-                        
-                        prompt += f"""
-- {start_time}～{end_time} {event['subject']}
-  場所: {event['location']}
-  {"オンライン会議URL: " + event.get('meeting_url', 'なし') if 'meeting_url' in event else ""}
-  {"参加者: " + event.get('required_attendees', '記載なし') if 'required_attendees' in event else ""}
-"""
-                    except Exception:
-                        prompt += f"- {event['subject']}\n"
-
-        # 分析指示を追加
-        prompt += """
-# 分析とレポート作成の指示
-
-## 1. メール分析
-- メールを「緊急対応」「今日中に対応」「週内対応」「情報のみ」に分類してください
-- 各カテゴリのメールについて簡潔な要約と推奨アクションを提示してください
-- 特に優先ドメインや優先キーワードを含むメールに注目してください
+        except UnexpectedResponseError:
+            self._local.failed = True
+            return "APIからの応答で予期しない形式が返されました。"
+        except Exception as e:
+            self._local.failed = True
+            return self._format_error(e)
 
-## 2. 予定分析
-- 今後の予定を時系列で整理し、準備が必要なものを特定してください
-- 予定と予定の間の移動時間や準備時間を考慮した現実的なスケジュールを提案してください
-- 集中作業時間を確保できるよう、予定の調整案があれば提示してください
+    def send_message(self, prompt, system=SYSTEM_PROMPT, max_tokens=MAX_TOKENS, max_retries=MAX_RETRIES):
+        """
+        Claude APIを呼び出し、応答テキストをそのまま返す
+        
+        レート制限（429）や過負荷（529）などの一時的なエラーと、接続できない・応答が
+        タイムアウトした場合は、retry-afterヘッダまたは指数バックオフに従って再試行する。
+        待機中は同じクライアントを使う他のスレッドの送信も止める。
+        
+        Args:
+            prompt (Prompt or str): 送信するプロンプト
+            system (str): システムプロンプト
+            max_tokens (int): 最大出力トークン数
+            max_retries (int): 最大再試行回数
+            
+        Returns:
+            str: Claudeからの応答
+            
+        Raises:
+            requests.RequestException: 再試行しても呼び出しに失敗した場合
+            UnexpectedResponseError: 応答の形式が想定と異なる場合
+        """
+        headers, data = self._build_request(prompt, system=system, max_tokens=max_tokens)
+        self._local.usage = None
+        cache_key = self._cache_key(data)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                self.telemetry.count("response_cache_hits")
+                return cached
+        
+        response = self._post(headers, data, max_retries=max_retries)
+        result = response.json()
+        self._local.usage = result.get("usage")
+        self.telemetry.add_usage(result.get("usage"))
+        if "content" in result and len(result["content"]) > 0 and "text" in result["content"][0]:
+            response_text = result["content"][0]["text"]
+            if cache_key is not None:
+                self.response_cache.put(cache_key, response_text)
+            return response_text
+        raise UnexpectedResponseError(result)
 
-## 3. タスク管理
-- メールと予定から抽出した具体的なタスクリストを作成してください
-- 各タスクに優先度（高/中/低）と対応期限を設定してください
-- 「今日必ず完了すべきこと」のショートリスト（3項目以内）を提示してください
+    def _post(self, headers, data, stream=False, max_retries=MAX_RETRIES):
+        """
+        一時的なエラーを再試行しながらリクエストを送る
+        
+        Returns:
+            requests.Response: 成功した応答
+            
+        Raises:
+            requests.RequestException: 再試行しても呼び出しに失敗した場合
+        """
+        for attempt in range(max_retries + 1):
+            self._wait_for_rate_limit()
+            self.telemetry.count("api_requests")
+            try:
+                response = requests.post(self.api_url, headers=headers, json=data, stream=stream,
+                                         timeout=self.timeout)
+            except RETRYABLE_EXCEPTIONS:
+                if attempt >= max_retries:
+                    raise
+                self.telemetry.count("api_retries")
+                self._throttle(retry_delay(None, attempt))
+                continue
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < max_retries:
+                response.close()
+                self.telemetry.count("api_retries")
+                self._throttle(self._retry_delay(response, attempt))
+                continue
+            response.raise_for_status()  # エラーチェック
+            return response
 
-## 4. 今後の計画
-- 今日から1週間の効率的な業務計画を提案してください
-- 重要な締め切りや準備が必要なイベントを強調してください
-- 週末までに完了すべき主要タスクを特定してください
+    def _cache_key(self, data):
+        """応答キャッシュのキー（キャッシュを使わない場合はNone）"""
+        if self.response_cache is None:
+            return None
+        return make_cache_key(data)
 
-秘書としての経験と判断力を活かし、意思決定を支援する具体的で実用的なアドバイスを提供してください。
-情報の重要度に応じて簡潔にまとめ、すぐに行動に移せる形式で提示してください。
+    def _retry_delay(self, response, attempt):
+        """再試行までの待ち時間（秒）を決定"""
+        return retry_delay(response.headers.get("retry-after"), attempt)
 
-必ずMarkdown形式でレポートを作成してください。見出し、箇条書き、強調などのMarkdown記法を適切に活用して、読みやすく構造化されたレポートにしてください。
-"""
+    def _throttle(self, delay):
+        """全スレッドの送信を delay 秒後まで止める"""
+        with self._throttle_lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
 
-        return prompt
+    def _wait_for_rate_limit(self):
+        """レート制限による待機時間が残っていれば待ち、送信用のトークンを取得する"""
+        while True:
+            with self._throttle_lock:
+                remaining = self._resume_at - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(remaining)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
 
-    def call_api(self, prompt):
+    def call_api_stream(self, prompt, on_text=None):
         """
-        Claude APIを呼び出す
+        Claude APIをストリーミングモードで呼び出す
+        
+        応答はServer-Sent Eventsとして受信し、重複行を除いたテキストを
+        届いた順に on_text へ渡す。message_stop の前にストリームが途切れた場合は、
+        受信済みのテキストの後ろにエラーメッセージを付け、last_call_failed を True にする。接続時の一時的なエラーは
+        send_message と同じように再試行する。
         
         Args:
-            prompt (str): 送信するプロンプト
+            prompt (Prompt or str): 送信するプロンプト
+            on_text (callable): テキスト断片を受け取るコールバック
             
         Returns:
-            str: Claudeからの応答
+            str: Claudeからの応答全体
         """
-        headers = {
-            "x-api-key": self.api_key,
-            "anthropic-version": self.api_version,
-            "content-type": "application/json"
-        }
+        headers, data = self._build_request(prompt, stream=True)
+        self._local.usage = None
+        self._local.failed = False
+        dedup = LineDeduplicator()
+        chunks = []
+        raw_chunks = []
+        stopped = False
         
-        data = {
-            "model": "claude-3-7-sonnet-20250219",  # 最新のモデル
-            "max_tokens": 4000,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            "system": "あなたは優秀な秘書です。メールや予定表の情報を整理し、優先順位をつけてMarkdown形式で簡潔にまとめてください。重要なタスクを特定し、具体的なアドバイスを提供してください。Markdown形式の見出し、箇条書き、強調などを活用して、読みやすく構造化されたレポートを作成してください。"
-        }
+        def emit(text):
+            if text:
+                chunks.append(text)
+                if on_text:
+                    on_text(text)
+        
+        cache_key = self._cache_key(data)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                self.telemetry.count("response_cache_hits")
+                emit(dedup.feed(cached))
+                emit(dedup.flush())
+                return "".join(chunks)
         
         try:
-            response = requests.post(self.api_url, headers=headers, json=data)
-            response.raise_for_status()  # エラーチェック
+            with self._post(headers, data, stream=True) as response:
+                for event, payload in iter_sse_events(response.iter_lines(decode_unicode=True)):
+                    # 入力トークン数は message_start、出力トークン数（累計）は message_delta で届く
+                    if event == "message_start":
+                        usage = dict(payload.get("message", {}).get("usage") or {})
+                        usage.pop("output_tokens", None)
+                        self.telemetry.add_usage(usage)
+                        self._local.usage = usage
+                    elif event == "message_delta":
+                        self.telemetry.add_usage(payload.get("usage"))
+                        self._local.usage = {**(self._local.usage or {}), **(payload.get("usage") or {})}
+                    elif event == "content_block_delta" and payload.get("delta", {}).get("type") == "text_delta":
+                        raw_chunks.append(payload["delta"]["text"])
+                        emit(dedup.feed(payload["delta"]["text"]))
+                    elif event == "error":
+                        raise RuntimeError(payload.get("error", {}).get("message", "ストリーミング中にエラーが発生しました"))
+                    elif event == "message_stop":
+                        stopped = True
+                        break
+            if not stopped:
+                raise IncompleteStreamError("message_stop を受信する前にストリームが終了しました")
+            emit(dedup.flush())
+            # message_stop まで受信した完全な応答だけを保存する
+            if cache_key is not None:
+                self.response_cache.put(cache_key, "".join(raw_chunks))
             
-            result = response.json()
-            if "content" in result and len(result["content"]) > 0 and "text" in result["content"][0]:
-                response_text = result["content"][0]["text"]
-                
-                # 重複部分を検出して削除する処理
-                lines = response_text.split('\n')
-                unique_lines = []
-                seen = set()
-                
-                for line in lines:
-                    line_key = line.strip()
-                    if line_key and line_key not in seen:
-                        seen.add(line_key)
-                        unique_lines.append(line)
-                
-                return '\n'.join(unique_lines)
-            else:
-                return "APIからの応答で予期しない形式が返されました。"
-                
         except Exception as e:
-            error_details = f"{str(e)}"
-            if hasattr(e, 'response') and e.response:
-                try:
-                    error_details += f" - Response: {e.response.text}"
-                except:
-                    pass
-            return f"APIの呼び出し中にエラーが発生しました: {error_details}"
+            self._local.failed = True
+            emit(dedup.flush())
+            emit(("\n" if chunks else "") + self._format_error(e))
+        
+        return "".join(chunks)
+
+    def _format_error(self, e):
+        """API呼び出し時の例外をエラーメッセージに変換"""
+        error_details = f"{str(e)}"
+        if hasattr(e, 'response') and e.response:
+            try:
+                error_details += f" - Response: {e.response.text}"
+            except:
+                pass
+        return f"APIの呼び出し中にエラーが発生しました: {error_details}"
 
-    def save_response(self, response):
+    def save_response(self, response, filename=None):
         """
         応答をファイルに保存
         
         Args:
             response (str): 保存する応答内容
+            filename (str): 出力ファイル名（省略時はタイムスタンプ付きの名前）
             
         Returns:
             str: 保存したファイルのパス
         """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"assistant_report_{timestamp}.md"
+        with ReportWriter(filename) as writer:
+            writer.write(response)
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(response)
+        return writer.path
+
+
+class UnexpectedResponseError(Exception):
+    """APIの応答が想定した形式でない場合の例外"""
+
+
+class IncompleteStreamError(Exception):
+    """ストリーミング応答が message_stop の前に途切れた場合の例外"""
+
+
+class ReportFailedError(Exception):
+    """API呼び出しに失敗し、レポートの代わりにエラーメッセージを受け取った場合の例外"""
+
+
+class LineDeduplicator:
+    """
+    応答テキストから空行と重複行を取り除くフィルタ
+    
+    テキストを断片ごとに受け取り、改行で確定した行だけを判定して返す。
+    """
+    
+    def __init__(self):
+        self.seen = set()
+        self.pending = ""
+        self.started = False
+    
+    def feed(self, text):
+        """
+        テキスト断片を追加
+        
+        Args:
+            text (str): 受信したテキスト断片
+            
+        Returns:
+            str: 出力が確定したテキスト
+        """
+        self.pending += text
+        *lines, self.pending = self.pending.split('\n')
+        return "".join(self._accept(line) for line in lines)
+    
+    def flush(self):
+        """
+        残りのテキストを確定させる
+        
+        Returns:
+            str: 最後の行（重複や空行の場合は空文字列）
+        """
+        line, self.pending = self.pending, ""
+        return self._accept(line)
+    
+    def _accept(self, line):
+        """行が初出であれば出力用の文字列を返す"""
+        line_key = line.strip()
+        if not line_key or line_key in self.seen:
+            return ""
+        self.seen.add(line_key)
+        output = ("\n" if self.started else "") + line
+        self.started = True
+        return output
+
+
+class ReportWriter:
+    """
+    レポートファイルへの逐次書き込み
+    
+    with文で使い、書き込んだ内容はすぐにファイルへ反映する。
+    """
+    
+    def __init__(self, filename=None):
+        """
+        初期化
+        
+        Args:
+            filename (str): 出力ファイル名（省略時はタイムスタンプ付きの名前）
+        """
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"assistant_report_{timestamp}.md"
+        self.path = os.path.abspath(filename)
+        self.file = None
+    
+    def __enter__(self):
+        self.file = open(self.path, 'w', encoding='utf-8')
+        return self
+    
+    def __exit__(self, exc_type, exc_value, tb):
+        self.file.close()
+    
+    def write(self, text):
+        """テキストを書き込んでフラッシュする"""
+        self.file.write(text)
+        self.file.flush()
+
+
+def retry_delay(retry_after, attempt):
+    """
+    再試行までの待ち時間
+    
+    Args:
+        retry_after (str): 応答の retry-after ヘッダ（ない場合はNone）
+        attempt (int): これまでの試行回数（0始まり）
+        
+    Returns:
+        float: 待ち時間（秒）。retry-after があればそれに従い、なければ揺らぎを加えた指数バックオフ
+    """
+    try:
+        return min(float(retry_after), MAX_RETRY_DELAY)
+    except (TypeError, ValueError):
+        return min(2 ** attempt, MAX_RETRY_DELAY) + random.uniform(0, 1)
+
+
+def format_usage(usage):
+    """
+    表示用のトークン数
+    
+    Args:
+        usage (dict): APIの応答の usage
+        
+    Returns:
+        str: 入力（うちキャッシュからの読み込み・キャッシュへの書き込み）と出力のトークン数
+    """
+    usage = usage or {}
+    return (f"入力 {usage.get('input_tokens', 0):,}"
+            f"（キャッシュ読み込み {usage.get('cache_read_input_tokens', 0):,}"
+            f" / キャッシュ書き込み {usage.get('cache_creation_input_tokens', 0):,}）, "
+            f"出力 {usage.get('output_tokens', 0):,}")
+
+
+def iter_sse_events(lines):
+    """
+    Server-Sent Eventsの行をイベントに変換
+    
+    Args:
+        lines (iterable): 受信した行（改行なし）
         
-        return os.path.abspath(filename)
+    Yields:
+        tuple: (イベント名, JSONを解析したデータ)
+    """
+    event = None
+    data_lines = []
+    for line in lines:
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield event or "message", json.loads("\n".join(data_lines))
+            event = None
+            data_lines = []
+        elif line.startswith(":"):
+            continue
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].lstrip())
+    if data_lines:
+        yield event or "message", json.loads("\n".join(data_lines))
@@ -20,6 +20,8 @@ DEFAULT_SETTINGS = {
 API_KEY = "YOUR_ANTHROPIC_API_KEY"
 API_URL = "https://api.anthropic.com/v1/messages"
 API_VERSION = "2023-06-01"
+# プロンプトキャッシュの対象になる先頭部分の最小トークン数（Claude 3.7 Sonnet）
+PROMPT_CACHE_MIN_TOKENS = 1024
 
 def parse_domain_list(domain_str):
     """カンマ区切りのドメインリストを解析する"""
@@ -43,11 +45,53 @@ def create_arg_parser():
     parser.add_argument('--days', type=int, default=7, help='何日先までの予定を取得するか')
     parser.add_argument('--api-key', type=str, help='Anthropic API Key（設定済みの場合は不要）')
     parser.add_argument('--api-version', type=str, help='Anthropic API Version（設定済みの場合は不要）')
+    parser.add_argument('--api-url', type=str, default=API_URL, help='Messages APIのURL（mock_claude_server.py で動作確認する場合に変更）')
     parser.add_argument('--priority-domains', type=str, help='優先ドメインをカンマ区切りで指定（例: company.com,client.com）')
     parser.add_argument('--priority-keywords', type=str, help='優先キーワードをカンマ区切りで指定（例: 至急,重要,期限）')
     parser.add_argument('--working-hours', type=int, nargs=2, metavar=('START', 'END'), help='勤務時間（例: 9 18）')
     parser.add_argument('--focus-time', type=int, nargs=2, metavar=('START', 'END'), help='集中作業時間（例: 10 12）')
     parser.add_argument('--report-style', type=str, choices=['detailed', 'concise'], default='detailed', help='レポートスタイル')
+    parser.add_argument('--stream', action='store_true', help='応答をストリーミングで受信し、届いた順にファイルと画面へ出力する')
+    parser.add_argument('--calendar-analysis', action='store_true', help='予定の重複・空き時間・集中作業時間との重なりをローカルで計算してプロンプトに含める')
+    parser.add_argument('--prefilter', action='store_true', help='優先ドメイン・優先キーワードに該当する未読メールをOutlook側で絞り込み、優先度の高いメールだけ本文を取得する')
+    parser.add_argument('--scan-emails', type=int, default=500, help='--prefilter 時に取得する優先メールのヘッダの最大件数')
+    parser.add_argument('--no-normalize', action='store_true', help='メール本文から引用・署名・定型文などを除去せずにそのまま使う')
+    parser.add_argument('--no-entities', action='store_true', help='本文から会議URL・期限・依頼の文を抽出せず、プロンプトにも含めない')
+    parser.add_argument('--collapse-threads', action='store_true', help='同じスレッドのメールを1件にまとめ、最新メール以外は差分だけをプロンプトに含める')
+    parser.add_argument('--token-budget', type=int, help='メール欄のトークン予算（指定すると優先度の高いメールほど本文を長く含める）')
+    parser.add_argument('--map-reduce', action='store_true', help='メールをチャンクごとに並列要約してから最終レポートを作成する（大量の未読メール向け）')
+    parser.add_argument('--summary-memo', action='store_true', help='メールを1件ずつ要約してキャッシュし、新着メールだけを要約して最終レポートを作成する（--no-cache とは併用不可）')
+    parser.add_argument('--chunk-size', type=int, default=20, help='map-reduce・要約メモ化時に1回の要約に含めるメール件数')
+    parser.add_argument('--concurrency', type=int, default=4, help='map-reduce・要約メモ化時に同時実行するAPI呼び出し数')
+    parser.add_argument('--async-api', action='store_true', help='aiohttpの非同期クライアントで接続を再利用しながらAPI呼び出しを並行して行う（map-reduce・要約メモ化・一括モード）')
+    parser.add_argument('--response-cache-dir', type=str, default='response_cache', help='Claudeの応答キャッシュを保存するディレクトリ')
+    parser.add_argument('--response-cache-ttl', type=float, default=1440, help='応答キャッシュの保存期間（分）')
+    parser.add_argument('--response-cache-max-mb', type=float, default=50, help='応答キャッシュの合計サイズの上限（MB）')
+    parser.add_argument('--no-response-cache', action='store_true', help='応答キャッシュを使わずに毎回APIを呼び出す')
+    parser.add_argument('--cache-file', type=str, default='outlook_cache.sqlite3', help='取得済みメール・予定のキャッシュファイル')
+    parser.add_argument('--no-cache', action='store_true', help='キャッシュを使わずに毎回すべて取得する')
+    parser.add_argument('--extract-attachments', action='store_true', help='添付ファイル（PDF・docx・xlsx・テキスト）からテキストを抽出し、冒頭をプロンプトに含める')
+    parser.add_argument('--attachment-workers', type=int, help='添付ファイルのテキスト抽出に使うプロセス数（省略時はCPU数）')
+    parser.add_argument('--attachment-max-mb', type=float, default=10, help='テキストを抽出する添付ファイルのサイズの上限（MB）')
+    parser.add_argument('--attachment-timeout', type=float, default=20, help='添付ファイル1件あたりのテキスト抽出の時間の上限（秒）')
+    parser.add_argument('--watch', action='store_true', help='常駐して新着メールと予定の変更を監視し、変更があればレポートを更新する')
+    parser.add_argument('--debounce', type=float, default=30, help='常駐時、最後の変更からレポートを更新するまでの待ち時間（秒）')
+    parser.add_argument('--max-delay', type=float, default=300, help='常駐時、最初の変更からレポートを更新するまでの最大の待ち時間（秒）')
+    parser.add_argument('--schedule', action='store_true', help='常駐して毎日の勤務開始前にレポートを作成しておき、開始直前に新着メールや予定の変更があれば更新する')
+    parser.add_argument('--schedule-margin', type=float, default=10, help='勤務開始の何分前までに開始直前の更新を終えるか')
+    parser.add_argument('--schedule-state', type=str, default='prebuilt_report.json', help='事前作成したレポートの情報を保存するファイル')
+    parser.add_argument('--prebuilt', action='store_true', help='今日の分の事前作成したレポートがあれば、取得とAPI呼び出しを行わずにすぐ表示する')
+    parser.add_argument('--archive', type=str, default='report_archive.sqlite3', help='作成したレポートを全文検索用に保存するアーカイブ（report_archive.py で検索・比較する）')
+    parser.add_argument('--no-archive', action='store_true', help='レポートをアーカイブに保存しない')
+    parser.add_argument('--batch', type=str, metavar='FILE', help='JSONファイルに列挙した複数のメールボックス（共有・代理アクセスを含む）のレポートをまとめて作成する')
+    parser.add_argument('--offline', action='store_true', help='一括モードで全員分のプロンプトをMessage Batches APIにまとめて送信し、処理の終了を待ってレポートを保存する（夜間処理向け）')
+    parser.add_argument('--batch-journal', type=str, default='batch_journal.json', help='--offline 時に送信したバッチを記録するファイル（中断後の再実行で続きから再開する）')
+    parser.add_argument('--fetch-workers', type=int, default=4, help='一括モードでメールボックスの取得を並列に行うスレッド数')
+    parser.add_argument('--api-workers', type=int, default=4, help='一括モードでAPI呼び出しを並列に行うスレッド数')
+    parser.add_argument('--rate-limit', type=float, help='1分あたりのAPIリクエスト数の上限（全スレッド共通。一括モードの既定は50）')
+    parser.add_argument('--burst', type=int, help='レート制限の範囲内で連続して送信できるリクエスト数（省略時は --api-workers と同じ）')
+    parser.add_argument('--telemetry-file', type=str, help='段階ごとの所要時間・COM呼び出し回数・トークン数をJSON Lines形式で追記するファイル')
+    parser.add_argument('--prometheus-file', type=str, help='同じ集計をPrometheusのtextfile collector用の形式で書き出すファイル（例: /var/lib/node_exporter/outlook_assistant.prom）')
     return parser
 
 def load_settings(args):
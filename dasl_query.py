@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+DASLクエリ作成モジュール
+
+Outlookの Items.Restrict や Folder.GetTable に渡す "@SQL=" 形式（DASL）の条件を作成する。
+優先ドメイン・優先キーワード・予定の期間をOutlook側の条件にすることで、未読メールが
+数千件あっても、該当するメールだけをOutlookが絞り込んで返す。キーワードは、ストアの
+Instant Search（内容のインデックス）が有効なら ci_phrasematch でインデックスを使って検索し、
+無効なら LIKE で検索する。日時はUTCに変換し、地域設定によらない形式で指定する。
+
+ここでは条件の文字列を作成するだけでCOMは使わない。疑似Outlook（fake_outlook.py）は
+作成した条件を解析して評価できる。
+"""
+
+from datetime import datetime, timezone
+
+SQL_PREFIX = "@SQL="
+
+# DASLのプロパティ名
+READ = "urn:schemas:httpmail:read"
+SUBJECT = "urn:schemas:httpmail:subject"
+TEXT_DESCRIPTION = "urn:schemas:httpmail:textdescription"  # 本文
+FROM_EMAIL = "urn:schemas:httpmail:fromemail"
+DATE_RECEIVED = "urn:schemas:httpmail:datereceived"
+HAS_ATTACHMENT = "urn:schemas:httpmail:hasattachment"
+CALENDAR_START = "urn:schemas:calendar:dtstart"
+CALENDAR_END = "urn:schemas:calendar:dtend"
+
+# 日時の形式（DASLの日時はUTCとして比較される）
+DASL_DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+# キーワードを検索するプロパティ
+KEYWORD_PROPERTIES = (SUBJECT, TEXT_DESCRIPTION)
+
+
+def quote(value):
+    """文字列を引用符で囲む（値の中の ' は '' にする）"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def format_date(value):
+    """
+    日時をDASLの値に変換
+
+    Args:
+        value (datetime): 日時（タイムゾーンがない場合はローカル時刻として扱う）
+
+    Returns:
+        str: UTCに変換した 'YYYY-MM-DD HH:MM'
+    """
+    return quote(value.astimezone(timezone.utc).strftime(DASL_DATE_FORMAT))
+
+
+def condition(prop, operator, value):
+    """
+    1つの比較条件を作成
+
+    Args:
+        prop (str): DASLのプロパティ名
+        operator (str): 演算子（=, <>, <, >, <=, >=, LIKE, ci_phrasematch, ci_startswith）
+        value: 比較する値（bool は 1/0、datetime はUTCの日時にする）
+
+    Returns:
+        str: 例 "urn:schemas:httpmail:read" = 0
+    """
+    if isinstance(value, bool):
+        literal = "1" if value else "0"
+    elif isinstance(value, int):
+        literal = str(value)
+    elif isinstance(value, datetime):
+        literal = format_date(value)
+    else:
+        literal = quote(value)
+    return f'"{prop}" {operator} {literal}'
+
+
+def _join(operator, conditions):
+    conditions = [c for c in conditions if c]
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return f" {operator} ".join(f"({c})" for c in conditions)
+
+
+def all_of(*conditions):
+    """条件を AND で連結（None は無視し、条件がなければNone）"""
+    return _join("AND", conditions)
+
+
+def any_of(*conditions):
+    """条件を OR で連結（None は無視し、条件がなければNone）"""
+    return _join("OR", conditions)
+
+
+def to_filter(condition_string):
+    """
+    条件を Restrict・GetTable に渡すフィルタにする
+
+    Args:
+        condition_string (str): all_of などで作成した条件
+
+    Returns:
+        str: "@SQL=" で始まるフィルタ
+    """
+    return SQL_PREFIX + condition_string
+
+
+def unread_condition():
+    """未読メールの条件"""
+    return condition(READ, "=", False)
+
+
+def keyword_condition(keyword, content_indexed=True):
+    """
+    件名または本文にキーワードを含む条件
+
+    Args:
+        keyword (str): キーワード
+        content_indexed (bool): ストアの内容のインデックスを使えるか（True なら ci_phrasematch を使う）
+
+    Returns:
+        str: 条件
+    """
+    if content_indexed:
+        return any_of(*(condition(prop, "ci_phrasematch", keyword) for prop in KEYWORD_PROPERTIES))
+    return any_of(*(condition(prop, "LIKE", f"%{keyword}%") for prop in KEYWORD_PROPERTIES))
+
+
+def domain_condition(domain):
+    """
+    送信者のアドレスが優先ドメインまたはそのサブドメインである条件
+
+    Args:
+        domain (str): ドメイン（先頭の @ や . は無視する）
+
+    Returns:
+        str: 条件
+    """
+    domain = domain.strip().lower().lstrip("@.")
+    return any_of(condition(FROM_EMAIL, "LIKE", f"%@{domain}"), condition(FROM_EMAIL, "LIKE", f"%@%.{domain}"))
+
+
+def priority_condition(domains, keywords, content_indexed=True):
+    """
+    優先ドメインからのメール、または優先キーワードを含むメールの条件
+
+    Args:
+        domains (list): 優先ドメイン
+        keywords (list): 優先キーワード
+        content_indexed (bool): ストアの内容のインデックスを使えるか
+
+    Returns:
+        str: 条件（優先ドメインも優先キーワードもない場合はNone）
+    """
+    return any_of(*(domain_condition(d) for d in domains or () if d.strip()),
+                  *(keyword_condition(k, content_indexed) for k in keywords or () if k.strip()))
+
+
+def overlap_condition(start, end):
+    """
+    期間と重なる予定の条件
+
+    期間の前に始まって期間中に終わる予定や、期間中に始まって期間の後に終わる予定も含める。
+
+    Args:
+        start (datetime): 期間の開始日時
+        end (datetime): 期間の終了日時
+
+    Returns:
+        str: 条件
+    """
+    return all_of(condition(CALENDAR_START, "<", end), condition(CALENDAR_END, ">", start))
@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+本文の情報抽出モジュール
+
+メールと予定の本文から、オンライン会議のURL（Teams・Zoom・Google Meet・Webex）、
+期限（「期限：5/1」「6月3日(金)17時までに」「〆切 明日」「by Friday」など）、
+依頼の文（「ご確認ください」「please review」など）を取り出す。
+
+3種類のパターンは1つの正規表現にまとめてモジュールの読み込み時にコンパイルし、
+本文を1回走査するだけですべて検出する。大文字・小文字は照合時にだけ無視し、
+本文は書き換えないため、大文字・小文字を区別するURLもそのまま取り出せる。
+期限の日付は受信日時（予定は更新日時）を基準に解釈するため、「明日」「金曜」も日付にできる。
+抽出した結果をプロンプトに含めることで、Claudeが本文から読み取る手間と出力を減らす。
+"""
+
+import calendar
+import re
+from datetime import datetime, timedelta
+
+from records import Deadline, MeetingLink, Record, format_datetime
+
+# オンライン会議のサービスの表示名
+PROVIDER_NAMES = {
+    "teams": "Microsoft Teams",
+    "zoom": "Zoom",
+    "meet": "Google Meet",
+    "webex": "Webex",
+}
+
+# 1件あたりに残す依頼の文の数と長さ
+MAX_ACTION_ITEMS = 3
+MAX_ACTION_CHARS = 100
+
+# 会議URL（サービスごとの名前付きグループで、どのサービスかを判別する）
+_MEETING_URL = r"""
+(?P<url>https?://(?:
+    (?P<teams>teams\.microsoft\.com/(?:l/meetup-join|meet)/|teams\.live\.com/meet/)
+  | (?P<zoom>(?:[\w-]+\.)*zoom\.us/(?:j|w|my|s|wc/join)/)
+  | (?P<meet>meet\.google\.com/[a-z]{3}-)
+  | (?P<webex>(?:[\w-]+\.)*webex\.com/(?:meet/|join/|[\w-]+/j\.php|wbxmjs/joinservice/))
+)[^\s<>"'()（）\[\]]*)
+"""
+
+_ENGLISH_MONTHS = r"jan|feb|mar|apr|may|jun|jul|aug|sept?|oct|nov|dec"
+_ENGLISH_WEEKDAYS = r"mon|tue|tues|wed|wednes|thu|thur|thurs|fri|sat|satur|sun"
+
+# 日付の表現（曜日と時刻が続く場合は含める）
+_DATE = rf"""
+(?:
+    \d{{4}}\s*[/.年-]\s*\d{{1,2}}\s*[/.月-]\s*\d{{1,2}}\s*日?
+  | \d{{1,2}}\s*(?:/|月)\s*\d{{1,2}}\s*日?
+  | (?:来週|今週|次の)?\s*[月火水木金土日]曜日?
+  | 明後日|あさって|明日|あした|本日|今日|今週中|今週末|来週中|来週末|週明け|今月末|今月中|月末
+  | tomorrow|today|tonight|eod|cob|end\s+of\s+(?:the\s+)?(?:day|week|month)
+  | (?:next\s+|this\s+)?(?:{_ENGLISH_WEEKDAYS})(?:day)?\b
+  | (?:{_ENGLISH_MONTHS})[a-z]*\.?\s+\d{{1,2}}(?:st|nd|rd|th)?\b
+  | \d{{1,2}}(?:st|nd|rd|th)?\s+(?:{_ENGLISH_MONTHS})[a-z]*\b
+)
+(?:\s*[(（][月火水木金土日][)）])?
+(?:\s*(?:\d{{1,2}}\s*[:：]\s*\d{{2}}|\d{{1,2}}\s*時(?:\s*\d{{1,2}}\s*分)?|正午))?
+"""
+
+_DEADLINE_WORD = r"提出期限|回答期限|返答期限|期限|締め?切り?|〆切り?|〆|納期|デッドライン|due(?:\s+date)?|deadline"
+
+# 期限（「期限：日付」「by 日付」、または日付が前にある「日付までに」「日付〆切」）
+# どの選択肢も決まった語で始まるようにして、本文の各位置で日付のパターンを試さずに済ませる。
+# 日付が前にある形は、語が見つかった位置から DEADLINE_LOOKBACK 文字だけさかのぼって日付を探す。
+# 「5/1から5/3まで休暇」「out until Friday」のような期間の終わりを期限としないよう、
+# 「まで」「until」だけでは期限とみなさない。
+_DEADLINE = rf"""
+(?P<deadline_word>{_DEADLINE_WORD})(?:\s*[:：]?\s*(?:は|is|on)?\s*(?P<deadline_after>{_DATE}))?
+| \b(?:by|before|no\s+later\s+than)\s+(?:the\s+)?(?P<deadline_by>{_DATE})
+| (?P<deadline_until>までに|迄に|必着)
+"""
+
+DEADLINE_LOOKBACK = 40
+
+# 依頼の表現（この表現を含む文を依頼の文として取り出す）
+_ACTION = r"""
+(?P<action>
+    して(?:ください|下さい|いただけ|頂け)
+  | お願い(?:します|致します|いたします|できます)
+  | ご(?:確認|対応|返信|回答|検討|連絡|準備|提出|承認|記入)(?:ください|下さい|願います|の程|をお願い)
+  | \b(?:please|kindly|action\s+required|could\s+you|can\s+you)\b
+)
+"""
+
+# 各選択肢の先頭になりうる文字。先読みで先に確かめることで、該当しない位置では
+# 選択肢を1つずつ試さずに次の文字へ進む（パターンを変えたらここも更新する）
+_FIRST_CHARS = "h" "提回返期締〆納デd" "bn" "ま迄必" "しおご" "pkac"
+
+_ENTITY_PATTERN = re.compile(f"(?=[{_FIRST_CHARS}])(?:{_MEETING_URL}|{_DEADLINE}|{_ACTION})",
+                             re.IGNORECASE | re.VERBOSE)
+
+# 語の直前で終わる日付（「日付まで」の形）
+_DATE_BEFORE = re.compile(rf"(?:{_DATE})\s*$", re.IGNORECASE | re.VERBOSE)
+
+# 期限の日付を解釈するためのパターン（一致した短い文字列にだけ使う）
+_FULL_DATE = re.compile(r"(\d{4})\s*[/.年-]\s*(\d{1,2})\s*[/.月-]\s*(\d{1,2})")
+_MONTH_DAY = re.compile(r"(\d{1,2})\s*(?:/|月)\s*(\d{1,2})")
+_ENGLISH_MONTH_DAY = re.compile(
+    rf"(?:({_ENGLISH_MONTHS})[a-z]*\.?\s+(\d{{1,2}})|(\d{{1,2}})(?:st|nd|rd|th)?\s+({_ENGLISH_MONTHS}))")
+_TIME = re.compile(r"(\d{1,2})\s*(?:[:：]\s*(\d{2})|時(?:\s*(\d{1,2})\s*分)?)|(正午)")
+_JAPANESE_WEEKDAY = re.compile(r"(来週|今週|次の)?\s*([月火水木金土日])曜")
+_ENGLISH_WEEKDAY = re.compile(rf"(next\s+|this\s+)?({_ENGLISH_WEEKDAYS})")
+
+_JAPANESE_WEEKDAYS = "月火水木金土日"
+_ENGLISH_WEEKDAY_INDEX = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+_ENGLISH_MONTH_INDEX = {name: i for i, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), 1)}
+
+# 基準日からの日数で表す表現
+_RELATIVE_DAYS = {"本日": 0, "今日": 0, "today": 0, "tonight": 0, "eod": 0, "cob": 0,
+                  "明日": 1, "あした": 1, "tomorrow": 1, "明後日": 2, "あさって": 2}
+
+# 文の区切り（依頼の文の前後を探す）
+_SENTENCE_END = re.compile(r"[。！？!?\n]|\.(?:\s|$)")
+_SENTENCE_START = "。！？!?\n"
+
+
+def _week_day(reference, weekday, weeks=0):
+    """基準日と同じ週（月曜始まり）の weekday の日（weeks 週後）"""
+    monday = reference - timedelta(days=reference.weekday())
+    return monday + timedelta(days=weekday, weeks=weeks)
+
+
+def _next_weekday(reference, weekday):
+    """基準日以降で最初の weekday の日（基準日が weekday ならその日）"""
+    return reference + timedelta(days=(weekday - reference.weekday()) % 7)
+
+
+def _month_day(reference, month, day):
+    """年のない月日を、基準日に近い日付にする（基準日より1か月以上前なら翌年とみなす）"""
+    try:
+        date = datetime(reference.year, month, day)
+    except ValueError:
+        return None
+    if date < reference - timedelta(days=31):
+        try:
+            date = date.replace(year=reference.year + 1)
+        except ValueError:
+            return None
+    return date
+
+
+def _end_of_month(reference):
+    return reference.replace(day=calendar.monthrange(reference.year, reference.month)[1])
+
+
+def parse_deadline(text, reference):
+    """
+    期限の表現を日時に変換
+
+    Args:
+        text (str): 日付の表現（「5/1(木) 17:00」「明日」「next Friday」「end of month」など）
+        reference (datetime): 基準の日時（メールの受信日時など）
+
+    Returns:
+        datetime: 期限の日時（時刻の指定がなければ0時。解釈できない場合はNone）
+    """
+    lowered = text.lower()
+    reference = reference.replace(hour=0, minute=0, second=0, microsecond=0)
+    date = None
+    match = _FULL_DATE.search(lowered)
+    if match:
+        try:
+            date = datetime(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        except ValueError:
+            return None
+    elif _MONTH_DAY.search(lowered):
+        match = _MONTH_DAY.search(lowered)
+        date = _month_day(reference, int(match.group(1)), int(match.group(2)))
+    elif _ENGLISH_MONTH_DAY.search(lowered):
+        match = _ENGLISH_MONTH_DAY.search(lowered)
+        month = match.group(1) or match.group(4)
+        day = match.group(2) or match.group(3)
+        date = _month_day(reference, _ENGLISH_MONTH_INDEX[month[:3]], int(day))
+    elif _JAPANESE_WEEKDAY.search(lowered):
+        match = _JAPANESE_WEEKDAY.search(lowered)
+        weekday = _JAPANESE_WEEKDAYS.index(match.group(2))
+        if match.group(1) == "来週":
+            date = _week_day(reference, weekday, weeks=1)
+        elif match.group(1) == "今週":
+            date = _week_day(reference, weekday)
+        else:
+            date = _next_weekday(reference, weekday)
+    elif "週明け" in lowered:
+        date = _week_day(reference, 0, weeks=1)
+    elif "来週" in lowered:
+        date = _week_day(reference, 4, weeks=1)
+    elif "週末" in lowered or "今週中" in lowered or "week" in lowered:
+        date = _week_day(reference, 4)
+    elif "月末" in lowered or "今月中" in lowered or "month" in lowered:
+        date = _end_of_month(reference)
+    elif "end of" in lowered:  # end of day
+        date = reference
+    else:
+        for word, days in _RELATIVE_DAYS.items():
+            if word in lowered:
+                date = reference + timedelta(days=days)
+                break
+        else:
+            match = _ENGLISH_WEEKDAY.search(lowered)
+            if match:
+                weekday = _ENGLISH_WEEKDAY_INDEX[match.group(2)[:3]]
+                if match.group(1) and match.group(1).startswith("next"):
+                    date = _week_day(reference, weekday, weeks=1)
+                else:
+                    date = _next_weekday(reference, weekday)
+    if date is None:
+        return None
+
+    # 「5/1 17:00」の「1 17」を時刻と取り違えないよう、日付の後ろだけから探す
+    time_match = _TIME.search(lowered, match.end() if match else 0)
+    if time_match:
+        if time_match.group(4):
+            return date.replace(hour=12)
+        hour = int(time_match.group(1))
+        minute = int(time_match.group(2) or time_match.group(3) or 0)
+        if hour < 24 and minute < 60:
+            return date.replace(hour=hour, minute=minute)
+    return date
+
+
+def _sentence(text, start, end):
+    """位置 start～end を含む文（長い場合は先頭から MAX_ACTION_CHARS 文字）"""
+    period = text.rfind(". ", 0, start)
+    begin = max(max(text.rfind(ch, 0, start) for ch in _SENTENCE_START) + 1, period + 2 if period >= 0 else 0)
+    stop = _SENTENCE_END.search(text, end)
+    sentence = text[begin:stop.end() if stop else len(text)].strip()
+    sentence = sentence.lstrip(">＞ \t・-*")
+    if len(sentence) > MAX_ACTION_CHARS:
+        sentence = sentence[:MAX_ACTION_CHARS] + "..."
+    return sentence
+
+
+class ExtractedEntities(Record):
+    """1件の本文から抽出した情報"""
+
+    __slots__ = ("meeting_links", "deadlines", "action_items")
+    _defaults = {"meeting_links": [], "deadlines": [], "action_items": []}
+    _nested_fields = {"meeting_links": MeetingLink, "deadlines": Deadline}
+
+
+def extract_entities(text, reference=None):
+    """
+    本文を1回走査して、会議URL・期限・依頼の文を抽出
+
+    Args:
+        text (str): 本文
+        reference (datetime): 期限を解釈する基準の日時（省略時は現在時刻）
+
+    Returns:
+        ExtractedEntities: 抽出した情報（それぞれ本文中の順。同じものは1つにまとめる）
+    """
+    entities = ExtractedEntities()
+    if not text:
+        return entities
+    reference = reference or datetime.now()
+    seen = set()
+    last_end = 0
+    for match in _ENTITY_PATTERN.finditer(text):
+        if match.group("url") is not None:
+            url = match.group("url").rstrip(".,;:。、")
+            if url not in seen:
+                seen.add(url)
+                provider = next(name for name in PROVIDER_NAMES if match.group(name) is not None)
+                entities.meeting_links.append(MeetingLink(provider=provider, url=url))
+        elif match.group("action") is not None:
+            if len(entities.action_items) < MAX_ACTION_ITEMS:
+                sentence = _sentence(text, match.start(), match.end())
+                if sentence and sentence not in seen:
+                    seen.add(sentence)
+                    entities.action_items.append(sentence)
+        else:
+            start = match.start()
+            date_text = match.group("deadline_after") or match.group("deadline_by")
+            if date_text is None:
+                # 直前の一致と重ならない範囲で、語の前にある日付を探す
+                window_start = max(last_end, start - DEADLINE_LOOKBACK)
+                before = _DATE_BEFORE.search(text, window_start, start)
+                if before is None:
+                    last_end = match.end()
+                    continue
+                date_text = before.group(0)
+                start = before.start()
+            phrase = " ".join(text[start:match.end()].split())
+            if phrase not in seen:
+                seen.add(phrase)
+                entities.deadlines.append(Deadline(text=phrase, due=parse_deadline(date_text, reference)))
+        last_end = match.end()
+    return entities
+
+
+def extract_meeting_links(text):
+    """
+    本文からオンライン会議のURLだけを抽出
+
+    Returns:
+        list: MeetingLink のリスト
+    """
+    return extract_entities(text).meeting_links
+
+
+def annotate(records, reference=None):
+    """
+    メールまたは予定の本文から抽出した情報をレコードに設定
+
+    正規化で署名と一緒に会議の案内が除かれることがあるため、元の本文（raw_body）があればそちらを使う。
+    期限は、メールは受信日時、予定は更新日時を基準に解釈する。
+
+    Args:
+        records (list): EmailRecord または EventRecord のリスト（そのまま書き換える）
+        reference (datetime): 受信日時・更新日時がない場合の基準の日時
+
+    Returns:
+        list: records と同じリスト
+    """
+    for record in records:
+        text = getattr(record, "raw_body", None) or record.body
+        base = getattr(record, "received_time", None) or record.last_modified or reference
+        entities = extract_entities(text, base)
+        record.meeting_links = entities.meeting_links
+        record.deadlines = entities.deadlines
+        record.action_items = entities.action_items
+        if hasattr(record, "meeting_url") and entities.meeting_links:
+            record.meeting_url = entities.meeting_links[0].url
+    return records
+
+
+def format_meeting_link(link):
+    """表示用の会議URL（サービス名付き）"""
+    return f"{PROVIDER_NAMES.get(link.provider, link.provider)} {link.url}"
+
+
+def format_deadline(deadline):
+    """表示用の期限（解釈した日時と本文中の表現）"""
+    if deadline.due is None:
+        return f"「{deadline.text}」"
+    fmt = "%Y-%m-%d(%a)" if deadline.due.hour == 0 and deadline.due.minute == 0 else "%Y-%m-%d(%a) %H:%M"
+    return f"{format_datetime(deadline.due, fmt)}「{deadline.text}」"
+
+
+def format_entities(record, indent="", meeting_links=True):
+    """
+    プロンプト用に抽出した情報を整形
+
+    Args:
+        record (EmailRecord or EventRecord): annotate で情報を設定したレコード
+        indent (str): 各行の先頭に付ける文字列
+        meeting_links (bool): 会議URLを含めるか
+
+    Returns:
+        str: 改行で始まる箇条書き（抽出した情報がない場合は空文字列）
+    """
+    lines = []
+    if record.deadlines:
+        lines.append(f"- 期限（抽出済み）: {', '.join(format_deadline(d) for d in record.deadlines)}")
+    if meeting_links and record.meeting_links:
+        lines.append(f"- 会議URL: {', '.join(format_meeting_link(link) for link in record.meeting_links)}")
+    if record.action_items:
+        lines.append(f"- 依頼: {' / '.join(record.action_items)}")
+    return "".join(f"\n{indent}{line}" for line in lines)
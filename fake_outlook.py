@@ -0,0 +1,714 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+疑似Outlookオブジェクトモデル
+
+Outlook（MAPI）のCOMオブジェクトのうち、OutlookClient と OutlookMailStore が
+使う部分（Namespace, Folder, Items, Restrict, Sort, GetTable, GetItemFromID,
+Attachments）をメモリ上で再現する。Outlookのない環境でベンチマークや
+動作確認を行うためのもので、COM呼び出し1回ごとの待ち時間を設定できる。
+Restrict と GetTable の条件は、Jet形式（[Start] < '...'）と、dasl_query.py で
+作成した DASL形式（@SQL=...）の両方を評価できる。
+
+COMのオブジェクトモデルを介さずに MailStore のインターフェースだけを再現する
+メモリ上の疑似メールボックス（FakeMailStore）も提供する。
+"""
+
+import random
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+import dasl_query
+from attachments import is_extractable, DEFAULT_MAX_BYTES
+from mail_store import (DEFAULT_BATCH_SIZE, EMAIL_COLUMNS, HAS_ATTACHMENT_PROPERTY, OL_FOLDER_INBOX, MailStore,
+                        new_attachment_path)
+from records import EventRecord
+
+OL_FOLDER_CALENDAR = 9
+
+# Restrict の条件（[プロパティ] 演算子 値）
+_JET_CONDITION = re.compile(r"\[(\w+)\]\s*(<=|>=|<>|<|>|=)\s*('[^']*'|\w+)")
+_JET_DATE_FORMATS = ("%m/%d/%Y %H:%M %p", "%m/%d/%Y %H:%M", "%m/%d/%Y %I:%M %p", "%Y-%m-%d %H:%M")
+_OPERATORS = {
+    "=": lambda a, b: a == b,
+    "<>": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    ">": lambda a, b: a > b,
+    "<=": lambda a, b: a <= b,
+    ">=": lambda a, b: a >= b,
+}
+
+# DASLの字句（"プロパティ", '文字列', 数値, 演算子, 括弧, 単語）
+_DASL_TOKEN = re.compile(r"""\s*(?:"(?P<prop>[^"]+)"|'(?P<string>(?:[^']|'')*)'|(?P<number>-?\d+)"""
+                         r"""|(?P<op><>|<=|>=|<|>|=)|(?P<paren>[()])|(?P<word>\w+))""")
+
+
+def _to_utc(value):
+    """ローカル時刻をUTC（タイムゾーンなし）に変換（DASLの日時はUTCで比較する）"""
+    if value is None:
+        return None
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# DASLのプロパティと疑似アイテムの値の対応
+_DASL_PROPERTIES = {
+    dasl_query.READ: lambda item: not item.UnRead,
+    dasl_query.SUBJECT: lambda item: item.Subject,
+    dasl_query.TEXT_DESCRIPTION: lambda item: item.Body,
+    dasl_query.FROM_EMAIL: lambda item: item.SenderEmailAddress,
+    dasl_query.DATE_RECEIVED: lambda item: _to_utc(item.ReceivedTime),
+    dasl_query.HAS_ATTACHMENT: lambda item: item.Attachments.Count > 0,
+    dasl_query.CALENDAR_START: lambda item: _to_utc(item.Start),
+    dasl_query.CALENDAR_END: lambda item: _to_utc(item.End),
+}
+_DASL_DATE_PROPERTIES = (dasl_query.DATE_RECEIVED, dasl_query.CALENDAR_START, dasl_query.CALENDAR_END)
+
+
+def _like(pattern):
+    """LIKE のパターン（% は任意の文字列）を正規表現に変換"""
+    regex = re.compile(".*".join(re.escape(part) for part in pattern.split("%")), re.IGNORECASE | re.DOTALL)
+    return lambda text: regex.fullmatch(text) is not None
+
+
+def _dasl_comparison(prop, operator, value):
+    """1つの比較条件を、アイテムを受け取って真偽を返す関数にする"""
+    if prop not in _DASL_PROPERTIES:
+        raise ValueError(f"対応していないDASLのプロパティです: {prop}")
+    get = _DASL_PROPERTIES[prop]
+    if prop in _DASL_DATE_PROPERTIES and isinstance(value, str):
+        value = datetime.strptime(value, dasl_query.DASL_DATE_FORMAT)
+    operator = operator.lower()
+    if operator == "like":
+        test = _like(value)
+    elif operator == "ci_phrasematch":
+        test = lambda text, phrase=value.lower(): phrase in text.lower()
+    elif operator == "ci_startswith":
+        test = lambda text, prefix=value.lower(): any(word.startswith(prefix) for word in text.lower().split())
+    elif operator in _OPERATORS:
+        compare = _OPERATORS[operator]
+        test = lambda actual: compare(actual, value)
+    else:
+        raise ValueError(f"対応していないDASLの演算子です: {operator}")
+
+    def matches(item):
+        actual = get(item)
+        return actual is not None and test(actual)
+    return matches
+
+
+class _DaslParser:
+    """AND・OR・NOT・括弧で組み合わせたDASLの条件の解析"""
+
+    def __init__(self, text):
+        self.tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = _DASL_TOKEN.match(text, position)
+            if match is None or match.end() == position:
+                raise ValueError(f"解析できないDASLの条件です: {text[position:]}")
+            self.tokens.append((match.lastgroup, match.group(match.lastgroup)))
+            position = match.end()
+        self.position = 0
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _next(self):
+        token = self._peek()
+        self.position += 1
+        return token
+
+    def _keyword(self, word):
+        kind, value = self._peek()
+        if kind == "word" and value.upper() == word:
+            self.position += 1
+            return True
+        return False
+
+    def parse(self):
+        predicate = self._or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"DASLの条件の末尾を解析できません: {self.tokens[self.position:]}")
+        return predicate
+
+    def _or(self):
+        terms = [self._and()]
+        while self._keyword("OR"):
+            terms.append(self._and())
+        return terms[0] if len(terms) == 1 else (lambda item: any(term(item) for term in terms))
+
+    def _and(self):
+        terms = [self._not()]
+        while self._keyword("AND"):
+            terms.append(self._not())
+        return terms[0] if len(terms) == 1 else (lambda item: all(term(item) for term in terms))
+
+    def _not(self):
+        if self._keyword("NOT"):
+            term = self._not()
+            return lambda item: not term(item)
+        if self._peek() == ("paren", "("):
+            self._next()
+            term = self._or()
+            if self._next() != ("paren", ")"):
+                raise ValueError("DASLの条件の括弧が閉じていません")
+            return term
+        return self._comparison()
+
+    def _comparison(self):
+        kind, prop = self._next()
+        if kind != "prop":
+            raise ValueError(f"DASLのプロパティがありません: {prop}")
+        kind, operator = self._next()
+        if kind not in ("op", "word"):
+            raise ValueError(f"DASLの演算子がありません: {operator}")
+        kind, value = self._next()
+        if kind == "string":
+            value = value.replace("''", "'")
+        elif kind == "number":
+            value = int(value)
+        else:
+            raise ValueError(f"DASLの値がありません: {value}")
+        return _dasl_comparison(prop, operator, value)
+
+
+def parse_dasl_filter(filter_string):
+    """
+    DASL形式（@SQL=...）の条件を解析
+
+    Args:
+        filter_string (str): dasl_query.to_filter で作成した条件
+
+    Returns:
+        callable: アイテムを受け取り、条件に一致するかを返す関数
+    """
+    return _DaslParser(filter_string[len(dasl_query.SQL_PREFIX):]).parse()
+
+
+def compile_filter(filter_string):
+    """
+    Restrict・GetTable の条件（Jet形式またはDASL形式）を解析
+
+    Args:
+        filter_string (str): 条件
+
+    Returns:
+        callable: アイテムを受け取り、条件に一致するかを返す関数
+    """
+    if filter_string.startswith(dasl_query.SQL_PREFIX):
+        return parse_dasl_filter(filter_string)
+    conditions = parse_jet_filter(filter_string)
+    return lambda item: all(compare(getattr(item, name), value) for name, compare, value in conditions)
+
+
+class ComLatency:
+    """
+    COM呼び出しの回数の記録と、1回ごとの待ち時間
+
+    Outlookのオブジェクトモデルは Outlook のメインスレッドで動くため、複数のスレッドからの
+    呼び出しは順番に処理される。lock を共有すると、その待ち時間も再現できる。
+    """
+
+    def __init__(self, seconds=0.0, lock=None):
+        self.seconds = seconds
+        self.lock = lock
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if not self.seconds:
+            return
+        if self.lock is None:
+            time.sleep(self.seconds)
+        else:
+            with self.lock:
+                time.sleep(self.seconds)
+
+
+def _parse_jet_value(text):
+    """Restrict の値を Python の値に変換"""
+    if text.startswith("'"):
+        text = text[1:-1]
+        for fmt in _JET_DATE_FORMATS:
+            try:
+                return datetime.strptime(text, fmt)
+            except ValueError:
+                continue
+        return text
+    if text.lower() in ("true", "false"):
+        return text.lower() == "true"
+    return int(text) if text.isdigit() else text
+
+
+def parse_jet_filter(filter_string):
+    """
+    AND で連結した Jet 形式の条件を解析
+
+    Args:
+        filter_string (str): 例 "[Start] < '01/31/2025 09:00 AM' AND [End] > '...'"
+
+    Returns:
+        list: (プロパティ名, 比較関数, 値) のリスト
+    """
+    conditions = []
+    for part in re.split(r"\s+AND\s+", filter_string.strip(), flags=re.IGNORECASE):
+        match = _JET_CONDITION.fullmatch(part.strip())
+        if match is None:
+            raise ValueError(f"解析できない条件です: {part}")
+        name, operator, value = match.groups()
+        conditions.append((name, _OPERATORS[operator], _parse_jet_value(value)))
+    return conditions
+
+
+class FakeAttachment:
+    def __init__(self, filename, size, content=None, latency=None):
+        self.FileName = filename
+        self.Size = size
+        self._content = content
+        self._latency = latency
+
+    def SaveAsFile(self, path):
+        self._latency()
+        with open(path, "wb") as f:
+            f.write(self._content if self._content is not None else b"\0" * self.Size)
+
+
+class FakeAttachments:
+    def __init__(self, attachments, latency):
+        self._attachments = attachments
+        self._latency = latency
+
+    @property
+    def Count(self):
+        return len(self._attachments)
+
+    def Item(self, index):
+        """1始まりの番号で添付ファイルを取得"""
+        self._latency()
+        return self._attachments[index - 1]
+
+
+class FakeMailItem:
+    def __init__(self, message, latency):
+        self.EntryID = message["entry_id"]
+        self.Subject = message["subject"]
+        self.SenderName = message["sender"]
+        self.SenderEmailAddress = message["sender_email"]
+        self.ReceivedTime = message["received_time"]
+        self.LastModificationTime = message["last_modified"]
+        self.ConversationTopic = message["conversation_topic"]
+        self.ConversationIndex = message["conversation_index"]
+        self.Body = message.get("body", "")
+        self.UnRead = message.get("unread", True)
+        self.Attachments = FakeAttachments(
+            [FakeAttachment(a["filename"], a["size"], a.get("content"), latency) for a in message.get("attachments", [])],
+            latency)
+
+
+class FakeAppointmentItem:
+    def __init__(self, event):
+        self.EntryID = event.entry_id
+        self.Subject = event.subject
+        self.Start = event.start
+        self.End = event.end
+        self.Location = event.location
+        self.Body = event.body
+        self.Organizer = event.organizer
+        self.IsRecurring = event.is_recurring
+        self.AllDayEvent = event.is_all_day_event
+        self.Importance = 1
+        self.Sensitivity = 0
+        self.MeetingStatus = 1
+        self.RequiredAttendees = event.required_attendees or ""
+        self.OptionalAttendees = event.optional_attendees or ""
+        self.LastModificationTime = event.last_modified or event.start
+
+
+class FakeItems:
+    """Items コレクション（Sort, Restrict, GetFirst/GetNext, Item）"""
+
+    def __init__(self, items, latency):
+        self._items = list(items)
+        self._latency = latency
+        self._position = 0
+        self.IncludeRecurrences = False
+
+    @property
+    def Count(self):
+        return len(self._items)
+
+    def Item(self, index):
+        """1始まりの番号で項目を取得"""
+        self._latency()
+        return self._items[index - 1]
+
+    def Sort(self, property_name, descending=False):
+        self._latency()
+        name = property_name.strip("[]")
+        self._items.sort(key=lambda item: getattr(item, name), reverse=bool(descending))
+
+    def Restrict(self, filter_string):
+        self._latency()
+        matched = list(filter(compile_filter(filter_string), self._items))
+        restricted = FakeItems(matched, self._latency)
+        restricted.IncludeRecurrences = self.IncludeRecurrences
+        return restricted
+
+    def GetFirst(self):
+        self._position = 0
+        return self.GetNext()
+
+    def GetNext(self):
+        self._latency()
+        if self._position >= len(self._items):
+            return None
+        item = self._items[self._position]
+        self._position += 1
+        return item
+
+    def __iter__(self):
+        return iter(self._items)
+
+
+class FakeColumns:
+    def __init__(self):
+        self.names = []
+
+    def RemoveAll(self):
+        self.names = []
+
+    def Add(self, name):
+        self.names.append(name)
+
+
+class FakeTable:
+    """Folder.GetTable が返すテーブル（Columns, Sort, GetArray, EndOfTable）"""
+
+    def __init__(self, items, latency):
+        self._items = items
+        self._latency = latency
+        self._position = 0
+        self.Columns = FakeColumns()
+
+    @property
+    def EndOfTable(self):
+        return self._position >= len(self._items)
+
+    def Sort(self, property_name, descending=False):
+        self._latency()
+        name = property_name.strip("[]")
+        self._items.sort(key=lambda item: getattr(item, name), reverse=bool(descending))
+
+    def _value(self, item, column):
+        if column == HAS_ATTACHMENT_PROPERTY:
+            return item.Attachments.Count > 0
+        return getattr(item, column)
+
+    def GetArray(self, max_rows):
+        """最大 max_rows 行を列の値のタプルとして読み込む（呼び出し1回分）"""
+        self._latency()
+        rows = self._items[self._position:self._position + max_rows]
+        self._position += len(rows)
+        return tuple(tuple(self._value(item, column) for column in self.Columns.names) for item in rows)
+
+
+class FakeFolder:
+    def __init__(self, items, latency, store_id="FAKESTORE", store=None):
+        self._items = items
+        self._latency = latency
+        self.StoreID = store_id
+        self.Store = store
+
+    @property
+    def Items(self):
+        self._latency()
+        return FakeItems(self._items, self._latency)
+
+    @property
+    def UnReadItemCount(self):
+        self._latency()
+        return sum(1 for item in self._items if getattr(item, "UnRead", False))
+
+    def GetTable(self, filter_string, table_contents=0):
+        self._latency()
+        matched = list(filter(compile_filter(filter_string.replace("[Unread]", "[UnRead]")), self._items))
+        return FakeTable(matched, self._latency)
+
+
+class FakeRecipient:
+    def __init__(self, address, known):
+        self.Address = address
+        self.Resolved = False
+        self._known = known
+
+    def Resolve(self):
+        self.Resolved = self._known
+        return self.Resolved
+
+
+class FakeStore:
+    def __init__(self, namespace):
+        self._namespace = namespace
+        self.IsInstantSearchEnabled = namespace.instant_search
+
+    def GetDefaultFolder(self, folder_id):
+        return self._namespace.GetDefaultFolder(folder_id)
+
+
+class FakeStoreFolder:
+    """Namespace.Folders の要素（ストアの最上位フォルダ）"""
+
+    def __init__(self, namespace):
+        self.Store = FakeStore(namespace)
+
+
+class FakeFolders:
+    def __init__(self, stores):
+        self._stores = stores
+
+    def Item(self, name):
+        return FakeStoreFolder(self._stores[name])
+
+
+class FakeNamespace:
+    def __init__(self, messages=(), events=(), latency=0.0, store_id="FAKESTORE", shared=None, com_lock=None,
+                 instant_search=True):
+        """
+        初期化
+
+        Args:
+            messages (list): generate_fake_messages の形式のメール
+            events (list): EventRecord のリスト
+            latency (float): COM呼び出し1回ごとの待ち時間（秒）
+            store_id (str): このメールボックスのStoreID
+            shared (dict): 共有・代理アクセスできるメールボックス（アドレスまたは表示名 → FakeNamespace）
+            com_lock (threading.Lock): 複数のメールボックスで共有する、COM呼び出しを順番に処理するためのロック
+            instant_search (bool): ストアの Instant Search（内容のインデックス）が有効か
+        """
+        self.latency = ComLatency(latency, com_lock)
+        self.store_id = store_id
+        self.shared = shared or {}
+        self.instant_search = instant_search
+        self._mail = [FakeMailItem(m, self.latency) for m in messages]
+        self._by_id = {item.EntryID: item for item in self._mail}
+        store = FakeStore(self)
+        self._folders = {
+            OL_FOLDER_INBOX: FakeFolder(self._mail, self.latency, store_id, store),
+            OL_FOLDER_CALENDAR: FakeFolder([FakeAppointmentItem(e) for e in events], self.latency, store_id, store),
+        }
+
+    def GetDefaultFolder(self, folder_id):
+        self.latency()
+        return self._folders[folder_id]
+
+    def GetItemFromID(self, entry_id, store_id=None):
+        self.latency()
+        if store_id is not None and store_id != self.store_id:
+            for namespace in self.shared.values():
+                if namespace.store_id == store_id:
+                    return namespace.GetItemFromID(entry_id)
+            raise KeyError(f"StoreIDが見つかりません: {store_id}")
+        return self._by_id[entry_id]
+
+    def CreateRecipient(self, address):
+        self.latency()
+        return FakeRecipient(address, address in self.shared)
+
+    def GetSharedDefaultFolder(self, recipient, folder_id):
+        self.latency()
+        return self.shared[recipient.Address].GetDefaultFolder(folder_id)
+
+    @property
+    def Folders(self):
+        return FakeFolders(self.shared)
+
+
+class FakeOutlookApplication:
+    def __init__(self, namespace):
+        self._namespace = namespace
+
+    def GetNamespace(self, name):
+        return self._namespace
+
+
+class FakeMailStore(MailStore):
+    """
+    メモリ上の疑似メールボックス
+
+    Outlookのない環境での動作確認や計測に使う。ストアへの呼び出し回数を
+    round_trips に記録し、latency を指定すると1回の呼び出しごとに待機する。
+    """
+
+    def __init__(self, messages, latency=0.0):
+        """
+        初期化
+
+        Args:
+            messages (list): メールの辞書のリスト（EMAIL_COLUMNS のキーと
+                "body", "attachments", "unread" を持つ。添付ファイルの "content" に
+                バイト列を指定すると、保存先を指定した get_details でファイルに書き出す）
+            latency (float): 1回の呼び出しごとの待ち時間（秒）
+        """
+        self.messages = list(messages)
+        self.latency = latency
+        self.round_trips = 0
+        self._by_id = {m["entry_id"]: m for m in self.messages}
+
+    def _round_trip(self):
+        """呼び出し1回分を記録"""
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_unread_count(self):
+        """未読メール数を取得"""
+        self._round_trip()
+        return sum(1 for m in self.messages if m.get("unread", True))
+
+    def is_content_indexed(self):
+        """内容のインデックスを使った検索ができるか（疑似メールボックスは常に全文を検索できる）"""
+        return True
+
+    def iter_unread_rows(self, max_items, batch_size=DEFAULT_BATCH_SIZE, query=None):
+        """未読メールのヘッダを受信日時の降順で取得"""
+        unread = [m for m in self.messages if m.get("unread", True)]
+        if query is not None:
+            matches = compile_filter(dasl_query.to_filter(query))
+            unread = [m for m in unread if matches(FakeMailItem(m, None))]
+        unread.sort(key=lambda m: m["received_time"], reverse=True)
+        unread = unread[:max_items]
+
+        for start in range(0, len(unread), batch_size):
+            self._round_trip()
+            for message in unread[start:start + batch_size]:
+                yield {key: message[key] for _, key in EMAIL_COLUMNS}
+
+    def get_details(self, entry_id, include_attachments=False, save_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        """メール本文と添付ファイル情報を取得"""
+        self._round_trip()
+        message = self._by_id[entry_id]
+        attachments = []
+        for attachment in message.get("attachments", []) if include_attachments else []:
+            info = {"filename": attachment["filename"], "size": attachment["size"]}
+            content = attachment.get("content")
+            if save_dir is not None and content is not None and is_extractable(info["filename"], info["size"], max_bytes):
+                info["path"] = new_attachment_path(save_dir, info["filename"])
+                with open(info["path"], "wb") as f:
+                    f.write(content)
+            attachments.append(info)
+        return {
+            "body": message.get("body", "").strip(),
+            "attachments": attachments,
+        }
+
+
+def generate_fake_messages(count, seed=0, now=None):
+    """
+    疑似メールボックス用のメールを生成
+
+    Args:
+        count (int): 生成する件数
+        seed (int): 乱数シード
+        now (datetime): 最新メールの受信日時（省略時は現在時刻）
+
+    Returns:
+        list: FakeMailStore に渡せるメールの辞書のリスト
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    domains = ["example.com", "important-client.com", "partner.co.jp", "news.example.org"]
+    subjects = ["定例会議の件", "至急: 見積もりのご確認", "週次レポート", "重要: 契約更新について", "ご案内"]
+
+    messages = []
+    for i in range(count):
+        domain = rng.choice(domains)
+        has_attachments = rng.random() < 0.2
+        thread = rng.randint(0, max(1, count // 3))
+        topic = f"{subjects[thread % len(subjects)]} #{thread}"
+        messages.append({
+            "entry_id": f"FAKE{i:08d}",
+            "subject": ("RE: " if rng.random() < 0.5 else "") + topic,
+            "conversation_topic": topic,
+            "conversation_index": f"{thread:044X}{i:010X}",
+            "sender": f"送信者{i % 50}",
+            "sender_email": f"user{i % 50}@{domain}",
+            "received_time": now - timedelta(minutes=i * 7),
+            "last_modified": now - timedelta(minutes=i * 7),
+            "has_attachments": has_attachments,
+            "body": f"お疲れ様です。案件{i}についてご連絡します。\n" * rng.randint(1, 20),
+            "attachments": [{"filename": f"資料{i}.pdf", "size": rng.randint(1000, 500000)}] if has_attachments else [],
+            "unread": rng.random() < 0.7,
+        })
+    return messages
+
+
+def generate_fake_events(days, recurring, single_per_day=3, seed=0, start=None):
+    """
+    合成カレンダーを生成
+
+    Args:
+        days (int): 期間の日数
+        recurring (int): 毎週の定期的な予定の数（各回に展開して生成する）
+        single_per_day (int): 1日あたりの単発の予定の数
+        seed (int): 乱数シード
+        start (datetime): 期間の開始日時
+
+    Returns:
+        list: EventRecord のリスト
+    """
+    rng = random.Random(seed)
+    start = (start or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    events = []
+
+    def add(subject, begin, minutes):
+        events.append(EventRecord(
+            id=len(events) + 1,
+            subject=subject,
+            start=begin,
+            end=begin + timedelta(minutes=minutes),
+        ))
+
+    for r in range(recurring):
+        weekday = rng.randint(0, 4)
+        begin = start + timedelta(days=(weekday - start.weekday()) % 7, hours=rng.randint(8, 18), minutes=rng.choice((0, 30)))
+        minutes = rng.choice((30, 60, 90))
+        while begin < start + timedelta(days=days):
+            add(f"定例 {r}", begin, minutes)
+            begin += timedelta(days=7)
+
+    for day in range(days):
+        for n in range(single_per_day):
+            begin = start + timedelta(days=day, hours=rng.randint(8, 18), minutes=rng.choice((0, 15, 30, 45)))
+            add(f"打ち合わせ {day}-{n}", begin, rng.choice((30, 60)))
+
+    rng.shuffle(events)
+    return events
+
+
+def generate_fake_mailbox(count, days=7, recurring=20, seed=0, latency=0.0, now=None, store_id="FAKESTORE",
+                          shared=None, com_lock=None):
+    """
+    疑似メールボックスを生成
+
+    Args:
+        count (int): メールの件数（100～100,000件程度を想定）
+        days (int): 予定を生成する日数
+        recurring (int): 毎週の定期的な予定の数
+        seed (int): 乱数シード
+        latency (float): COM呼び出し1回ごとの待ち時間（秒）
+        now (datetime): 基準の日時（省略時は現在時刻）
+        store_id (str): このメールボックスのStoreID
+        shared (dict): 共有・代理アクセスできるメールボックス（アドレス → FakeNamespace）
+        com_lock (threading.Lock): 複数のメールボックスで共有する、COM呼び出しを順番に処理するためのロック
+
+    Returns:
+        FakeNamespace: 疑似MAPI名前空間
+    """
+    now = now or datetime.now()
+    events = generate_fake_events(days, recurring, seed=seed, start=now)
+    for number, event in enumerate(events, 1):
+        event.entry_id = f"FAKEEVENT{number:08d}"
+    return FakeNamespace(generate_fake_messages(count, seed=seed, now=now), events, latency, store_id, shared, com_lock)
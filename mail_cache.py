@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+メールボックスキャッシュモジュール
+
+取得済みのメールと予定をSQLiteに保存し、次回以降の実行で再利用する。
+メールはEntryID、予定はEntryIDと開始日時をキーとし、LastModificationTimeが
+変わっていない項目はOutlookから取り直さない。メールごとの要約もEntryIDと
+内容のハッシュを、添付ファイルから抽出したテキストは内容のハッシュをキーとして
+保存する。受信日時の最大値（ハイウォーターマーク）も保存し、前回実行以降の
+新着メールを判定できるようにする。cached_at は保存時と読み出し時に更新し、
+prune() は最後に使われてから一定期間が過ぎた項目だけを削除する。
+"""
+
+import json
+import sqlite3
+import time
+
+from records import EmailRecord, EventRecord, to_datetime
+
+DEFAULT_CACHE_PATH = "outlook_cache.sqlite3"
+
+# キャッシュから削除するまでの既定の日数
+DEFAULT_MAX_AGE_DAYS = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS emails (
+    entry_id TEXT PRIMARY KEY,
+    last_modified TEXT NOT NULL,
+    received_time TEXT NOT NULL,
+    data TEXT NOT NULL,
+    cached_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    entry_id TEXT NOT NULL,
+    start TEXT NOT NULL,
+    last_modified TEXT NOT NULL,
+    data TEXT NOT NULL,
+    cached_at REAL NOT NULL,
+    PRIMARY KEY (entry_id, start)
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    entry_id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    cached_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attachment_texts (
+    content_hash TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    cached_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# キャッシュに保存しないキー（実行ごとに変わる連番）
+_VOLATILE_KEYS = ("id",)
+# 添付ファイルの保存先は終了時に削除する一時フォルダのため保存しない
+_VOLATILE_ATTACHMENT_KEYS = ("path",)
+
+
+def _dump(record):
+    """レコードをJSON文字列に変換"""
+    data = {k: v for k, v in record.to_dict().items() if k not in _VOLATILE_KEYS}
+    if data.get("attachments"):
+        data["attachments"] = [{k: v for k, v in attachment.items() if k not in _VOLATILE_ATTACHMENT_KEYS}
+                               for attachment in data["attachments"]]
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _key(value):
+    """日時をキー用の文字列に変換"""
+    return value.isoformat() if value is not None else ""
+
+
+class MailCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, check_same_thread=True):
+        """
+        初期化
+
+        Args:
+            path (str): SQLiteファイルのパス（":memory:" も可）
+            check_same_thread (bool): 作成したスレッド以外からの使用を禁止するか
+                （一括モードでは取得とレポート作成を別スレッドで順に行うため False にする）
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=check_same_thread)
+        self.conn.executescript(_SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def commit(self):
+        """変更を確定（常駐時に定期的に呼び出す）"""
+        self.conn.commit()
+
+    def close(self):
+        """変更を確定して接続を閉じる"""
+        self.conn.commit()
+        self.conn.close()
+
+    def get_email(self, entry_id, last_modified):
+        """
+        キャッシュ済みのメールを取得
+
+        Args:
+            entry_id (str): メールのEntryID
+            last_modified (datetime): OutlookのLastModificationTime
+
+        Returns:
+            EmailRecord: 更新日時が一致する場合はメール情報、それ以外はNone
+        """
+        row = self.conn.execute(
+            "SELECT rowid, data FROM emails WHERE entry_id = ? AND last_modified = ?",
+            (entry_id, _key(last_modified))
+        ).fetchone()
+        return self._count(row, EmailRecord, "emails")
+
+    def put_email(self, email_data):
+        """メール情報を保存"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO emails VALUES (?, ?, ?, ?, ?)",
+            (email_data.entry_id, _key(email_data.last_modified),
+             _key(email_data.received_time), _dump(email_data), time.time())
+        )
+
+    def get_event(self, entry_id, start, last_modified):
+        """
+        キャッシュ済みの予定を取得
+
+        定期的な予定の各回はEntryIDを共有するため、開始日時もキーに含める。
+
+        Returns:
+            EventRecord: 更新日時が一致する場合は予定情報、それ以外はNone
+        """
+        row = self.conn.execute(
+            "SELECT rowid, data FROM events WHERE entry_id = ? AND start = ? AND last_modified = ?",
+            (entry_id, _key(start), _key(last_modified))
+        ).fetchone()
+        return self._count(row, EventRecord, "events")
+
+    def put_event(self, event_data):
+        """予定情報を保存"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?)",
+            (event_data.entry_id, _key(event_data.start), _key(event_data.last_modified),
+             _dump(event_data), time.time())
+        )
+
+    def get_summary(self, entry_id, content_hash):
+        """
+        メールの要約を取得
+
+        Args:
+            entry_id (str): メールのEntryID
+            content_hash (str): 要約したときのメール内容のハッシュ
+
+        Returns:
+            str: 内容が変わっていなければ要約、それ以外はNone
+        """
+        row = self.conn.execute(
+            "SELECT rowid, summary FROM summaries WHERE entry_id = ? AND content_hash = ?",
+            (entry_id, content_hash)
+        ).fetchone()
+        if row is None:
+            return None
+        self._touch("summaries", row[0])
+        return row[1]
+
+    def put_summary(self, entry_id, content_hash, summary):
+        """メールの要約を保存"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)",
+            (entry_id, content_hash, summary, time.time())
+        )
+
+    def get_attachment_text(self, content_hash):
+        """
+        添付ファイルから抽出したテキストを取得
+
+        Args:
+            content_hash (str): 添付ファイルの内容のハッシュ
+
+        Returns:
+            str: 抽出済みのテキスト（未抽出の場合はNone）
+        """
+        row = self.conn.execute(
+            "SELECT rowid, text FROM attachment_texts WHERE content_hash = ?", (content_hash,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._touch("attachment_texts", row[0])
+        return row[1]
+
+    def put_attachment_text(self, content_hash, text):
+        """添付ファイルから抽出したテキストを保存"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO attachment_texts VALUES (?, ?, ?)",
+            (content_hash, text, time.time())
+        )
+
+    def _touch(self, table, rowid):
+        """読み出した項目の cached_at を更新（毎回使われる項目を prune() で削除しないため）"""
+        self.conn.execute(f"UPDATE {table} SET cached_at = ? WHERE rowid = ?", (time.time(), rowid))
+
+    def _count(self, row, record_class, table):
+        """ヒット/ミスを記録してレコードを返す"""
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(table, row[0])
+        return record_class.from_dict(json.loads(row[1]))
+
+    def get_high_water_mark(self, key="emails"):
+        """
+        前回実行時に記録した受信日時の最大値を取得
+
+        Returns:
+            datetime: 記録済みの値（未記録の場合はNone）
+        """
+        row = self.conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return to_datetime(row[0]) if row else None
+
+    def set_high_water_mark(self, value, key="emails"):
+        """受信日時の最大値を記録"""
+        self.conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (key, _key(value)))
+
+    def prune(self, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        """
+        一定期間使われていない（保存も読み出しもされていない）キャッシュを削除
+
+        Returns:
+            int: 削除した件数
+        """
+        threshold = time.time() - max_age_days * 86400
+        removed = 0
+        for table in ("emails", "events", "summaries", "attachment_texts"):
+            cursor = self.conn.execute(f"DELETE FROM {table} WHERE cached_at < ?", (threshold,))
+            removed += cursor.rowcount
+        self.conn.commit()
+        return removed
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+メールストアモジュール
+
+Outlookのフォルダから未読メールのヘッダ情報を列単位でまとめて取得する。
+Outlookの Table API（Folder.GetTable）を使い、必要な列だけを行バッチで読み込むことで
+メール1件ごとのCOM呼び出しを避ける。本文や添付ファイル情報は、実際に使うメールに
+対してだけ後から取得する。
+
+Outlookがない環境での動作確認や計測には、同じインターフェースを持つ
+メモリ上の疑似メールボックス（fake_outlook.FakeMailStore）を使う。
+"""
+
+import abc
+import os
+import tempfile
+
+from attachments import is_extractable, DEFAULT_MAX_BYTES
+from dasl_query import all_of, to_filter, unread_condition
+
+# 既定のフォルダ番号
+OL_FOLDER_INBOX = 6
+
+# Folder.GetTable の TableContents 引数（olUserItems）
+OL_USER_ITEMS = 0
+
+# 添付ファイル有無のDASLプロパティ（Tableの列として追加できる）
+HAS_ATTACHMENT_PROPERTY = "urn:schemas:httpmail:hasattachment"
+
+# Tableに設定する列と、取得結果の辞書キーの対応
+EMAIL_COLUMNS = (
+    ("EntryID", "entry_id"),
+    ("Subject", "subject"),
+    ("SenderName", "sender"),
+    ("SenderEmailAddress", "sender_email"),
+    ("ReceivedTime", "received_time"),
+    ("LastModificationTime", "last_modified"),
+    ("ConversationTopic", "conversation_topic"),
+    ("ConversationIndex", "conversation_index"),
+    (HAS_ATTACHMENT_PROPERTY, "has_attachments"),
+)
+
+# 1回のGetArrayで読み込む行数
+DEFAULT_BATCH_SIZE = 100
+
+
+class MailStore(abc.ABC):
+    """
+    メールストアの基底クラス
+
+    ヘッダの一括取得（iter_unread_rows）と、個別メールの詳細取得（get_details）を
+    分けて提供する。
+    """
+
+    @abc.abstractmethod
+    def get_unread_count(self):
+        """
+        未読メール数を取得
+
+        Returns:
+            int: 未読メール数
+        """
+
+    def is_content_indexed(self):
+        """
+        内容のインデックスを使った検索（ci_phrasematch）ができるか
+
+        Returns:
+            bool: できる場合はTrue
+        """
+        return False
+
+    @abc.abstractmethod
+    def iter_unread_rows(self, max_items, batch_size=DEFAULT_BATCH_SIZE, query=None):
+        """
+        未読メールのヘッダを受信日時の降順で取得
+
+        Args:
+            max_items (int): 取得する最大件数
+            batch_size (int): 1回の読み込みで取得する行数
+            query (str): 未読であることに加えてストア側で絞り込むDASLの条件（dasl_query で作成）
+
+        Yields:
+            dict: EMAIL_COLUMNS のキーを持つヘッダ情報
+        """
+
+    @abc.abstractmethod
+    def get_details(self, entry_id, include_attachments=False, save_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        メール本文と添付ファイル情報を取得
+
+        Args:
+            entry_id (str): メールのEntryID
+            include_attachments (bool): 添付ファイル情報も取得するか
+            save_dir (str): 指定した場合、テキストを抽出できる添付ファイルをこのフォルダに保存する
+            max_bytes (int): 保存する添付ファイルのサイズの上限
+
+        Returns:
+            dict: "body" と "attachments"（filename, size と、保存した場合は path）を持つ辞書
+        """
+
+
+def new_attachment_path(save_dir, filename):
+    """
+    添付ファイルの保存先（同名のファイルと衝突しないパス）を作成
+
+    Args:
+        save_dir (str): 保存先のフォルダ
+        filename (str): 添付ファイル名（拡張子だけを使う）
+
+    Returns:
+        str: 作成した空のファイルのパス
+    """
+    fd, path = tempfile.mkstemp(dir=save_dir, suffix=os.path.splitext(filename)[1].lower())
+    os.close(fd)
+    return path
+
+
+class OutlookMailStore(MailStore):
+    """Outlook（MAPI）のフォルダを対象とするメールストア"""
+
+    def __init__(self, namespace, folder_id=OL_FOLDER_INBOX):
+        """
+        初期化
+
+        Args:
+            namespace: MAPI名前空間オブジェクト
+            folder_id (int): 対象フォルダの番号（既定は受信トレイ）
+        """
+        self.namespace = namespace
+        self.folder_id = folder_id
+        self._folder = None
+
+    @property
+    def folder(self):
+        """対象フォルダ（初回アクセス時に取得）"""
+        if self._folder is None:
+            self._folder = self.namespace.GetDefaultFolder(self.folder_id)
+        return self._folder
+
+    def get_unread_count(self):
+        """未読メール数を取得"""
+        return self.folder.UnReadItemCount
+
+    def is_content_indexed(self):
+        """ストアの Instant Search（内容のインデックス）が有効か"""
+        try:
+            return bool(self.folder.Store.IsInstantSearchEnabled)
+        except Exception:
+            return False
+
+    def iter_unread_rows(self, max_items, batch_size=DEFAULT_BATCH_SIZE, query=None):
+        """未読メールのヘッダを受信日時の降順で取得"""
+        table = self.folder.GetTable(to_filter(all_of(unread_condition(), query)), OL_USER_ITEMS)
+        table.Columns.RemoveAll()
+        for column, _ in EMAIL_COLUMNS:
+            table.Columns.Add(column)
+        table.Sort("[ReceivedTime]", True)
+
+        remaining = max_items
+        while remaining > 0 and not table.EndOfTable:
+            rows = table.GetArray(min(batch_size, remaining))
+            if not rows:
+                break
+            for values in rows:
+                yield {key: value for (_, key), value in zip(EMAIL_COLUMNS, values)}
+            remaining -= len(rows)
+
+    def get_details(self, entry_id, include_attachments=False, save_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        """メール本文と添付ファイル情報を取得"""
+        item = self.namespace.GetItemFromID(entry_id)
+        details = {"body": (item.Body or "").strip(), "attachments": []}
+
+        if include_attachments:
+            attachments = item.Attachments
+            for j in range(1, attachments.Count + 1):
+                attachment = attachments.Item(j)
+                info = {
+                    "filename": attachment.FileName,
+                    "size": attachment.Size
+                }
+                if save_dir is not None and is_extractable(info["filename"], info["size"], max_bytes):
+                    info["path"] = new_attachment_path(save_dir, info["filename"])
+                    attachment.SaveAsFile(info["path"])
+                details["attachments"].append(info)
+        return details
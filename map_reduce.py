@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+メール要約のmap-reduceモジュール
+
+大量の未読メールを一定件数ごとのチャンクに分け、スレッドプールで並列に要約する（map）。
+非同期クライアント（async_claude_client.py）を使う場合は、1つのイベントループから
+接続を再利用しながら並行して要約する。要約結果は ClaudeClient.create_prompt の
+email_summaries に渡し、最終レポートの作成（reduce）に使う。
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from async_claude_client import AsyncClaudeClient
+
+from attachments import format_attachments
+from records import format_datetime
+from threads import format_thread_deltas
+
+DEFAULT_CHUNK_SIZE = 20
+DEFAULT_CONCURRENCY = 4
+
+# map段階で1件あたりに含める本文の最大文字数
+MAP_BODY_CHARS = 2000
+MAP_MAX_TOKENS = 1500
+MAP_SYSTEM_PROMPT = "あなたは優秀な秘書です。渡されたメールを1件ずつ正確かつ簡潔に要約してください。"
+
+
+def chunk_emails(emails_data, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    メールをチャンクに分割
+
+    Args:
+        emails_data (list): 未読メールのリスト
+        chunk_size (int): 1チャンクあたりの件数
+
+    Returns:
+        list: (開始番号, メールのリスト) のリスト（番号は1始まり）
+    """
+    return [(start + 1, emails_data[start:start + chunk_size])
+            for start in range(0, len(emails_data), chunk_size)]
+
+
+def create_map_prompt(first_number, chunk, settings):
+    """
+    チャンク要約用のプロンプトを作成
+
+    Args:
+        first_number (int): チャンク先頭のメール番号
+        chunk (list): メールのリスト
+        settings (dict): カスタム設定
+
+    Returns:
+        str: 要約用プロンプト
+    """
+    parts = [f"""以下のメール{len(chunk)}件を要約してください。
+- 優先ドメイン: {', '.join(settings['priority_domains'])}
+- 優先キーワード: {', '.join(settings['priority_keywords'])}
+
+各メールについて次の形式で1項目ずつ出力してください。
+- メール番号 / 件名 / 送信者
+  - 分類: 緊急対応・今日中に対応・週内対応・情報のみ のいずれか
+  - 要約: 1～2文
+  - 推奨アクション: あれば1文
+"""]
+    for number, email in enumerate(chunk, first_number):
+        body = email.body
+        parts.append(f"""
+## メール {number}: {email.subject}
+- 送信者: {email.sender} ({email.sender_email})
+- 受信日時: {format_datetime(email.received_time)}
+- 添付ファイル: {format_attachments(email)}{format_thread_deltas(email)}
+
+{body[:MAP_BODY_CHARS]}{"..." if len(body) > MAP_BODY_CHARS else ""}
+""")
+    return "".join(parts)
+
+
+class MapReduceSummarizer:
+    def __init__(self, claude, chunk_size=DEFAULT_CHUNK_SIZE, concurrency=DEFAULT_CONCURRENCY, async_api=False):
+        """
+        初期化
+
+        Args:
+            claude (ClaudeClient): API呼び出しに使うクライアント
+            chunk_size (int): 1回の要約に含めるメール件数
+            concurrency (int): 同時に実行するAPI呼び出しの数
+            async_api (bool): 非同期クライアント（aiohttp）で呼び出すか
+        """
+        self.claude = claude
+        self.chunk_size = max(1, chunk_size)
+        self.concurrency = max(1, concurrency)
+        self.async_api = async_api
+
+    def summarize(self, emails_data, settings):
+        """
+        メールをチャンクごとに並列要約
+
+        Args:
+            emails_data (list): 未読メールのリスト
+            settings (dict): カスタム設定
+
+        Returns:
+            str: メール番号順に並べたチャンクごとの要約
+        """
+        chunks = chunk_emails(emails_data, self.chunk_size)
+        print(f"  {len(emails_data)}件のメールを{len(chunks)}個のチャンクに分けて要約します（同時実行数: {self.concurrency}）")
+
+        prompts = [create_map_prompt(first_number, chunk, settings) for first_number, chunk in chunks]
+        results = self.map_prompts(prompts, MAP_SYSTEM_PROMPT, MAP_MAX_TOKENS)
+        return "\n\n".join(self._format_summary(chunk_entry, result)
+                            for chunk_entry, result in zip(chunks, results))
+
+    def map_prompts(self, prompts, system=MAP_SYSTEM_PROMPT, max_tokens=MAP_MAX_TOKENS):
+        """
+        複数のプロンプトを並列に送信
+
+        同時に投入する要求は concurrency の2倍までに抑え、残りは完了に応じて
+        順次投入する。レート制限時の待機と再試行は ClaudeClient.send_message が行う。
+
+        Args:
+            prompts (list): プロンプトのリスト
+            system (str): システムプロンプト
+            max_tokens (int): 1回あたりの最大出力トークン数
+
+        Returns:
+            list: プロンプトと同じ順序の応答テキスト（失敗した要素は例外オブジェクト）
+        """
+        if self.async_api:
+            return asyncio.run(self._map_prompts_async(prompts, system, max_tokens))
+        results = [None] * len(prompts)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            queue = iter(enumerate(prompts))
+            pending = {}
+
+            def submit_next():
+                for index, prompt in queue:
+                    future = pool.submit(self.claude.send_message, prompt,
+                                         system=system, max_tokens=max_tokens)
+                    pending[future] = index
+                    return
+
+            for _ in range(self.concurrency * 2):
+                submit_next()
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    try:
+                        results[index] = future.result()
+                    except Exception as e:
+                        results[index] = e
+                    submit_next()
+
+        return results
+
+    async def _map_prompts_async(self, prompts, system, max_tokens):
+        """非同期クライアントで複数のプロンプトを並行して送信"""
+        async with AsyncClaudeClient(self.claude, self.concurrency) as client:
+            return await client.map_prompts(prompts, system, max_tokens)
+
+    def _format_summary(self, chunk_entry, result):
+        """チャンクの要約結果を見出し付きの文字列にする"""
+        first_number, chunk = chunk_entry
+        last_number = first_number + len(chunk) - 1
+        heading = f"## メール {first_number}～{last_number} の要約"
+        if isinstance(result, Exception):
+            print(f"  メール {first_number}～{last_number} の要約中にエラー: {result}")
+            text = "（要約に失敗しました。件名のみ記載します）\n" + "\n".join(
+                f"- メール {n}: {email.subject}" for n, email in enumerate(chunk, first_number))
+        else:
+            print(f"  メール {first_number}～{last_number} の要約が完了しました")
+            text = result
+        return f"{heading}\n{text}"
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Message Batches APIモジュール
+
+夜間の一括処理など、すぐに結果が必要ない場合に、全員分のプロンプトを
+Message Batches API（POST /v1/messages/batches）にまとめて送信する。
+処理状況は間隔を広げながら確認し、終了したら結果を利用者ごとのレポートファイルに
+保存する。通常のAPI呼び出しより料金が安く、レート制限も別枠になる。
+
+送信したバッチのIDと各リクエストの状態はジャーナル（JSONファイル）に記録する。
+途中で中断しても、次回の実行でジャーナルから同じバッチの確認と保存を再開するため、
+同じプロンプトを二重に送信しない。
+"""
+
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+import requests
+
+from claude_client import LineDeduplicator, RETRYABLE_EXCEPTIONS, RETRYABLE_STATUS_CODES, MAX_RETRIES, retry_delay
+from prompt_templates import Prompt
+from telemetry import Telemetry
+
+DEFAULT_JOURNAL_PATH = "batch_journal.json"
+
+# 処理状況を確認する間隔（秒）。確認のたびに POLL_BACKOFF 倍にし、POLL_MAX_INTERVAL で頭打ちにする
+POLL_INITIAL_INTERVAL = 10
+POLL_BACKOFF = 1.5
+POLL_MAX_INTERVAL = 300
+
+# リクエストの状態
+PENDING = "pending"      # 送信前
+SUBMITTED = "submitted"  # 送信済み・結果待ち
+SAVED = "saved"          # レポートを保存済み
+FAILED = "failed"        # エラー・取り消し・期限切れ
+
+_CUSTOM_ID_INVALID = re.compile(r"[^A-Za-z0-9_-]")
+
+
+def make_custom_id(index, name):
+    """
+    Message Batches APIの custom_id を作成（英数字・_・- の64文字以内）
+
+    Args:
+        index (int): 一覧での順番
+        name (str): メールボックスの名前
+
+    Returns:
+        str: custom_id
+    """
+    return f"{index:04d}-{_CUSTOM_ID_INVALID.sub('_', name)}"[:64]
+
+
+class BatchJournal:
+    """
+    送信したバッチの記録
+
+    状態を変えるたびに一時ファイルへ書き込んでから置き換えるため、
+    書き込み中に中断しても壊れたジャーナルは残らない。
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        """
+        初期化
+
+        Args:
+            path (str): ジャーナルのパス
+        """
+        self.path = path
+        self.state = None
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    @property
+    def active(self):
+        """完了していないバッチがあるか"""
+        return self.state is not None and not self.state.get("completed")
+
+    @property
+    def batch_id(self):
+        return self.state.get("batch_id") if self.state else None
+
+    @property
+    def requests(self):
+        """custom_id からリクエストの記録（name, report_file, status など）への辞書"""
+        return self.state["requests"] if self.state else {}
+
+    def start(self, entries):
+        """
+        新しいバッチの記録を開始
+
+        Args:
+            entries (list): (custom_id, メールボックス名, プロンプト, レポートのファイル名) のリスト
+        """
+        self.state = {
+            "batch_id": None,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "completed": False,
+            "requests": {
+                # 再開時の作業フォルダが異なっても同じファイルに保存できるよう、絶対パスで記録する
+                custom_id: {"name": name, "prompt": prompt.to_dict(), "status": PENDING,
+                            "report_file": os.path.abspath(report_file) if report_file else None}
+                for custom_id, name, prompt, report_file in entries
+            },
+        }
+        self.save()
+
+    def set_batch_id(self, batch_id):
+        """送信したバッチのIDを記録（プロンプトはサーバー側にあるため記録から削除する）"""
+        self.state["batch_id"] = batch_id
+        for entry in self.requests.values():
+            entry.pop("prompt", None)
+            entry["status"] = SUBMITTED
+        self.save()
+
+    def mark(self, custom_id, status, report_path=None, error=None):
+        """リクエストの状態を更新（保存は save で行う）"""
+        entry = self.requests[custom_id]
+        entry["status"] = status
+        if report_path is not None:
+            entry["report_path"] = report_path
+        if error is not None:
+            entry["error"] = error
+
+    def complete(self):
+        """バッチの完了を記録"""
+        self.state["completed"] = True
+        self.save()
+
+    def save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+
+class MessageBatchRunner:
+    def __init__(self, claude, journal, telemetry=None, sleep=time.sleep,
+                 poll_interval=POLL_INITIAL_INTERVAL, poll_max_interval=POLL_MAX_INTERVAL, archive=None):
+        """
+        初期化
+
+        Args:
+            claude (ClaudeClient): 認証情報・APIのURL・モデルなどを共有するClaudeクライアント
+            journal (BatchJournal): バッチの記録
+            telemetry (Telemetry): トークン数などの集計先
+            sleep (callable): 待機する関数
+            poll_interval (float): 最初に処理状況を確認するまでの間隔（秒）
+            poll_max_interval (float): 処理状況を確認する間隔の上限（秒）
+            archive (ReportArchive): 保存したレポートを登録するアーカイブ
+        """
+        self.claude = claude
+        self.journal = journal
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        self.sleep = sleep
+        self.poll_interval = poll_interval
+        self.poll_max_interval = poll_max_interval
+        self.archive = archive
+        self.batches_url = claude.api_url.rstrip("/") + "/batches"
+
+    def _request(self, method, url, **kwargs):
+        """一時的なエラー（接続できない・タイムアウトを含む）を再試行しながらリクエストを送る"""
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = requests.request(method, url, headers=self.claude.headers(), timeout=self.claude.timeout,
+                                            **kwargs)
+            except RETRYABLE_EXCEPTIONS:
+                if attempt >= MAX_RETRIES:
+                    raise
+                self.telemetry.count("api_retries")
+                self.sleep(retry_delay(None, attempt))
+                continue
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < MAX_RETRIES:
+                self.telemetry.count("api_retries")
+                self.sleep(retry_delay(response.headers.get("retry-after"), attempt))
+                continue
+            response.raise_for_status()
+            return response
+
+    def submit(self, prompts):
+        """
+        プロンプトをまとめてバッチとして送信
+
+        Args:
+            prompts (list): (メールボックス名, プロンプト, レポートのファイル名) のリスト
+
+        Returns:
+            str: バッチのID（送信するプロンプトがない場合はNone）
+        """
+        entries = [(make_custom_id(i, name), name, prompt, report_file)
+                   for i, (name, prompt, report_file) in enumerate(prompts, 1) if prompt is not None]
+        if not entries:
+            print("  送信するプロンプトがありません。")
+            return None
+        # 送信前に記録しておき、送信中に中断した場合も次回に同じプロンプトで送り直せるようにする
+        self.journal.start(entries)
+        return self._submit_pending()
+
+    def _submit_pending(self):
+        """ジャーナルに記録した送信前のリクエストを送信"""
+        requests_data = [self.claude.batch_request(custom_id, Prompt.from_dict(entry["prompt"]))
+                         for custom_id, entry in self.journal.requests.items()]
+        print(f"  {len(requests_data)}件のリクエストをバッチとして送信しています...")
+        with self.telemetry.span("batch_submit", requests=len(requests_data)):
+            batch = self._request("POST", self.batches_url, json={"requests": requests_data}).json()
+        self.telemetry.count("api_requests")
+        self.telemetry.count("batch_requests", len(requests_data))
+        self.journal.set_batch_id(batch["id"])
+        print(f"  バッチを送信しました: {batch['id']}")
+        return batch["id"]
+
+    def wait(self):
+        """
+        バッチの処理が終わるまで、間隔を広げながら処理状況を確認する
+
+        Returns:
+            dict: 終了したバッチの情報（results_url を含む）
+        """
+        batch_id = self.journal.batch_id
+        interval = self.poll_interval
+        with self.telemetry.span("batch_wait", batch_id=batch_id):
+            while True:
+                batch = self._request("GET", f"{self.batches_url}/{batch_id}").json()
+                counts = batch.get("request_counts", {})
+                if batch.get("processing_status") == "ended":
+                    print(f"  バッチの処理が終わりました: 成功 {counts.get('succeeded', 0)}件, "
+                          f"エラー {counts.get('errored', 0)}件, 期限切れ {counts.get('expired', 0)}件")
+                    return batch
+                print(f"  処理中 {counts.get('processing', 0)}件 - {interval:.0f}秒後に再確認します...")
+                self.sleep(interval)
+                interval = min(interval * POLL_BACKOFF, self.poll_max_interval)
+
+    def save_results(self, batch):
+        """
+        バッチの結果を利用者ごとのレポートファイルに保存
+
+        保存済みのリクエストは飛ばすため、保存の途中で中断しても再実行できる。
+
+        Args:
+            batch (dict): 終了したバッチの情報
+
+        Returns:
+            dict: ジャーナルのリクエストの記録（custom_id → 状態）
+        """
+        entries = self.journal.requests
+        with self.telemetry.span("batch_results"), \
+                self._request("GET", batch["results_url"], stream=True) as response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                item = json.loads(line)
+                entry = entries.get(item.get("custom_id"))
+                if entry is None or entry["status"] == SAVED:
+                    continue
+                self._save_result(item["custom_id"], entry, item.get("result", {}))
+                self.journal.save()
+        for custom_id, entry in entries.items():
+            if entry["status"] == SUBMITTED:
+                self.journal.mark(custom_id, FAILED, error="結果に含まれていませんでした")
+        self.journal.complete()
+        return entries
+
+    def _save_result(self, custom_id, entry, result):
+        """1件分の結果を保存し、ジャーナルの状態を更新"""
+        if result.get("type") != "succeeded":
+            error = result.get("error") or {}
+            error = error.get("error", {}).get("message") or error.get("message") or result.get("type", "unknown")
+            print(f"  [{entry['name']}] レポートを作成できませんでした: {error}")
+            self.journal.mark(custom_id, FAILED, error=error)
+            return
+        message = result["message"]
+        self.telemetry.add_usage(message.get("usage"))
+        text = "".join(block.get("text", "") for block in message.get("content", []) if block.get("type") == "text")
+        dedup = LineDeduplicator()
+        text = dedup.feed(text) + dedup.flush()
+        report_path = self.claude.save_response(text, entry.get("report_file"))
+        print(f"  [{entry['name']}] 秘書レポートを保存しました: {report_path}")
+        if self.archive is not None:
+            self.archive.add(text, report_path, entry["name"], self.telemetry.run_id, usage=message.get("usage"))
+        self.journal.mark(custom_id, SAVED, report_path=report_path)
+
+    def run(self, prompts=None):
+        """
+        送信から保存までを行う（ジャーナルに未完了のバッチがあれば、その続きから再開する）
+
+        Args:
+            prompts (list): 新しく送信する (メールボックス名, プロンプト, レポートのファイル名) のリスト
+
+        Returns:
+            dict: ジャーナルのリクエストの記録（custom_id → 状態）
+        """
+        if self.journal.active:
+            if self.journal.batch_id is None:
+                print("  送信前に中断したバッチを送り直します...")
+                self._submit_pending()
+            else:
+                print(f"  中断したバッチ {self.journal.batch_id} の続きから再開します...")
+        elif self.submit(prompts or []) is None:
+            return {}
+        return self.save_results(self.wait())
+
+
+def format_journal(entries):
+    """
+    表示用の結果一覧
+
+    Args:
+        entries (dict): ジャーナルのリクエストの記録
+
+    Returns:
+        str: 結果の一覧
+    """
+    lines = [f"バッチの結果（{len(entries)}件）:"]
+    for entry in entries.values():
+        if entry["status"] == SAVED:
+            lines.append(f"  {entry['name']}: {entry['report_path']}")
+        else:
+            lines.append(f"  {entry['name']}: 失敗 - {entry.get('error', entry['status'])}")
+    return "\n".join(lines)
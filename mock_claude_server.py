@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Claude APIのモックサーバー
+
+Messages API（POST /v1/messages）と同じ形式の応答を返すローカルHTTPサーバー。
+応答までの待ち時間と、ストリーミング時の断片ごとの待ち時間を設定できる。
+Message Batches API（POST /v1/messages/batches、GET /v1/messages/batches/{id}、
+GET /v1/messages/batches/{id}/results）にも対応し、バッチは batch_delay 秒後に終了する。
+cache_control を付けたシステムプロンプトはプロンプトキャッシュとして扱い、初回は
+cache_creation_input_tokens、同じ内容の2回目以降は cache_read_input_tokens を返す。
+実際のAPIと同じく、キャッシュの対象が min_cache_tokens（既定は1024トークン）に満たない場合は
+キャッシュせず、どちらも0にする。
+stream_cutoff を指定すると、ストリーミングの途中で message_stop を送らずに接続を切る。
+ネットワークやAPI Keyなしで ClaudeClient の計測・動作確認を行うために使う。
+
+使用方法:
+python mock_claude_server.py [--port N] [--latency SEC] [--chunk-delay SEC] [--batch-delay SEC]
+                              [--min-cache-tokens N]
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import PROMPT_CACHE_MIN_TOKENS
+from prompt_packer import estimate_tokens
+
+DEFAULT_RESPONSE_TEXT = """# 秘書レポート（モック）
+
+## 1. メール分析
+- 緊急対応: なし
+- 今日中に対応: 見積もりのご確認
+
+## 2. 予定分析
+- 予定の重複はありません
+
+## 3. タスク管理
+- 見積もりを確認して返信する（優先度: 高）
+"""
+
+# ストリーミング時に1回で送る文字数
+STREAM_CHUNK_CHARS = 16
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "MockClaude/1.0"
+
+    def log_message(self, format, *args):
+        """アクセスログを出力しない"""
+
+    def do_POST(self):
+        mock = self.server.mock
+        length = int(self.headers.get("content-length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_error(400, "invalid_request_error", "invalid JSON")
+            return
+        with mock.lock:
+            mock.requests += 1
+            mock.last_request = request
+
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/messages/batches"):
+            self._send_json(200, mock.create_batch(request.get("requests", []), self._base_url()))
+            return
+
+        time.sleep(mock.latency)
+        text = mock.response_text
+        if request.get("stream"):
+            self._stream(text, mock.usage(request, text), request.get("model", ""))
+        else:
+            self._send_json(200, _message(f"msg_mock_{mock.requests}", request, text, mock.usage(request, text)))
+
+    def do_GET(self):
+        mock = self.server.mock
+        parts = self.path.split("?")[0].rstrip("/").split("/")
+        # /v1/messages/batches/{id} または /v1/messages/batches/{id}/results
+        if "batches" not in parts or parts.index("batches") + 1 >= len(parts):
+            self._send_error(404, "not_found_error", "not found")
+            return
+        index = parts.index("batches")
+        batch_id = parts[index + 1]
+        with mock.lock:
+            mock.requests += 1
+        if len(parts) > index + 2 and parts[index + 2] == "results":
+            lines = mock.batch_results(batch_id)
+            if lines is None:
+                self._send_error(404, "not_found_error", f"results for {batch_id} are not available")
+                return
+            body = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode("utf-8")
+            self.send_response(200)
+            self.send_header("content-type", "application/x-jsonl")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        batch = mock.get_batch(batch_id, self._base_url())
+        if batch is None:
+            self._send_error(404, "not_found_error", f"batch {batch_id} not found")
+        else:
+            self._send_json(200, batch)
+
+    def _base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _send_error(self, status, error_type, message):
+        self._send_json(status, {"type": "error", "error": {"type": error_type, "message": message}})
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _event(self, name, payload):
+        self.wfile.write(f"event: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _stream(self, text, usage, model):
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream; charset=utf-8")
+        self.send_header("cache-control", "no-cache")
+        self.send_header("connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        self._event("message_start", {"type": "message_start", "message": {
+            "id": "msg_mock", "type": "message", "role": "assistant", "model": model, "content": [],
+            "usage": {**usage, "output_tokens": 0}}})
+        self._event("content_block_start", {"type": "content_block_start", "index": 0,
+                                            "content_block": {"type": "text", "text": ""}})
+        cutoff = self.server.mock.stream_cutoff
+        for number, start in enumerate(range(0, len(text), STREAM_CHUNK_CHARS)):
+            if cutoff is not None and number >= cutoff:
+                # 途中で切れたストリーム（message_stop を送らずに接続を閉じる）
+                return
+            time.sleep(self.server.mock.chunk_delay)
+            self._event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                "delta": {"type": "text_delta", "text": text[start:start + STREAM_CHUNK_CHARS]}})
+        self._event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        self._event("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn"},
+                                      "usage": {"output_tokens": usage["output_tokens"]}})
+        self._event("message_stop", {"type": "message_stop"})
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        """タイムアウトしたクライアントが先に切断した場合のエラーは出力しない"""
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def _tokens(value):
+    """おおよそのトークン数（JSONにして estimate_tokens で数える）"""
+    return estimate_tokens(json.dumps(value, ensure_ascii=False))
+
+
+def _cached_prefix(request):
+    """システムプロンプトのうち、最後の cache_control までのブロック（なければNone）"""
+    system = request.get("system")
+    if not isinstance(system, list):
+        return None
+    marked = [i for i, block in enumerate(system) if isinstance(block, dict) and block.get("cache_control")]
+    return system[:marked[-1] + 1] if marked else None
+
+
+def _message(message_id, request, text, usage):
+    return {
+        "id": message_id,
+        "type": "message",
+        "role": "assistant",
+        "model": request.get("model", ""),
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "usage": usage,
+    }
+
+
+class MockClaudeServer:
+    def __init__(self, port=0, latency=0.0, chunk_delay=0.0, response_text=DEFAULT_RESPONSE_TEXT, batch_delay=0.0,
+                 stream_cutoff=None, min_cache_tokens=PROMPT_CACHE_MIN_TOKENS):
+        """
+        初期化
+
+        Args:
+            port (int): 待ち受けるポート（0の場合は空いているポート）
+            latency (float): 応答を返し始めるまでの待ち時間（秒）
+            chunk_delay (float): ストリーミング時の断片ごとの待ち時間（秒）
+            response_text (str): 返す応答のテキスト
+            batch_delay (float): バッチを受け付けてから処理が終わるまでの時間（秒）
+            stream_cutoff (int): ストリーミング時にこの数の断片を送ったら接続を切る（省略時は最後まで送る）
+            min_cache_tokens (int): プロンプトキャッシュの対象になる最小トークン数
+        """
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.response_text = response_text
+        self.batch_delay = batch_delay
+        self.stream_cutoff = stream_cutoff
+        self.min_cache_tokens = min_cache_tokens
+        self.requests = 0
+        self.last_request = None
+        self.batches = {}
+        self.cached_prefixes = set()
+        self.lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", port), _Handler)
+        self._server.mock = self
+        self._thread = None
+
+    def usage(self, request, text):
+        """
+        応答の usage（プロンプトキャッシュの読み込み・書き込みを含む）
+
+        Args:
+            request (dict): リクエストの本文
+            text (str): 返す応答のテキスト
+
+        Returns:
+            dict: input_tokens, cache_creation_input_tokens, cache_read_input_tokens, output_tokens
+        """
+        usage = {"input_tokens": _tokens(request), "cache_creation_input_tokens": 0,
+                 "cache_read_input_tokens": 0, "output_tokens": len(text) // 4}
+        prefix = _cached_prefix(request)
+        if prefix is None:
+            return usage
+        cached_tokens = _tokens(prefix)
+        if cached_tokens < self.min_cache_tokens:
+            # 短すぎる場合は cache_control を付けてもキャッシュされない
+            return usage
+        key = hashlib.sha256(json.dumps([request.get("model"), prefix], ensure_ascii=False).encode("utf-8")).digest()
+        with self.lock:
+            hit = key in self.cached_prefixes
+            self.cached_prefixes.add(key)
+        usage["cache_read_input_tokens" if hit else "cache_creation_input_tokens"] = cached_tokens
+        # input_tokens はキャッシュの対象外の部分だけを数える
+        usage["input_tokens"] = max(usage["input_tokens"] - cached_tokens, 0)
+        return usage
+
+    def create_batch(self, requests, base_url):
+        """バッチを受け付ける"""
+        batch_id = f"msgbatch_mock_{uuid.uuid4().hex[:12]}"
+        with self.lock:
+            self.batches[batch_id] = {"requests": requests, "created_at": time.time()}
+        return self.get_batch(batch_id, base_url)
+
+    def get_batch(self, batch_id, base_url):
+        """バッチの処理状況（batch_delay 秒が過ぎると ended になる）"""
+        batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+        ended = time.time() >= batch["created_at"] + self.batch_delay
+        count = len(batch["requests"])
+        errored = sum(1 for r in batch["requests"] if not r.get("params", {}).get("messages"))
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count - errored if ended else 0,
+                "errored": errored if ended else 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "results_url": f"{base_url}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def batch_results(self, batch_id):
+        """終了したバッチの結果（JSON Linesの各行。終了していない場合はNone）"""
+        batch = self.batches.get(batch_id)
+        if batch is None or time.time() < batch["created_at"] + self.batch_delay:
+            return None
+        results = []
+        for number, request in enumerate(batch["requests"], 1):
+            params = request.get("params", {})
+            if params.get("messages"):
+                result = {"type": "succeeded",
+                          "message": _message(f"msg_mock_{batch_id}_{number}", params, self.response_text,
+                                              self.usage(params, self.response_text))}
+            else:
+                result = {"type": "errored", "error": {"type": "error", "error": {
+                    "type": "invalid_request_error", "message": "messages: Field required"}}}
+            results.append({"custom_id": request.get("custom_id"), "result": result})
+        return results
+
+    @property
+    def url(self):
+        """ClaudeClient の api_url に指定するURL"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/messages"
+
+    def start(self):
+        """別スレッドで待ち受けを開始"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """現在のスレッドで待ち受ける（Ctrl+Cで終了）"""
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def stop(self):
+        """待ち受けを終了"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop()
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description='Claude APIのモックサーバー',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765, help='待ち受けるポート')
+    parser.add_argument('--latency', type=float, default=0.5, help='応答を返し始めるまでの待ち時間（秒）')
+    parser.add_argument('--chunk-delay', type=float, default=0.02, help='ストリーミング時の断片ごとの待ち時間（秒）')
+    parser.add_argument('--batch-delay', type=float, default=30, help='バッチを受け付けてから処理が終わるまでの時間（秒）')
+    parser.add_argument('--min-cache-tokens', type=int, default=PROMPT_CACHE_MIN_TOKENS,
+                        help='プロンプトキャッシュの対象になる最小トークン数')
+    args = parser.parse_args()
+
+    server = MockClaudeServer(args.port, args.latency, args.chunk_delay, batch_delay=args.batch_delay,
+                              min_cache_tokens=args.min_cache_tokens)
+    print(f"モックサーバーを起動しました: {server.url}（Ctrl+Cで終了）")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
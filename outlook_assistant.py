@@ -16,30 +16,469 @@ python outlook_assistant.py [オプション]
 --days N          : 取得する予定の日数 (デフォルト: 7)
 --api-key KEY     : Anthropic API Key
 --api-version VER : Anthropic API バージョン
+--api-url URL     : Messages APIのURL（モックサーバーで動作確認する場合に変更）
 --priority-domains DOMAINS : 優先ドメインをカンマ区切りで指定
 --priority-keywords KEYWORDS : 優先キーワードをカンマ区切りで指定
 --working-hours START END : 勤務時間 (例: --working-hours 9 18)
 --focus-time START END : 集中作業時間 (例: --focus-time 10 12)
 --report-style STYLE : レポートスタイル (detailed/concise)
+--stream          : 応答をストリーミングで受信し、逐次出力する
+--calendar-analysis : 予定の重複・空き時間・集中作業時間との重なりをローカルで計算する
+--prefilter       : 優先ドメイン・優先キーワードに該当する未読メールをOutlook側で絞り込み、優先度の高いメールだけ本文を取得する
+--scan-emails N   : --prefilter 時に取得する優先メールのヘッダの最大件数 (デフォルト: 500)
+--no-normalize    : メール本文から引用・署名・定型文などを除去せずにそのまま使う
+--no-entities     : 本文から会議URL・期限・依頼の文を抽出せず、プロンプトにも含めない
+--collapse-threads : 同じスレッドのメールを1件にまとめる
+--token-budget N  : メール欄のトークン予算（優先度に応じて本文量を調整）
+--map-reduce      : メールをチャンクごとに並列要約してから最終レポートを作成する
+--summary-memo    : メールを1件ずつ要約してキャッシュし、新着メールだけを要約する（--no-cache とは併用不可）
+--chunk-size N    : map-reduce・要約メモ化時に1回の要約に含めるメール件数 (デフォルト: 20)
+--concurrency N   : map-reduce・要約メモ化時に同時実行するAPI呼び出し数 (デフォルト: 4)
+--async-api       : aiohttpの非同期クライアントで接続を再利用しながらAPI呼び出しを並行して行う（map-reduce・要約メモ化・一括モード）
+--response-cache-dir DIR : Claudeの応答キャッシュを保存するディレクトリ
+--response-cache-ttl MIN : 応答キャッシュの保存期間（分） (デフォルト: 1440)
+--response-cache-max-mb MB : 応答キャッシュの合計サイズの上限 (デフォルト: 50)
+--no-response-cache : 応答キャッシュを使わずに毎回APIを呼び出す
+--cache-file PATH : 取得済みメール・予定のキャッシュファイル
+--no-cache        : キャッシュを使わずに毎回すべて取得する
+--extract-attachments : 添付ファイルからテキストを抽出し、冒頭をプロンプトに含める
+--attachment-workers N : 添付ファイルのテキスト抽出に使うプロセス数 (デフォルト: CPU数)
+--attachment-max-mb MB : テキストを抽出する添付ファイルのサイズの上限 (デフォルト: 10)
+--attachment-timeout SEC : 添付ファイル1件あたりのテキスト抽出の時間の上限 (デフォルト: 20)
+--watch           : 常駐して新着メールと予定の変更を監視し、変更があればレポートを更新する
+--debounce SEC    : 常駐時、最後の変更からレポートを更新するまでの待ち時間 (デフォルト: 30)
+--max-delay SEC   : 常駐時、最初の変更からレポートを更新するまでの最大の待ち時間 (デフォルト: 300)
+--schedule        : 常駐して毎日の勤務開始前にレポートを作成しておき、開始直前に新着があれば更新する
+--schedule-margin MIN : 勤務開始の何分前までに開始直前の更新を終えるか (デフォルト: 10)
+--schedule-state PATH : 事前作成したレポートの情報を保存するファイル (デフォルト: prebuilt_report.json)
+--prebuilt        : 今日の分の事前作成したレポートがあれば、取得とAPI呼び出しを行わずにすぐ表示する
+--telemetry-file PATH : 段階ごとの所要時間・COM呼び出し回数・トークン数をJSON Lines形式で追記する
+--prometheus-file PATH : 同じ集計をPrometheusのtextfile collector用の形式で書き出す
+--archive PATH    : 作成したレポートを全文検索用に保存するアーカイブ (デフォルト: report_archive.sqlite3)
+--no-archive      : レポートをアーカイブに保存しない
+--batch FILE      : JSONファイルに列挙した複数のメールボックスのレポートをまとめて作成する
+--offline         : 一括モードで全員分のプロンプトをMessage Batches APIにまとめて送信する
+--batch-journal PATH : --offline 時に送信したバッチを記録するファイル (デフォルト: batch_journal.json)
+--fetch-workers N : 一括モードで取得を並列に行うスレッド数 (デフォルト: 4)
+--api-workers N   : 一括モードでAPI呼び出しを並列に行うスレッド数 (デフォルト: 4)
+--rate-limit N    : 1分あたりのAPIリクエスト数の上限（全スレッド共通） (デフォルト: 一括モードでは50)
+--burst N         : レート制限の範囲内で連続して送信できるリクエスト数 (デフォルト: --api-workers と同じ)
 """
 
+import asyncio
 import sys
 import time
 import traceback
+from datetime import datetime
 
 from config import create_arg_parser, load_settings, API_KEY, API_VERSION
 from outlook_client import OutlookClient
-from claude_client import ClaudeClient
+from mail_cache import MailCache
+from map_reduce import MapReduceSummarizer
+from priority_classifier import PriorityClassifier
+from response_cache import ResponseCache
+from summary_memo import SummaryMemo
+from body_normalizer import normalize_emails, NormalizationStats
+from entity_extractor import annotate
+from threads import ThreadIndex
+from calendar_index import CalendarIndex
+from claude_client import ClaudeClient, ReportFailedError, ReportWriter, format_usage
+from attachments import AttachmentExtractor
+from async_claude_client import is_available as async_api_available
+from report_archive import ReportArchive, format_diff
+from telemetry import Telemetry
+from batch import BatchRunner, TokenBucket, load_mailboxes, format_results, DEFAULT_RATE_LIMIT
+from message_batches import BatchJournal, MessageBatchRunner, format_journal
+from watcher import ReportDaemon, OutlookEventSource, Debouncer, calendar_window_filter
+from scheduler import LeadTimeEstimator, PregenerationScheduler, load_prebuilt, load_run_history
+from records import format_datetime
+
+class ReportSession:
+    """
+    レポート作成の状態
+
+    取得済みのメールと予定を保持し、常駐時は変更があった側だけを取り直す。
+    """
+
+    def __init__(self, args, settings, outlook, claude, cache=None, response_cache=None, telemetry=None,
+                 report_file=None, archive=None, user=None):
+        self.args = args
+        self.settings = settings
+        self.outlook = outlook
+        self.claude = claude
+        self.cache = cache
+        self.response_cache = response_cache
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        self.report_file = report_file
+        self.archive = archive
+        self.user = user or self.telemetry.labels["user"]
+        self.emails_data = []
+        self.events_data = []
+        self._last_prompt = None
+
+    def fetch_emails(self):
+        """未読メールを取得して正規化・スレッド集約する"""
+        args = self.args
+        print(f"\n1. 未読メールを最大{args.emails}件取得します...")
+        try:
+            with self.telemetry.span("fetch_emails"):
+                if args.prefilter:
+                    headers = self.outlook.get_priority_headers(self.settings, max(args.scan_emails, args.emails),
+                                                                update_mark=False)
+                    if len(headers) < args.emails:
+                        # 優先メールだけでは足りない場合は、最新の未読メールで補う
+                        seen = {email.entry_id for email in headers}
+                        latest = self.outlook.get_unread_headers(args.emails, update_mark=False)
+                        headers += [email for email in latest if email.entry_id not in seen]
+                        headers.sort(key=lambda email: email.received_time or datetime.min, reverse=True)
+                        for i, email in enumerate(headers, 1):
+                            email.id = i
+                    # 新着メール数は、まとめた後のヘッダで1度だけ数える
+                    self.outlook.update_high_water_mark(headers)
+                    emails_data = PriorityClassifier(self.settings).select(headers, args.emails)
+                    print(f"  {len(headers)}件から優先度の高い{len(emails_data)}件を選択しました。")
+                    emails_data = self.outlook.fetch_email_bodies(emails_data)
+                else:
+                    emails_data = self.outlook.get_unread_emails(args.emails)
+            print(f"  {len(emails_data)}件のメールを取得しました。")
+            with self.telemetry.span("normalize_emails"):
+                if not args.no_normalize:
+                    stats = NormalizationStats()
+                    emails_data = list(normalize_emails(emails_data, stats))
+                    print(f"  本文の正規化: {stats.summary()}")
+                if args.collapse_threads:
+                    thread_index = ThreadIndex(emails_data)
+                    emails_data = thread_index.collapse()
+                    print(f"  スレッドごとにまとめて{len(emails_data)}件になりました。")
+            if not args.no_entities:
+                with self.telemetry.span("extract_entities", target="emails"):
+                    annotate(emails_data)
+        except Exception as e:
+            print(f"  メール処理中にエラー: {e}")
+            emails_data = []
+        self.telemetry.count("emails", len(emails_data))
+        self.emails_data = emails_data
+
+    def fetch_events(self):
+        """予定を取得する"""
+        print(f"\n2. 今後{self.args.days}日間の予定を取得します...")
+        try:
+            with self.telemetry.span("fetch_events"):
+                self.events_data = self.outlook.get_calendar_events(self.args.days)
+            if not self.args.no_entities:
+                with self.telemetry.span("extract_entities", target="events"):
+                    annotate(self.events_data)
+            print(f"  {len(self.events_data)}件の予定を取得しました。")
+        except Exception as e:
+            print(f"  予定処理中にエラー: {e}")
+            self.events_data = []
+        self.telemetry.count("events", len(self.events_data))
+
+    def refresh(self, batch):
+        """
+        変更のあった側だけを取り直してレポートを更新する
+
+        Args:
+            batch (ChangeBatch): デバウンスでまとめた変更
+
+        Returns:
+            str: 保存したレポートのパス（プロンプトが前回と同じため更新しなかった場合はNone）
+        """
+        if batch.mail_changed:
+            self.fetch_emails()
+        if batch.calendar_changed:
+            self.fetch_events()
+        try:
+            return self.generate()
+        finally:
+            if self.cache is not None:
+                self.cache.commit()
+            self.telemetry.count("refreshes")
+            self.telemetry.flush()
+
+    def build_prompt(self, force=False):
+        """
+        取得済みのメールと予定からプロンプトを作成する
+
+        Args:
+            force (bool): 前回とプロンプトが同じでも作成するか
+
+        Returns:
+            Prompt: プロンプト（前回とプロンプトが同じ場合はNone）
+        """
+        args = self.args
+        settings = self.settings
+        claude = self.claude
+
+        print("\n3. 秘書アシスタント用のプロンプトを作成しています...")
+        extractor = self.outlook.attachment_extractor
+        telemetry = self.telemetry
+        if extractor is not None:
+            # 抽出はメールと予定の取得中に別プロセスで進めておき、ここで結果を受け取る
+            with telemetry.span("extract_attachments"):
+                extractor.collect()
+            print(f"  添付ファイルのテキスト: {extractor.stats()}")
+        email_summaries = None
+        if args.summary_memo and self.cache is not None and self.emails_data:
+            # 要約はメールボックスキャッシュに保存する（--no-cache との組み合わせは main で拒否する）
+            with telemetry.span("summarize_emails", method="summary_memo"):
+                memo = SummaryMemo(claude, self.cache, args.chunk_size, args.concurrency, args.async_api)
+                email_summaries = memo.summarize(self.emails_data, settings)
+        elif args.map_reduce and self.emails_data:
+            with telemetry.span("summarize_emails", method="map_reduce"):
+                summarizer = MapReduceSummarizer(claude, args.chunk_size, args.concurrency, args.async_api)
+                email_summaries = summarizer.summarize(self.emails_data, settings)
+        calendar_facts = None
+        if args.calendar_analysis:
+            with telemetry.span("calendar_analysis"):
+                calendar_facts = CalendarIndex(self.events_data).summarize(settings, days=args.days)
+        with telemetry.span("build_prompt"):
+            prompt = claude.create_prompt(self.emails_data, self.events_data, settings, email_summaries,
+                                          args.token_budget, calendar_facts)
+        telemetry.count("prompt_chars", len(prompt.text()))
+        if prompt == self._last_prompt and not force:
+            print("  前回のレポートから内容に変更がないため、更新しません。")
+            return None
+        self._last_prompt = prompt
+        return prompt
+
+    def generate(self, force=False):
+        """
+        プロンプトを作成してClaudeにレポートを作成させる
+
+        Args:
+            force (bool): 前回とプロンプトが同じでもレポートを作成するか
+
+        Returns:
+            str: 保存したレポートのパス（前回とプロンプトが同じため更新しなかった場合はNone）
+
+        Raises:
+            ReportFailedError: API呼び出しに失敗した場合（エラーメッセージはレポートファイルに保存し、
+                アーカイブには保存しない）
+        """
+        args = self.args
+        claude = self.claude
+        telemetry = self.telemetry
+
+        prompt = self.build_prompt(force)
+        if prompt is None:
+            return None
+        
+        print("\n4. Claude APIを呼び出しています...")
+        if args.stream:
+            print("\n5. 秘書レポートを受信しながら保存しています...")
+            print("\n========= 秘書レポート =========")
+            # 受信と保存を同時に行うため、保存も api_call に含まれる
+            with telemetry.span("api_call", stream=True), ReportWriter(self.report_file) as writer:
+                def on_text(text):
+                    writer.write(text)
+                    print(text, end="", flush=True)
+                response = claude.call_api_stream(prompt, on_text=on_text)
+            report_path = writer.path
+            print("\n================================")
+            self._print_usage(claude.last_usage)
+            print(f"\n秘書レポートを保存しました: {report_path}")
+            self._raise_if_failed(claude.last_call_failed, report_path)
+            self._archive_report(response, report_path, claude.last_usage)
+        else:
+            print("  APIからの応答を待っています...")
+            with telemetry.span("api_call", stream=False):
+                response = claude.call_api(prompt)
+            self._print_usage(claude.last_usage)
+            report_path = self._save_report(response)
+            self._raise_if_failed(claude.last_call_failed, report_path)
+            self._archive_report(response, report_path, claude.last_usage)
+        
+        if self.response_cache is not None:
+            print(f"\n応答キャッシュ: {self.response_cache.stats()}")
+        return report_path
+
+    async def generate_async(self, client):
+        """
+        generate の非同期版（ストリーミングは使わない）
+
+        応答を待っている間に、同じイベントループで他のメールボックスの取得やAPI呼び出しを進める。
+
+        Args:
+            client (AsyncClaudeClient): API呼び出しに使う非同期クライアント
+
+        Returns:
+            str: 保存したレポートのパス（前回とプロンプトが同じため更新しなかった場合はNone）
+
+        Raises:
+            ReportFailedError: API呼び出しに失敗した場合
+        """
+        # 要約（--map-reduce など）は内部でイベントループを作るため、プロンプトの作成は別スレッドで行う
+        prompt = await asyncio.get_running_loop().run_in_executor(None, self.build_prompt)
+        if prompt is None:
+            return None
+
+        print("\n4. Claude APIを呼び出しています...")
+        with self.telemetry.span("api_call", stream=False):
+            response = await client.call_api(prompt)
+        self._print_usage(client.last_usage)
+        report_path = self._save_report(response)
+        self._raise_if_failed(client.last_call_failed, report_path)
+        self._archive_report(response, report_path, client.last_usage)
+
+        if self.response_cache is not None:
+            print(f"\n応答キャッシュ: {self.response_cache.stats()}")
+        return report_path
+
+    def _save_report(self, response):
+        """応答をレポートファイルに保存して冒頭を表示"""
+        print("\n5. 秘書レポートを保存しています...")
+        with self.telemetry.span("save_report"):
+            report_path = self.claude.save_response(response, self.report_file)
+        
+        print(f"\n秘書レポートを保存しました: {report_path}")
+        print("\n========= 秘書レポート =========")
+        print(response[:1000] + ("..." if len(response) > 1000 else ""))
+        print("================================")
+        return report_path
+
+    def _raise_if_failed(self, failed, report_path):
+        """API呼び出しに失敗した場合は、アーカイブに保存せずに ReportFailedError を送出"""
+        if not failed:
+            return
+        # プロンプトが同じでも、次の更新で作成し直す
+        self._last_prompt = None
+        self.telemetry.count("api_failures")
+        raise ReportFailedError(f"Claude APIの呼び出しに失敗しました（エラーメッセージを {report_path} に保存しました）")
+
+    def _archive_report(self, response, report_path, usage):
+        """レポートをアーカイブに保存し、前回のレポートからのタスクの変化を表示"""
+        if self.archive is None:
+            return
+        with self.telemetry.span("archive_report"):
+            report_id = self.archive.add(response, report_path, self.user, self.telemetry.run_id, self.settings,
+                                         usage)
+            diff = self.archive.diff(report_id)
+        if diff.previous is not None:
+            print(f"\n前回のレポートからのタスクの変化:\n{format_diff(diff)}")
+
+    def _print_usage(self, usage):
+        """直前のAPI呼び出しのトークン数を表示（プロンプトキャッシュの効果の確認用）"""
+        if usage is not None:
+            print(f"  トークン: {format_usage(usage)}")
+
+
+def watch(session, args):
+    """常駐して変更を監視し、変更があればレポートを更新する"""
+    print("\n常駐モード: 新着メールと予定の変更を監視しています（Ctrl+Cで終了）...")
+    daemon = ReportDaemon(
+        OutlookEventSource(session.outlook),
+        session.refresh,
+        Debouncer(args.debounce, args.max_delay),
+        calendar_window_filter(args.days),
+    )
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        print(f"\n常駐モードを終了します（レポートの更新: {daemon.refreshes}回）。")
+
+
+def schedule(session, args):
+    """勤務開始前にレポートを作成しておき、開始直前に新着があれば更新する"""
+    estimator = LeadTimeEstimator(load_run_history(args.telemetry_file), args.schedule_margin * 60)
+    scheduler = PregenerationScheduler(session, OutlookEventSource(session.outlook), estimator,
+                                       session.settings["working_hours"]["start"], args.schedule_state,
+                                       relevant=calendar_window_filter(args.days))
+    print("\nスケジュールモード: 毎日の勤務開始前にレポートを作成します（Ctrl+Cで終了）...")
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        print(f"\nスケジュールモードを終了します（事前作成: {scheduler.prebuilds}回, 開始直前の更新: {scheduler.refreshes}回）。")
+
+
+def show_prebuilt(args):
+    """
+    今日の分の事前作成したレポートがあれば表示する
+
+    Returns:
+        bool: 表示した場合は True
+    """
+    prebuilt = load_prebuilt(args.schedule_state)
+    if prebuilt is None:
+        print("今日の分の事前作成したレポートがないため、新しく作成します。")
+        return False
+    report_path, generated_at = prebuilt
+    with open(report_path, encoding="utf-8") as f:
+        report = f.read()
+    print(f"\n{format_datetime(generated_at)} に作成したレポートです: {report_path}")
+    print("\n========= 秘書レポート =========")
+    print(report)
+    print("================================")
+    return True
+
+
+def run_batch(args, settings, claude, response_cache, telemetry, archive=None):
+    """JSONファイルに列挙したメールボックスのレポートをまとめて作成する"""
+    mailboxes = load_mailboxes(args.batch)
+    print(f"\n一括モード: {len(mailboxes)}件のメールボックスを処理します"
+          f"（取得 {args.fetch_workers}並列, API呼び出し {args.api_workers}並列）...")
+    if args.extract_attachments:
+        print("  一括モードでは添付ファイルのテキスト抽出は行いません。")
+        args.extract_attachments = False
+
+    def create_session(mailbox_args, mailbox_settings, outlook, cache, report_file, name):
+        return ReportSession(mailbox_args, mailbox_settings, outlook, claude, cache, response_cache, telemetry,
+                             report_file, archive, name)
+
+    started_at = time.perf_counter()
+    runner = BatchRunner(mailboxes, args, settings, claude, create_session,
+                         fetch_workers=args.fetch_workers, api_workers=args.api_workers, telemetry=telemetry,
+                         async_api=args.async_api)
+    results = runner.run()
+    print("\n" + format_results(results, time.perf_counter() - started_at))
+
+
+def run_offline_batch(args, settings, claude, response_cache, telemetry, archive=None):
+    """
+    全員分のプロンプトをMessage Batches APIにまとめて送信し、結果をレポートファイルに保存する
+
+    ジャーナルに完了していないバッチがあれば、メールボックスを取得し直さずにその続きから再開する。
+    """
+    journal = BatchJournal(args.batch_journal)
+    batches = MessageBatchRunner(claude, journal, telemetry, archive=archive)
+    prompts = None
+    if not journal.active:
+        mailboxes = load_mailboxes(args.batch)
+        print(f"\nバッチモード: {len(mailboxes)}件のメールボックスのプロンプトを作成します...")
+        args.extract_attachments = False
+
+        def create_session(mailbox_args, mailbox_settings, outlook, cache, report_file, name):
+            return ReportSession(mailbox_args, mailbox_settings, outlook, claude, cache, response_cache, telemetry,
+                                 report_file, user=name)
+
+        runner = BatchRunner(mailboxes, args, settings, claude, create_session,
+                             fetch_workers=args.fetch_workers, telemetry=telemetry)
+        prompts = runner.collect_prompts()
+
+    print("\nMessage Batches APIでレポートを作成します（中断した場合は同じコマンドで再開できます）...")
+    entries = batches.run(prompts)
+    print("\n" + format_journal(entries))
+
 
 def main():
     """メイン関数"""
     parser = create_arg_parser()
     args = parser.parse_args()
+    if args.summary_memo and args.no_cache:
+        parser.error("--summary-memo は要約をキャッシュファイルに保存するため、--no-cache とは同時に指定できません")
     
     print("Outlook秘書アシスタント")
     print("=" * 40)
     
+    cache = None
+    extractor = None
+    archive = None
+    telemetry = Telemetry(args.telemetry_file, args.prometheus_file,
+                          labels={"emails": args.emails, "days": args.days, "report_style": args.report_style})
     try:
+        if args.prebuilt and show_prebuilt(args):
+            return
+
         # API KEYの検証と設定
         api_key = args.api_key or API_KEY
         api_version = args.api_version or API_VERSION
@@ -54,55 +493,73 @@ def main():
         # 設定の読み込み
         settings = load_settings(args)
         
-        # Outlookクライアントの初期化
-        outlook = OutlookClient()
-        
-        # メールと予定の取得
-        print(f"\n1. 未読メールを最大{args.emails}件取得します...")
-        try:
-            emails_data = outlook.get_unread_emails(args.emails)
-            print(f"  {len(emails_data)}件のメールを取得しました。")
-        except Exception as e:
-            print(f"  メール処理中にエラー: {e}")
-            emails_data = []
-        
-        print(f"\n2. 今後{args.days}日間の予定を取得します...")
-        try:
-            events_data = outlook.get_calendar_events(args.days)
-            print(f"  {len(events_data)}件の予定を取得しました。")
-        except Exception as e:
-            print(f"  予定処理中にエラー: {e}")
-            events_data = []
-            
         # Claudeクライアントの初期化
-        claude = ClaudeClient(api_key, api_version)
-            
-        # プロンプトの作成とAPI呼び出し
-        print("\n3. 秘書アシスタント用のプロンプトを作成しています...")
-        prompt = claude.create_prompt(emails_data, events_data, settings)
-        
-        print("\n4. Claude APIを呼び出しています...")
-        print("  APIからの応答を待っています...")
-        response = claude.call_api(prompt)
+        response_cache = None
+        if not args.no_response_cache:
+            response_cache = ResponseCache(args.response_cache_dir, args.response_cache_ttl,
+                                           int(args.response_cache_max_mb * 1024 * 1024))
+        rate_limit = args.rate_limit or (DEFAULT_RATE_LIMIT if args.batch else None)
+        rate_limiter = None
+        if rate_limit:
+            rate_limiter = TokenBucket(rate_limit / 60, args.burst or args.api_workers)
+        claude = ClaudeClient(api_key, api_version, response_cache, args.api_url, telemetry, rate_limiter)
+        if not args.no_archive:
+            # 一括モードでは複数のスレッドからレポートを保存する
+            archive = ReportArchive(args.archive, check_same_thread=False)
+        if args.async_api and not async_api_available():
+            print("aiohttpがインストールされていないため、--async-api を使わずに実行します。")
+            args.async_api = False
         
-        # 結果の保存と表示
-        print("\n5. 秘書レポートを保存しています...")
-        report_path = claude.save_response(response)
+        if args.batch and args.offline:
+            run_offline_batch(args, settings, claude, response_cache, telemetry, archive)
+            return
+        if args.batch:
+            run_batch(args, settings, claude, response_cache, telemetry, archive)
+            return
         
-        print(f"\n秘書レポートを保存しました: {report_path}")
-        print("\n========= 秘書レポート =========")
-        print(response[:1000] + ("..." if len(response) > 1000 else ""))
-        print("================================")
+        # Outlookクライアントの初期化
+        if not args.no_cache:
+            cache = MailCache(args.cache_file)
+        if args.extract_attachments:
+            extractor = AttachmentExtractor(cache, args.attachment_workers,
+                                            int(args.attachment_max_mb * 1024 * 1024), args.attachment_timeout)
+        outlook = OutlookClient(cache=cache, attachment_extractor=extractor, telemetry=telemetry)
         
+        # メールと予定の取得とレポート作成
+        session = ReportSession(args, settings, outlook, claude, cache, response_cache, telemetry, archive=archive)
+        if args.schedule:
+            schedule(session, args)
+            return
+        session.fetch_emails()
+        session.fetch_events()
+        try:
+            session.generate()
+        except ReportFailedError as e:
+            # 常駐モードでは、次の更新で作成し直す
+            print(f"\n{e}")
         print("\nレポート全文は保存されたファイルで確認できます。")
         
+        if args.watch:
+            watch(session, args)
+        
     except Exception as e:
         print(f"エラーが発生しました: {e}")
         traceback.print_exc()
     
     finally:
-        print("\n5秒後に終了します...")
-        time.sleep(5)
+        if extractor is not None:
+            extractor.close()
+        if cache is not None:
+            cache.prune()
+            cache.close()
+        if archive is not None:
+            archive.close()
+        if telemetry.stages:
+            print(f"\n処理時間の内訳:\n{telemetry.summary()}")
+        telemetry.close()
+        if not (args.watch or args.schedule):
+            print("\n5秒後に終了します...")
+            time.sleep(5)
 
 if __name__ == "__main__":
     main()
@@ -5,47 +5,146 @@
 Outlookクライアントモジュール
 """
 
-import win32com.client
-import pythoncom
 import traceback
 from datetime import datetime, timedelta
-import re
+
+try:
+    import win32com.client
+    import pythoncom
+except ImportError:  # Windows以外ではpywin32を利用できない
+    win32com = None
+    pythoncom = None
+
+from dasl_query import overlap_condition, priority_condition, to_filter
+from entity_extractor import extract_meeting_links
+from mail_store import OutlookMailStore, DEFAULT_BATCH_SIZE
+from records import EmailRecord, EventRecord, AttachmentRecord, to_datetime
+from telemetry import Telemetry, wrap_com
 
 class OutlookClient:
-    def __init__(self):
-        """Outlookクライアントの初期化"""
+    def __init__(self, store=None, batch_size=DEFAULT_BATCH_SIZE, cache=None, attachment_extractor=None,
+                 namespace=None, telemetry=None):
+        """
+        Outlookクライアントの初期化
+
+        Args:
+            store (MailStore): メールの取得元（省略時は受信トレイのOutlookMailStore）
+            batch_size (int): ヘッダを一括取得する際の1回あたりの行数
+            cache (MailCache): 取得済みのメールと予定のキャッシュ（省略時は使用しない）
+            attachment_extractor (AttachmentExtractor): 添付ファイルのテキスト抽出（省略時は抽出しない）
+            namespace: 使用するMAPI名前空間（省略時はOutlookに接続して取得。疑似オブジェクトモデルも指定できる）
+            telemetry (Telemetry): 所要時間とCOM呼び出し回数の集計先（指定した場合のみCOM呼び出しを数える）
+        """
         self.outlook = None
-        self.namespace = None
+        self.namespace = namespace
+        self.store = store
+        self.batch_size = batch_size
+        self.cache = cache
+        self.attachment_extractor = attachment_extractor
+        self.new_email_count = None
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        self._count_com_calls = telemetry is not None
         
     def connect(self):
-        """Outlookに接続"""
+        """Outlookに接続（接続済みの場合はその接続を使う）"""
+        if self.namespace is not None:
+            return True
+        if win32com is None:
+            print("Outlookへの接続に失敗しました: pywin32がインストールされていません")
+            return False
         try:
-            self.outlook = win32com.client.Dispatch("Outlook.Application")
-            self.namespace = self.outlook.GetNamespace("MAPI")
+            with self.telemetry.span("connect"):
+                self.outlook = win32com.client.Dispatch("Outlook.Application")
+                self.namespace = self.outlook.GetNamespace("MAPI")
             return True
         except pythoncom.com_error as e:
             print(f"Outlookへの接続に失敗しました: {e}")
             return False
 
+    def disconnect(self):
+        """
+        COMオブジェクトへの参照を手放す
+
+        スレッドごとにCOMを初期化する一括モードでは、アパートメントを解放する前に呼ぶ。
+        """
+        self.store = None
+        self.namespace = None
+        self.outlook = None
+
+    def _com_namespace(self):
+        """
+        取得処理で使う名前空間（計測する場合はCOM呼び出しを数えるラッパー）
+
+        イベントの購読には元の名前空間（self.namespace）を使う。
+        """
+        if self._count_com_calls:
+            return wrap_com(self.namespace, self.telemetry)
+        return self.namespace
+
+    def _get_mail_store(self):
+        """メールストアを取得（未指定の場合はOutlookに接続して作成）"""
+        if self.store is None:
+            if not self.connect():
+                return None
+            self.store = OutlookMailStore(self._com_namespace())
+        return self.store
+
     def get_unread_emails(self, max_emails=10):
         """未読メールを取得"""
+        emails_data = self.get_unread_headers(max_emails)
+        return self.fetch_email_bodies(emails_data)
+
+    def get_priority_headers(self, settings, max_emails=10, update_mark=True):
+        """
+        優先ドメインからのメールと優先キーワードを含むメールのヘッダを取得
+
+        条件はDASLにしてOutlook側で絞り込むため、未読メールが多くても
+        該当するメールだけを取得する。
+
+        Args:
+            settings (dict): priority_domains と priority_keywords を含む設定
+            max_emails (int): 取得する最大件数
+            update_mark (bool): 新着メール数を数えて受信日時の最大値を記録するか
+
+        Returns:
+            list: EmailRecord のリスト（優先ドメインも優先キーワードもない場合は最新の未読メール）
+        """
+        store = self._get_mail_store()
+        if store is None:
+            return []
+        content_indexed = store.is_content_indexed()
+        query = priority_condition(settings["priority_domains"], settings["priority_keywords"], content_indexed)
+        if query is not None:
+            print("優先メールをOutlook側で絞り込みます"
+                  f"（キーワード検索: {'インデックス' if content_indexed else 'LIKE'}）")
+        return self.get_unread_headers(max_emails, query, update_mark)
+
+    def get_unread_headers(self, max_emails=10, query=None, update_mark=True):
+        """
+        未読メールのヘッダ情報を一括取得
+
+        本文と添付ファイル情報は含まない。必要なメールに対して
+        fetch_email_bodies で後から取得する。
+
+        Args:
+            max_emails (int): 取得する最大件数
+            query (str): 未読であることに加えてOutlook側で絞り込むDASLの条件
+            update_mark (bool): 新着メール数を数えて受信日時の最大値を記録するか（複数回に分けて
+                取得する場合は False にし、まとめた後で update_high_water_mark を呼ぶ）
+        """
         emails_data = []
         
         try:
-            if not self.connect():
+            store = self._get_mail_store()
+            if store is None:
                 return emails_data
                 
             # 受信トレイを取得
             print("受信トレイにアクセス中...")
-            try:
-                inbox = self.namespace.GetDefaultFolder(6)  # 6は受信トレイを表す定数
-            except Exception as e:
-                print(f"受信トレイの取得に失敗しました: {e}")
-                return emails_data
                 
             # 未読メールの件数を確認
             try:
-                unread_count = inbox.UnReadItemCount
+                unread_count = store.get_unread_count()
                 print(f"未読メール数: {unread_count}")
                 if unread_count == 0:
                     print("未読メールはありません。")
@@ -53,36 +152,18 @@ class OutlookClient:
             except Exception as e:
                 print(f"未読メール数の取得に失敗しました: {e}")
                 
-            # 未読メールだけをフィルタリング
+            # 未読メールのヘッダを列単位でまとめて取得
+            print("未読メールを取得中...")
             try:
-                filter_string = "[Unread]=True"
-                unread_items = inbox.Items.Restrict(filter_string)
-                unread_items.Sort("[ReceivedTime]", True)  # 受信日時の降順でソート
+                for i, row in enumerate(store.iter_unread_rows(max_emails, self.batch_size, query), 1):
+                    emails_data.append(self._process_email(row, i))
             except Exception as e:
-                print(f"未読メールのフィルタリングに失敗しました: {e}")
-                return emails_data
+                print(f"未読メールの一括取得に失敗しました: {e}")
+                traceback.print_exc()
                 
-            # 取得する件数を決定
-            try:
-                emails_to_process = min(max_emails, unread_items.Count)
-                print(f"処理する未読メール: {emails_to_process}件")
-            except Exception as e:
-                print(f"未読メール数の計算に失敗しました: {e}")
-                return emails_data
-            
-            # 未読メールを処理
-            print("未読メールを取得中...")
-            for i in range(1, emails_to_process + 1):
-                try:
-                    email = unread_items.Item(i)
-                    email_data = self._process_email(email, i)
-                    emails_data.append(email_data)
-                    print(f"  メール {i} の情報を取得しました: {email_data['subject']}")
-                    
-                except Exception as e:
-                    print(f"  メール {i} の処理中にエラー: {e}")
-                    traceback.print_exc()
-            
+            print(f"処理する未読メール: {len(emails_data)}件")
+            if update_mark:
+                self.update_high_water_mark(emails_data)
             return emails_data
             
         except Exception as e:
@@ -90,37 +171,85 @@ class OutlookClient:
             traceback.print_exc()
             return emails_data
 
-    def _process_email(self, email, index):
-        """メールオブジェクトからデータを抽出"""
-        email_data = {
-            "id": index,
-            "subject": getattr(email, "Subject", ""),
-            "sender": getattr(email, "SenderName", ""),
-            "sender_email": getattr(email, "SenderEmailAddress", ""),
-            "received_time": str(getattr(email, "ReceivedTime", "")),
-            "body": getattr(email, "Body", "").strip(),
-            "has_attachments": getattr(email, "Attachments", None) is not None and getattr(email, "Attachments.Count", 0) > 0,
-        }
-        
-        # 添付ファイル情報の取得
-        if email_data["has_attachments"]:
-            email_data["attachments"] = self._get_attachments_info(email)
+    def update_high_water_mark(self, emails_data):
+        """
+        前回実行以降の新着メール数を数え、受信日時の最大値を記録
+
+        1回の実行で1度だけ呼ぶ（記録した後に呼ぶと、同じメールを新着として数えない）。
+
+        Args:
+            emails_data (list): この実行で取得したメールヘッダ（EmailRecord のリスト）
+        """
+        if self.cache is None or not emails_data:
+            return
+        previous = self.cache.get_high_water_mark()
+        received_times = [e.received_time for e in emails_data if e.received_time is not None]
+        if not received_times:
+            return
+        self.new_email_count = sum(1 for t in received_times if previous is None or t > previous)
+        latest = max(received_times)
+        if previous is None or latest > previous:
+            self.cache.set_high_water_mark(latest)
+        print(f"前回実行以降の新着メール: {self.new_email_count}件")
+
+    def fetch_email_bodies(self, emails_data):
+        """
+        ヘッダ情報に本文と添付ファイル情報を追加
+
+        添付ファイルのテキスト抽出を指定した場合は抽出を開始するだけで、
+        結果は AttachmentExtractor.collect で受け取る。
+        """
+        store = self._get_mail_store()
+        if store is None:
+            return emails_data
+            
+        extractor = self.attachment_extractor
+        for email_data in emails_data:
+            i = email_data.id
+            if self._restore_cached_email(email_data):
+                if extractor is not None:
+                    extractor.submit(email_data)
+                continue
+            try:
+                with self.telemetry.measure("fetch_email_detail"):
+                    if extractor is not None:
+                        details = store.get_details(email_data.entry_id, email_data.has_attachments,
+                                                    extractor.temp_dir, extractor.max_bytes)
+                    else:
+                        details = store.get_details(email_data.entry_id, email_data.has_attachments)
+                    email_data.body = details["body"]
+                    if email_data.has_attachments:
+                        email_data.attachments = [AttachmentRecord(**a) for a in details["attachments"]]
+                        if extractor is not None:
+                            # 抽出は別プロセスで進め、ここでは結果を待たない
+                            extractor.submit(email_data)
+                    if self.cache is not None:
+                        self.cache.put_email(email_data)
+                print(f"  メール {i} の情報を取得しました: {email_data.subject}")
+                
+            except Exception as e:
+                print(f"  メール {i} の処理中にエラー: {e}")
+                traceback.print_exc()
         
-        return email_data
+        return emails_data
 
-    def _get_attachments_info(self, email):
-        """メールの添付ファイル情報を取得"""
-        attachments_info = []
-        try:
-            for j in range(1, email.Attachments.Count + 1):
-                attachment = email.Attachments.Item(j)
-                attachments_info.append({
-                    "filename": attachment.FileName,
-                    "size": attachment.Size
-                })
-        except Exception as e:
-            print(f"  添付ファイル情報取得中にエラー: {e}")
-        return attachments_info
+    def _restore_cached_email(self, email_data):
+        """キャッシュに同じ更新日時のメールがあれば本文と添付ファイル情報を復元"""
+        if self.cache is None:
+            return False
+        cached = self.cache.get_email(email_data.entry_id, email_data.last_modified)
+        if cached is None:
+            return False
+        self.telemetry.count("email_cache_hits")
+        email_data.body = cached.body
+        email_data.attachments = cached.attachments
+        return True
+
+    def _process_email(self, row, index):
+        """Tableの行データからメール情報を作成（本文は fetch_email_bodies で取得）"""
+        email_data = EmailRecord.from_row(row, index)
+        email_data.body = ""
+        return email_data
 
     def get_calendar_events(self, days_ahead=7):
         """予定を取得"""
@@ -133,7 +262,7 @@ class OutlookClient:
             # カレンダーフォルダを取得
             print("カレンダーフォルダにアクセス中...")
             try:
-                calendar = self.namespace.GetDefaultFolder(9)  # 9はカレンダーを表す定数
+                calendar = self._com_namespace().GetDefaultFolder(9)  # 9はカレンダーを表す定数
             except Exception as e:
                 print(f"カレンダーフォルダの取得に失敗しました: {e}")
                 return events_data
@@ -141,15 +270,13 @@ class OutlookClient:
             # 日付範囲を設定
             start_date = datetime.now()
             end_date = start_date + timedelta(days=days_ahead)
-            start_date_str = start_date.strftime("%m/%d/%Y %H:%M %p")
-            end_date_str = end_date.strftime("%m/%d/%Y %H:%M %p")
             
-            # 指定期間内の予定を取得
+            # 指定期間と重なる予定を取得（定期的な予定は各回に展開する）
             try:
-                filter_string = f"[Start] >= '{start_date_str}' AND [End] <= '{end_date_str}'"
-                appointments = calendar.Items.Restrict(filter_string)
-                appointments.Sort("[Start]")  # 開始日時でソート
-                print(f"期間内の予定数: {appointments.Count}")
+                items = calendar.Items
+                items.Sort("[Start]")  # IncludeRecurrences は Sort の後に設定する必要がある
+                items.IncludeRecurrences = True
+                appointments = items.Restrict(to_filter(overlap_condition(start_date, end_date)))
             except Exception as e:
                 print(f"予定の取得に失敗しました: {e}")
                 traceback.print_exc()
@@ -158,22 +285,33 @@ class OutlookClient:
             # 各予定を処理
             print(f"予定を取得中... ({start_date.strftime('%Y/%m/%d')} から {end_date.strftime('%Y/%m/%d')} まで)")
             
-            if appointments.Count == 0:
+            # 定期的な予定を展開した場合は Count が正しく取得できないため、GetFirst/GetNext で列挙する
+            i = 0
+            appointment = appointments.GetFirst()
+            while appointment is not None:
+                i += 1
+                try:
+                    with self.telemetry.measure("process_appointment"):
+                        event_data = self._get_cached_appointment(appointment, i)
+                        if event_data is None:
+                            event_data = self._process_appointment(appointment, i)
+                            if self.cache is not None:
+                                self.cache.put_event(event_data)
+                    events_data.append(event_data)
+                    
+                    # 簡易情報を表示
+                    start_time = appointment.Start.strftime("%Y/%m/%d %H:%M") if hasattr(appointment, "Start") else "不明"
+                    print(f"  予定 {i}: {start_time} - {event_data.subject}")
+                    
+                except Exception as e:
+                    print(f"  予定 {i} の処理中にエラー: {e}")
+                    traceback.print_exc()
+                appointment = appointments.GetNext()
+            
+            if i == 0:
                 print("  指定期間内に予定はありません。")
             else:
-                for i in range(1, appointments.Count + 1):
-                    try:
-                        appointment = appointments.Item(i)
-                        event_data = self._process_appointment(appointment, i)
-                        events_data.append(event_data)
-                        
-                        # 簡易情報を表示
-                        start_time = appointment.Start.strftime("%Y/%m/%d %H:%M") if hasattr(appointment, "Start") else "不明"
-                        print(f"  予定 {i}: {start_time} - {event_data['subject']}")
-                        
-                    except Exception as e:
-                        print(f"  予定 {i} の処理中にエラー: {e}")
-                        traceback.print_exc()
+                print(f"期間内の予定数: {i}")
             
             return events_data
             
@@ -182,30 +320,44 @@ class OutlookClient:
             traceback.print_exc()
             return events_data
 
+    def _get_cached_appointment(self, appointment, index):
+        """キャッシュに同じ更新日時の予定があれば返す"""
+        if self.cache is None:
+            return None
+        cached = self.cache.get_event(
+            getattr(appointment, "EntryID", ""),
+            to_datetime(getattr(appointment, "Start", None)),
+            to_datetime(getattr(appointment, "LastModificationTime", None))
+        )
+        if cached is not None:
+            cached.id = index
+            self.telemetry.count("event_cache_hits")
+        return cached
+
     def _process_appointment(self, appointment, index):
         """予定オブジェクトからデータを抽出"""
-        event_data = {
-            "id": index,
-            "subject": getattr(appointment, "Subject", ""),
-            "start": str(getattr(appointment, "Start", "")),
-            "end": str(getattr(appointment, "End", "")),
-            "location": getattr(appointment, "Location", ""),
-            "body": getattr(appointment, "Body", "").strip(),
-            "organizer": getattr(appointment, "Organizer", ""),
-            "is_recurring": getattr(appointment, "IsRecurring", False),
-            "is_all_day_event": getattr(appointment, "AllDayEvent", False),
-            "importance": str(getattr(appointment, "Importance", "")),
-            "sensitivity": str(getattr(appointment, "Sensitivity", "")),
-            "meeting_status": str(getattr(appointment, "MeetingStatus", "")),
-        }
+        event_data = EventRecord(
+            id=index,
+            entry_id=getattr(appointment, "EntryID", ""),
+            last_modified=to_datetime(getattr(appointment, "LastModificationTime", None)),
+            subject=getattr(appointment, "Subject", ""),
+            start=to_datetime(getattr(appointment, "Start", None)),
+            end=to_datetime(getattr(appointment, "End", None)),
+            location=getattr(appointment, "Location", ""),
+            body=getattr(appointment, "Body", "").strip(),
+            organizer=getattr(appointment, "Organizer", ""),
+            is_recurring=bool(getattr(appointment, "IsRecurring", False)),
+            is_all_day_event=bool(getattr(appointment, "AllDayEvent", False)),
+            importance=getattr(appointment, "Importance", None),
+            sensitivity=getattr(appointment, "Sensitivity", None),
+            meeting_status=getattr(appointment, "MeetingStatus", None),
+        )
         
         # 参加者情報の取得
         self._add_attendees_info(appointment, event_data)
         
         # オンライン会議URLの抽出
-        meeting_url = self._extract_meeting_url(event_data["body"])
-        if meeting_url:
-            event_data["meeting_url"] = meeting_url
+        event_data.meeting_url = self._extract_meeting_url(event_data.body)
             
         return event_data
 
@@ -213,32 +365,13 @@ class OutlookClient:
         """予定の参加者情報を取得"""
         try:
             if hasattr(appointment, "RequiredAttendees"):
-                event_data["required_attendees"] = appointment.RequiredAttendees
+                event_data.required_attendees = appointment.RequiredAttendees
             if hasattr(appointment, "OptionalAttendees"):
-                event_data["optional_attendees"] = appointment.OptionalAttendees
+                event_data.optional_attendees = appointment.OptionalAttendees
         except Exception as e:
             print(f"  参加者情報取得中にエラー: {e}")
 
     def _extract_meeting_url(self, body):
-        """本文からオンライン会議URLを抽出"""
-        try:
-            body = body.lower()
-            
-            # Teams会議リンクの検索
-            if "teams.microsoft.com" in body:
-                teams_pattern = r'https://teams\.microsoft\.com/l/meetup-join/[^\s<>"]+'
-                teams_match = re.search(teams_pattern, body)
-                if teams_match:
-                    return teams_match.group(0)
-            
-            # Zoom会議リンクの検索
-            elif "zoom.us" in body:
-                zoom_pattern = r'https://[a-zA-Z0-9-.]+zoom\.us/[^\s<>"]+'
-                zoom_match = re.search(zoom_pattern, body)
-                if zoom_match:
-                    return zoom_match.group(0)
-                    
-            return None
-            
-        except Exception:
-            return None
+        """本文からオンライン会議URLを抽出（Teams・Zoom・Google Meet・Webexのうち本文中で最初のもの）"""
+        links = extract_meeting_links(body)
+        return links[0].url if links else None
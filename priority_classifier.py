@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+優先度分類モジュール
+
+設定の優先ドメインと優先キーワードを一度だけコンパイルし、大量のメールを
+ローカルで高速に採点する。ドメインはサフィックスの集合として保持し、
+キーワードはAho-Corasick法の照合器にまとめることで、件名と本文をそれぞれ
+1回走査するだけで全キーワードを検出する。
+"""
+
+from collections import deque
+from datetime import datetime
+
+# スコアの重み
+DOMAIN_WEIGHT = 3.0
+SUBJECT_KEYWORD_WEIGHT = 2.0
+BODY_KEYWORD_WEIGHT = 1.0
+ATTACHMENT_WEIGHT = 0.5
+RECENCY_WEIGHT = 2.0
+RECENCY_HOURS = 72
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick法による複数キーワードの同時照合
+
+    失敗遷移をあらかじめ展開した決定性オートマトンとして保持し、1文字あたり
+    辞書参照1回で走査する。英字の大文字・小文字は区別しない。
+    """
+
+    def __init__(self, keywords):
+        """
+        初期化
+
+        Args:
+            keywords (list): 照合するキーワードのリスト
+        """
+        self.keywords = [k for k in dict.fromkeys(k.lower() for k in keywords) if k]
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for index, keyword in enumerate(self.keywords):
+            self._add(keyword, index)
+        self._build_failure_links()
+        self._delta = self._build_transitions()
+
+    def _add(self, keyword, index):
+        """キーワードをトライ木に追加"""
+        state = 0
+        for ch in keyword:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[state][ch] = next_state
+            state = next_state
+        self._output[state] = self._output[state] + (index,)
+
+    def _build_failure_links(self):
+        """幅優先で失敗遷移と出力を設定"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def _build_transitions(self):
+        """失敗遷移を展開した状態遷移表を作成"""
+        delta = [None] * len(self._goto)
+        delta[0] = dict(self._goto[0])
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            transitions = dict(delta[self._fail[state]])
+            transitions.update(self._goto[state])
+            delta[state] = transitions
+            queue.extend(self._goto[state].values())
+        return delta
+
+    def find(self, text):
+        """
+        テキストに含まれるキーワードを検出
+
+        Args:
+            text (str): 対象のテキスト
+
+        Returns:
+            set: 見つかったキーワードの番号（self.keywords の添字）
+        """
+        found = set()
+        if not self.keywords or not text:
+            return found
+        delta, output = self._delta, self._output
+        state = 0
+        for ch in text.lower():
+            state = delta[state].get(ch, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class DomainMatcher:
+    """優先ドメインとそのサブドメインの判定"""
+
+    def __init__(self, domains):
+        """
+        初期化
+
+        Args:
+            domains (list): 優先ドメインのリスト
+        """
+        self.domains = frozenset(d.strip().lower().lstrip("@.") for d in domains if d.strip())
+
+    def match(self, email_address):
+        """
+        メールアドレスのドメインが優先ドメインに含まれるか判定
+
+        Args:
+            email_address (str): 送信者のメールアドレス
+
+        Returns:
+            str: 一致した優先ドメイン（一致しない場合はNone）
+        """
+        if not self.domains or "@" not in (email_address or ""):
+            return None
+        domain = email_address.rsplit("@", 1)[1].lower()
+        while True:
+            if domain in self.domains:
+                return domain
+            if "." not in domain:
+                return None
+            domain = domain.split(".", 1)[1]
+
+
+class PriorityClassifier:
+    def __init__(self, settings):
+        """
+        初期化
+
+        Args:
+            settings (dict): priority_domains と priority_keywords を含む設定
+        """
+        self.domain_matcher = DomainMatcher(settings["priority_domains"])
+        self.keyword_matcher = KeywordMatcher(settings["priority_keywords"])
+
+    def classify(self, email, now=None):
+        """
+        メールを採点
+
+        優先ドメインからの送信、件名・本文の優先キーワード、受信からの経過時間、
+        添付ファイルの有無を加点する。
+
+        Args:
+            email (EmailRecord): メール情報（本文がなくても採点できる）
+            now (datetime): 現在時刻（省略時は datetime.now()）
+
+        Returns:
+            dict: score（スコア）, priority（優先ドメインまたは優先キーワードに
+                該当するか）, domain（一致したドメイン）, keywords（一致したキーワード）
+        """
+        now = now or datetime.now()
+        score = 0.0
+
+        domain = self.domain_matcher.match(email.sender_email)
+        if domain:
+            score += DOMAIN_WEIGHT
+
+        subject_hits = self.keyword_matcher.find(email.subject)
+        body_hits = self.keyword_matcher.find(email.body) - subject_hits
+        score += SUBJECT_KEYWORD_WEIGHT * len(subject_hits) + BODY_KEYWORD_WEIGHT * len(body_hits)
+
+        if email.has_attachments:
+            score += ATTACHMENT_WEIGHT
+
+        received = email.received_time
+        if received is not None:
+            age_hours = max(0.0, (now - received).total_seconds() / 3600)
+            score += RECENCY_WEIGHT * max(0.0, 1 - age_hours / RECENCY_HOURS)
+
+        keywords = [self.keyword_matcher.keywords[i] for i in sorted(subject_hits | body_hits)]
+        return {
+            "score": score,
+            "priority": bool(domain or keywords),
+            "domain": domain,
+            "keywords": keywords,
+        }
+
+    def score(self, email, now=None):
+        """メールのスコアのみを返す"""
+        return self.classify(email, now)["score"]
+
+    def select(self, emails_data, max_emails, now=None):
+        """
+        スコアの高いメールを選択
+
+        Args:
+            emails_data (list): メールのリスト（受信日時の降順）
+            max_emails (int): 選択する最大件数
+            now (datetime): 現在時刻
+
+        Returns:
+            list: 選択したメール（元の順序を保つ）
+        """
+        now = now or datetime.now()
+        ranked = sorted(range(len(emails_data)),
+                        key=lambda i: (-self.score(emails_data[i], now), i))
+        return [emails_data[i] for i in sorted(ranked[:max_emails])]
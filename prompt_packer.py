@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+プロンプトパッキングモジュール
+
+メールごとに優先度スコアを計算し、指定したトークン予算の範囲でどのメールに
+どれだけ本文を含めるかを決める。優先度の高いメールほど本文を長く含め、
+低いメールは件名などの1行だけにする。
+"""
+
+import re
+from datetime import datetime
+
+from attachments import format_attachments
+from entity_extractor import format_deadline, format_entities
+from priority_classifier import PriorityClassifier
+from records import format_datetime
+from threads import format_thread_deltas
+
+# スコアに応じた本文の最大文字数（スコアの閾値, 最大文字数）
+BODY_TIERS = (
+    (4.0, 2000),
+    (2.0, 800),
+    (0.5, 300),
+)
+
+# 件名・送信者以外の見出しや書式にかかるトークン数の目安
+HEADER_ONLY_OVERHEAD_TOKENS = 8
+FULL_ENTRY_OVERHEAD_TOKENS = 20
+
+_WIDE_CHAR = re.compile(r'[　-鿿가-힯＀-￯]')
+
+
+def estimate_tokens(text):
+    """
+    テキストのトークン数を概算
+
+    日本語などの全角文字は1文字1トークン、それ以外は4文字1トークンとして数える。
+
+    Args:
+        text (str): 対象のテキスト
+
+    Returns:
+        int: 推定トークン数
+    """
+    wide = len(_WIDE_CHAR.findall(text))
+    return wide + (len(text) - wide + 3) // 4
+
+
+def _header_tokens(email):
+    """件名のみの1行（本文を省いても残す期限を含む）にかかるトークン数"""
+    header = f"{email.subject}{email.sender}{email.sender_email}{format_datetime(email.received_time)}"
+    if email.deadlines:
+        header += f" 期限: {', '.join(format_deadline(d) for d in email.deadlines)}"
+    return estimate_tokens(header) + HEADER_ONLY_OVERHEAD_TOKENS
+
+
+def _body_cap(score):
+    """スコアに応じた本文の最大文字数"""
+    for threshold, chars in BODY_TIERS:
+        if score >= threshold:
+            return chars
+    return 0
+
+
+class PromptPacker:
+    def __init__(self, token_budget):
+        """
+        初期化
+
+        Args:
+            token_budget (int): メール欄に使うトークン数の上限
+        """
+        self.token_budget = token_budget
+
+    def pack(self, emails_data, settings, now=None):
+        """
+        各メールに含める本文の文字数を決定
+
+        まず全メールの1行分を確保し、残りの予算をスコアの高い順に本文へ
+        割り当てる。1行分も入りきらない場合はスコアの低いメールから省く。
+
+        Args:
+            emails_data (list): 未読メールのリスト
+            settings (dict): カスタム設定
+            now (datetime): 現在時刻
+
+        Returns:
+            list: 元の順序での (メール, 本文の文字数) のリスト。
+                本文の文字数が None のメールは件名のみを出力する。
+                予算に入らなかったメールは含まれない。
+        """
+        classifier = PriorityClassifier(settings)
+        now = now or datetime.now()
+        scored = sorted(
+            ((classifier.score(email, now), i, email) for i, email in enumerate(emails_data)),
+            key=lambda entry: (-entry[0], entry[1])
+        )
+
+        remaining = self.token_budget
+        included = []
+        for score, i, email in scored:
+            cost = _header_tokens(email)
+            if remaining < cost:
+                break
+            remaining -= cost
+            included.append((score, i, email))
+
+        allocation = {}
+        for score, i, email in included:
+            cap = _body_cap(score)
+            body = email.body
+            extra = (FULL_ENTRY_OVERHEAD_TOKENS + estimate_tokens(format_thread_deltas(email))
+                     + estimate_tokens(format_attachments(email)) + estimate_tokens(format_entities(email)))
+            if cap == 0 or not body or remaining < extra:
+                allocation[i] = None
+                continue
+            remaining -= extra
+            text = body[:cap]
+            while text and estimate_tokens(text) > remaining:
+                text = text[:len(text) // 2]
+            if not text:
+                remaining += extra
+                allocation[i] = None
+                continue
+            remaining -= estimate_tokens(text)
+            allocation[i] = len(text)
+
+        return [(emails_data[i], allocation[i]) for i in sorted(allocation)]
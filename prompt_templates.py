@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+プロンプトテンプレートモジュール
+
+レポート作成用プロンプトの見出し・メール・予定・分析指示をテンプレートとして
+定義する。テンプレートはモジュールの読み込み時に1回だけ解析しておき、
+描画時は各部分をリストに追加して最後に1回だけ連結する。分析指示は
+レポートスタイル（detailed / concise）ごとに別のテンプレートを持つ。
+
+プロンプトは、実行ごとに変わらない部分（役割・ガイドライン・分析指示）と、
+実行ごとに変わる部分（日付・メール・予定）に分けて作成する。変わらない部分は
+システムプロンプトの後ろに置き、プロンプトキャッシュの対象にする。
+"""
+
+import string
+from datetime import datetime
+
+from attachments import format_attachments
+from entity_extractor import format_deadline, format_entities
+from prompt_packer import PromptPacker
+from records import Record, format_datetime
+from threads import format_thread_deltas
+
+# 本文の文字数を指定しない場合にメール1件あたりに含める本文の文字数
+DEFAULT_BODY_CHARS = 500
+
+
+class Template:
+    """
+    {name} 形式のプレースホルダを持つテンプレート
+
+    作成時にテンプレートを1回だけ解析して、リテラルとプレースホルダの並びとして保持する。
+    描画時は並びの順に値を書式化してリストに追加し、最後に1回だけ連結する。
+    {name:spec} の書式指定も使える。
+    """
+
+    def __init__(self, text):
+        """
+        初期化
+
+        Args:
+            text (str): テンプレート（{ と } そのものは {{ と }} と書く）
+        """
+        self.text = text
+        self.fields = []
+        # 最初のプレースホルダより前のリテラルと、(名前, 書式指定, 直後のリテラル) の並び
+        self._head = ""
+        self._parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if self._parts:
+                name, field_spec, following = self._parts[-1]
+                self._parts[-1] = (name, field_spec, following + literal)
+            else:
+                self._head += literal
+            if field is None:
+                continue
+            if not field.isidentifier() or conversion:
+                raise ValueError(f"テンプレートのプレースホルダが不正です: {{{field}}}")
+            self.fields.append(field)
+            self._parts.append((field, spec, ""))
+
+    def render(self, values):
+        """
+        テンプレートを描画
+
+        Args:
+            values (dict): プレースホルダの名前から値への辞書
+
+        Returns:
+            str: 描画した文字列
+        """
+        out = [self._head]
+        append = out.append
+        for name, spec, following in self._parts:
+            append(format(values[name], spec))
+            append(following)
+        return "".join(out)
+
+
+# 実行ごとに変わらない部分（プロンプトキャッシュの対象）の先頭
+GUIDELINES = Template("""
+あなたは経験豊富なエグゼクティブアシスタントです。
+ユーザーのメッセージで渡す今日の日付・未読メール・予定を基に、効率的なタスク管理と意思決定をサポートするレポートを作成してください。
+
+# 分析のためのガイドライン
+- 優先ドメイン: {priority_domains}
+- 優先キーワード: {priority_keywords}
+- 勤務時間: {working_start}時～{working_end}時
+- 集中作業時間: {focus_start}時～{focus_end}時
+- レポートスタイル: {report_style}
+""")
+
+# 実行ごとに変わる部分の先頭
+HEADER = Template("""
+今日は{today}です。
+
+# 未読メール（最新{email_count}件）
+""")
+
+NO_EMAILS = "未読メールはありません。\n\n"
+
+EMAIL_SUMMARIES = Template("\n以下は全メールの要約です。\n\n{summaries}\n\n")
+
+EMAIL = Template("""
+## メール {number}: {subject}
+- 送信者: {sender} ({sender_email})
+- 受信日時: {received_time}
+- 添付ファイル: {attachments}{thread}{entities}
+
+{body}
+
+""")
+
+EMAIL_HEADER_ONLY_SECTION = "\n## その他のメール（件名のみ）\n"
+
+EMAIL_HEADER_ONLY = Template("- メール {number}: {subject}（{sender} <{sender_email}>, {received_time}{thread}）{deadlines}\n")
+
+EMAILS_OMITTED = Template("\n※優先度の低いメール{count}件は省略しています。\n")
+
+EVENTS_HEADER = Template("\n# 今後{event_count}件の予定\n")
+
+NO_EVENTS = "予定はありません。\n\n"
+
+EVENT_DATE = Template("\n## {date}\n")
+
+EVENT = Template("""
+- {start}～{end} {subject}
+  場所: {location}
+  {meeting_url}
+  {attendees}{entities}
+""")
+
+UNDATED_EVENTS_HEADER = "\n## 日時不明\n"
+
+UNDATED_EVENT = Template("- {subject}\n")
+
+CALENDAR_FACTS = Template("\n# 予定の重複と空き時間（計算済み）\n以下は予定表から計算した事実です。予定分析ではこの結果をそのまま使ってください。\n\n{facts}\n")
+
+# レポートスタイルごとの分析指示（プレースホルダを持たないため文字列のまま使う）
+INSTRUCTIONS = {
+    "detailed": """
+# 分析とレポート作成の指示
+
+## 1. メール分析
+- メールを「緊急対応」「今日中に対応」「週内対応」「情報のみ」に分類してください
+- 各カテゴリのメールについて簡潔な要約と推奨アクションを提示してください
+- 特に優先ドメインや優先キーワードを含むメールに注目してください
+
+## 2. 予定分析
+- 今後の予定を時系列で整理し、準備が必要なものを特定してください
+- 予定と予定の間の移動時間や準備時間を考慮した現実的なスケジュールを提案してください
+- 集中作業時間を確保できるよう、予定の調整案があれば提示してください
+
+## 3. タスク管理
+- メールと予定から抽出した具体的なタスクリストを作成してください
+- 各タスクに優先度（高/中/低）と対応期限を設定してください
+- 「今日必ず完了すべきこと」のショートリスト（3項目以内）を提示してください
+
+## 4. 今後の計画
+- 今日から1週間の効率的な業務計画を提案してください
+- 重要な締め切りや準備が必要なイベントを強調してください
+- 週末までに完了すべき主要タスクを特定してください
+
+秘書としての経験と判断力を活かし、意思決定を支援する具体的で実用的なアドバイスを提供してください。
+情報の重要度に応じて簡潔にまとめ、すぐに行動に移せる形式で提示してください。
+
+必ずMarkdown形式でレポートを作成してください。見出し、箇条書き、強調などのMarkdown記法を適切に活用して、読みやすく構造化されたレポートにしてください。
+""",
+    "concise": """
+# 分析とレポート作成の指示
+
+以下の3つの見出しだけで、要点を短くまとめてください。
+
+## 1. 対応が必要なメール
+- 「緊急対応」「今日中に対応」のメールだけを、1件1行（件名と推奨アクション）で挙げてください
+- 優先ドメインや優先キーワードを含むメールを優先してください
+
+## 2. 注意が必要な予定
+- 準備が必要な予定と、重複や集中作業時間との重なりだけを挙げてください
+
+## 3. 今日やること
+- 「今日必ず完了すべきこと」を3項目以内で挙げてください
+
+必ずMarkdown形式で、箇条書きを中心に作成してください。
+""",
+}
+
+
+def _email_values(number, email, body_chars):
+    """メール1件分のテンプレートの値"""
+    body = email.body
+    return {
+        "number": number,
+        "subject": email.subject,
+        "sender": email.sender,
+        "sender_email": email.sender_email,
+        "received_time": format_datetime(email.received_time),
+        "attachments": format_attachments(email),
+        "thread": format_thread_deltas(email),
+        "entities": format_entities(email),
+        "body": body[:body_chars] + ("..." if len(body) > body_chars else ""),
+    }
+
+
+def _header_only_values(number, email):
+    """件名のみのメール1件分のテンプレートの値"""
+    return {
+        "number": number,
+        "subject": email.subject,
+        "sender": email.sender,
+        "sender_email": email.sender_email,
+        "received_time": format_datetime(email.received_time),
+        "thread": f", スレッド{email.thread_count}件" if email.thread_count > 1 else "",
+        # 本文を省いても期限だけは残す
+        "deadlines": f" 期限: {', '.join(format_deadline(d) for d in email.deadlines)}" if email.deadlines else "",
+    }
+
+
+def _event_values(event):
+    """予定1件分のテンプレートの値"""
+    return {
+        "start": format_datetime(event.start, "%H:%M"),
+        "end": format_datetime(event.end, "%H:%M"),
+        "subject": event.subject,
+        "location": event.location,
+        "meeting_url": "オンライン会議URL: " + event.meeting_url if event.meeting_url else "",
+        "attendees": "参加者: " + event.required_attendees if event.required_attendees else "",
+        # 会議URLは meeting_url で表示するため、期限と依頼だけを含める
+        "entities": format_entities(event, indent="  ", meeting_links=False),
+    }
+
+
+class Prompt(Record):
+    """
+    レポート作成用のプロンプト
+
+    prefix は設定が同じなら毎回同じになる部分（ガイドラインと分析指示）で、
+    ClaudeClient がシステムプロンプトの後ろに cache_control 付きで置く。
+    body は日付・メール・予定などの実行ごとに変わる部分で、ユーザーのメッセージになる。
+    """
+
+    __slots__ = ("prefix", "body")
+    _defaults = {"prefix": "", "body": ""}
+
+    def text(self):
+        """1つの文字列にしたプロンプト（文字数の集計やキャッシュ以外の用途向け）"""
+        return self.prefix + self.body
+
+
+class PromptRenderer:
+    def __init__(self, settings):
+        """
+        初期化
+
+        Args:
+            settings (dict): カスタム設定
+        """
+        self.settings = settings
+        self.instructions = INSTRUCTIONS.get(settings.get("report_style"), INSTRUCTIONS["detailed"])
+        self.prefix = self._render_prefix()
+
+    def render(self, emails_data, events_data, email_summaries=None, token_budget=None,
+               calendar_facts=None, today=None):
+        """
+        プロンプトを描画
+
+        引数の意味は ClaudeClient.create_prompt と同じ。
+
+        Args:
+            today (datetime): 今日の日付（省略時は datetime.now()）
+
+        Returns:
+            Prompt: Claudeに送るプロンプト
+        """
+        out = []
+        out.append(HEADER.render({
+            "today": (today or datetime.now()).strftime("%Y年%m月%d日"),
+            "email_count": len(emails_data),
+        }))
+        self._render_emails(out, emails_data, email_summaries, token_budget)
+        self._render_events(out, events_data)
+        if calendar_facts:
+            out.append(CALENDAR_FACTS.render({"facts": calendar_facts}))
+        return Prompt(prefix=self.prefix, body="".join(out))
+
+    def _render_prefix(self):
+        """ガイドラインと分析指示（設定が同じなら毎回同じ文字列）を描画"""
+        settings = self.settings
+        guidelines = GUIDELINES.render({
+            "priority_domains": ", ".join(settings["priority_domains"]),
+            "priority_keywords": ", ".join(settings["priority_keywords"]),
+            "working_start": settings["working_hours"]["start"],
+            "working_end": settings["working_hours"]["end"],
+            "focus_start": settings["focus_time"]["start"],
+            "focus_end": settings["focus_time"]["end"],
+            "report_style": settings["report_style"],
+        })
+        return guidelines + self.instructions
+
+    def _render_emails(self, out, emails_data, email_summaries, token_budget):
+        """メール欄を描画"""
+        if not emails_data:
+            out.append(NO_EMAILS)
+        elif email_summaries is not None:
+            out.append(EMAIL_SUMMARIES.render({"summaries": email_summaries}))
+        elif token_budget is not None:
+            self._render_packed_emails(out, emails_data, token_budget)
+        else:
+            render = EMAIL.render
+            out.extend(render(_email_values(i, email, DEFAULT_BODY_CHARS))
+                       for i, email in enumerate(emails_data, 1))
+
+    def _render_packed_emails(self, out, emails_data, token_budget):
+        """トークン予算に合わせて本文量を調整したメール欄を描画"""
+        packed = PromptPacker(token_budget).pack(emails_data, self.settings)
+        header_only = []
+        for i, (email, body_chars) in enumerate(packed, 1):
+            if body_chars is None:
+                header_only.append(EMAIL_HEADER_ONLY.render(_header_only_values(i, email)))
+            else:
+                out.append(EMAIL.render(_email_values(i, email, body_chars)))
+
+        if header_only:
+            out.append(EMAIL_HEADER_ONLY_SECTION)
+            out.extend(header_only)
+        omitted = len(emails_data) - len(packed)
+        if omitted:
+            out.append(EMAILS_OMITTED.render({"count": omitted}))
+        out.append("\n")
+
+    def _render_events(self, out, events_data):
+        """予定欄を描画（開始日時で1回だけソートし、日付ごとにまとめる）"""
+        out.append(EVENTS_HEADER.render({"event_count": len(events_data)}))
+        if not events_data:
+            out.append(NO_EVENTS)
+            return
+
+        current_date = None
+        for event in sorted((e for e in events_data if e.start is not None), key=lambda e: e.start):
+            date = event.start.date()
+            if date != current_date:
+                out.append(EVENT_DATE.render({"date": date.strftime("%Y年%m月%d日(%a)")}))
+                current_date = date
+            out.append(EVENT.render(_event_values(event)))
+
+        undated = [e for e in events_data if e.start is None]
+        if undated:
+            out.append(UNDATED_EVENTS_HEADER)
+            out.extend(UNDATED_EVENT.render({"subject": e.subject}) for e in undated)
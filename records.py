@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+レコードモジュール
+
+メールと予定を表す型付きのレコード。日時はdatetimeのまま、フラグはboolのまま
+保持し、取得・キャッシュ・分類・プロンプト作成の各段で共有する。__slots__ を
+使うため、数万件を保持してもメモリ消費を抑えられる。to_dict / from_dict で
+JSONに変換してディスクに保存できる。
+"""
+
+from datetime import datetime
+
+
+def to_datetime(value):
+    """
+    OutlookやJSONから得た日時をタイムゾーン情報なしのdatetimeに変換
+
+    pywin32が返す日時（pywintypes.datetime）は datetime のサブクラスのため、
+    そのまま扱える。Outlookの日時はローカル時刻のため、タイムゾーン情報は捨てる。
+
+    Args:
+        value: datetime、ISO 8601形式の文字列、またはNone
+
+    Returns:
+        datetime: 変換した日時（変換できない場合はNone）
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day, value.hour,
+                        value.minute, value.second, value.microsecond)
+    try:
+        return datetime.fromisoformat(str(value)).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def format_datetime(value, fmt="%Y-%m-%d %H:%M"):
+    """日時の表示用文字列（Noneの場合は空文字列）"""
+    return value.strftime(fmt) if value is not None else ""
+
+
+class Record:
+    """
+    レコードの基底クラス
+
+    サブクラスは __slots__ にフィールドを列挙し、_defaults に既定値（リストと辞書は
+    インスタンスごとに複製する）、_datetime_fields に日時のフィールド、_nested_fields に
+    レコードのリストを持つフィールドとその型を指定する。
+    """
+
+    __slots__ = ()
+    _defaults = {}
+    _datetime_fields = ()
+    _nested_fields = {}
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            if name in fields:
+                value = fields.pop(name)
+            else:
+                value = self._defaults.get(name)
+                if isinstance(value, (list, dict)):
+                    value = value.copy()
+            setattr(self, name, value)
+        if fields:
+            raise TypeError(f"{type(self).__name__} に不明なフィールドがあります: {', '.join(fields)}")
+
+    def copy(self, **changes):
+        """一部のフィールドを変更した複製を作成"""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return type(self)(**fields)
+
+    def to_dict(self):
+        """
+        JSONに変換できる辞書を作成
+
+        Returns:
+            dict: 日時はISO 8601形式の文字列にした辞書
+        """
+        data = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if name in self._datetime_fields and value is not None:
+                value = value.isoformat()
+            elif name in self._nested_fields:
+                value = [item.to_dict() for item in value]
+            data[name] = value
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        to_dict で作成した辞書からレコードを復元
+
+        未知のキーは無視する。
+        """
+        fields = {}
+        for name in cls.__slots__:
+            if name not in data:
+                continue
+            value = data[name]
+            if name in cls._datetime_fields:
+                value = to_datetime(value)
+            elif name in cls._nested_fields:
+                value = [cls._nested_fields[name].from_dict(item) for item in value or []]
+            fields[name] = value
+        return cls(**fields)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__[:3])
+        return f"{type(self).__name__}({fields}, ...)"
+
+
+class AttachmentRecord(Record):
+    """添付ファイルの情報（path は保存先、text は抽出したテキスト）"""
+
+    __slots__ = ("filename", "size", "path", "content_hash", "text")
+    _defaults = {"filename": "", "size": 0, "path": None, "content_hash": None, "text": None}
+
+
+class ThreadDelta(Record):
+    """スレッド内の過去のメールの差分"""
+
+    __slots__ = ("entry_id", "sender", "received_time", "excerpt")
+    _defaults = {"entry_id": "", "sender": "", "excerpt": ""}
+    _datetime_fields = ("received_time",)
+
+
+class MeetingLink(Record):
+    """本文から抽出したオンライン会議のURL（provider は teams / zoom / meet / webex）"""
+
+    __slots__ = ("provider", "url")
+    _defaults = {"provider": "", "url": ""}
+
+
+class Deadline(Record):
+    """本文から抽出した期限（text は本文中の表現、due は解釈した日時で、解釈できない場合はNone）"""
+
+    __slots__ = ("text", "due")
+    _defaults = {"text": ""}
+    _datetime_fields = ("due",)
+
+
+class EmailRecord(Record):
+    """メール"""
+
+    __slots__ = (
+        "id", "entry_id", "subject", "sender", "sender_email",
+        "received_time", "last_modified", "conversation_topic", "conversation_index",
+        "has_attachments", "attachments", "body", "raw_body",
+        "thread_count", "thread_messages",
+        "meeting_links", "deadlines", "action_items",
+    )
+    _defaults = {
+        "id": 0, "entry_id": "", "subject": "", "sender": "", "sender_email": "",
+        "conversation_topic": "", "conversation_index": "",
+        "has_attachments": False, "attachments": [], "body": "", "raw_body": None,
+        "thread_count": 1, "thread_messages": [],
+        "meeting_links": [], "deadlines": [], "action_items": [],
+    }
+    _datetime_fields = ("received_time", "last_modified")
+    _nested_fields = {"attachments": AttachmentRecord, "thread_messages": ThreadDelta,
+                      "meeting_links": MeetingLink, "deadlines": Deadline}
+
+    @classmethod
+    def from_row(cls, row, index=0):
+        """
+        メールストアの行データから作成
+
+        Args:
+            row (dict): MailStore.iter_unread_rows が返す行（"body" があれば本文も使う）
+            index (int): 実行中の通し番号
+
+        Returns:
+            EmailRecord: 作成したレコード
+        """
+        return cls(
+            id=index,
+            entry_id=row.get("entry_id") or "",
+            subject=row.get("subject") or "",
+            sender=row.get("sender") or "",
+            sender_email=row.get("sender_email") or "",
+            received_time=to_datetime(row.get("received_time")),
+            last_modified=to_datetime(row.get("last_modified")),
+            conversation_topic=row.get("conversation_topic") or "",
+            conversation_index=row.get("conversation_index") or "",
+            has_attachments=bool(row.get("has_attachments")),
+            body=(row.get("body") or "").strip(),
+        )
+
+
+class EventRecord(Record):
+    """予定"""
+
+    __slots__ = (
+        "id", "entry_id", "last_modified", "subject", "start", "end",
+        "location", "body", "organizer", "is_recurring", "is_all_day_event",
+        "importance", "sensitivity", "meeting_status",
+        "required_attendees", "optional_attendees", "meeting_url",
+        "meeting_links", "deadlines", "action_items",
+    )
+    _defaults = {
+        "id": 0, "entry_id": "", "subject": "", "location": "", "body": "", "organizer": "",
+        "is_recurring": False, "is_all_day_event": False,
+        "importance": None, "sensitivity": None, "meeting_status": None,
+        "required_attendees": None, "optional_attendees": None, "meeting_url": None,
+        "meeting_links": [], "deadlines": [], "action_items": [],
+    }
+    _datetime_fields = ("last_modified", "start", "end")
+    _nested_fields = {"meeting_links": MeetingLink, "deadlines": Deadline}
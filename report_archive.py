@@ -0,0 +1,482 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+レポートアーカイブモジュール
+
+作成したレポートを、実行ID・利用者・設定のハッシュ・トークン数とともにSQLiteに保存し、
+FTS5の全文検索インデックスに登録する。トークナイザーには trigram を使うため、
+単語を空白で区切らない日本語でも部分一致で検索できる。「この取引先の期限が最初に
+レポートに現れたのはいつか」のような検索を、何年分のレポートに対しても1秒以内に行える。
+
+レポートの「タスク管理」（簡潔スタイルでは「今日やること」）の箇条書きはタスクとして
+別に保存し、同じ利用者の前回のレポートと比べて、追加されたタスクとなくなったタスクを表示する。
+
+使用方法:
+python report_archive.py search QUERY [--user NAME] [--since YYYY-MM-DD] [--until YYYY-MM-DD] [--first] [--limit N]
+python report_archive.py diff [REPORT_ID] [--user NAME]
+python report_archive.py import FILE [FILE ...] [--user NAME]
+"""
+
+import argparse
+import getpass
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from datetime import datetime
+
+from records import Record, format_datetime, to_datetime
+
+DEFAULT_ARCHIVE_PATH = "report_archive.sqlite3"
+
+# trigram トークナイザーで全文検索インデックスを使える最短の文字数（短い場合は LIKE で検索する）
+MIN_MATCH_CHARS = 3
+
+# タスクとして扱う箇条書きの見出し
+TASK_HEADINGS = ("タスク", "やること")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    user TEXT NOT NULL,
+    run_id TEXT,
+    settings_hash TEXT,
+    path TEXT,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    cache_read_input_tokens INTEGER,
+    cache_creation_input_tokens INTEGER,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_user_created ON reports (user, created_at);
+CREATE INDEX IF NOT EXISTS reports_created ON reports (created_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5(
+    content, content='reports', content_rowid='id', tokenize='trigram'
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    report_id INTEGER NOT NULL REFERENCES reports (id),
+    position INTEGER NOT NULL,
+    task_key TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (report_id, position)
+);
+"""
+
+# 箇条書きの行（- / * / + / 1. と、任意のチェックボックス）
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+(?:\[[ xX]\]\s*)?(.+)$")
+_HEADING = re.compile(r"^\s*#{1,6}\s+(.+)$")
+_MARKUP = re.compile(r"\*\*|__|`|~~")
+# 「（優先度: 高）」「(期限: 5/1)」のような補足は比較に使わない
+_ANNOTATION = re.compile(r"[（(][^（）()]*[:：][^（）()]*[）)]\s*$")
+
+# レポートのファイル名に含まれる日時（assistant_report_20250131_090000.md など）
+_FILENAME_TIMESTAMP = re.compile(r"(\d{8}_\d{6})")
+
+
+class ArchivedReport(Record):
+    """アーカイブに保存したレポート（content は検索結果では抜粋）"""
+
+    __slots__ = ("id", "created_at", "user", "run_id", "settings_hash", "path",
+                 "input_tokens", "output_tokens", "content")
+    _datetime_fields = ("created_at",)
+
+
+class Task(Record):
+    """レポートのタスク（key は比較用に正規化した文字列）"""
+
+    __slots__ = ("key", "text")
+    _defaults = {"key": "", "text": ""}
+
+
+class TaskDiff(Record):
+    """前回のレポートとのタスクの差分"""
+
+    __slots__ = ("report", "previous", "added", "removed", "kept")
+    _defaults = {"added": [], "removed": [], "kept": []}
+
+
+def settings_hash(settings):
+    """
+    設定のハッシュ（同じ設定で作成したレポートどうしを比べるために保存する）
+
+    Args:
+        settings (dict): カスタム設定
+
+    Returns:
+        str: SHA-256の先頭16文字
+    """
+    encoded = json.dumps(settings, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def task_key(text):
+    """タスクの比較用の文字列（全角・半角、強調記号、空白、末尾の補足の違いを無視する）"""
+    text = unicodedata.normalize("NFKC", _MARKUP.sub("", text))
+    text = _ANNOTATION.sub("", text.strip())
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def extract_tasks(content):
+    """
+    レポートからタスクの箇条書きを取り出す
+
+    「タスク」または「やること」を含む見出しの下の箇条書きを、次の同じ階層以上の見出しまで取り出す。
+
+    Args:
+        content (str): レポートのMarkdown
+
+    Returns:
+        list: Task のリスト（同じタスクは1つにまとめる）
+    """
+    tasks = []
+    seen = set()
+    task_level = None
+    for line in content.splitlines():
+        heading = _HEADING.match(line)
+        if heading:
+            level = len(line.lstrip()) - len(line.lstrip().lstrip("#"))
+            if task_level is not None and level <= task_level:
+                task_level = None
+            if task_level is None and any(word in heading.group(1) for word in TASK_HEADINGS):
+                task_level = level
+            continue
+        if task_level is None:
+            continue
+        item = _LIST_ITEM.match(line)
+        if item is None:
+            continue
+        text = _MARKUP.sub("", item.group(1)).strip()
+        key = task_key(text)
+        if key and key not in seen:
+            seen.add(key)
+            tasks.append(Task(key=key, text=text))
+    return tasks
+
+
+def _fts_phrase(query):
+    """検索語をFTS5のフレーズ（"..."）にする（" は "" にする）"""
+    return '"' + query.replace('"', '""') + '"'
+
+
+class ReportArchive:
+    def __init__(self, path=DEFAULT_ARCHIVE_PATH, check_same_thread=True):
+        """
+        初期化
+
+        Args:
+            path (str): SQLiteファイルのパス（":memory:" も可）
+            check_same_thread (bool): 作成したスレッド以外からの使用を禁止するか
+                （一括モードでは複数のスレッドから保存するため False にする）
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=check_same_thread)
+        self.conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        """変更を確定して接続を閉じる"""
+        self.conn.commit()
+        self.conn.close()
+
+    def add(self, content, path=None, user=None, run_id=None, settings=None, usage=None, created_at=None):
+        """
+        レポートを保存して検索インデックスに登録
+
+        Args:
+            content (str): レポートのMarkdown
+            path (str): 保存したレポートファイルのパス
+            user (str): 利用者またはメールボックスの名前（省略時はログインユーザー名）
+            run_id (str): 実行ID（Telemetry.run_id）
+            settings (dict): レポート作成に使ったカスタム設定
+            usage (dict): APIの応答の usage
+            created_at (datetime): 作成日時（省略時は現在時刻）
+
+        Returns:
+            int: レポートのID
+        """
+        usage = usage or {}
+        created_at = created_at or datetime.now()
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO reports (created_at, user, run_id, settings_hash, path, input_tokens, output_tokens,"
+                " cache_read_input_tokens, cache_creation_input_tokens, content) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (_key(created_at), user or getpass.getuser(), run_id,
+                 settings_hash(settings) if settings is not None else None,
+                 os.path.abspath(path) if path else None,
+                 usage.get("input_tokens"), usage.get("output_tokens"),
+                 usage.get("cache_read_input_tokens"), usage.get("cache_creation_input_tokens"), content))
+            report_id = cursor.lastrowid
+            self.conn.execute("INSERT INTO reports_fts (rowid, content) VALUES (?, ?)", (report_id, content))
+            self.conn.executemany(
+                "INSERT INTO tasks (report_id, position, task_key, text) VALUES (?, ?, ?, ?)",
+                [(report_id, i, task.key, task.text) for i, task in enumerate(extract_tasks(content))])
+        return report_id
+
+    def search(self, query, user=None, since=None, until=None, oldest_first=False, limit=20):
+        """
+        レポートを全文検索
+
+        3文字以上の検索語は trigram のインデックスで検索し、2文字以下の検索語は LIKE で検索する。
+
+        Args:
+            query (str): 検索語（部分一致）
+            user (str): 利用者で絞り込む
+            since (datetime): この日時以降に作成したレポートに絞り込む
+            until (datetime): この日時より前に作成したレポートに絞り込む
+            oldest_first (bool): 古い順に並べるか（最初に現れたレポートを調べる場合）
+            limit (int): 最大件数
+
+        Returns:
+            list: ArchivedReport のリスト（content は検索語の前後の抜粋）
+        """
+        query = query.strip()
+        if not query:
+            return []
+        indexed = len(query) >= MIN_MATCH_CHARS
+        conditions = []
+        params = []
+        if indexed:
+            source = "reports_fts JOIN reports r ON r.id = reports_fts.rowid"
+            conditions.append("reports_fts MATCH ?")
+            params.append(_fts_phrase(query))
+        else:
+            source = "reports r"
+            conditions.append("r.content LIKE ? ESCAPE '\\'")
+            params.append("%" + re.sub(r"([%_\\])", r"\\\1", query) + "%")
+        if user:
+            conditions.append("r.user = ?")
+            params.append(user)
+        if since:
+            conditions.append("r.created_at >= ?")
+            params.append(_key(since))
+        if until:
+            conditions.append("r.created_at < ?")
+            params.append(_key(until))
+        order = "ASC" if oldest_first else "DESC"
+        rows = self.conn.execute(
+            f"SELECT r.id, r.created_at, r.user, r.run_id, r.settings_hash, r.path, r.input_tokens, r.output_tokens,"
+            f" NULL FROM {source} WHERE {' AND '.join(conditions)}"
+            f" ORDER BY r.created_at {order}, r.id {order} LIMIT ?",
+            (*params, limit)).fetchall()
+        reports = [self._report(row) for row in rows]
+        # 抜粋は並べ替えの後に、表示する件数分だけ作成する（該当する全件に作ると遅くなる）
+        if indexed and reports:
+            placeholders = ",".join("?" * len(reports))
+            snippets = dict(self.conn.execute(
+                "SELECT rowid, snippet(reports_fts, 0, '【', '】', '…', 24) FROM reports_fts"
+                f" WHERE reports_fts MATCH ? AND rowid IN ({placeholders})",
+                (_fts_phrase(query), *(report.id for report in reports))).fetchall())
+            for report in reports:
+                report.content = snippets.get(report.id, "")
+        else:
+            for report in reports:
+                report.content = _excerpt(self._content(report.id), query)
+        return reports
+
+    def _content(self, report_id):
+        row = self.conn.execute("SELECT content FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return row[0] if row else ""
+
+    def get(self, report_id):
+        """
+        IDを指定してレポートを取得
+
+        Returns:
+            ArchivedReport: レポート（ない場合はNone）
+        """
+        row = self.conn.execute(
+            "SELECT id, created_at, user, run_id, settings_hash, path, input_tokens, output_tokens, content"
+            " FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return self._report(row) if row else None
+
+    def latest(self, user=None):
+        """最新のレポート（利用者を指定した場合はその利用者の最新のレポート）"""
+        sql = "SELECT id FROM reports"
+        params = ()
+        if user:
+            sql += " WHERE user = ?"
+            params = (user,)
+        row = self.conn.execute(sql + " ORDER BY created_at DESC, id DESC LIMIT 1", params).fetchone()
+        return self.get(row[0]) if row else None
+
+    def previous(self, report):
+        """同じ利用者の1つ前のレポート（ない場合はNone）"""
+        row = self.conn.execute(
+            "SELECT id FROM reports WHERE user = ? AND (created_at < ? OR (created_at = ? AND id < ?))"
+            " ORDER BY created_at DESC, id DESC LIMIT 1",
+            (report.user, _key(report.created_at), _key(report.created_at), report.id)).fetchone()
+        return self.get(row[0]) if row else None
+
+    def tasks(self, report_id):
+        """レポートのタスク（Task のリスト）"""
+        rows = self.conn.execute(
+            "SELECT task_key, text FROM tasks WHERE report_id = ? ORDER BY position", (report_id,)).fetchall()
+        return [Task(key=key, text=text) for key, text in rows]
+
+    def diff(self, report_id=None, user=None):
+        """
+        レポートのタスクを同じ利用者の1つ前のレポートと比較
+
+        Args:
+            report_id (int): 比較するレポート（省略時は最新のレポート）
+            user (str): report_id を省略した場合に、この利用者の最新のレポートを使う
+
+        Returns:
+            TaskDiff: 差分（レポートがない場合はNone。前回のレポートがない場合は全タスクが added）
+        """
+        report = self.get(report_id) if report_id is not None else self.latest(user)
+        if report is None:
+            return None
+        previous = self.previous(report)
+        current_tasks = self.tasks(report.id)
+        previous_tasks = self.tasks(previous.id) if previous else []
+        previous_keys = {task.key for task in previous_tasks}
+        current_keys = {task.key for task in current_tasks}
+        return TaskDiff(
+            report=report, previous=previous,
+            added=[task for task in current_tasks if task.key not in previous_keys],
+            removed=[task for task in previous_tasks if task.key not in current_keys],
+            kept=[task for task in current_tasks if task.key in previous_keys])
+
+    def _report(self, row):
+        return ArchivedReport(id=row[0], created_at=to_datetime(row[1]), user=row[2], run_id=row[3],
+                              settings_hash=row[4], path=row[5], input_tokens=row[6], output_tokens=row[7],
+                              content=row[8])
+
+
+def _key(value):
+    return value.isoformat(timespec="seconds")
+
+
+def _excerpt(content, query, width=24):
+    """検索語の前後の抜粋（検索語を【】で囲む）"""
+    index = content.find(query)
+    if index < 0:
+        return content[:width * 2]
+    start = max(0, index - width)
+    end = index + len(query) + width
+    return (("…" if start > 0 else "") + content[start:index] + f"【{query}】"
+            + content[index + len(query):end] + ("…" if end < len(content) else ""))
+
+
+def format_search_results(reports):
+    """
+    表示用の検索結果
+
+    Args:
+        reports (list): ArchivedReport のリスト
+
+    Returns:
+        str: 検索結果の一覧
+    """
+    if not reports:
+        return "該当するレポートはありません。"
+    lines = []
+    for report in reports:
+        lines.append(f"#{report.id} {format_datetime(report.created_at)} [{report.user}] {report.path or ''}")
+        lines.append("    " + " ".join(report.content.split()))
+    return "\n".join(lines)
+
+
+def format_diff(diff):
+    """
+    表示用のタスクの差分
+
+    Args:
+        diff (TaskDiff): 差分
+
+    Returns:
+        str: 追加されたタスクとなくなったタスクの一覧
+    """
+    report = diff.report
+    if diff.previous is None:
+        header = f"#{report.id} {format_datetime(report.created_at)} [{report.user}]（前回のレポートはありません）"
+    else:
+        header = (f"#{diff.previous.id} {format_datetime(diff.previous.created_at)} → "
+                  f"#{report.id} {format_datetime(report.created_at)} [{report.user}]")
+    lines = [header, f"  追加 {len(diff.added)}件 / なくなった {len(diff.removed)}件 / 継続 {len(diff.kept)}件"]
+    lines.extend(f"  + {task.text}" for task in diff.added)
+    lines.extend(f"  - {task.text}" for task in diff.removed)
+    return "\n".join(lines)
+
+
+def import_reports(archive, paths, user=None):
+    """
+    保存済みのレポートファイルをアーカイブに登録
+
+    作成日時はファイル名の日時（assistant_report_YYYYMMDD_HHMMSS.md）、なければ更新日時を使う。
+
+    Args:
+        archive (ReportArchive): 登録先
+        paths (list): レポートファイルのパス
+        user (str): 利用者の名前
+
+    Returns:
+        int: 登録した件数
+    """
+    entries = []
+    for path in paths:
+        match = _FILENAME_TIMESTAMP.search(os.path.basename(path))
+        if match:
+            created_at = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+        else:
+            created_at = datetime.fromtimestamp(os.path.getmtime(path))
+        entries.append((created_at, path))
+    # 前回のレポートとの比較が作成順になるよう、古い順に登録する
+    for created_at, path in sorted(entries):
+        with open(path, encoding="utf-8") as f:
+            archive.add(f.read(), path, user=user, created_at=created_at)
+    return len(entries)
+
+
+def _parse_date(text):
+    return datetime.strptime(text, "%Y-%m-%d")
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description='レポートアーカイブの検索とタスクの差分',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--archive', type=str, default=DEFAULT_ARCHIVE_PATH, help='アーカイブのファイル')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    search = subparsers.add_parser('search', help='レポートを全文検索する')
+    search.add_argument('query', help='検索語（部分一致）')
+    search.add_argument('--user', type=str, help='利用者・メールボックスの名前で絞り込む')
+    search.add_argument('--since', type=_parse_date, help='この日以降のレポートに絞り込む（YYYY-MM-DD）')
+    search.add_argument('--until', type=_parse_date, help='この日より前のレポートに絞り込む（YYYY-MM-DD）')
+    search.add_argument('--first', action='store_true', help='古い順に表示する（最初に現れたレポートを調べる）')
+    search.add_argument('--limit', type=int, default=20, help='表示する最大件数')
+
+    diff = subparsers.add_parser('diff', help='前回のレポートからのタスクの変化を表示する')
+    diff.add_argument('report_id', type=int, nargs='?', help='レポートのID（省略時は最新のレポート）')
+    diff.add_argument('--user', type=str, help='この利用者・メールボックスの最新のレポートを使う')
+
+    importer = subparsers.add_parser('import', help='保存済みのレポートファイルを登録する')
+    importer.add_argument('files', nargs='+', help='レポートファイル（ワイルドカード可）')
+    importer.add_argument('--user', type=str, help='利用者・メールボックスの名前（省略時はログインユーザー名）')
+    args = parser.parse_args()
+
+    archive = ReportArchive(args.archive)
+    try:
+        if args.command == 'search':
+            reports = archive.search(args.query, args.user, args.since, args.until, args.first, args.limit)
+            print(format_search_results(reports))
+        elif args.command == 'diff':
+            result = archive.diff(args.report_id, args.user)
+            print(format_diff(result) if result else "レポートがありません。")
+        else:
+            paths = [path for pattern in args.files for path in (glob.glob(pattern) or [pattern])]
+            print(f"{import_reports(archive, paths, args.user)}件のレポートを登録しました。")
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
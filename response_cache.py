@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+応答キャッシュモジュール
+
+Claude APIへのリクエスト内容（正規化したプロンプト、モデル、システムプロンプト、
+最大トークン数）のハッシュをキーとして応答をディスクに保存する。メールや予定に
+変化がない実行では、API呼び出しを行わずに保存済みの応答を返す。
+
+保存期間（TTL）を過ぎた応答は削除し、合計サイズが上限を超えた場合は
+最後に使われた時刻が古いものから削除する（LRU）。削除はディレクトリ全体を
+調べるため、保存のたびではなく EVICT_INTERVAL 件ごとに行う。
+
+map-reduce・要約メモ・一括モードでは複数のスレッドが1つのインスタンスを共有するため、
+読み書きと削除はロックで直列化する。一時ファイルは保存ごとに別の名前で作り、
+ファイルの更新や置き換えに失敗した場合はキャッシュを使わなかったものとして扱う。
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+DEFAULT_CACHE_DIR = "response_cache"
+DEFAULT_TTL_MINUTES = 24 * 60
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+# 古い応答を削除する間隔（保存の件数。最初の保存時にも削除する）
+EVICT_INTERVAL = 32
+
+
+def normalize_prompt(prompt):
+    """
+    キャッシュキー用にプロンプトを正規化
+
+    行末の空白を除き、連続する空行を1行にまとめる。
+    """
+    lines = [line.rstrip() for line in prompt.strip().splitlines()]
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines))
+
+
+def make_cache_key(data):
+    """
+    リクエスト本文からキャッシュキーを作成
+
+    優先ドメインや勤務時間などの設定はプロンプトのガイドライン欄に含まれるため、
+    プロンプトを通じてキーに反映される。
+
+    Args:
+        data (dict): APIリクエストの本文
+
+    Returns:
+        str: SHA-256の16進文字列
+    """
+    material = {
+        "model": data["model"],
+        "max_tokens": data["max_tokens"],
+        "system": data.get("system"),
+        "messages": [
+            {"role": m["role"], "content": normalize_prompt(m["content"]) if isinstance(m["content"], str) else m["content"]}
+            for m in data["messages"]
+        ],
+    }
+    encoded = json.dumps(material, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl_minutes=DEFAULT_TTL_MINUTES, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        初期化
+
+        Args:
+            cache_dir (str): 応答を保存するディレクトリ
+            ttl_minutes (float): 応答の保存期間（分）
+            max_bytes (int): 保存する応答の合計サイズの上限（バイト）
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl_minutes * 60
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._puts_until_evict = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        """キーに対応するファイルのパス"""
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """
+        保存済みの応答を取得
+
+        Args:
+            key (str): キャッシュキー
+
+        Returns:
+            str: 有効期限内の応答（ない場合はNone）
+        """
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    entry = json.load(f)
+                if time.time() - entry["created_at"] > self.ttl:
+                    self._remove(path)
+                    entry = None
+                else:
+                    os.utime(path)  # 最終使用時刻を更新（LRU用）
+            except (OSError, ValueError, KeyError, TypeError):
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry["response"]
+
+    def put(self, key, response):
+        """
+        応答を保存し、必要に応じて古い応答を削除
+
+        Args:
+            key (str): キャッシュキー
+            response (str): 保存する応答
+        """
+        path = self._path(key)
+        with self._lock:
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"created_at": time.time(), "response": response}, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except OSError:
+                # 他のプロセスが読み込み中で置き換えられない場合などは保存しない
+                self._remove(tmp_path)
+                return
+
+            self._puts_until_evict -= 1
+            if self._puts_until_evict > 0:
+                return
+            self._puts_until_evict = EVICT_INTERVAL
+            self._evict()
+
+    def evict(self):
+        """
+        期限切れの応答を削除し、合計サイズが上限を超える分を古い順に削除
+
+        Returns:
+            int: 削除した件数
+        """
+        with self._lock:
+            return self._evict()
+
+    def _evict(self):
+        """evict の本体（ロックを取得してから呼び出す）"""
+        now = time.time()
+        entries = []
+        removed = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith((".json", ".tmp")):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith(".tmp"):
+                # 保存の途中で終了したプロセスが残した一時ファイル
+                if now - stat.st_mtime > self.ttl:
+                    removed += self._remove(path)
+                continue
+            # 最終使用時刻がTTLより古ければ作成時刻も同様に古く、期限切れとみなせる
+            if now - stat.st_mtime > self.ttl:
+                removed += self._remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            removed += self._remove(path)
+            total -= size
+        return removed
+
+    def _remove(self, path):
+        """ファイルを削除（削除できた場合は1を返す）"""
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+    def stats(self):
+        """ヒット数とミス数の表示用文字列"""
+        return f"ヒット {self.hits}件 / ミス {self.misses}件"
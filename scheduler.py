@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+事前作成スケジューラーモジュール
+
+勤務開始（working_hours の start）の前にメールと予定を取得してレポートを作成しておき、
+開始直前に新着メールや予定の変更があった場合だけ、変更のあった側を取り直して更新する。
+開始時刻にレポートを求めると、取得やAPI呼び出しを待たずに作成済みのレポートを表示できる。
+
+作成と更新を始める時刻は、計測した所要時間（--telemetry-file の過去の実行の段階ごとの集計と、
+常駐中の実行の経過時間）から見積もる。作成や更新に失敗した場合（API呼び出しのエラーなど）は、
+そのレポートを事前作成の結果として保存せず、失敗した事前作成は開始直前に作り直す。
+
+現在日時と待機は関数として渡すため、ManualWallClock を使えば実際に待たずに
+1日分の動きを確かめられる。
+"""
+
+import json
+import os
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timedelta
+
+from records import Record, format_datetime, to_datetime
+from watcher import ChangeBatch
+
+DEFAULT_STATE_PATH = "prebuilt_report.json"
+
+# 計測結果がない場合の、レポート作成1回分の所要時間の見積もり（秒）
+DEFAULT_RUN_SECONDS = 120
+# 見積もりに掛ける余裕の倍率
+SAFETY_FACTOR = 2.0
+# 事前作成から開始直前の更新までの最短の間隔（秒）
+MIN_PREBUILD_LEAD_SECONDS = 30 * 60
+# 勤務開始の何秒前までに更新を終えるか
+DEFAULT_MARGIN_SECONDS = 10 * 60
+# 見積もりに使う過去の実行の数
+HISTORY_RUNS = 10
+# 作成後、変更イベントを確認する間隔（秒）
+POLL_INTERVAL_SECONDS = 5
+# 1回に待つ時間の上限（秒）。スリープや時計の変更があっても、予定の時刻を大きく過ぎないよう小分けに待つ
+MAX_SLEEP_SECONDS = 60
+# レポート作成1回を構成する最上位の段階（connect・fetch_email_detail・process_appointment など、
+# これらの中で計測する段階を二重に数えないよう、見積もりにはこの段階だけを使う）
+RUN_STAGES = ("fetch_emails", "normalize_emails", "extract_entities", "fetch_events", "extract_attachments",
+              "summarize_emails", "calendar_analysis", "build_prompt", "api_call", "save_report", "archive_report")
+
+
+class ManualWallClock:
+    """手動で進める日時の時計（シミュレーション用。sleep で日時が進む）"""
+
+    def __init__(self, start):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+
+class DailyPlan(Record):
+    """1日分の予定（事前作成・開始直前の更新・勤務開始の日時）"""
+
+    __slots__ = ("prebuild_at", "refresh_at", "start_at")
+    _datetime_fields = ("prebuild_at", "refresh_at", "start_at")
+
+
+def run_seconds(stages):
+    """
+    段階ごとの集計から、レポート作成1回分の所要時間を見積もる
+
+    Args:
+        stages (dict): 段階名から集計への辞書（Telemetry.stages の StageStats、
+            または JSON Lines の "stages" の {"count", "total_ms"}）
+
+    Returns:
+        float: RUN_STAGES の所要時間の合計を、レポート作成の回数（build_prompt の回数）で割った値
+            （秒。集計がない場合はNone）
+    """
+    counts = {}
+    total = 0.0
+    for name in RUN_STAGES:
+        stats = stages.get(name)
+        if stats is None:
+            continue
+        if isinstance(stats, dict):
+            counts[name], seconds = stats.get("count", 0), stats.get("total_ms", 0) / 1000
+        else:
+            counts[name], seconds = stats.count, stats.total
+        total += seconds
+    # 1回の作成で複数回計測する段階（メールと予定の extract_entities など）があるため、段階ごとには割らない
+    runs = counts.get("build_prompt") or max(counts.values(), default=0)
+    return total / runs if runs and total else None
+
+
+def load_run_history(path, limit=HISTORY_RUNS):
+    """
+    --telemetry-file に記録した過去の実行から、1回分の所要時間を読み込む
+
+    Args:
+        path (str): JSON Lines のファイル
+        limit (int): 新しいものから読み込む実行の数
+
+    Returns:
+        list: 1回分の所要時間（秒）のリスト（古い順）
+    """
+    if not path or not os.path.exists(path):
+        return []
+    history = deque(maxlen=limit)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            # 段階ごとの行は読み飛ばし、実行の最後に出力する集計の行だけを使う
+            if '"type": "run"' not in line:
+                continue
+            try:
+                seconds = run_seconds(json.loads(line).get("stages") or {})
+            except ValueError:
+                continue
+            if seconds:
+                history.append(seconds)
+    return list(history)
+
+
+class LeadTimeEstimator:
+    """過去と常駐中の所要時間から、作成と更新を始める時刻を決める"""
+
+    def __init__(self, history=None, margin=DEFAULT_MARGIN_SECONDS, safety_factor=SAFETY_FACTOR,
+                 default_seconds=DEFAULT_RUN_SECONDS):
+        """
+        初期化
+
+        Args:
+            history (list): 過去の1回分の所要時間（秒）
+            margin (float): 勤務開始の何秒前までに更新を終えるか
+            safety_factor (float): 見積もりに掛ける余裕の倍率
+            default_seconds (float): 計測結果がない場合の1回分の所要時間（秒）
+        """
+        self.history = deque(history or [], maxlen=HISTORY_RUNS)
+        self.margin = margin
+        self.safety_factor = safety_factor
+        self.default_seconds = default_seconds
+
+    def record(self, seconds):
+        """常駐中に計測した1回分の所要時間を追加"""
+        if seconds:
+            self.history.append(seconds)
+
+    @property
+    def run_seconds(self):
+        """1回分の所要時間の見積もり（遅かった回に合わせるため、平均ではなく最大を使う）"""
+        return max(self.history) if self.history else self.default_seconds
+
+    def plan(self, now, start_hour):
+        """
+        次の勤務開始に向けた予定を作成
+
+        Args:
+            now (datetime): 現在日時
+            start_hour (int): 勤務開始の時
+
+        Returns:
+            DailyPlan: 今日の勤務開始がまだ先なら今日、過ぎていれば翌日の予定
+        """
+        start_at = now.replace(hour=start_hour, minute=0, second=0, microsecond=0)
+        if now >= start_at:
+            start_at += timedelta(days=1)
+        lead = self.run_seconds * self.safety_factor
+        refresh_at = start_at - timedelta(seconds=lead + self.margin)
+        prebuild_at = refresh_at - timedelta(seconds=max(lead, MIN_PREBUILD_LEAD_SECONDS))
+        return DailyPlan(prebuild_at=prebuild_at, refresh_at=refresh_at, start_at=start_at)
+
+
+def save_prebuilt(path, report_path, generated_at, start_at):
+    """事前作成したレポートの情報を保存（--prebuilt で表示するため）"""
+    state = {"report_path": os.path.abspath(report_path), "generated_at": generated_at.isoformat(timespec="seconds"),
+             "start_at": start_at.isoformat(timespec="seconds")}
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def load_prebuilt(path=DEFAULT_STATE_PATH, now=None):
+    """
+    今日の勤務開始に向けて事前作成したレポートを探す
+
+    Args:
+        path (str): save_prebuilt で保存したファイル
+        now (datetime): 現在日時（省略時は datetime.now()）
+
+    Returns:
+        tuple: (レポートのパス, 作成日時)（今日の分がない場合はNone）
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    now = now or datetime.now()
+    start_at = to_datetime(state.get("start_at"))
+    report_path = state.get("report_path")
+    if start_at is None or start_at.date() != now.date() or not report_path or not os.path.exists(report_path):
+        return None
+    return report_path, to_datetime(state.get("generated_at"))
+
+
+class PregenerationScheduler:
+    def __init__(self, session, source, estimator, start_hour, state_path=DEFAULT_STATE_PATH, relevant=None,
+                 clock=datetime.now, sleep=time.sleep, poll_interval=POLL_INTERVAL_SECONDS):
+        """
+        初期化
+
+        Args:
+            session (ReportSession): メールと予定を取得してレポートを作成するセッション
+            source (EventSource): 事前作成後の変更イベントの取得元
+            estimator (LeadTimeEstimator): 作成と更新を始める時刻の見積もり
+            start_hour (int): 勤務開始の時
+            state_path (str): 事前作成したレポートの情報を保存するファイル
+            relevant (callable): ChangeEvent を受け取り、更新が必要なら True を返す関数
+            clock (callable): 現在日時を返す関数
+            sleep (callable): 指定秒数だけ待つ関数
+            poll_interval (float): 事前作成後、変更イベントを確認する間隔（秒）
+        """
+        self.session = session
+        self.source = source
+        self.estimator = estimator
+        self.start_hour = start_hour
+        self.state_path = state_path
+        self.relevant = relevant or (lambda event: True)
+        self.clock = clock
+        self.sleep = sleep
+        self.poll_interval = poll_interval
+        self.prebuilds = 0
+        self.refreshes = 0
+
+    def _wait_until(self, when, events=None):
+        """
+        指定日時まで待つ
+
+        1回に待つのは MAX_SLEEP_SECONDS（変更イベントを確認する場合は poll_interval）までとし、
+        待つたびに現在日時を確かめ直す。
+
+        Args:
+            when (datetime): 待つ日時
+            events (list): 渡した場合は、待っている間に届いた変更イベントを追加する
+        """
+        interval = self.poll_interval if events is not None else MAX_SLEEP_SECONDS
+        while True:
+            remaining = (when - self.clock()).total_seconds()
+            if events is not None:
+                events.extend(e for e in self.source.poll() if self.relevant(e))
+            if remaining <= 0:
+                return
+            self.sleep(min(remaining, interval, MAX_SLEEP_SECONDS))
+
+    def _measure(self, func):
+        """func の所要時間を時計で計測して見積もりに加える（失敗した場合は加えない）"""
+        started_at = self.clock()
+        result = func()
+        self.estimator.record((self.clock() - started_at).total_seconds())
+        return result
+
+    def _build(self, plan, label, func):
+        """
+        作成または更新を実行し、レポートを作成できた場合だけ --prebuilt で表示できるように保存する
+
+        Args:
+            plan (DailyPlan): 実行中の予定
+            label (str): エラー時に表示する処理の名前
+            func (callable): 保存したレポートのパスを返す関数
+
+        Returns:
+            str: 保存したレポートのパス（失敗した場合や更新しなかった場合はNone）
+        """
+        try:
+            report_path = self._measure(func)
+        except Exception as e:
+            # API呼び出しの失敗（ReportFailedError）を含め、失敗したレポートは事前作成の結果にしない
+            print(f"\n{label}中にエラー: {e}")
+            traceback.print_exc()
+            return None
+        if report_path:
+            save_prebuilt(self.state_path, report_path, self.clock(), plan.start_at)
+        return report_path
+
+    def _prebuild(self):
+        """メールと予定を取得してレポートを作成"""
+        session = self.session
+        session.fetch_emails()
+        session.fetch_events()
+        # 内容が前日と同じでも、その日の分のレポートとして作成し直す
+        return session.generate(force=True)
+
+    def run_day(self):
+        """
+        次の勤務開始に向けて、事前作成と開始直前の更新を1回ずつ行う
+
+        Returns:
+            DailyPlan: 実行した予定
+        """
+        plan = self.estimator.plan(self.clock(), self.start_hour)
+        print(f"\n次の勤務開始 {format_datetime(plan.start_at)} に向けて、{format_datetime(plan.prebuild_at)} に作成し、"
+              f"{format_datetime(plan.refresh_at)} に新着があれば更新します"
+              f"（1回の見積もり {self.estimator.run_seconds:.0f}秒）。")
+        self._wait_until(plan.prebuild_at)
+
+        print(f"\n[{format_datetime(self.clock())}] レポートを事前に作成します...")
+        report_path = self._build(plan, "事前作成", self._prebuild)
+        self.prebuilds += 1
+
+        # 作成後に届いた変更だけを、開始直前にまとめて反映する
+        events = []
+        self.source.start()
+        try:
+            self._wait_until(plan.refresh_at, events)
+        finally:
+            self.source.stop()
+        if not report_path:
+            # 事前作成に失敗した場合は、変更の有無によらず開始直前に作成し直す
+            print(f"\n[{format_datetime(self.clock())}] 事前作成に失敗したため、作成し直します...")
+            self._build(plan, "事前作成", self._prebuild)
+            self.prebuilds += 1
+            return plan
+        if not events:
+            print(f"\n[{format_datetime(self.clock())}] 作成後に新着メール・予定の変更はありません。")
+            return plan
+
+        batch = ChangeBatch(events)
+        print(f"\n[{format_datetime(self.clock())}] 開始直前の更新: {batch.describe()}")
+        self._build(plan, "開始直前の更新", lambda: self.session.refresh(batch))
+        self.refreshes += 1
+        return plan
+
+    def run(self, days=None):
+        """
+        毎日の勤務開始に向けて事前作成を続ける
+
+        Args:
+            days (int): この日数分を実行したら終了する（省略時は無制限）
+        """
+        completed = 0
+        while days is None or completed < days:
+            plan = self.run_day()
+            completed += 1
+            # 勤務開始を過ぎてから翌日の予定を立てる
+            self._wait_until(plan.start_at)
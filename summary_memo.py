@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+メール要約のメモ化モジュール
+
+メールを1件ずつ一度だけ要約し、EntryIDと内容のハッシュをキーとして
+MailCache に保存する。次回以降は保存済みの要約を再利用し、新着または
+内容が変わったメールだけをClaudeに要約させる。最終レポートのプロンプトには
+本文の代わりにこの要約を使う。
+"""
+
+import hashlib
+import re
+
+from attachments import format_attachments
+from map_reduce import MapReduceSummarizer, chunk_emails, DEFAULT_CHUNK_SIZE, DEFAULT_CONCURRENCY
+from records import format_datetime
+
+# 1件あたりに含める本文の最大文字数
+MEMO_BODY_CHARS = 2000
+MEMO_MAX_TOKENS = 2000
+MEMO_SYSTEM_PROMPT = "あなたは優秀な秘書です。渡されたメールを1件ずつ正確かつ簡潔に要約し、指定された形式だけで出力してください。"
+
+# 要約を取得できなかったメールで代わりに使う本文の文字数
+FALLBACK_BODY_CHARS = 200
+
+_SUMMARY_LINE = re.compile(r'^\s*\[(\d+)\]\s*(.+?)\s*$')
+
+
+def content_hash(email):
+    """
+    メール内容のハッシュを計算
+
+    Args:
+        email (EmailRecord): メール情報
+
+    Returns:
+        str: 件名・送信者・本文から計算したSHA-256の16進文字列
+    """
+    material = "\0".join((email.subject, email.sender_email, email.body))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def create_memo_prompt(chunk, settings):
+    """
+    1件ずつの要約を求めるプロンプトを作成
+
+    Args:
+        chunk (list): メールのリスト
+        settings (dict): カスタム設定
+
+    Returns:
+        str: 要約用プロンプト
+    """
+    parts = [f"""以下のメール{len(chunk)}件を1件ずつ要約してください。
+- 優先ドメイン: {', '.join(settings['priority_domains'])}
+- 優先キーワード: {', '.join(settings['priority_keywords'])}
+
+各メールについて、次の形式の1行だけを出力してください。他の文章は出力しないでください。
+[メール番号] 分類（緊急対応・今日中に対応・週内対応・情報のみ のいずれか） | 要約（1～2文） | 推奨アクション（なければ「なし」）
+"""]
+    for number, email in enumerate(chunk, 1):
+        body = email.body
+        parts.append(f"""
+## メール {number}: {email.subject}
+- 送信者: {email.sender} ({email.sender_email})
+- 受信日時: {format_datetime(email.received_time)}
+
+{body[:MEMO_BODY_CHARS]}{"..." if len(body) > MEMO_BODY_CHARS else ""}
+""")
+    return "".join(parts)
+
+
+def parse_memo_response(text, count):
+    """
+    要約の応答をメール番号ごとに分解
+
+    Args:
+        text (str): Claudeからの応答
+        count (int): チャンク内のメール件数
+
+    Returns:
+        dict: メール番号（1始まり）から要約への辞書
+    """
+    summaries = {}
+    for line in text.splitlines():
+        match = _SUMMARY_LINE.match(line)
+        if match and 1 <= int(match.group(1)) <= count:
+            summaries.setdefault(int(match.group(1)), match.group(2))
+    return summaries
+
+
+class SummaryMemo:
+    def __init__(self, claude, cache, chunk_size=DEFAULT_CHUNK_SIZE, concurrency=DEFAULT_CONCURRENCY, async_api=False):
+        """
+        初期化
+
+        Args:
+            claude (ClaudeClient): API呼び出しに使うクライアント
+            cache (MailCache): 要約の保存先
+            chunk_size (int): 1回の要約に含めるメール件数
+            concurrency (int): 同時に実行するAPI呼び出しの数
+            async_api (bool): 非同期クライアント（aiohttp）で呼び出すか
+        """
+        self.cache = cache
+        self.mapper = MapReduceSummarizer(claude, chunk_size, concurrency, async_api)
+        self.reused = 0
+        self.created = 0
+
+    def summarize(self, emails_data, settings):
+        """
+        全メールの要約を取得
+
+        保存済みの要約はそのまま使い、残りのメールだけをまとめて要約する。
+
+        Args:
+            emails_data (list): 未読メールのリスト
+            settings (dict): カスタム設定
+
+        Returns:
+            str: ClaudeClient.create_prompt の email_summaries に渡す要約
+        """
+        hashes = [content_hash(email) for email in emails_data]
+        summaries = [self.cache.get_summary(email.entry_id, h) for email, h in zip(emails_data, hashes)]
+        missing = [i for i, summary in enumerate(summaries) if summary is None]
+        self.reused = len(emails_data) - len(missing)
+        print(f"  保存済みの要約: {self.reused}件 / 新たに要約するメール: {len(missing)}件")
+
+        if missing:
+            chunks = chunk_emails(missing, self.mapper.chunk_size)
+            prompts = [create_memo_prompt([emails_data[i] for i in indexes], settings) for _, indexes in chunks]
+            results = self.mapper.map_prompts(prompts, MEMO_SYSTEM_PROMPT, MEMO_MAX_TOKENS)
+
+            for (_, indexes), result in zip(chunks, results):
+                if isinstance(result, Exception):
+                    print(f"  要約中にエラー: {result}")
+                    continue
+                parsed = parse_memo_response(result, len(indexes))
+                for number, i in enumerate(indexes, 1):
+                    if number in parsed:
+                        summaries[i] = parsed[number]
+                        self.cache.put_summary(emails_data[i].entry_id, hashes[i], parsed[number])
+                        self.created += 1
+
+        return "\n".join(self._format_entry(number, email, summary)
+                         for number, (email, summary) in enumerate(zip(emails_data, summaries), 1))
+
+    def _format_entry(self, number, email, summary):
+        """メール1件分の要約欄を作成"""
+        header = f"""## メール {number}: {email.subject}
+- 送信者: {email.sender} ({email.sender_email})
+- 受信日時: {format_datetime(email.received_time)}
+- 添付ファイル: {format_attachments(email)}
+"""
+        if summary is None:
+            body = email.body
+            return header + f"- 本文抜粋: {body[:FALLBACK_BODY_CHARS]}{'...' if len(body) > FALLBACK_BODY_CHARS else ''}\n"
+        return header + f"- 要約: {summary}\n"
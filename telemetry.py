@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+計測モジュール
+
+処理の段階（接続・取得・1件ごとの処理・プロンプト作成・API呼び出し・保存）の
+所要時間と、COMのプロパティ・メソッド呼び出し回数、APIの入出力トークン数を集計する。
+集計結果はJSON Lines形式のファイルに追記し、Prometheus（node_exporter の
+textfile collector）用のテキストファイルにも出力できる。多数の利用者の実行結果を
+集めて、どの段階に時間がかかっているか、--emails や --days に応じてトークン数が
+どう増えるかを調べるために使う。
+"""
+
+import getpass
+import json
+import os
+import threading
+import time
+import types
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+# Prometheusのメトリクス名の接頭辞
+METRIC_PREFIX = "outlook_assistant"
+
+# COMオブジェクトとして扱わない（ラップしない）値の型
+_PLAIN_TYPES = (str, bytes, int, float, bool, tuple, list, dict, datetime, type(None))
+
+# メソッドとして扱う型（COMオブジェクト自体も呼び出し可能なため callable では判定しない）
+_METHOD_TYPES = (types.MethodType, types.BuiltinMethodType, types.FunctionType)
+
+
+class StageStats:
+    """1つの段階の所要時間の集計"""
+
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def to_dict(self):
+        return {"count": self.count, "total_ms": round(self.total * 1000, 3), "max_ms": round(self.max * 1000, 3)}
+
+
+class Telemetry:
+    def __init__(self, jsonl_path=None, prometheus_path=None, labels=None, clock=time.perf_counter):
+        """
+        初期化
+
+        Args:
+            jsonl_path (str): 計測結果を追記するJSON Linesファイル（省略時は出力しない）
+            prometheus_path (str): Prometheus用のテキストファイル（省略時は出力しない）
+            labels (dict): すべての出力に付ける属性（利用者名や --emails の値など）
+            clock (callable): 経過時間（秒）を返す関数
+        """
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.run_id = uuid.uuid4().hex[:12]
+        self.labels = {"user": getpass.getuser(), **(labels or {})}
+        self.clock = clock
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._jsonl = None
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        段階の所要時間を計測し、終了時にJSON Linesへ1行出力する
+
+        Args:
+            name (str): 段階の名前
+            attributes: 出力に含める属性
+        """
+        start = self.clock()
+        try:
+            yield
+        finally:
+            seconds = self.clock() - start
+            self._add_stage(name, seconds)
+            self._emit({"type": "span", "name": name, "duration_ms": round(seconds * 1000, 3), **attributes})
+
+    @contextmanager
+    def measure(self, name):
+        """
+        段階の所要時間を集計だけする（メール1件ごとの処理など、回数の多いもの）
+
+        Args:
+            name (str): 段階の名前
+        """
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self._add_stage(name, self.clock() - start)
+
+    def _add_stage(self, name, seconds):
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.add(seconds)
+
+    def count(self, name, value=1):
+        """
+        カウンタを加算
+
+        Args:
+            name (str): カウンタの名前
+            value (int): 加算する値
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_usage(self, usage):
+        """
+        APIの応答の usage（トークン数）を加算
+
+        Args:
+            usage (dict): input_tokens, output_tokens などを持つ辞書
+        """
+        if not usage:
+            return
+        for key, value in usage.items():
+            if key.endswith("_tokens") and isinstance(value, int):
+                self.count(key, value)
+
+    def _emit(self, record):
+        """JSON Linesファイルに1行追記"""
+        if self.jsonl_path is None:
+            return
+        line = json.dumps({"time": datetime.now().isoformat(timespec="milliseconds"), "run_id": self.run_id,
+                           **self.labels, **record}, ensure_ascii=False)
+        with self._lock:
+            if self._jsonl is None:
+                self._jsonl = open(self.jsonl_path, "a", encoding="utf-8")
+            self._jsonl.write(line + "\n")
+            self._jsonl.flush()
+
+    def summary(self):
+        """
+        表示用の集計
+
+        Returns:
+            str: 段階ごとの合計時間（長い順）とカウンタ
+        """
+        stages = sorted(self.stages.items(), key=lambda item: item[1].total, reverse=True)
+        lines = [f"  {name}: {stats.total:.2f}秒（{stats.count}回）" for name, stats in stages]
+        lines.extend(f"  {name}: {value:,}" for name, value in sorted(self.counters.items()))
+        return "\n".join(lines)
+
+    def to_prometheus(self):
+        """
+        Prometheusのテキスト形式に変換
+
+        Returns:
+            str: メトリクスのテキスト
+        """
+        labels = ",".join(f'{key}="{_escape_label(value)}"' for key, value in self.labels.items())
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_seconds_total 段階ごとの所要時間の合計",
+            f"# TYPE {METRIC_PREFIX}_stage_seconds_total counter",
+        ]
+        lines.extend(f'{METRIC_PREFIX}_stage_seconds_total{{{labels},stage="{name}"}} {stats.total:.6f}'
+                     for name, stats in sorted(self.stages.items()))
+        lines.append(f"# TYPE {METRIC_PREFIX}_stage_count_total counter")
+        lines.extend(f'{METRIC_PREFIX}_stage_count_total{{{labels},stage="{name}"}} {stats.count}'
+                     for name, stats in sorted(self.stages.items()))
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+            lines.append(f"{METRIC_PREFIX}_{name}_total{{{labels}}} {value}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge")
+        lines.append(f"{METRIC_PREFIX}_last_run_timestamp_seconds{{{labels}}} {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Prometheus用のファイルを現在の集計で書き直す（常駐時はレポートの更新ごとに呼ぶ）"""
+        if self.prometheus_path is None:
+            return
+        # 収集中に途中までのファイルを読まれないよう、書き終えてから置き換える
+        temp_path = f"{self.prometheus_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_path, self.prometheus_path)
+
+    def close(self):
+        """集計結果を出力してファイルを閉じる"""
+        self._emit({
+            "type": "run",
+            "stages": {name: stats.to_dict() for name, stats in self.stages.items()},
+            "counters": dict(self.counters),
+        })
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._jsonl = None
+        self.flush()
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class ComCallCounter:
+    """
+    COMオブジェクトのプロパティ参照とメソッド呼び出しを数えるラッパー
+
+    戻り値のCOMオブジェクトも同じようにラップするため、名前空間をラップすれば
+    そこからたどったフォルダ・Items・Table などへのアクセスもすべて数えられる。
+    値の設定（items.IncludeRecurrences = True など）はそのまま元のオブジェクトに行う。
+    """
+
+    __slots__ = ("_target", "_telemetry")
+
+    def __init__(self, target, telemetry):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_telemetry", telemetry)
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if isinstance(value, _METHOD_TYPES):
+            return _CountedMethod(value, self._telemetry)
+        self._telemetry.count("com_calls")
+        return wrap_com(value, self._telemetry)
+
+    def __setattr__(self, name, value):
+        self._telemetry.count("com_calls")
+        setattr(self._target, name, value)
+
+    def __iter__(self):
+        return (wrap_com(item, self._telemetry) for item in self._target)
+
+
+class _CountedMethod:
+    __slots__ = ("_method", "_telemetry")
+
+    def __init__(self, method, telemetry):
+        self._method = method
+        self._telemetry = telemetry
+
+    def __call__(self, *args, **kwargs):
+        self._telemetry.count("com_calls")
+        return wrap_com(self._method(*args, **kwargs), self._telemetry)
+
+
+def wrap_com(value, telemetry):
+    """
+    COMオブジェクトを ComCallCounter でラップ（文字列・数値・日時などはそのまま返す）
+
+    Args:
+        value: COMのプロパティ値やメソッドの戻り値
+        telemetry (Telemetry): 呼び出し回数の加算先
+
+    Returns:
+        ラップしたオブジェクト、または value そのもの
+    """
+    if isinstance(value, _PLAIN_TYPES) or isinstance(value, ComCallCounter):
+        return value
+    return ComCallCounter(value, telemetry)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""添付ファイルのテキスト抽出のテスト"""
+
+import json
+import multiprocessing
+import os
+import time
+import unittest
+from unittest import mock
+
+from attachments import AttachmentExtractor
+from mail_cache import MailCache
+from records import AttachmentRecord, EmailRecord
+
+
+def _hang(path, max_bytes, timeout):
+    """ページの解析で止まった抽出の代わり（ワーカープロセスで実行する）"""
+    time.sleep(60)
+    return "終わらないはずの抽出", None
+
+
+def _slow(path, max_bytes, timeout):
+    """処理時間の上限より少し短い時間がかかる抽出（ワーカープロセスで実行する）"""
+    time.sleep(timeout * 0.6)
+    return os.path.basename(path), None
+
+
+def _email_with_attachment(directory, filename, content):
+    path = os.path.join(directory, filename)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return EmailRecord(entry_id="mail", subject="添付あり", has_attachments=True,
+                       attachments=[AttachmentRecord(filename=filename, size=len(content), path=path)])
+
+
+class AttachmentExtractorTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = MailCache(":memory:")
+        self.extractor = AttachmentExtractor(self.cache, workers=1, timeout=0.5)
+
+    def tearDown(self):
+        self.extractor.close()
+        self.cache.close()
+
+    def test_extracts_text_in_worker_and_caches_it(self):
+        email = _email_with_attachment(self.extractor.temp_dir, "memo.txt", "見積書の  内容\nです")
+        self.extractor.submit(email)
+        self.extractor.collect()
+        self.assertEqual(email.attachments[0].text, "見積書の 内容 です")
+
+        again = _email_with_attachment(self.extractor.temp_dir, "copy.txt", "見積書の  内容\nです")
+        self.extractor.submit(again)
+        self.assertEqual(again.attachments[0].text, "見積書の 内容 です")
+        self.assertEqual(self.extractor.stats(), "抽出 1件 / キャッシュ 1件 / 失敗 0件")
+
+    def test_hung_worker_is_terminated(self):
+        email = _email_with_attachment(self.extractor.temp_dir, "stuck.txt", "内容")
+        with mock.patch("attachments.extract_text", _hang), mock.patch("builtins.print"):
+            self.extractor.submit(email)
+            workers = multiprocessing.active_children()
+            self.assertTrue(workers)
+            started_at = time.monotonic()
+            self.extractor.collect()
+
+        self.assertLess(time.monotonic() - started_at, 10)
+        self.assertIsNone(email.attachments[0].text)
+        self.assertEqual(self.extractor.failed, 1)
+        for worker in workers:
+            worker.join(timeout=5)
+            self.assertFalse(worker.is_alive())
+
+    def test_queued_files_are_not_timed_out(self):
+        # ワーカー1つに4件を提出すると、最後の1件は上限の2倍を過ぎてから終わる
+        emails = [_email_with_attachment(self.extractor.temp_dir, f"memo{i}.txt", f"内容{i}") for i in range(4)]
+        with mock.patch("attachments.extract_text", _slow), mock.patch("builtins.print"):
+            for email in emails:
+                self.extractor.submit(email)
+            self.extractor.collect()
+
+        self.assertEqual([e.attachments[0].text for e in emails], [f"memo{i}.txt" for i in range(4)])
+        self.assertEqual(self.extractor.failed, 0)
+
+    def test_close_stops_running_workers(self):
+        email = _email_with_attachment(self.extractor.temp_dir, "stuck.txt", "内容")
+        with mock.patch("attachments.extract_text", _hang):
+            self.extractor.submit(email)
+            workers = multiprocessing.active_children()
+            self.extractor.close()
+        for worker in workers:
+            worker.join(timeout=5)
+            self.assertFalse(worker.is_alive())
+        self.assertFalse(os.path.exists(self.extractor.temp_dir))
+
+    def test_cached_email_does_not_keep_temporary_path(self):
+        email = _email_with_attachment(self.extractor.temp_dir, "memo.txt", "内容")
+        email.attachments[0].content_hash = "hash"
+        self.cache.put_email(email)
+        row = self.cache.conn.execute("SELECT data FROM emails").fetchone()
+        self.assertNotIn("path", json.loads(row[0])["attachments"][0])
+        self.assertIsNone(self.cache.get_email("mail", None).attachments[0].path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""複数メールボックスの一括処理のテスト（疑似Outlookと疑似APIサーバーを使う）"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from async_claude_client import is_available as async_api_available
+from batch import BatchRunner, MailboxConfig, MailboxNamespace, TokenBucket, SHARED_MAILBOX
+from claude_client import ClaudeClient
+from config import DEFAULT_SETTINGS, create_arg_parser
+from fake_outlook import generate_fake_mailbox
+from mail_store import OL_FOLDER_INBOX
+from mock_claude_server import MockClaudeServer
+from outlook_assistant import ReportSession
+
+
+class ManualClock:
+    """sleep で進む時計"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TokenBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = ManualClock()
+        self.bucket = TokenBucket(2, capacity=3, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_burst_up_to_capacity(self):
+        self.assertEqual([self.bucket.acquire() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_blocks_until_refilled(self):
+        for _ in range(3):
+            self.bucket.acquire()
+
+        self.assertAlmostEqual(self.bucket.acquire(), 0.5)
+        self.assertAlmostEqual(self.clock.now, 100.5)
+        # 待っている間に補充された分は使い切っている
+        self.assertAlmostEqual(self.bucket.acquire(), 0.5)
+
+    def test_refill_after_idle(self):
+        for _ in range(3):
+            self.bucket.acquire()
+        self.clock.now += 1.0
+
+        self.assertEqual([self.bucket.acquire(), self.bucket.acquire()], [0.0, 0.0])
+        self.assertAlmostEqual(self.bucket.acquire(), 0.5)
+
+    def test_refill_is_capped_at_capacity(self):
+        self.bucket.acquire()
+        self.clock.now += 3600
+
+        self.assertEqual([self.bucket.acquire() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(self.bucket.acquire(), 0.5)
+
+    def test_minimum_capacity(self):
+        bucket = TokenBucket(1, capacity=0, clock=self.clock, sleep=self.clock.sleep)
+
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertAlmostEqual(bucket.acquire(), 1.0)
+
+
+class BatchRunnerTest(unittest.TestCase):
+    USERS = 3
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        for patcher in (mock.patch("builtins.print"), mock.patch("traceback.print_exc")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        com_lock = threading.Lock()
+        self.shared = {f"user{i}@example.com": generate_fake_mailbox(30, seed=i, store_id=f"STORE{i}",
+                                                                     com_lock=com_lock)
+                       for i in range(self.USERS)}
+        self.primary = generate_fake_mailbox(0, shared=self.shared, com_lock=com_lock)
+        self.args = create_arg_parser().parse_args(
+            ["--emails", "5", "--no-cache", "--no-response-cache", "--no-normalize"])
+
+        self.server = MockClaudeServer()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.claude = ClaudeClient("mock-key", "2023-06-01", api_url=self.server.url)
+
+    def _mailboxes(self):
+        mailboxes = [MailboxConfig(name=f"user{i}", address=address, kind=SHARED_MAILBOX,
+                                   output=os.path.join(self.directory, f"user{i}.md"))
+                     for i, address in enumerate(self.shared)]
+        # アクセス権のないメールボックス（アドレスを解決できない）
+        mailboxes.insert(1, MailboxConfig(name="unknown", address="unknown@example.com", kind=SHARED_MAILBOX,
+                                          output=os.path.join(self.directory, "unknown.md")))
+        return mailboxes
+
+    def _open_mailbox(self, mailbox):
+        # open_outlook_mailbox と同じく、接続時に受信トレイを開いて解決の失敗をエラーにする
+        namespace = MailboxNamespace(self.primary, mailbox.address, mailbox.kind)
+        namespace.GetDefaultFolder(OL_FOLDER_INBOX)
+        return namespace
+
+    def _run(self, async_api=False):
+        def create_session(mailbox_args, settings, outlook, cache, report_file, name):
+            return ReportSession(mailbox_args, settings, outlook, self.claude, cache, report_file=report_file,
+                                 user=name)
+
+        runner = BatchRunner(self._mailboxes(), self.args, DEFAULT_SETTINGS, self.claude, create_session,
+                             open_mailbox=self._open_mailbox,
+                             fetch_workers=2, api_workers=2, async_api=async_api)
+        return runner.run()
+
+    def _assert_results(self, results):
+        self.assertEqual([r.name for r in results], ["user0", "unknown", "user1", "user2"])
+
+        failed = results[1]
+        self.assertIn("unknown@example.com", failed.error)
+        self.assertIsNone(failed.report_path)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "unknown.md")))
+
+        for result in results[:1] + results[2:]:
+            with self.subTest(name=result.name):
+                self.assertIsNone(result.error)
+                self.assertEqual(result.report_path, os.path.join(self.directory, f"{result.name}.md"))
+                self.assertTrue(os.path.exists(result.report_path))
+                self.assertEqual(result.emails, 5)
+                self.assertGreater(result.events, 0)
+
+    def test_reports_for_each_mailbox(self):
+        self._assert_results(self._run())
+
+    @unittest.skipUnless(async_api_available(), "aiohttp がインストールされていません")
+    def test_reports_for_each_mailbox_async(self):
+        self._assert_results(self._run(async_api=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""メール本文の正規化のテスト"""
+
+import unittest
+from unittest import mock
+
+from body_normalizer import NormalizationStats, normalize_body, normalize_emails
+from records import EmailRecord
+
+
+class NormalizeBodyTest(unittest.TestCase):
+    def test_many_separator_lines_do_not_recurse(self):
+        body = "hello\n" + "\n".join(["-----", "row"] * 2000)
+        normalized = normalize_body(body)
+        self.assertTrue(normalized.startswith("hello\n-----\nrow"))
+        self.assertEqual(normalized.count("row"), 2000)
+
+    def test_many_from_lines_do_not_recurse(self):
+        body = "hello\n" + "\n".join(["From: 営業部", "本文"] * 2000)
+        self.assertEqual(normalize_body(body).count("From: 営業部"), 2000)
+
+    def test_message_from_person_in_body_is_kept(self):
+        body = "本文です。\n\n山田さんからのメッセージ：\n明日の会議は10時です。"
+        self.assertEqual(normalize_body(body), body)
+
+    def test_quote_header_is_dropped(self):
+        self.assertEqual(normalize_body("了解しました。\n\n2025/05/01 10:00 yamada@example.com のメッセージ:\n> 前回の本文"),
+                         "了解しました。")
+        self.assertEqual(normalize_body("了解しました。\n\n山田さんは書きました:\n前回の本文"), "了解しました。")
+        self.assertEqual(normalize_body("Thanks.\n\nOn Thu, May 1, 2025 at 10:00 Yamada wrote:\nold"), "Thanks.")
+        self.assertEqual(normalize_body("了解です。\n\nFrom: 山田\n\nSent: 2025/05/01\nSubject: 見積\n前回"),
+                         "了解です。")
+
+    def test_from_line_in_body_is_kept(self):
+        body = "転送します。\nFrom: 営業部の山田さんより\n詳細は以下の通りです。"
+        self.assertEqual(normalize_body(body), body)
+
+    def test_table_rule_followed_by_contact_is_kept(self):
+        rows = "\n".join(f"拠点{i} | 担当{i}" for i in range(20))
+        body = f"各拠点の連絡先です。\n-----\nTel: 03-1234-5678（代表）\n-----\n{rows}\n以上です。"
+        self.assertEqual(normalize_body(body), body)
+
+    def test_signature_is_dropped(self):
+        body = ("資料を送ります。\n\n----------\n山田 太郎\n株式会社サンプル\nTel: 03-1234-5678\n"
+                "Mail: yamada@example.com\n----------")
+        self.assertEqual(normalize_body(body), "資料を送ります。")
+        self.assertEqual(normalize_body("資料を送ります。\n--\n山田"), "資料を送ります。")
+
+
+class NormalizeEmailsTest(unittest.TestCase):
+    def test_failing_email_keeps_raw_body(self):
+        emails = [EmailRecord(subject="1", body="a\n\n\nb"), EmailRecord(subject="2", body="失敗する本文"),
+                  EmailRecord(subject="3", body="c")]
+        original = normalize_body
+
+        def failing(body, stats=None):
+            if body == "失敗する本文":
+                raise RecursionError("maximum recursion depth exceeded")
+            return original(body, stats)
+
+        stats = NormalizationStats()
+        with mock.patch("body_normalizer.normalize_body", side_effect=failing), mock.patch("builtins.print"):
+            result = list(normalize_emails(emails, stats))
+        self.assertEqual([email.body for email in result], ["a\n\nb", "失敗する本文", "c"])
+        self.assertEqual(result[1].raw_body, "失敗する本文")
+        self.assertEqual((stats.emails, stats.failed), (2, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""カレンダー解析のテスト"""
+
+import unittest
+from datetime import date, datetime
+
+from calendar_index import CalendarIndex
+from records import EventRecord
+
+WORKING_HOURS = {"start": 9, "end": 18}
+FOCUS_TIME = {"start": 10, "end": 12}
+# 2025年5月1日は木曜日
+THURSDAY = date(2025, 5, 1)
+
+
+def event(subject, start, end, all_day=False):
+    return EventRecord(subject=subject, start=start, end=end, is_all_day_event=all_day)
+
+
+def at(day, hour, minute=0):
+    return datetime(2025, 5, day, hour, minute)
+
+
+class ConflictsTest(unittest.TestCase):
+    def test_overlapping_events(self):
+        a = event("A", at(1, 10), at(1, 11))
+        b = event("B", at(1, 10, 30), at(1, 11, 30))
+        c = event("C", at(1, 10, 45), at(1, 10, 50))
+
+        conflicts = CalendarIndex([b, c, a]).conflicts()
+
+        self.assertEqual([(x.subject, y.subject, start, end) for x, y, start, end in conflicts], [
+            ("A", "B", at(1, 10, 30), at(1, 11)),
+            ("A", "C", at(1, 10, 45), at(1, 10, 50)),
+            ("B", "C", at(1, 10, 45), at(1, 10, 50)),
+        ])
+
+    def test_back_to_back_events_do_not_conflict(self):
+        index = CalendarIndex([event("A", at(1, 12), at(1, 13)), event("B", at(1, 13), at(1, 14))])
+
+        self.assertEqual(index.conflicts(), [])
+
+    def test_all_day_events_are_ignored(self):
+        index = CalendarIndex([event("休暇", at(1, 0), at(2, 0), all_day=True), event("A", at(1, 10), at(1, 11))])
+
+        self.assertEqual(index.conflicts(), [])
+        self.assertEqual(index.busy_intervals(), [(at(1, 10), at(1, 11))])
+
+
+class FreeSlotsTest(unittest.TestCase):
+    def test_gaps_between_events(self):
+        index = CalendarIndex([
+            event("A", at(1, 9), at(1, 10)),
+            event("B", at(1, 10), at(1, 10, 45)),
+            event("C", at(1, 11), at(1, 12)),  # 15分の空きは報告しない
+            event("D", at(1, 13), at(1, 17, 45)),
+        ])
+
+        slots = index.free_slots(THURSDAY, 1, WORKING_HOURS)
+
+        self.assertEqual(slots, {THURSDAY: [(at(1, 12), at(1, 13))]})
+
+    def test_all_day_event_leaves_day_free(self):
+        index = CalendarIndex([event("休暇", at(1, 0), at(2, 0), all_day=True)])
+
+        self.assertEqual(index.free_slots(THURSDAY, 1, WORKING_HOURS), {THURSDAY: [(at(1, 9), at(1, 18))]})
+
+    def test_busy_interval_spanning_midnight(self):
+        index = CalendarIndex([event("夜間作業", at(1, 17), at(2, 10))])
+
+        slots = index.free_slots(THURSDAY, 2, WORKING_HOURS)
+
+        self.assertEqual(slots[THURSDAY], [(at(1, 9), at(1, 17))])
+        self.assertEqual(slots[date(2025, 5, 2)], [(at(2, 10), at(2, 18))])
+
+    def test_weekend_is_skipped(self):
+        slots = CalendarIndex([]).free_slots(date(2025, 5, 2), 4, WORKING_HOURS)
+
+        self.assertEqual(list(slots), [date(2025, 5, 2), date(2025, 5, 5)])
+
+    def test_today_starts_from_now(self):
+        index = CalendarIndex([event("A", at(1, 15), at(1, 16))])
+
+        slots = index.free_slots(THURSDAY, 2, WORKING_HOURS, now=at(1, 14))
+
+        self.assertEqual(slots[THURSDAY], [(at(1, 14), at(1, 15)), (at(1, 16), at(1, 18))])
+        self.assertEqual(slots[date(2025, 5, 2)], [(at(2, 9), at(2, 18))])
+
+    def test_no_slots_after_working_hours(self):
+        slots = CalendarIndex([]).free_slots(THURSDAY, 1, WORKING_HOURS, now=at(1, 19))
+
+        self.assertEqual(slots, {THURSDAY: []})
+
+    def test_summarize_omits_past_hours(self):
+        facts = CalendarIndex([]).summarize({"working_hours": WORKING_HOURS, "focus_time": FOCUS_TIME},
+                                            days=1, now=at(1, 14))
+
+        self.assertIn("- 05/01(Thu): 14:00～18:00", facts)
+
+
+class FocusViolationsTest(unittest.TestCase):
+    def test_focus_time_boundaries(self):
+        index = CalendarIndex([
+            event("直前", at(1, 9), at(1, 10)),
+            event("直後", at(1, 12), at(1, 13)),
+            event("重なる", at(1, 11, 59), at(1, 12, 30)),
+        ])
+
+        self.assertEqual([(day, e.subject) for day, e in index.focus_violations(FOCUS_TIME)],
+                         [(THURSDAY, "重なる")])
+
+    def test_event_spanning_days(self):
+        index = CalendarIndex([event("出張", at(1, 11), at(2, 11))])
+
+        self.assertEqual([day for day, _ in index.focus_violations(FOCUS_TIME)], [THURSDAY, date(2025, 5, 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
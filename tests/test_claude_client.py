@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Claude APIクライアントのテスト（モックサーバーを使う）"""
+
+import socket
+import unittest
+from unittest import mock
+
+import requests
+
+from claude_client import ClaudeClient, iter_sse_events
+from config import PROMPT_CACHE_MIN_TOKENS
+from mock_claude_server import DEFAULT_RESPONSE_TEXT, MockClaudeServer
+from prompt_templates import Prompt
+
+
+class IterSseEventsTest(unittest.TestCase):
+    def test_parses_events_and_skips_comments(self):
+        lines = [": ping", "event: message_start", 'data: {"a": 1}', "",
+                 'data: {"b":', 'data: 2}', "", None, "event: message_stop", 'data: {}']
+        self.assertEqual(list(iter_sse_events(lines)),
+                         [("message_start", {"a": 1}), ("message", {"b": 2}), ("message_stop", {})])
+
+
+class CallApiStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockClaudeServer().start()
+        self.client = ClaudeClient("test-key", "2023-06-01", api_url=self.server.url)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_stream_delivers_whole_response(self):
+        pieces = []
+        text = self.client.call_api_stream("プロンプト", on_text=pieces.append)
+
+        self.assertEqual(text, DEFAULT_RESPONSE_TEXT.strip().replace("\n\n", "\n"))
+        self.assertGreater(len(pieces), 1)
+        self.assertEqual("".join(pieces), text)
+        self.assertTrue(self.server.last_request["stream"])
+        self.assertGreater(self.client.last_usage["output_tokens"], 0)
+        self.assertEqual(self.client.telemetry.counters["api_requests"], 1)
+
+    def test_stream_cut_before_message_stop_reports_error(self):
+        self.server.stream_cutoff = 3
+        text = self.client.call_api_stream("プロンプト")
+
+        self.assertTrue(text.startswith("# 秘書レポート（モック）"))
+        self.assertIn("APIの呼び出し中にエラーが発生しました", text)
+        self.assertIn("message_stop", text)
+        self.assertNotIn("タスク管理", text)
+
+    def test_mock_sends_sse_events(self):
+        data = {"model": "m", "max_tokens": 10, "stream": True, "messages": [{"role": "user", "content": "x"}]}
+        with requests.post(self.server.url, json=data, stream=True) as response:
+            events = [name for name, _ in iter_sse_events(response.iter_lines(decode_unicode=True))]
+        self.assertEqual(events[0], "message_start")
+        self.assertEqual(events[-2:], ["message_delta", "message_stop"])
+
+
+class RetryTest(unittest.TestCase):
+    def test_read_timeout_is_raised_instead_of_blocking(self):
+        with MockClaudeServer(latency=1.0) as server:
+            client = ClaudeClient("test-key", "2023-06-01", api_url=server.url, timeout=(1, 0.1))
+            with self.assertRaises(requests.Timeout):
+                client.send_message("プロンプト", max_retries=0)
+
+    def test_timeout_is_retried(self):
+        with MockClaudeServer(latency=0.3) as server, mock.patch("claude_client.retry_delay", return_value=0):
+            client = ClaudeClient("test-key", "2023-06-01", api_url=server.url, timeout=(1, 0.1))
+            with self.assertRaises(requests.Timeout):
+                client.send_message("プロンプト", max_retries=2)
+            self.assertEqual(client.telemetry.counters["api_requests"], 3)
+            self.assertEqual(client.telemetry.counters["api_retries"], 2)
+
+            # 応答が間に合うようになれば再試行で成功する
+            server.latency = 0
+            self.assertIn("秘書レポート", client.send_message("プロンプト", max_retries=2))
+
+    def test_connection_error_is_retried(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        client = ClaudeClient("test-key", "2023-06-01", api_url=f"http://127.0.0.1:{port}/v1/messages")
+        with mock.patch("claude_client.retry_delay", return_value=0):
+            with self.assertRaises(requests.ConnectionError):
+                client.send_message("プロンプト", max_retries=1)
+            self.assertIn("APIの呼び出し中にエラーが発生しました", client.call_api_stream("プロンプト"))
+        self.assertEqual(client.telemetry.counters["api_retries"], 1 + 4)
+
+
+class PromptCacheTest(unittest.TestCase):
+    def _call_twice(self, prefix, **server_options):
+        prompt = Prompt(prefix=prefix, body="今日は2025年05月01日です。")
+        with MockClaudeServer(**server_options) as server:
+            client = ClaudeClient("test-key", "2023-06-01", api_url=server.url)
+            with mock.patch("builtins.print") as printed:
+                client.call_api(prompt)
+                first = client.last_usage
+                client.call_api(prompt)
+            return first, client.last_usage, printed
+
+    def test_short_prefix_is_not_cached_and_reported_once(self):
+        first, second, printed = self._call_twice("短いガイドライン")
+
+        for usage in (first, second):
+            self.assertEqual(usage["cache_creation_input_tokens"], 0)
+            self.assertEqual(usage["cache_read_input_tokens"], 0)
+        messages = [c.args[0] for c in printed.call_args_list if "キャッシュされません" in c.args[0]]
+        self.assertEqual(len(messages), 1)
+
+    def test_long_prefix_is_written_then_read(self):
+        first, second, printed = self._call_twice("ガイドライン" * 200)
+
+        self.assertGreater(first["cache_creation_input_tokens"], PROMPT_CACHE_MIN_TOKENS)
+        self.assertEqual(first["cache_read_input_tokens"], 0)
+        self.assertEqual(second["cache_read_input_tokens"], first["cache_creation_input_tokens"])
+        self.assertFalse(any("キャッシュされません" in c.args[0] for c in printed.call_args_list))
+
+    def test_mock_minimum_can_be_lowered(self):
+        _, second, _ = self._call_twice("短いガイドライン", min_cache_tokens=1)
+
+        self.assertGreater(second["cache_read_input_tokens"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
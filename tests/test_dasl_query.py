@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""DASLクエリ作成と、疑似Outlookによる評価のテスト"""
+
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import dasl_query
+from fake_outlook import compile_filter
+
+JST = timezone(timedelta(hours=9))
+
+
+def _mail(subject="件名", body="", sender_email="someone@example.org", unread=True):
+    return SimpleNamespace(Subject=subject, Body=body, SenderEmailAddress=sender_email, UnRead=unread)
+
+
+def _event(start, end):
+    return SimpleNamespace(Start=start, End=end)
+
+
+class QuoteTest(unittest.TestCase):
+    def test_single_quotes_are_doubled(self):
+        self.assertEqual(dasl_query.quote("O'Brien's"), "'O''Brien''s'")
+
+    def test_condition_literals(self):
+        self.assertEqual(dasl_query.unread_condition(), '"urn:schemas:httpmail:read" = 0')
+        self.assertEqual(dasl_query.condition(dasl_query.SUBJECT, "=", "it's"),
+                         '"urn:schemas:httpmail:subject" = \'it\'\'s\'')
+
+    def test_quoted_value_round_trips_through_fake_outlook(self):
+        matches = compile_filter(dasl_query.to_filter(dasl_query.condition(dasl_query.SUBJECT, "=", "O'Brien")))
+
+        self.assertTrue(matches(_mail(subject="O'Brien")))
+        self.assertFalse(matches(_mail(subject="OBrien")))
+
+
+class FormatDateTest(unittest.TestCase):
+    def test_converted_to_utc(self):
+        self.assertEqual(dasl_query.format_date(datetime(2025, 5, 1, 9, 30, tzinfo=JST)), "'2025-05-01 00:30'")
+
+    def test_utc_conversion_crosses_the_date(self):
+        self.assertEqual(dasl_query.format_date(datetime(2025, 5, 1, 8, 0, tzinfo=JST)), "'2025-04-30 23:00'")
+
+    def test_naive_datetime_is_local_time(self):
+        value = datetime(2025, 5, 1, 12, 0)
+        expected = value.astimezone(timezone.utc).strftime(dasl_query.DASL_DATE_FORMAT)
+        self.assertEqual(dasl_query.format_date(value), f"'{expected}'")
+
+
+class OverlapConditionTest(unittest.TestCase):
+    def setUp(self):
+        self.start = datetime(2025, 5, 1, 9, 0, tzinfo=JST)
+        self.end = datetime(2025, 5, 1, 18, 0, tzinfo=JST)
+        self.matches = compile_filter(dasl_query.to_filter(dasl_query.overlap_condition(self.start, self.end)))
+
+    def _at(self, start_hour, end_hour):
+        return _event(self.start.replace(hour=start_hour), self.start.replace(hour=end_hour))
+
+    def test_condition_uses_utc_bounds(self):
+        self.assertEqual(dasl_query.overlap_condition(self.start, self.end),
+                         '("urn:schemas:calendar:dtstart" < \'2025-05-01 09:00\')'
+                         ' AND ("urn:schemas:calendar:dtend" > \'2025-05-01 00:00\')')
+
+    def test_events_overlapping_the_window(self):
+        self.assertTrue(self.matches(self._at(10, 11)))   # 期間中
+        self.assertTrue(self.matches(self._at(8, 10)))    # 期間の前に始まり、期間中に終わる
+        self.assertTrue(self.matches(self._at(17, 19)))   # 期間中に始まり、期間の後に終わる
+        self.assertTrue(self.matches(self._at(7, 20)))    # 期間全体を含む
+
+    def test_events_outside_the_window(self):
+        self.assertFalse(self.matches(self._at(6, 8)))
+        self.assertFalse(self.matches(self._at(19, 20)))
+        # 境界で接するだけの予定は含めない
+        self.assertFalse(self.matches(self._at(8, 9)))
+        self.assertFalse(self.matches(self._at(18, 19)))
+
+    def test_item_times_in_another_zone_are_compared_in_utc(self):
+        utc_event = _event(datetime(2025, 5, 1, 0, 30, tzinfo=timezone.utc), datetime(2025, 5, 1, 1, 0, tzinfo=timezone.utc))
+        self.assertTrue(self.matches(utc_event))
+
+
+class PriorityConditionTest(unittest.TestCase):
+    def test_no_domains_or_keywords(self):
+        self.assertIsNone(dasl_query.priority_condition([], [" "]))
+
+    def test_domains_and_keywords(self):
+        for content_indexed in (True, False):
+            with self.subTest(content_indexed=content_indexed):
+                condition = dasl_query.priority_condition(["@Example.com"], ["至急"], content_indexed)
+                matches = compile_filter(dasl_query.to_filter(dasl_query.all_of(dasl_query.unread_condition(),
+                                                                                 condition)))
+
+                self.assertTrue(matches(_mail(sender_email="boss@example.com")))
+                self.assertTrue(matches(_mail(sender_email="boss@tokyo.example.com")))
+                self.assertFalse(matches(_mail(sender_email="boss@notexample.com")))
+                self.assertTrue(matches(_mail(subject="【至急】確認")))
+                self.assertTrue(matches(_mail(body="至急ご対応ください")))
+                self.assertFalse(matches(_mail(sender_email="boss@example.com", unread=False)))
+
+    def test_operator_depends_on_content_index(self):
+        self.assertIn("ci_phrasematch", dasl_query.keyword_condition("至急", content_indexed=True))
+        self.assertIn("LIKE '%至急%'", dasl_query.keyword_condition("至急", content_indexed=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
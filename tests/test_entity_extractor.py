@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""本文の情報抽出のテスト"""
+
+import unittest
+from datetime import datetime
+
+from entity_extractor import extract_entities
+
+# 2025年4月30日(水)に受信したメールとして解釈する
+RECEIVED = datetime(2025, 4, 30, 9, 0)
+
+
+class ActionItemTest(unittest.TestCase):
+    def test_sentence_at_start_of_body_keeps_first_character(self):
+        entities = extract_entities("ご確認ください。よろしくお願いいたします。", RECEIVED)
+
+        self.assertEqual(entities.action_items[0], "ご確認ください。")
+
+    def test_english_sentence_at_start_of_body(self):
+        entities = extract_entities("Please review the attached draft. Thanks.", RECEIVED)
+
+        self.assertEqual(entities.action_items, ["Please review the attached draft."])
+
+    def test_sentence_after_period(self):
+        entities = extract_entities("Hi team. Could you send the numbers? Thanks.", RECEIVED)
+
+        self.assertEqual(entities.action_items, ["Could you send the numbers?"])
+
+
+class DeadlineTest(unittest.TestCase):
+    def _deadlines(self, text):
+        return [(d.text, d.due) for d in extract_entities(text, RECEIVED).deadlines]
+
+    def test_deadline_word(self):
+        self.assertEqual(self._deadlines("回答期限：5/1(木) 17:00 です。"),
+                         [("回答期限：5/1(木) 17:00", datetime(2025, 5, 1, 17, 0))])
+
+    def test_date_before_madeni(self):
+        self.assertEqual(self._deadlines("6月3日(火)17時までにご提出ください。"),
+                         [("6月3日(火)17時までに", datetime(2025, 6, 3, 17, 0))])
+
+    def test_by_date(self):
+        self.assertEqual(self._deadlines("Please reply by Friday."), [("by Friday", datetime(2025, 5, 2))])
+
+    def test_leave_range_is_not_a_deadline(self):
+        self.assertEqual(self._deadlines("5/1から5/3まで休暇をいただきます。"), [])
+        self.assertEqual(self._deadlines("明日まで不在です。"), [])
+        self.assertEqual(self._deadlines("I am out of office until Friday."), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
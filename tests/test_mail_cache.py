@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""メールボックスキャッシュのテスト"""
+
+import time
+import unittest
+from datetime import datetime
+
+from mail_cache import MailCache
+from records import EmailRecord, EventRecord
+
+MODIFIED = datetime(2025, 5, 1, 9, 0)
+
+
+class PruneTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = MailCache(":memory:")
+        self.cache.put_email(EmailRecord(entry_id="mail", subject="件名", last_modified=MODIFIED,
+                                         received_time=MODIFIED))
+        self.cache.put_event(EventRecord(entry_id="event", subject="定例", start=MODIFIED, last_modified=MODIFIED))
+        self.cache.put_summary("mail", "hash", "要約")
+        self.cache.put_attachment_text("content", "本文")
+        # 最初の保存から期限を過ぎたことにする
+        old = time.time() - 40 * 86400
+        for table in ("emails", "events", "summaries", "attachment_texts"):
+            self.cache.conn.execute(f"UPDATE {table} SET cached_at = ?", (old,))
+
+    def tearDown(self):
+        self.cache.close()
+
+    def test_prune_keeps_entries_read_since(self):
+        self.assertIsNotNone(self.cache.get_email("mail", MODIFIED))
+        self.assertIsNotNone(self.cache.get_event("event", MODIFIED, MODIFIED))
+        self.assertEqual(self.cache.get_summary("mail", "hash"), "要約")
+        self.assertEqual(self.cache.get_attachment_text("content"), "本文")
+
+        self.assertEqual(self.cache.prune(max_age_days=30), 0)
+        self.assertIsNotNone(self.cache.get_email("mail", MODIFIED))
+
+    def test_prune_removes_unused_entries(self):
+        self.assertEqual(self.cache.prune(max_age_days=30), 4)
+        self.assertIsNone(self.cache.get_email("mail", MODIFIED))
+
+    def test_miss_does_not_touch(self):
+        self.assertIsNone(self.cache.get_email("mail", datetime(2025, 5, 2)))
+        self.assertEqual(self.cache.prune(max_age_days=30), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
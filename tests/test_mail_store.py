@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""メールストア（Table APIによる列単位の取得）のテスト"""
+
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from dasl_query import keyword_condition
+from fake_outlook import FakeMailStore, FakeNamespace, FakeTable, generate_fake_messages
+from mail_store import EMAIL_COLUMNS, MailStore, OutlookMailStore
+
+NOW = datetime(2025, 5, 1, 12, 0)
+
+
+def _messages(count, read_every=4):
+    """受信日時の昇順に並べたメール（read_every 件ごとに1件を既読にする）"""
+    messages = generate_fake_messages(count, seed=1, now=NOW)
+    for i, message in enumerate(messages):
+        message["unread"] = i % read_every != 0
+    messages.reverse()
+    return messages
+
+
+def _expected_ids(messages, max_items):
+    unread = [m for m in messages if m["unread"]]
+    unread.sort(key=lambda m: m["received_time"], reverse=True)
+    return [m["entry_id"] for m in unread[:max_items]]
+
+
+class MailStoreTest(unittest.TestCase):
+    def test_base_class_is_abstract(self):
+        with self.assertRaises(TypeError):
+            MailStore()
+
+
+class FakeMailStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.messages = _messages(320)  # 未読は240件
+        self.store = FakeMailStore(self.messages)
+
+    def test_rows_in_batches(self):
+        rows = list(self.store.iter_unread_rows(230, batch_size=100))
+
+        self.assertEqual([r["entry_id"] for r in rows], _expected_ids(self.messages, 230))
+        self.assertEqual(set(rows[0]), {key for _, key in EMAIL_COLUMNS})
+        self.assertEqual(self.store.round_trips, 3)
+
+    def test_max_items_larger_than_unread(self):
+        rows = list(self.store.iter_unread_rows(1000, batch_size=100))
+
+        self.assertEqual(len(rows), 240)
+        self.assertEqual(self.store.round_trips, 3)
+
+    def test_stops_reading_when_consumer_stops(self):
+        rows = self.store.iter_unread_rows(230, batch_size=100)
+        first = [next(rows) for _ in range(100)]
+
+        self.assertEqual(len(first), 100)
+        self.assertEqual(self.store.round_trips, 1)
+
+    def test_query(self):
+        rows = list(self.store.iter_unread_rows(1000, query=keyword_condition("週次レポート")))
+
+        self.assertTrue(rows)
+        self.assertTrue(all("週次レポート" in r["subject"] for r in rows))
+
+    def test_unread_count(self):
+        self.assertEqual(self.store.get_unread_count(), 240)
+
+
+class OutlookMailStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.messages = _messages(320)
+        self.store = OutlookMailStore(FakeNamespace(self.messages))
+
+    def _rows(self, max_items, batch_size):
+        with mock.patch.object(FakeTable, "GetArray", autospec=True, side_effect=FakeTable.GetArray) as get_array:
+            rows = list(self.store.iter_unread_rows(max_items, batch_size=batch_size))
+        return rows, [call.args[1] for call in get_array.call_args_list]
+
+    def test_get_array_batches_truncated_to_max_items(self):
+        rows, requested = self._rows(230, 100)
+
+        self.assertEqual([r["entry_id"] for r in rows], _expected_ids(self.messages, 230))
+        # 最後の読み込みは残りの件数だけを要求する
+        self.assertEqual(requested, [100, 100, 30])
+
+    def test_end_of_table(self):
+        rows, requested = self._rows(1000, 100)
+
+        self.assertEqual(len(rows), 240)
+        self.assertEqual(requested, [100, 100, 100])
+
+    def test_columns_match_fake_store(self):
+        rows, _ = self._rows(5, 100)
+
+        self.assertEqual(rows, list(FakeMailStore(self.messages).iter_unread_rows(5)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Message Batches APIの送信・確認・保存・再開のテスト（モックサーバーを使う）"""
+
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from claude_client import ClaudeClient
+from message_batches import FAILED, SAVED, SUBMITTED, BatchJournal, MessageBatchRunner, make_custom_id
+from mock_claude_server import MockClaudeServer
+from prompt_templates import Prompt
+
+
+class MessageBatchRunnerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.server = MockClaudeServer().start()
+        self.claude = ClaudeClient("test-key", "2023-06-01", api_url=self.server.url)
+        self.journal_path = os.path.join(self.dir.name, "batch_journal.json")
+        print_patcher = mock.patch("builtins.print")
+        print_patcher.start()
+        self.addCleanup(print_patcher.stop)
+
+    def tearDown(self):
+        self.server.stop()
+        self.dir.cleanup()
+
+    def runner(self):
+        return MessageBatchRunner(self.claude, BatchJournal(self.journal_path), sleep=time.sleep,
+                                  poll_interval=0.05, poll_max_interval=0.1)
+
+    def prompts(self, *names):
+        return [(name, Prompt(prefix="指示", body=f"{name}のメール"), self.report_file(name)) for name in names]
+
+    def report_file(self, name):
+        return os.path.join(self.dir.name, f"{name}.md")
+
+    def submitted_contents(self):
+        batch = next(iter(self.server.batches.values()))
+        return [request["params"]["messages"][0]["content"] for request in batch["requests"]]
+
+    def assert_saved(self, entry, name):
+        self.assertEqual(entry["status"], SAVED)
+        self.assertEqual(entry["report_path"], self.report_file(name))
+        with open(self.report_file(name), encoding="utf-8") as f:
+            self.assertIn("秘書レポート（モック）", f.read())
+
+    def test_submit_poll_and_save(self):
+        self.server.batch_delay = 0.3
+        runner = self.runner()
+        entries = runner.run(self.prompts("yamada", "suzuki"))
+
+        self.assert_saved(entries[make_custom_id(1, "yamada")], "yamada")
+        self.assert_saved(entries[make_custom_id(2, "suzuki")], "suzuki")
+        self.assertEqual(self.submitted_contents(), ["yamadaのメール", "suzukiのメール"])
+        # 処理中の間は確認を繰り返す
+        self.assertGreater(self.server.requests, 3)
+        self.assertGreater(runner.telemetry.counters["output_tokens"], 0)
+        self.assertFalse(BatchJournal(self.journal_path).active)
+
+    def test_nothing_to_submit(self):
+        self.assertEqual(self.runner().run([("yamada", None, None)]), {})
+        self.assertEqual(self.server.requests, 0)
+        self.assertFalse(os.path.exists(self.journal_path))
+
+    def test_resume_submitted_batch_without_resubmitting(self):
+        self.server.batch_delay = 60
+        batch_id = self.runner().submit(self.prompts("yamada"))
+        journal = BatchJournal(self.journal_path)
+        self.assertEqual(journal.batch_id, batch_id)
+        self.assertEqual(journal.requests[make_custom_id(1, "yamada")]["status"], SUBMITTED)
+        self.assertNotIn("prompt", journal.requests[make_custom_id(1, "yamada")])
+
+        # 中断後の再実行（新しいプロンプトは渡さない）
+        self.server.batch_delay = 0
+        entries = self.runner().run()
+        self.assert_saved(entries[make_custom_id(1, "yamada")], "yamada")
+        self.assertEqual(len(self.server.batches), 1)
+
+    def test_resume_journal_without_batch_id(self):
+        # 送信前に中断した場合は、ジャーナルに記録したプロンプトで送り直す
+        BatchJournal(self.journal_path).start(
+            [(make_custom_id(1, name), name, prompt, report_file) for name, prompt, report_file in self.prompts("yamada")])
+        self.assertIsNone(BatchJournal(self.journal_path).batch_id)
+
+        entries = self.runner().run(self.prompts("suzuki"))
+        self.assertEqual(list(entries), [make_custom_id(1, "yamada")])
+        self.assert_saved(entries[make_custom_id(1, "yamada")], "yamada")
+        self.assertEqual(self.submitted_contents(), ["yamadaのメール"])
+
+    def test_resume_skips_saved_results(self):
+        runner = self.runner()
+        runner.submit(self.prompts("yamada", "suzuki"))
+        runner.journal.mark(make_custom_id(1, "yamada"), SAVED, report_path="saved-before.md")
+        runner.journal.save()
+
+        entries = self.runner().run()
+        self.assertEqual(entries[make_custom_id(1, "yamada")]["report_path"], "saved-before.md")
+        self.assertFalse(os.path.exists(self.report_file("yamada")))
+        self.assert_saved(entries[make_custom_id(2, "suzuki")], "suzuki")
+
+    def test_missing_results_are_failed(self):
+        runner = self.runner()
+        runner.submit(self.prompts("yamada"))
+        runner.journal.requests["9999-missing"] = {"name": "missing", "status": SUBMITTED, "report_file": None}
+        runner.journal.save()
+
+        entries = self.runner().run()
+        self.assertEqual(entries["9999-missing"]["status"], FAILED)
+        self.assert_saved(entries[make_custom_id(1, "yamada")], "yamada")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""優先度分類のテスト"""
+
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from priority_classifier import DomainMatcher, KeywordMatcher, PriorityClassifier
+from records import EmailRecord
+
+NOW = datetime(2025, 5, 1, 12, 0)
+
+
+def found(matcher, text):
+    return {matcher.keywords[i] for i in matcher.find(text)}
+
+
+class KeywordMatcherTest(unittest.TestCase):
+    def test_overlapping_keywords(self):
+        matcher = KeywordMatcher(["he", "she", "his", "hers"])
+
+        self.assertEqual(found(matcher, "ushers"), {"he", "she", "hers"})
+        self.assertEqual(found(matcher, "ahishers"), {"his", "she", "he", "hers"})
+
+    def test_keyword_that_is_suffix_of_another(self):
+        matcher = KeywordMatcher(["至急対応", "急対応", "対応"])
+
+        self.assertEqual(found(matcher, "本件は至急対応をお願いします"), {"至急対応", "急対応", "対応"})
+        self.assertEqual(found(matcher, "後日対応します"), {"対応"})
+
+    def test_keyword_that_is_prefix_of_another(self):
+        matcher = KeywordMatcher(["期限", "期限切れ"])
+
+        self.assertEqual(found(matcher, "期限は明日"), {"期限"})
+        self.assertEqual(found(matcher, "期限切れのため"), {"期限", "期限切れ"})
+
+    def test_case_folding(self):
+        matcher = KeywordMatcher(["Urgent", "ＡＳＡＰ"])
+
+        self.assertEqual(found(matcher, "URGENT: reply"), {"urgent"})
+        self.assertEqual(found(matcher, "至急ａｓａｐで"), {"ａｓａｐ"})
+        self.assertEqual(found(matcher, "ASAP"), set())  # 全角と半角は別の文字として扱う
+
+    def test_duplicates_and_empty_keywords(self):
+        matcher = KeywordMatcher(["重要", "重要", "", "IMPORTANT", "important"])
+
+        self.assertEqual(matcher.keywords, ["重要", "important"])
+        self.assertEqual(KeywordMatcher([]).find("重要"), set())
+
+    def test_matches_naive_search(self):
+        rng = random.Random(0)
+        alphabet = "abc至急"
+        for _ in range(200):
+            keywords = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(5)]
+            text = "".join(rng.choice(alphabet) for _ in range(30))
+            matcher = KeywordMatcher(keywords)
+            with self.subTest(keywords=keywords, text=text):
+                self.assertEqual(found(matcher, text), {k for k in matcher.keywords if k in text})
+
+
+class DomainMatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.matcher = DomainMatcher(["Example.com", "@client.co.jp", " "])
+
+    def test_domain_and_subdomain(self):
+        self.assertEqual(self.matcher.match("boss@example.com"), "example.com")
+        self.assertEqual(self.matcher.match("boss@Tokyo.EXAMPLE.com"), "example.com")
+        self.assertEqual(self.matcher.match("sales@client.co.jp"), "client.co.jp")
+
+    def test_look_alike_domain(self):
+        self.assertIsNone(self.matcher.match("boss@notexample.com"))
+        self.assertIsNone(self.matcher.match("boss@example.com.evil.net"))
+        self.assertIsNone(self.matcher.match("boss@co.jp"))
+
+    def test_invalid_address(self):
+        self.assertIsNone(self.matcher.match(""))
+        self.assertIsNone(self.matcher.match(None))
+        self.assertIsNone(self.matcher.match("example.com"))
+
+
+class PriorityClassifierTest(unittest.TestCase):
+    def setUp(self):
+        self.classifier = PriorityClassifier({"priority_domains": ["example.com"], "priority_keywords": ["至急"]})
+
+    def _email(self, number, sender_email="someone@other.org", subject="連絡", body="", hours_ago=100):
+        return EmailRecord(id=number, subject=subject, sender_email=sender_email, body=body,
+                           received_time=NOW - timedelta(hours=hours_ago))
+
+    def test_classify(self):
+        result = self.classifier.classify(self._email(1, "boss@example.com", "至急", "至急です", 100), NOW)
+
+        self.assertEqual(result["domain"], "example.com")
+        self.assertEqual(result["keywords"], ["至急"])
+        self.assertTrue(result["priority"])
+        # 件名で一致したキーワードは本文では数えない
+        self.assertEqual(result["score"], 3.0 + 2.0)
+
+    def test_select_keeps_received_order_and_cuts_off(self):
+        emails = [
+            self._email(1, hours_ago=1),                        # 新しいだけ
+            self._email(2, "boss@example.com", hours_ago=2),    # 優先ドメイン
+            self._email(3, hours_ago=3),
+            self._email(4, subject="至急", hours_ago=4),         # 件名に優先キーワード
+            self._email(5, body="至急", hours_ago=5),            # 本文に優先キーワード
+        ]
+
+        selected = self.classifier.select(emails, 3, NOW)
+
+        # スコアは 2 > 4 > 5 > 1 > 3 の順（本文の優先キーワードは、新しさの差より重い）
+        self.assertEqual([e.id for e in selected], [2, 4, 5])
+        self.assertEqual([e.id for e in self.classifier.select(emails, 10, NOW)], [1, 2, 3, 4, 5])
+        self.assertEqual(self.classifier.select(emails, 0, NOW), [])
+
+    def test_ties_prefer_earlier_emails(self):
+        emails = [self._email(i) for i in range(1, 5)]
+
+        self.assertEqual([e.id for e in self.classifier.select(emails, 2, NOW)], [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""プロンプトパッキングのテスト"""
+
+import unittest
+from datetime import datetime
+
+from config import DEFAULT_SETTINGS
+from entity_extractor import annotate
+from prompt_packer import PromptPacker, estimate_tokens
+from prompt_templates import EMAIL, EMAIL_HEADER_ONLY, _email_values, _header_only_values
+from records import EmailRecord
+
+NOW = datetime(2025, 4, 30, 12, 0)
+BODY = ("期限：5/2(金) 17:00 までにご確認ください。回答期限は5/7です。"
+        "会議は https://teams.microsoft.com/l/meetup-join/abc です。資料をご準備ください。"
+        + "詳細は以下のとおりです。" * 40)
+
+
+def _annotated_emails(count=3):
+    emails = [EmailRecord(id=i, subject=f"【至急】見積もりの件{i}", sender="田中", sender_email="tanaka@example.com",
+                          received_time=datetime(2025, 4, 30, 9, i), body=BODY) for i in range(count)]
+    return annotate(emails)
+
+
+def _rendered_tokens(packed):
+    """パッキングの結果をプロンプトのメール欄と同じテンプレートで描画したときのトークン数"""
+    tokens = 0
+    for number, (email, body_chars) in enumerate(packed, 1):
+        if body_chars is None:
+            tokens += estimate_tokens(EMAIL_HEADER_ONLY.render(_header_only_values(number, email)))
+        else:
+            tokens += estimate_tokens(EMAIL.render(_email_values(number, email, body_chars)))
+    return tokens
+
+
+class PackTest(unittest.TestCase):
+    def test_extracted_entities_stay_within_budget(self):
+        emails = _annotated_emails()
+        self.assertTrue(all(e.deadlines and e.action_items and e.meeting_links for e in emails))
+
+        for budget in range(40, 1500, 7):
+            with self.subTest(budget=budget):
+                packed = PromptPacker(budget).pack(emails, dict(DEFAULT_SETTINGS), NOW)
+                self.assertLessEqual(_rendered_tokens(packed), budget)
+
+    def test_header_only_counts_deadlines(self):
+        emails = _annotated_emails(1)
+        header_only = estimate_tokens(EMAIL_HEADER_ONLY.render(_header_only_values(1, emails[0])))
+
+        # 件名のみの1行（期限を含む）がちょうど入らない予算では、メールを省く
+        self.assertEqual(PromptPacker(header_only - 1).pack(emails, dict(DEFAULT_SETTINGS), NOW), [])
+        self.assertEqual(PromptPacker(header_only + 8).pack(emails, dict(DEFAULT_SETTINGS), NOW),
+                         [(emails[0], None)])
+
+    def test_higher_budget_includes_body(self):
+        emails = _annotated_emails(1)
+        packed = PromptPacker(4000).pack(emails, dict(DEFAULT_SETTINGS), NOW)
+
+        self.assertGreater(packed[0][1], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""プロンプトテンプレートのテスト"""
+
+import unittest
+
+from prompt_templates import EMAIL, EVENT, GUIDELINES, HEADER, Template
+
+
+class TemplateTest(unittest.TestCase):
+    def test_renders_like_str_format(self):
+        for template in (GUIDELINES, HEADER, EMAIL, EVENT):
+            values = {name: f"<{name}>" for name in template.fields}
+            self.assertEqual(template.render(values), template.text.format_map(values))
+
+    def test_format_spec_and_escaped_braces(self):
+        template = Template("{{literal}} {count:>3}件{unit}")
+        self.assertEqual(template.fields, ["count", "unit"])
+        self.assertEqual(template.render({"count": 5, "unit": "!"}), "{literal}   5件!")
+
+    def test_without_placeholders(self):
+        self.assertEqual(Template("").render({}), "")
+        self.assertEqual(Template("固定の文字列").render({}), "固定の文字列")
+
+    def test_invalid_placeholder(self):
+        for text in ("{0}", "{a.b}", "{a!r}", "{a[0]}"):
+            with self.assertRaises(ValueError):
+                Template(text)
+
+    def test_missing_value(self):
+        with self.assertRaises(KeyError):
+            HEADER.render({"today": "2025年05月01日"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""レコードのテスト"""
+
+import json
+import unittest
+from datetime import datetime, timezone
+
+from batch import MailboxConfig
+from records import AttachmentRecord, Deadline, EmailRecord, EventRecord, MeetingLink, ThreadDelta, to_datetime
+
+RECEIVED = datetime(2025, 5, 1, 9, 30)
+
+
+def _email():
+    return EmailRecord(
+        id=1, entry_id="ENTRY1", subject="見積もりの件", sender="田中", sender_email="tanaka@example.com",
+        received_time=RECEIVED, last_modified=datetime(2025, 5, 1, 10, 0), has_attachments=True,
+        attachments=[AttachmentRecord(filename="見積書.pdf", size=1234, path="C:/tmp/a.pdf")],
+        thread_count=2, thread_messages=[ThreadDelta(entry_id="ENTRY0", sender="鈴木",
+                                                     received_time=datetime(2025, 4, 30, 18, 0), excerpt="前回の件")],
+        meeting_links=[MeetingLink(provider="teams", url="https://teams.microsoft.com/l/meetup-join/abc")],
+        deadlines=[Deadline(text="5/2まで", due=datetime(2025, 5, 2)), Deadline(text="来週中")],
+        action_items=["ご確認ください。"],
+    )
+
+
+class RoundTripTest(unittest.TestCase):
+    def test_email_with_nested_records(self):
+        email = _email()
+
+        data = json.loads(json.dumps(email.to_dict()))
+        restored = EmailRecord.from_dict(data)
+
+        self.assertEqual(restored, email)
+        self.assertIsInstance(restored.deadlines[0], Deadline)
+        self.assertEqual(restored.deadlines[0].due, datetime(2025, 5, 2))
+        self.assertIsNone(restored.deadlines[1].due)
+        self.assertEqual(restored.thread_messages[0].received_time, datetime(2025, 4, 30, 18, 0))
+
+    def test_datetime_fields_are_iso_strings(self):
+        data = _email().to_dict()
+
+        self.assertEqual(data["received_time"], "2025-05-01T09:30:00")
+        self.assertEqual(data["deadlines"][0], {"text": "5/2まで", "due": "2025-05-02T00:00:00"})
+
+    def test_event_without_times(self):
+        event = EventRecord(subject="未定", start=None, end=None)
+
+        self.assertEqual(EventRecord.from_dict(event.to_dict()), event)
+
+    def test_missing_and_unknown_keys(self):
+        restored = EmailRecord.from_dict({"subject": "件名", "deadlines": None, "unknown": 1})
+
+        self.assertEqual(restored.subject, "件名")
+        self.assertEqual(restored.deadlines, [])
+        self.assertEqual(restored.thread_count, 1)
+
+    def test_to_datetime_drops_timezone(self):
+        self.assertEqual(to_datetime("2025-05-01T09:30:00+09:00"), RECEIVED)
+        self.assertEqual(to_datetime(datetime(2025, 5, 1, 9, 30, tzinfo=timezone.utc)), RECEIVED)
+        self.assertIsNone(to_datetime("not a date"))
+
+
+class DefaultsTest(unittest.TestCase):
+    def test_list_defaults_are_not_shared(self):
+        first, second = EmailRecord(), EmailRecord()
+        first.action_items.append("返信する")
+        first.deadlines.append(Deadline(text="明日"))
+
+        self.assertEqual(second.action_items, [])
+        self.assertEqual(second.deadlines, [])
+        self.assertEqual(EmailRecord._defaults["action_items"], [])
+
+    def test_dict_defaults_are_not_shared(self):
+        first, second = MailboxConfig(name="a"), MailboxConfig(name="b")
+        first.settings["priority_domains"] = ["example.com"]
+
+        self.assertEqual(second.settings, {})
+
+    def test_unknown_field(self):
+        with self.assertRaises(TypeError):
+            EmailRecord(subjects="件名")
+
+
+class CopyTest(unittest.TestCase):
+    def test_copy_with_changes(self):
+        email = _email()
+
+        copied = email.copy(subject="RE: 見積もりの件", body="本文")
+
+        self.assertEqual(copied.subject, "RE: 見積もりの件")
+        self.assertEqual(copied.body, "本文")
+        self.assertEqual(copied.received_time, email.received_time)
+        self.assertEqual(email.subject, "見積もりの件")
+        self.assertNotEqual(copied, email)
+        self.assertEqual(email.copy(), email)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""レポート作成（ReportSession）のテスト（モックサーバーと疑似メールボックスを使う）"""
+
+import asyncio
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
+
+import async_claude_client
+from async_claude_client import AsyncClaudeClient
+from claude_client import ClaudeClient, ReportFailedError
+from config import DEFAULT_SETTINGS, create_arg_parser
+from fake_outlook import FakeMailStore, generate_fake_messages
+from mail_cache import MailCache
+from mock_claude_server import MockClaudeServer
+from outlook_assistant import ReportSession
+from outlook_client import OutlookClient
+from report_archive import ReportArchive
+
+
+def _unused_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/v1/messages"
+
+
+class GenerateTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive = ReportArchive(":memory:")
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.addCleanup(self.archive.close)
+        patcher = mock.patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _session(self, api_url, *options):
+        args = create_arg_parser().parse_args(list(options))
+        claude = ClaudeClient("test-key", "2023-06-01", api_url=api_url)
+        return ReportSession(args, dict(DEFAULT_SETTINGS), SimpleNamespace(attachment_extractor=None), claude,
+                             report_file=os.path.join(self.directory, "report.md"), archive=self.archive,
+                             user="tester")
+
+    def test_successful_report_is_archived(self):
+        with MockClaudeServer() as server:
+            report_path = self._session(server.url).generate()
+
+        self.assertTrue(os.path.exists(report_path))
+        self.assertIsNotNone(self.archive.latest("tester"))
+
+    def test_failed_call_is_not_archived(self):
+        for options in ((), ("--stream",)):
+            with self.subTest(options=options), mock.patch("claude_client.retry_delay", return_value=0):
+                session = self._session(_unused_url(), *options)
+                with self.assertRaises(ReportFailedError):
+                    session.generate()
+
+                self.assertIsNone(self.archive.latest("tester"))
+                self.assertEqual(session.telemetry.counters["api_failures"], 1)
+                # 同じプロンプトでも、次の呼び出しで作成し直す
+                self.assertIsNotNone(session.build_prompt())
+
+    @unittest.skipUnless(async_claude_client.is_available(), "aiohttpがインストールされていません")
+    def test_failed_async_call_is_not_archived(self):
+        session = self._session(_unused_url())
+
+        async def generate():
+            async with AsyncClaudeClient(session.claude) as client:
+                return await session.generate_async(client)
+        with mock.patch("async_claude_client.retry_delay", return_value=0):
+            with self.assertRaises(ReportFailedError):
+                asyncio.run(generate())
+
+        self.assertIsNone(self.archive.latest("tester"))
+
+
+
+class PrefilterTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = MailCache(":memory:")
+        self.addCleanup(self.cache.close)
+        # 1時間おきに届いた未読メール10件のうち、4件目と7件目が優先ドメインから届いている
+        self.messages = generate_fake_messages(10, now=datetime(2025, 5, 1, 12, 0))
+        for i, message in enumerate(self.messages):
+            message.update(subject=f"連絡 {i}", body="本文", unread=True, received_time=datetime(2025, 5, 1, 12 - i),
+                           sender_email="boss@example.com" if i in (3, 6) else f"user{i}@other.org")
+        self.outlook = OutlookClient(store=FakeMailStore(self.messages), cache=self.cache)
+        args = create_arg_parser().parse_args(["--prefilter", "--emails", "5", "--no-normalize", "--no-entities"])
+        self.session = ReportSession(args, dict(DEFAULT_SETTINGS), self.outlook, None, cache=self.cache)
+
+    def test_new_email_count_covers_merged_headers(self):
+        self.session.fetch_emails()
+
+        # 優先メール2件と、最新の未読メール5件（うち1件は優先メール）をまとめた6件
+        self.assertEqual(self.outlook.new_email_count, 6)
+        self.assertEqual(self.cache.get_high_water_mark(), datetime(2025, 5, 1, 12, 0))
+
+    def test_second_run_has_no_new_emails(self):
+        self.session.fetch_emails()
+        self.session.fetch_emails()
+
+        self.assertEqual(self.outlook.new_email_count, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
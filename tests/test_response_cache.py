@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""応答キャッシュのテスト"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from claude_client import ClaudeClient
+from mock_claude_server import MockClaudeServer
+from response_cache import ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.dir.name)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_put_and_get(self):
+        self.cache.put("key", "応答")
+        self.assertEqual(self.cache.get("key"), "応答")
+        self.assertIsNone(self.cache.get("other"))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_removed_file_is_a_miss(self):
+        self.cache.put("key", "応答")
+        # 読み込んだ直後に他のスレッドの evict() で削除された場合
+        with mock.patch("response_cache.os.utime", side_effect=FileNotFoundError):
+            self.assertIsNone(self.cache.get("key"))
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_failed_replace_is_not_stored(self):
+        with mock.patch("response_cache.os.replace", side_effect=PermissionError):
+            self.cache.put("key", "応答")
+        self.assertIsNone(self.cache.get("key"))
+        self.assertEqual(os.listdir(self.dir.name), [])
+
+    def test_concurrent_puts_and_gets_of_same_key(self):
+        errors = []
+
+        def worker(number):
+            try:
+                for i in range(50):
+                    self.cache.put("same", f"応答 {number} {i}")
+                    self.assertIsNotNone(self.cache.get("same"))
+                    self.cache.evict()
+            except Exception as e:  # スレッド内の失敗をテストに伝える
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.cache.hits + self.cache.misses, 8 * 50)
+        self.assertEqual(os.listdir(self.dir.name), ["same.json"])
+
+    def test_evicts_periodically(self):
+        with mock.patch.object(self.cache, "_evict", wraps=self.cache._evict) as evict:
+            for i in range(40):
+                self.cache.put(f"key{i}", "応答")
+        # 最初の保存と、その後 EVICT_INTERVAL 件ごと
+        self.assertEqual(evict.call_count, 2)
+
+    def test_evicts_least_recently_used_over_limit(self):
+        cache = ResponseCache(self.dir.name)
+        for i in range(3):
+            cache.put(f"key{i}", "x" * 50)
+            os.utime(cache._path(f"key{i}"), (1000 + i, time.time() - 100 + i))
+        # 新しい2件だけが入る上限にする
+        cache.max_bytes = os.path.getsize(cache._path("key1")) + os.path.getsize(cache._path("key2"))
+        self.assertEqual(cache.evict(), 1)
+        self.assertIsNone(cache.get("key0"))
+        self.assertIsNotNone(cache.get("key2"))
+
+
+class StreamCacheTest(unittest.TestCase):
+    def test_only_completed_streams_are_cached(self):
+        with tempfile.TemporaryDirectory() as cache_dir, MockClaudeServer(stream_cutoff=2) as server:
+            client = ClaudeClient("test-key", "2023-06-01", response_cache=ResponseCache(cache_dir),
+                                  api_url=server.url)
+            self.assertIn("エラー", client.call_api_stream("プロンプト"))
+            self.assertEqual([n for n in os.listdir(cache_dir) if n.endswith(".json")], [])
+
+            server.stream_cutoff = None
+            complete = client.call_api_stream("プロンプト")
+            self.assertEqual(client.call_api_stream("プロンプト"), complete)
+            self.assertEqual(client.telemetry.counters["response_cache_hits"], 1)
+            self.assertEqual(server.requests, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
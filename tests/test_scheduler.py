@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""事前作成スケジューラーのテスト（ManualWallClock と SimulatedEventSource を使う）"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from claude_client import ReportFailedError
+from scheduler import (MAX_SLEEP_SECONDS, LeadTimeEstimator, ManualWallClock, PregenerationScheduler, run_seconds)
+from telemetry import Telemetry
+from watcher import MAIL, ChangeEvent, SimulatedEventSource
+
+# 1回の作成にかかる時間（シミュレーション上の秒数）
+BUILD_SECONDS = 90
+
+
+class FakeSession:
+    """取得とレポート作成のたびに時計を進めるセッション"""
+
+    def __init__(self, clock, failures=0):
+        self.clock = clock
+        self.failures = failures
+        self.telemetry = Telemetry()
+        self.generated_at = []
+        self.refreshed = []
+
+    def fetch_emails(self):
+        pass
+
+    def fetch_events(self):
+        pass
+
+    def generate(self, force=False):
+        self.clock.sleep(BUILD_SECONDS)
+        if self.failures:
+            self.failures -= 1
+            raise ReportFailedError("Claude APIの呼び出しに失敗しました")
+        self.generated_at.append(self.clock())
+        return f"report_{len(self.generated_at)}.md"
+
+    def refresh(self, batch):
+        self.refreshed.append(batch)
+        return self.generate()
+
+
+class PlanTest(unittest.TestCase):
+    def setUp(self):
+        self.estimator = LeadTimeEstimator(margin=600, default_seconds=120)
+
+    def test_before_start_hour(self):
+        plan = self.estimator.plan(datetime(2025, 5, 1, 7, 0), 9)
+
+        self.assertEqual(plan.start_at, datetime(2025, 5, 1, 9, 0))
+        # 見積もり120秒の2倍と余裕10分を差し引いて更新し、その30分前に作成する
+        self.assertEqual(plan.refresh_at, datetime(2025, 5, 1, 8, 46))
+        self.assertEqual(plan.prebuild_at, datetime(2025, 5, 1, 8, 16))
+
+    def test_after_start_hour_plans_next_day(self):
+        plan = self.estimator.plan(datetime(2025, 5, 1, 9, 0), 9)
+
+        self.assertEqual(plan.start_at, datetime(2025, 5, 2, 9, 0))
+        self.assertEqual(plan.prebuild_at, datetime(2025, 5, 2, 8, 16))
+
+    def test_around_midnight(self):
+        before = self.estimator.plan(datetime(2025, 5, 1, 23, 30), 1)
+        after = self.estimator.plan(datetime(2025, 5, 2, 0, 30), 1)
+
+        for plan in (before, after):
+            self.assertEqual(plan.start_at, datetime(2025, 5, 2, 1, 0))
+            self.assertEqual(plan.refresh_at, datetime(2025, 5, 2, 0, 46))
+            self.assertEqual(plan.prebuild_at, datetime(2025, 5, 2, 0, 16))
+
+    def test_prebuild_crosses_midnight_for_early_start(self):
+        plan = self.estimator.plan(datetime(2025, 5, 1, 22, 0), 0)
+
+        self.assertEqual(plan.start_at, datetime(2025, 5, 2, 0, 0))
+        self.assertEqual(plan.prebuild_at, datetime(2025, 5, 1, 23, 16))
+
+
+class RunSecondsTest(unittest.TestCase):
+    def test_nested_stages_are_not_counted(self):
+        stages = {
+            "fetch_emails": {"count": 1, "total_ms": 20000},
+            "fetch_email_detail": {"count": 50, "total_ms": 15000},
+            "connect": {"count": 1, "total_ms": 3000},
+            "extract_entities": {"count": 2, "total_ms": 1000},
+            "build_prompt": {"count": 1, "total_ms": 1000},
+            "api_call": {"count": 1, "total_ms": 40000},
+        }
+        self.assertAlmostEqual(run_seconds(stages), 62.0)
+
+    def test_divided_by_number_of_reports(self):
+        stages = {"build_prompt": {"count": 2, "total_ms": 2000}, "api_call": {"count": 2, "total_ms": 60000}}
+        self.assertAlmostEqual(run_seconds(stages), 31.0)
+
+    def test_no_stages(self):
+        self.assertIsNone(run_seconds({"connect": {"count": 1, "total_ms": 3000}}))
+
+
+class RunDayTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.state_path = os.path.join(self.directory, "prebuilt_report.json")
+        self.clock = ManualWallClock(datetime(2025, 5, 1, 7, 0))
+        self.sleeps = []
+        patcher = mock.patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.clock.sleep(seconds)
+
+    def _scheduler(self, session, script=()):
+        source = SimulatedEventSource(list(script), lambda: self.clock().timestamp())
+        estimator = LeadTimeEstimator(margin=600, default_seconds=120)
+        return PregenerationScheduler(session, source, estimator, 9, self.state_path, clock=self.clock,
+                                      sleep=self.sleep, poll_interval=5)
+
+    def _saved_report(self):
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path, encoding="utf-8") as f:
+            return os.path.basename(json.load(f)["report_path"])
+
+    def test_no_events_keeps_prebuilt_report(self):
+        session = FakeSession(self.clock)
+        scheduler = self._scheduler(session)
+        plan = scheduler.run_day()
+
+        self.assertEqual(session.generated_at, [plan.prebuild_at + timedelta(seconds=BUILD_SECONDS)])
+        self.assertEqual(session.refreshed, [])
+        self.assertEqual((scheduler.prebuilds, scheduler.refreshes), (1, 0))
+        self.assertEqual(self._saved_report(), "report_1.md")
+        self.assertGreaterEqual(self.clock(), plan.refresh_at)
+        # 作成までの1時間以上の待機も、上限の長さに分けて待つ
+        self.assertLessEqual(max(self.sleeps), MAX_SLEEP_SECONDS)
+        # 見積もりには作成にかかった時間だけを加える
+        self.assertEqual(list(scheduler.estimator.history), [BUILD_SECONDS])
+
+    def test_events_after_prebuild_refresh_before_start(self):
+        session = FakeSession(self.clock)
+        # 作成を始めてから10分後に新着メールが届く（開始時刻は source.start の時点）
+        scheduler = self._scheduler(session, [(600, ChangeEvent(kind=MAIL, entry_id="new"))])
+        plan = scheduler.run_day()
+
+        self.assertEqual(len(session.refreshed), 1)
+        self.assertEqual(session.refreshed[0].mail_entry_ids, {"new"})
+        self.assertEqual(session.generated_at[-1], plan.refresh_at + timedelta(seconds=BUILD_SECONDS))
+        self.assertEqual((scheduler.prebuilds, scheduler.refreshes), (1, 1))
+        self.assertEqual(self._saved_report(), "report_2.md")
+        self.assertLess(session.generated_at[-1], plan.start_at)
+
+    def test_failed_prebuild_is_not_saved_and_retried(self):
+        session = FakeSession(self.clock, failures=1)
+        scheduler = self._scheduler(session)
+        with mock.patch("traceback.print_exc"):
+            plan = scheduler.run_day()
+
+        self.assertEqual(session.generated_at, [plan.refresh_at + timedelta(seconds=BUILD_SECONDS)])
+        self.assertEqual(scheduler.prebuilds, 2)
+        self.assertEqual(self._saved_report(), "report_1.md")
+
+    def test_failed_report_is_never_saved(self):
+        session = FakeSession(self.clock, failures=2)
+        scheduler = self._scheduler(session, [(600, ChangeEvent(kind=MAIL, entry_id="new"))])
+        with mock.patch("traceback.print_exc"):
+            scheduler.run_day()
+
+        self.assertIsNone(self._saved_report())
+        self.assertEqual(list(scheduler.estimator.history), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
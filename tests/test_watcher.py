@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""常駐監視のテスト（SimulatedEventSource と ManualClock を使う）"""
+
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from watcher import (CALENDAR, MAIL, ChangeEvent, Debouncer, EventSource, ManualClock, ReportDaemon,
+                     SimulatedEventSource, calendar_window_filter)
+
+
+def mail(entry_id):
+    return ChangeEvent(kind=MAIL, entry_id=entry_id)
+
+
+def calendar(start=None, end=None):
+    return ChangeEvent(kind=CALENDAR, entry_id="event", start=start, end=end)
+
+
+class EventSourceTest(unittest.TestCase):
+    def test_poll_is_abstract(self):
+        class NoPoll(EventSource):
+            pass
+
+        with self.assertRaises(TypeError):
+            NoPoll()
+
+
+class DebouncerTest(unittest.TestCase):
+    def test_waits_for_quiet_period(self):
+        debouncer = Debouncer(quiet_seconds=30, max_delay=300)
+        self.assertFalse(debouncer.due(0))
+        debouncer.add([mail("a")], 0)
+        debouncer.add([], 20)
+        self.assertFalse(debouncer.due(29))
+        self.assertTrue(debouncer.due(30))
+
+        batch = debouncer.drain()
+        self.assertEqual(batch.mail_entry_ids, {"a"})
+        self.assertFalse(debouncer.due(1000))
+
+    def test_new_events_extend_the_wait(self):
+        debouncer = Debouncer(quiet_seconds=30, max_delay=300)
+        debouncer.add([mail("a")], 0)
+        debouncer.add([mail("b")], 25)
+        self.assertFalse(debouncer.due(50))
+        self.assertTrue(debouncer.due(55))
+
+    def test_max_delay_caps_continuous_events(self):
+        debouncer = Debouncer(quiet_seconds=30, max_delay=100)
+        for now in range(0, 100, 10):
+            debouncer.add([mail(str(now))], now)
+            self.assertFalse(debouncer.due(now))
+        self.assertTrue(debouncer.due(100))
+        self.assertEqual(len(debouncer.drain().mail_entry_ids), 10)
+
+
+class ReportDaemonTest(unittest.TestCase):
+    def run_daemon(self, script, debouncer, relevant=None, **run_options):
+        clock = ManualClock()
+        source = SimulatedEventSource(script, clock)
+        batches = []
+        daemon = ReportDaemon(source, lambda batch: batches.append((clock(), batch)), debouncer, relevant,
+                              clock=clock, sleep=clock.sleep)
+        with mock.patch("builtins.print"):
+            daemon.run(**run_options)
+        return daemon, batches
+
+    def test_burst_of_events_is_one_refresh(self):
+        script = [(1, mail("a")), (3, mail("b")), (5, mail("a")), (6, calendar())]
+        daemon, batches = self.run_daemon(script, Debouncer(quiet_seconds=10, max_delay=300), duration=60)
+
+        self.assertEqual(daemon.refreshes, 1)
+        refreshed_at, batch = batches[0]
+        self.assertEqual(refreshed_at, 16)
+        self.assertEqual(batch.mail_entry_ids, {"a", "b"})
+        self.assertTrue(batch.calendar_changed)
+        self.assertEqual(batch.describe(), "新着メール2件、予定の変更1件")
+
+    def test_separate_bursts_are_separate_refreshes(self):
+        script = [(1, mail("a")), (2, mail("b")), (100, calendar())]
+        daemon, batches = self.run_daemon(script, Debouncer(quiet_seconds=10, max_delay=300), max_refreshes=2)
+
+        self.assertEqual([at for at, _ in batches], [12, 110])
+        self.assertTrue(batches[0][1].mail_changed)
+        self.assertFalse(batches[0][1].calendar_changed)
+        self.assertFalse(batches[1][1].mail_changed)
+        self.assertTrue(batches[1][1].calendar_changed)
+
+    def test_steady_stream_is_capped_by_max_delay(self):
+        script = [(second, mail(str(second))) for second in range(1, 200, 5)]
+        daemon, batches = self.run_daemon(script, Debouncer(quiet_seconds=10, max_delay=60), max_refreshes=1)
+
+        self.assertEqual(batches[0][0], 61)
+
+    def test_irrelevant_calendar_events_are_ignored(self):
+        now = datetime(2025, 5, 1, 9, 0)
+        relevant = calendar_window_filter(7, now=lambda: now)
+        script = [(1, calendar(datetime(2025, 6, 1, 10), datetime(2025, 6, 1, 11))),
+                  (2, calendar(datetime(2025, 5, 2, 10), datetime(2025, 5, 2, 11)))]
+        daemon, batches = self.run_daemon(script, Debouncer(quiet_seconds=5, max_delay=60), relevant, duration=30)
+
+        self.assertEqual(daemon.ignored, 1)
+        self.assertEqual(daemon.refreshes, 1)
+        self.assertEqual(len(batches[0][1].events), 1)
+
+    def test_refresh_error_does_not_stop_the_daemon(self):
+        clock = ManualClock()
+        source = SimulatedEventSource([(1, mail("a")), (50, mail("b"))], clock)
+        calls = []
+
+        def refresh(batch):
+            calls.append(batch)
+            if len(calls) == 1:
+                raise RuntimeError("更新に失敗")
+
+        daemon = ReportDaemon(source, refresh, Debouncer(quiet_seconds=5, max_delay=60), clock=clock,
+                              sleep=clock.sleep)
+        with mock.patch("builtins.print"), mock.patch("traceback.print_exc"):
+            daemon.run(max_refreshes=2)
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(source.exhausted)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+スレッド集約モジュール
+
+同じ会話（スレッド）に属する未読メールを1件のエントリにまとめる。最新のメールは
+本文をそのまま残し、それより前のメールは送信者・日時と本文冒頭の差分だけを
+thread_messages に持たせる。まとめた結果は ThreadIndex として後段から参照できる。
+"""
+
+import re
+from datetime import datetime
+
+from records import ThreadDelta, format_datetime
+
+# ConversationIndex の先頭22バイト（16進44文字）は会話ごとに共通
+CONVERSATION_ID_HEX_CHARS = 44
+
+# 過去のメールについてプロンプトに含める本文の文字数
+DELTA_CHARS = 150
+
+_SUBJECT_PREFIX = re.compile(r'^\s*(?:(?:re|fw|fwd|返信|転送|ＲＥ|ＦＷ)\s*(?:\[\d+\])?\s*[:：]\s*)+', re.IGNORECASE)
+
+
+def normalize_topic(subject):
+    """
+    件名から返信・転送の接頭辞を除いた会話トピックを作成
+
+    Args:
+        subject (str): 件名
+
+    Returns:
+        str: 比較用の会話トピック
+    """
+    return _SUBJECT_PREFIX.sub('', subject or '').strip().lower()
+
+
+def thread_key(email):
+    """
+    メールが属するスレッドのキーを取得
+
+    ConversationIndex があればその先頭部分、なければ ConversationTopic または
+    件名から作ったトピックを使う。
+    """
+    index = email.conversation_index or ""
+    if len(index) >= CONVERSATION_ID_HEX_CHARS:
+        return "id:" + index[:CONVERSATION_ID_HEX_CHARS].upper()
+    return "topic:" + normalize_topic(email.conversation_topic or email.subject)
+
+
+def _delta(email):
+    """過去のメール1件分の差分情報"""
+    body = " ".join((email.body or "").split())
+    return ThreadDelta(
+        entry_id=email.entry_id,
+        sender=email.sender,
+        received_time=email.received_time,
+        excerpt=body[:DELTA_CHARS] + ("..." if len(body) > DELTA_CHARS else ""),
+    )
+
+
+def _received_order(email):
+    """受信日時でのソートキー（受信日時のないメールは最も古いものとして扱う）"""
+    return email.received_time or datetime.min
+
+
+def format_thread_deltas(email):
+    """
+    プロンプト用にスレッドの過去のメールを整形
+
+    Args:
+        email (EmailRecord): ThreadIndex.collapse で作成したエントリ
+
+    Returns:
+        str: 改行で始まる箇条書き（過去のメールがない場合は空文字列）
+    """
+    deltas = email.thread_messages
+    if not deltas:
+        return ""
+    lines = [f"\n- スレッド: 全{email.thread_count}件（以下は過去のメール、新しい順）"]
+    for delta in deltas:
+        lines.append(f"  - {format_datetime(delta.received_time)} {delta.sender}: {delta.excerpt}")
+    return "\n".join(lines)
+
+
+class ThreadIndex:
+    """
+    スレッドの索引
+
+    Attributes:
+        threads (dict): スレッドのキーから、受信日時の降順に並べたメールのリストへの辞書
+        by_entry_id (dict): EntryIDからスレッドのキーへの辞書
+    """
+
+    def __init__(self, emails_data):
+        """
+        初期化
+
+        Args:
+            emails_data (list): 未読メールのリスト
+        """
+        self.threads = {}
+        self.by_entry_id = {}
+        for email in emails_data:
+            key = thread_key(email)
+            self.threads.setdefault(key, []).append(email)
+            if email.entry_id:
+                self.by_entry_id[email.entry_id] = key
+        for messages in self.threads.values():
+            messages.sort(key=_received_order, reverse=True)
+
+    def thread_of(self, entry_id):
+        """
+        メールと同じスレッドのメールを取得
+
+        Returns:
+            list: 受信日時の降順のメールのリスト（見つからない場合は空）
+        """
+        return self.threads.get(self.by_entry_id.get(entry_id), [])
+
+    def collapse(self):
+        """
+        スレッドごとに1件のエントリにまとめる
+
+        Returns:
+            list: 各スレッドの最新メールに thread_count と thread_messages
+                （それより前のメールの差分、新しい順）を加えたリスト。
+                最新メールの受信日時の降順に並べる。
+        """
+        collapsed = []
+        for messages in self.threads.values():
+            collapsed.append(messages[0].copy(
+                thread_count=len(messages),
+                thread_messages=[_delta(m) for m in messages[1:]],
+            ))
+        collapsed.sort(key=_received_order, reverse=True)
+        return collapsed
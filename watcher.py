@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+常駐監視モジュール
+
+Outlookの新着メール（Application.NewMailEx）と予定の追加・変更・削除を
+イベントとして受け取り、短時間に続いたイベントをまとめてから（デバウンス）
+レポートを更新する。イベントの取得元は EventSource として抽象化しており、
+Outlookのない環境では SimulatedEventSource と ManualClock で同じ処理を動かせる。
+"""
+
+import abc
+import time
+import traceback
+from datetime import datetime, timedelta
+
+try:
+    import win32com.client
+    import pythoncom
+except ImportError:  # Windows以外ではpywin32を利用できない
+    win32com = None
+    pythoncom = None
+
+from records import Record, to_datetime
+
+# 最後のイベントからレポートを更新するまでの待ち時間（秒）
+DEFAULT_DEBOUNCE_SECONDS = 30
+# 最初のイベントからレポートを更新するまでの最大の待ち時間（秒）
+DEFAULT_MAX_DELAY_SECONDS = 300
+# イベントを確認する間隔（秒）
+POLL_INTERVAL_SECONDS = 1
+
+OL_FOLDER_CALENDAR = 9
+
+MAIL = "mail"
+CALENDAR = "calendar"
+
+
+class ChangeEvent(Record):
+    """メールボックスの変更1件"""
+
+    __slots__ = ("kind", "entry_id", "start", "end")
+    _defaults = {"entry_id": ""}
+    _datetime_fields = ("start", "end")
+
+
+class ChangeBatch:
+    """デバウンスでまとめた変更"""
+
+    def __init__(self, events):
+        """
+        初期化
+
+        Args:
+            events (list): ChangeEvent のリスト
+        """
+        self.events = events
+        self.mail_entry_ids = {e.entry_id for e in events if e.kind == MAIL}
+        self.calendar_changed = any(e.kind == CALENDAR for e in events)
+
+    @property
+    def mail_changed(self):
+        return bool(self.mail_entry_ids)
+
+    def describe(self):
+        """表示用の文字列"""
+        parts = []
+        if self.mail_changed:
+            parts.append(f"新着メール{len(self.mail_entry_ids)}件")
+        if self.calendar_changed:
+            parts.append(f"予定の変更{sum(1 for e in self.events if e.kind == CALENDAR)}件")
+        return "、".join(parts)
+
+
+class EventSource(abc.ABC):
+    """変更イベントの取得元"""
+
+    def start(self):
+        """イベントの受信を開始"""
+
+    @abc.abstractmethod
+    def poll(self):
+        """
+        前回の呼び出し以降に届いたイベントを取得
+
+        Returns:
+            list: ChangeEvent のリスト
+        """
+
+    def stop(self):
+        """イベントの受信を終了"""
+
+
+class _ApplicationEvents:
+    """Outlook.Application のイベントハンドラ（source は登録後に設定する）"""
+
+    source = None
+
+    def OnNewMailEx(self, entry_ids):
+        for entry_id in str(entry_ids).split(","):
+            if entry_id.strip():
+                self.source._pending.append(ChangeEvent(kind=MAIL, entry_id=entry_id.strip()))
+
+
+class _CalendarItemsEvents:
+    """カレンダーフォルダの Items のイベントハンドラ（source は登録後に設定する）"""
+
+    source = None
+
+    def _add(self, item):
+        self.source._pending.append(ChangeEvent(
+            kind=CALENDAR,
+            entry_id=getattr(item, "EntryID", ""),
+            start=to_datetime(getattr(item, "Start", None)),
+            end=to_datetime(getattr(item, "End", None)),
+        ))
+
+    def OnItemAdd(self, item):
+        self._add(item)
+
+    def OnItemChange(self, item):
+        self._add(item)
+
+    def OnItemRemove(self):
+        # 削除された予定は特定できないため、常に変更として扱う
+        self.source._pending.append(ChangeEvent(kind=CALENDAR))
+
+
+class OutlookEventSource(EventSource):
+    def __init__(self, outlook_client):
+        """
+        初期化
+
+        Args:
+            outlook_client (OutlookClient): 接続済みのOutlookクライアント（COM接続を共有する）
+        """
+        self.client = outlook_client
+        self._pending = []
+        self._handlers = []
+
+    def start(self):
+        """NewMailEx とカレンダーの ItemAdd/ItemChange/ItemRemove を購読"""
+        if win32com is None or not self.client.connect():
+            raise RuntimeError("Outlookのイベントを購読できません: Outlookに接続できませんでした")
+        application = win32com.client.WithEvents(self.client.outlook, _ApplicationEvents)
+        application.source = self
+        # Items への参照を保持しないと購読が解除される
+        self._calendar_items = self.client.namespace.GetDefaultFolder(OL_FOLDER_CALENDAR).Items
+        calendar = win32com.client.WithEvents(self._calendar_items, _CalendarItemsEvents)
+        calendar.source = self
+        self._handlers = [application, calendar]
+
+    def poll(self):
+        """COMのメッセージを処理し、届いたイベントを返す"""
+        pythoncom.PumpWaitingMessages()
+        events, self._pending = self._pending, []
+        return events
+
+    def stop(self):
+        for handler in self._handlers:
+            try:
+                handler.close()
+            except Exception:
+                pass
+        self._handlers = []
+        self._calendar_items = None
+
+
+class ManualClock:
+    """手動で進める時計（シミュレーション用。sleep で時刻が進む）"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class SimulatedEventSource(EventSource):
+    def __init__(self, script, clock):
+        """
+        初期化
+
+        Args:
+            script (list): (開始からの秒数, ChangeEvent) のリスト
+            clock (callable): 現在時刻（秒）を返す関数
+        """
+        self.script = sorted(script, key=lambda entry: entry[0])
+        self.clock = clock
+        self._position = 0
+        self._started_at = None
+
+    def start(self):
+        self._started_at = self.clock()
+        self._position = 0
+
+    def poll(self):
+        elapsed = self.clock() - self._started_at
+        events = []
+        while self._position < len(self.script) and self.script[self._position][0] <= elapsed:
+            events.append(self.script[self._position][1])
+            self._position += 1
+        return events
+
+    @property
+    def exhausted(self):
+        return self._position >= len(self.script)
+
+
+class Debouncer:
+    def __init__(self, quiet_seconds=DEFAULT_DEBOUNCE_SECONDS, max_delay=DEFAULT_MAX_DELAY_SECONDS):
+        """
+        初期化
+
+        Args:
+            quiet_seconds (float): 最後のイベントからこの秒数だけ静かになったら更新する
+            max_delay (float): イベントが続いても、最初のイベントからこの秒数で更新する
+        """
+        self.quiet_seconds = quiet_seconds
+        self.max_delay = max_delay
+        self.pending = []
+        self.first_at = None
+        self.last_at = None
+
+    def add(self, events, now):
+        """イベントを追加"""
+        if not events:
+            return
+        if self.first_at is None:
+            self.first_at = now
+        self.last_at = now
+        self.pending.extend(events)
+
+    def due(self, now):
+        """更新する時期になったか判定"""
+        if not self.pending:
+            return False
+        return now - self.last_at >= self.quiet_seconds or now - self.first_at >= self.max_delay
+
+    def drain(self):
+        """
+        保留中のイベントを取り出す
+
+        Returns:
+            ChangeBatch: まとめた変更
+        """
+        batch = ChangeBatch(self.pending)
+        self.pending = []
+        self.first_at = None
+        self.last_at = None
+        return batch
+
+
+def calendar_window_filter(days_ahead, now=datetime.now):
+    """
+    レポートの対象期間に関係するイベントだけを通すフィルタを作成
+
+    メールのイベントと、日時が分からない予定のイベントは常に通す。
+
+    Args:
+        days_ahead (int): レポートに含める予定の日数
+        now (callable): 現在日時を返す関数
+
+    Returns:
+        callable: ChangeEvent を受け取り、関係があれば True を返す関数
+    """
+    def relevant(event):
+        if event.kind != CALENDAR or event.start is None or event.end is None:
+            return True
+        window_start = now()
+        return event.start < window_start + timedelta(days=days_ahead) and event.end > window_start
+    return relevant
+
+
+class ReportDaemon:
+    def __init__(self, source, refresh, debouncer=None, relevant=None, clock=time.monotonic, sleep=time.sleep,
+                 poll_interval=POLL_INTERVAL_SECONDS):
+        """
+        初期化
+
+        Args:
+            source (EventSource): 変更イベントの取得元
+            refresh (callable): ChangeBatch を受け取ってレポートを更新する関数
+            debouncer (Debouncer): イベントのまとめ方（省略時は既定値）
+            relevant (callable): ChangeEvent を受け取り、更新が必要なら True を返す関数
+            clock (callable): 現在時刻（秒）を返す関数
+            sleep (callable): 指定秒数だけ待つ関数
+            poll_interval (float): イベントを確認する間隔（秒）
+        """
+        self.source = source
+        self.refresh = refresh
+        self.debouncer = debouncer or Debouncer()
+        self.relevant = relevant or (lambda event: True)
+        self.clock = clock
+        self.sleep = sleep
+        self.poll_interval = poll_interval
+        self.refreshes = 0
+        self.ignored = 0
+
+    def run(self, max_refreshes=None, duration=None):
+        """
+        イベントを待ってレポートを更新し続ける
+
+        Args:
+            max_refreshes (int): この回数だけ更新したら終了する（省略時は無制限）
+            duration (float): この秒数が経過したら終了する（省略時は無制限）
+        """
+        self.source.start()
+        started_at = self.clock()
+        try:
+            while True:
+                now = self.clock()
+                events = self.source.poll()
+                relevant = [e for e in events if self.relevant(e)]
+                self.ignored += len(events) - len(relevant)
+                self.debouncer.add(relevant, now)
+
+                if self.debouncer.due(now):
+                    batch = self.debouncer.drain()
+                    print(f"\n変更を検出しました: {batch.describe()}")
+                    try:
+                        self.refresh(batch)
+                    except Exception as e:
+                        print(f"レポートの更新中にエラー: {e}")
+                        traceback.print_exc()
+                    self.refreshes += 1
+                    if max_refreshes is not None and self.refreshes >= max_refreshes:
+                        return
+
+                if duration is not None and now - started_at >= duration:
+                    return
+                self.sleep(self.poll_interval)
+        finally:
+            self.source.stop()